@@ -25,8 +25,9 @@ import asyncio
 import threading
 import asyncio
 import itertools
+from bisect import bisect_left
 from collections import defaultdict
-from typing import TYPE_CHECKING, Dict, Optional, Set, Tuple, NamedTuple, Sequence, List
+from typing import TYPE_CHECKING, Dict, Optional, Set, Tuple, NamedTuple, Sequence, List, Callable, Iterable
 
 from . import bitcoin, util
 from .bitcoin import COINBASE_MATURITY
@@ -65,6 +66,58 @@ class TxWalletDelta(NamedTuple):
     fee: Optional[int]
 
 
+class HistoryIndex:
+    """Wallet transactions sorted by txpos, with their delta and the running
+    balance after each of them. Transactions whose delta or position may have
+    changed are marked dirty; on update, only those are recomputed, and the
+    running balances only from the first position that changed.
+    Transactions with the same txpos (e.g. unconfirmed) are kept in the order
+    they were added.
+    """
+
+    def __init__(self, txids: Iterable[str] = ()):
+        self.keys = []  # type: List[Tuple[Tuple[float, int], int, str]]  # sorted (txpos, seq, txid)
+        self.key_of = {}  # type: Dict[str, Tuple[Tuple[float, int], int, str]]
+        self.deltas = {}  # type: Dict[str, int]
+        self._next_seq = 0
+        self.balances = []  # type: List[int]  # running balances, valid for a prefix of keys
+        self.dirty = set(txids)  # type: Set[str]
+
+    def mark_dirty(self, txid: str) -> None:
+        self.dirty.add(txid)
+
+    def update(self, compute_entry: Callable[[str], Optional[Tuple[Tuple[float, int], int]]]) -> None:
+        """compute_entry(txid) returns (txpos, delta), or None if txid is not in the history."""
+        dirty, self.dirty = self.dirty, set()
+        first_changed = len(self.balances)
+        for txid in dirty:
+            old_key = self.key_of.pop(txid, None)
+            if old_key is not None:
+                i = bisect_left(self.keys, old_key)
+                del self.keys[i]
+                del self.deltas[txid]
+                first_changed = min(first_changed, i)
+            entry = compute_entry(txid)
+            if entry is not None:
+                txpos, delta = entry
+                if old_key is not None:
+                    seq = old_key[1]
+                else:
+                    seq = self._next_seq
+                    self._next_seq += 1
+                key = (txpos, seq, txid)
+                i = bisect_left(self.keys, key)
+                self.keys.insert(i, key)
+                self.key_of[txid] = key
+                self.deltas[txid] = delta
+                first_changed = min(first_changed, i)
+        del self.balances[first_changed:]
+        balance = self.balances[-1] if self.balances else 0
+        for txpos, seq, txid in self.keys[first_changed:]:
+            balance += self.deltas[txid]
+            self.balances.append(balance)
+
+
 class AddressSynchronizer(Logger):
     """
     inherited by wallet
@@ -93,6 +146,13 @@ class AddressSynchronizer(Logger):
         self.threadlocal_cache = threading.local()
 
         self._get_addr_balance_cache = {}
+        # wallet balance: sum of the balances of the addresses in _balance_by_addr
+        self._balance_by_addr = {}  # type: Dict[str, Tuple[int, int, int]]
+        self._balance_total = (0, 0, 0)
+        self._balance_dirty = set()  # type: Set[str]  # addresses to add to the wallet balance again
+        # address -> height of the next block at which one of its coinbase outputs matures
+        self._coinbase_maturity = {}  # type: Dict[str, int]
+        self._balance_local_height = None  # type: Optional[int]
 
         self.load_and_cleanup()
 
@@ -195,7 +255,30 @@ class AddressSynchronizer(Logger):
             util.register_callback(self.on_blockchain_updated, ['blockchain_updated'])
 
     def on_blockchain_updated(self, event, *args):
-        self._get_addr_balance_cache = {}  # invalidate cache
+        local_height = self.get_local_height()
+        with self.lock:
+            if self._balance_local_height is None or local_height < self._balance_local_height:
+                # first block since we started, or reorg: the balances might
+                # have been computed at a higher height
+                for addr in list(self._get_addr_balance_cache) + list(self._balance_by_addr):
+                    self._invalidate_addr_balance(addr)
+            else:
+                # only coinbase maturity depends on the height
+                for addr, maturity_height in list(self._coinbase_maturity.items()):
+                    if local_height + 1 >= maturity_height:
+                        self._invalidate_addr_balance(addr)
+            self._balance_local_height = local_height
+
+    def _invalidate_addr_balance(self, addr: str) -> None:
+        self._get_addr_balance_cache.pop(addr, None)
+        self._coinbase_maturity.pop(addr, None)
+        self._balance_dirty.add(addr)
+
+    def _on_tx_height_changed(self, tx_hash: str) -> None:
+        with self.transaction_lock:
+            self._history_index.mark_dirty(tx_hash)
+            for addr in itertools.chain(self.db.get_txi_addresses(tx_hash), self.db.get_txo_addresses(tx_hash)):
+                self._invalidate_addr_balance(addr)
 
     def stop(self):
         if self.network:
@@ -210,7 +293,11 @@ class AddressSynchronizer(Logger):
 
     def add_address(self, address):
         if not self.db.get_addr_history(address):
-            self.db.history[address] = []
+            self.db.set_addr_history(address, [])
+            with self.transaction_lock:
+                for txid in self._history_local.get(address, set()):
+                    self._history_index.mark_dirty(txid)
+                self._invalidate_addr_balance(address)
             self.set_up_to_date(False)
         if self.synchronizer:
             self.synchronizer.add(address)
@@ -308,7 +395,7 @@ class AddressSynchronizer(Logger):
                         pass
                     else:
                         self.db.add_txi_addr(tx_hash, addr, ser, v)
-                        self._get_addr_balance_cache.pop(addr, None)  # invalidate cache
+                        self._invalidate_addr_balance(addr)
             for txi in tx.inputs():
                 if txi.is_coinbase_input():
                     continue
@@ -326,7 +413,7 @@ class AddressSynchronizer(Logger):
                 addr = self.get_txout_address(txo)
                 if addr and self.is_mine(addr):
                     self.db.add_txo_addr(tx_hash, addr, n, v, is_coinbase)
-                    self._get_addr_balance_cache.pop(addr, None)  # invalidate cache
+                    self._invalidate_addr_balance(addr)
                     # give v to txi that spends me
                     next_tx = self.db.get_spent_outpoint(tx_hash, n)
                     if next_tx is not None:
@@ -376,7 +463,7 @@ class AddressSynchronizer(Logger):
             remove_from_spent_outpoints()
             self._remove_tx_from_local_history(tx_hash)
             for addr in itertools.chain(self.db.get_txi_addresses(tx_hash), self.db.get_txo_addresses(tx_hash)):
-                self._get_addr_balance_cache.pop(addr, None)  # invalidate cache
+                self._invalidate_addr_balance(addr)
             self.db.remove_txi(tx_hash)
             self.db.remove_txo(tx_hash)
             self.db.remove_tx_fee(tx_hash)
@@ -410,6 +497,7 @@ class AddressSynchronizer(Logger):
                     # make tx local
                     self.unverified_tx.pop(tx_hash, None)
                     self.db.remove_verified_tx(tx_hash)
+                    self._on_tx_height_changed(tx_hash)
                     if self.verifier:
                         self.verifier.remove_spv_proof_for_tx(tx_hash)
             self.db.set_addr_history(addr, hist)
@@ -431,6 +519,9 @@ class AddressSynchronizer(Logger):
     def load_local_history(self):
         self._history_local = {}  # type: Dict[str, Set[str]]  # address -> set(txid)
         self._address_history_changed_events = defaultdict(asyncio.Event)  # address -> Event
+        self._history_index = HistoryIndex()
+        self._utxos = {}  # type: Dict[str, Dict[str, Tuple[int, bool]]]  # address -> prevout -> (value, is_coinbase)
+        self._utxos_dirty = set()  # type: Set[str]  # addresses whose entry in _utxos is outdated
         for txid in itertools.chain(self.db.list_txi(), self.db.list_txo()):
             self._add_tx_to_local_history(txid)
 
@@ -460,6 +551,14 @@ class AddressSynchronizer(Logger):
             with self.transaction_lock:
                 self.db.clear_history()
                 self._history_local.clear()
+                self._history_index = HistoryIndex()
+                self._utxos.clear()
+                self._utxos_dirty.clear()
+
+    def reset_history_index(self) -> None:
+        """Rebuild the history index on next use, e.g. after addresses were removed."""
+        with self.lock, self.transaction_lock:
+            self._history_index = HistoryIndex(self._history_index.key_of.keys() | self._history_index.dirty)
 
     def get_txpos(self, tx_hash):
         """Returns (height, txpos) tuple, even if the tx is unverified."""
@@ -489,9 +588,8 @@ class AddressSynchronizer(Logger):
     @with_transaction_lock
     @with_local_height_cached
     def get_history(self, *, domain=None) -> Sequence[HistoryItem]:
-        # get domain
         if domain is None:
-            domain = self.get_addresses()
+            return self._get_history_from_index()
         domain = set(domain)
         # 1. Get the history of each address in the domain, maintain the
         #    delta of a tx as the sum of its deltas on domain addresses
@@ -526,9 +624,38 @@ class AddressSynchronizer(Logger):
 
         return h2
 
+    def _get_history_index_entry(self, txid: str) -> Optional[Tuple[Tuple[float, int], int]]:
+        addrs = set(itertools.chain(self.db.get_txi_addresses(txid), self.db.get_txo_addresses(txid)))
+        addrs = [addr for addr in addrs if self.db.is_addr_in_history(addr)]
+        if not addrs:
+            return None
+        delta = sum(self.get_tx_delta(txid, addr) for addr in addrs)
+        return self.get_txpos(txid), delta
+
+    def _get_history_from_index(self) -> Sequence[HistoryItem]:
+        """Same as get_history() for all addresses, but only transactions
+        that changed since the last call are looked at again."""
+        with self.lock, self.transaction_lock:
+            index = self._history_index
+            index.update(self._get_history_index_entry)
+            h = []
+            for (txpos, seq, txid), balance in zip(index.keys, index.balances):
+                h.append(HistoryItem(txid=txid,
+                                     tx_mined_status=self.get_tx_height(txid),
+                                     delta=index.deltas[txid],
+                                     fee=self.get_tx_fee(txid),
+                                     balance=balance))
+            c, u, x = self.get_balance()
+        if (h[-1].balance if h else 0) != c + u + x:
+            raise Exception("wallet.get_history() failed balance sanity-check")
+        return h
+
     def _add_tx_to_local_history(self, txid):
         with self.transaction_lock:
+            self._history_index.mark_dirty(txid)
             for addr in itertools.chain(self.db.get_txi_addresses(txid), self.db.get_txo_addresses(txid)):
+                self._utxos_dirty.add(addr)
+                self._invalidate_addr_balance(addr)
                 cur_hist = self._history_local.get(addr, set())
                 cur_hist.add(txid)
                 self._history_local[addr] = cur_hist
@@ -536,7 +663,10 @@ class AddressSynchronizer(Logger):
 
     def _remove_tx_from_local_history(self, txid):
         with self.transaction_lock:
+            self._history_index.mark_dirty(txid)
             for addr in itertools.chain(self.db.get_txi_addresses(txid), self.db.get_txo_addresses(txid)):
+                self._utxos_dirty.add(addr)
+                self._invalidate_addr_balance(addr)
                 cur_hist = self._history_local.get(addr, set())
                 try:
                     cur_hist.remove(txid)
@@ -565,24 +695,29 @@ class AddressSynchronizer(Logger):
             if tx_height in (TX_HEIGHT_UNCONFIRMED, TX_HEIGHT_UNCONF_PARENT):
                 with self.lock:
                     self.db.remove_verified_tx(tx_hash)
+                    self._on_tx_height_changed(tx_hash)
                 if self.verifier:
                     self.verifier.remove_spv_proof_for_tx(tx_hash)
         else:
             with self.lock:
                 # tx will be verified only if height > 0
-                self.unverified_tx[tx_hash] = tx_height
+                if self.unverified_tx.get(tx_hash) != tx_height:
+                    self.unverified_tx[tx_hash] = tx_height
+                    self._on_tx_height_changed(tx_hash)
 
     def remove_unverified_tx(self, tx_hash, tx_height):
         with self.lock:
             new_height = self.unverified_tx.get(tx_hash)
             if new_height == tx_height:
                 self.unverified_tx.pop(tx_hash, None)
+                self._on_tx_height_changed(tx_hash)
 
     def add_verified_tx(self, tx_hash: str, info: TxMinedInfo):
         # Remove from the unverified map and add to the verified map
         with self.lock:
             self.unverified_tx.pop(tx_hash, None)
             self.db.add_verified_tx(tx_hash, info)
+            self._on_tx_height_changed(tx_hash)
         tx_mined_status = self.get_tx_height(tx_hash)
         util.trigger_callback('verified', self, tx_hash, tx_mined_status)
 
@@ -612,6 +747,7 @@ class AddressSynchronizer(Logger):
                         # into unverified_tx with the old height, and if we get
                         # a status update, that will overwrite it.
                         self.unverified_tx[tx_hash] = tx_height
+                        self._on_tx_height_changed(tx_hash)
                         txs.add(tx_hash)
         return txs
 
@@ -782,11 +918,33 @@ class AddressSynchronizer(Logger):
             out[prevout] = utxo
         return out
 
+    def _get_utxo_index(self) -> Dict[str, Dict[str, Tuple[int, bool]]]:
+        """Returns address -> prevout -> (value, is_coinbase) of the unspent outputs,
+        for addresses that have some. Only addresses whose txs changed are recomputed."""
+        with self.lock, self.transaction_lock:
+            while self._utxos_dirty:
+                addr = self._utxos_dirty.pop()
+                received, sent = self.get_addr_io(addr)
+                coins = {prevout_str: (v, is_cb)
+                         for prevout_str, (tx_height, v, is_cb) in received.items()
+                         if prevout_str not in sent}
+                if coins:
+                    self._utxos[addr] = coins
+                else:
+                    self._utxos.pop(addr, None)
+            return self._utxos
+
     def get_addr_utxo(self, address: str) -> Dict[TxOutpoint, PartialTxInput]:
-        out = self.get_addr_outputs(address)
-        for k, v in list(out.items()):
-            if v.spent_height is not None:
-                out.pop(k)
+        out = {}
+        with self.lock, self.transaction_lock:
+            coins = self._get_utxo_index().get(address, {})
+            for prevout_str, (value, is_cb) in coins.items():
+                prevout = TxOutpoint.from_str(prevout_str)
+                utxo = PartialTxInput(prevout=prevout, is_coinbase_output=is_cb)
+                utxo._trusted_address = address
+                utxo._trusted_value_sats = value
+                utxo.block_height = self.get_tx_height(prevout.txid.hex()).height
+                out[prevout] = utxo
         return out
 
     # return the total amount ever received by an address
@@ -794,6 +952,8 @@ class AddressSynchronizer(Logger):
         received, sent = self.get_addr_io(address)
         return sum([v for height, v, is_cb in received.values()])
 
+    @with_lock
+    @with_transaction_lock
     @with_local_height_cached
     def get_addr_balance(self, address, *, excluded_coins: Set[str] = None) -> Tuple[int, int, int]:
         """Return the balance of a bitcoin address:
@@ -809,11 +969,14 @@ class AddressSynchronizer(Logger):
         received, sent = self.get_addr_io(address)
         c = u = x = 0
         mempool_height = self.get_local_height() + 1  # height of next block
+        maturity_height = None
         for txo, (tx_height, v, is_cb) in received.items():
             if txo in excluded_coins:
                 continue
             if is_cb and tx_height + COINBASE_MATURITY > mempool_height:
                 x += v
+                if maturity_height is None or tx_height + COINBASE_MATURITY < maturity_height:
+                    maturity_height = tx_height + COINBASE_MATURITY
             elif tx_height > 0:
                 c += v
             else:
@@ -829,6 +992,8 @@ class AddressSynchronizer(Logger):
             # Cache needs to be invalidated if a transaction is added to/
             # removed from history; or on new blocks (maturity...)
             self._get_addr_balance_cache[address] = result
+            if maturity_height is not None:
+                self._coinbase_maturity[address] = maturity_height
         return result
 
     @with_local_height_cached
@@ -836,13 +1001,19 @@ class AddressSynchronizer(Logger):
                   mature_only: bool = False, confirmed_only: bool = False,
                   nonlocal_only: bool = False) -> Sequence[PartialTxInput]:
         coins = []
+        with self.lock, self.transaction_lock:
+            # only look at addresses that have coins
+            addrs = list(self._get_utxo_index())
         if domain is None:
-            domain = self.get_addresses()
-        domain = set(domain)
+            addrs = [addr for addr in addrs if self.db.is_addr_in_history(addr)]
+        else:
+            domain = set(domain)
+            addrs = [addr for addr in addrs if addr in domain]
         if excluded_addresses:
-            domain = set(domain) - set(excluded_addresses)
+            excluded_addresses = set(excluded_addresses)
+            addrs = [addr for addr in addrs if addr not in excluded_addresses]
         mempool_height = self.get_local_height() + 1  # height of next block
-        for addr in domain:
+        for addr in addrs:
             utxos = self.get_addr_utxo(addr)
             for utxo in utxos.values():
                 if confirmed_only and utxo.block_height <= 0:
@@ -858,6 +1029,8 @@ class AddressSynchronizer(Logger):
 
     def get_balance(self, domain=None, *, excluded_addresses: Set[str] = None,
                     excluded_coins: Set[str] = None) -> Tuple[int, int, int]:
+        if domain is None and not excluded_addresses and not excluded_coins:
+            return self._get_wallet_balance()
         if domain is None:
             domain = self.get_addresses()
         if excluded_addresses is None:
@@ -872,6 +1045,24 @@ class AddressSynchronizer(Logger):
             xx += x
         return cc, uu, xx
 
+    @with_local_height_cached
+    def _get_wallet_balance(self) -> Tuple[int, int, int]:
+        """Balance of all addresses. Only the addresses whose balance
+        was invalidated since the last call are looked at."""
+        with self.lock, self.transaction_lock:
+            cc, uu, xx = self._balance_total
+            while self._balance_dirty:
+                addr = self._balance_dirty.pop()
+                c, u, x = self._balance_by_addr.pop(addr, (0, 0, 0))
+                cc, uu, xx = cc - c, uu - u, xx - x
+                if self.db.is_addr_in_history(addr):
+                    c, u, x = self.get_addr_balance(addr)
+                    if c or u or x:
+                        self._balance_by_addr[addr] = c, u, x
+                        cc, uu, xx = cc + c, uu + u, xx + x
+            self._balance_total = cc, uu, xx
+            return self._balance_total
+
     def is_used(self, address: str) -> bool:
         return self.get_address_history_len(address) != 0
 
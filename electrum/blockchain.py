@@ -21,15 +21,19 @@
 # CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 import os
+import mmap
 import threading
 import time
-from typing import Optional, Dict, Mapping, Sequence
+import bisect
+import struct
+from collections import deque
+from typing import Optional, Dict, Mapping, Sequence, List, Tuple
 
 from . import util
 from .bitcoin import hash_encode, int_to_hex, rev_hex
 from .crypto import sha256d
 from . import constants
-from .util import bfh, bh2u
+from .util import bfh, bh2u, LRUCache
 from .simple_config import SimpleConfig
 from .logging import get_logger, Logger
 
@@ -40,6 +44,7 @@ _logger = get_logger(__name__)
 HEADER_SIZE = 80  # bytes
 HEADER_SIZE_SAPLING = 112  # bytes
 MAX_TARGET = 0x0007ffffffffffffffffffffffffffffffffffffffffffffffffffffffffffff
+HEADER_CACHE_SIZE = 4096  # per chain; number of deserialized headers kept in memory
 
 
 class MissingHeader(Exception):
@@ -81,6 +86,21 @@ def deserialize_header(s: bytes, height: int) -> dict:
     h['block_height'] = height
     return h
 
+
+def header_size_at_height(height: int) -> int:
+    return HEADER_SIZE if height < constants.net.SAPLING_HEIGHT else HEADER_SIZE_SAPLING
+
+
+def header_offset(height: int) -> int:
+    """Returns the position of the header at height in a headers file that starts at
+    height 0. Headers before SAPLING_HEIGHT are HEADER_SIZE bytes, the rest HEADER_SIZE_SAPLING.
+    The position in a file that starts at forkpoint is header_offset(height) - header_offset(forkpoint).
+    """
+    if height < constants.net.SAPLING_HEIGHT:
+        return height * HEADER_SIZE
+    return constants.net.SAPLING_HEIGHT * HEADER_SIZE + (height - constants.net.SAPLING_HEIGHT) * HEADER_SIZE_SAPLING
+
+
 def hash_header(header: dict) -> str:
     if header is None:
         return '0' * 64
@@ -93,6 +113,133 @@ def hash_raw_header(header: str) -> str:
     return hash_encode(sha256d(bfh(header)))
 
 
+def pow_hash_header(header: dict) -> str:
+    """Returns the yescrypt PoW hash of header, as big-endian hex."""
+    height = header.get('block_height')
+    size = HEADER_SIZE_SAPLING if height >= constants.net.SAPLING_HEIGHT else HEADER_SIZE
+    return _pow_hash_raw_header(bfh(serialize_header(header)), size)
+
+
+def _pow_hash_raw_header(raw_header: bytes, size: int) -> str:
+    # note: this runs in the worker processes of the pow executor
+    return rev_hex(bh2u(yescrypt.getPoWHash(raw_header, size)))
+
+
+_pow_pool = util.SpawnProcessPool('PoW hashing')
+
+
+def shutdown_pow_executor() -> None:
+    _pow_pool.shutdown()
+
+
+def compute_pow_hashes(headers: Sequence[dict], *, num_workers: int = 1) -> List[str]:
+    """Returns the PoW hashes of headers, in order.
+    If num_workers > 1, the (memory-hard) hashing is spread over a process pool.
+    The result is the same as calling pow_hash_header for each header.
+    """
+    if num_workers > 1 and len(headers) >= 2 * num_workers and _pow_pool.is_usable():
+        raw_headers = []
+        sizes = []
+        for header in headers:
+            height = header.get('block_height')
+            raw_headers.append(bfh(serialize_header(header)))
+            sizes.append(HEADER_SIZE_SAPLING if height >= constants.net.SAPLING_HEIGHT else HEADER_SIZE)
+        chunksize = max(1, len(headers) // (4 * num_workers))
+        powhashes = _pow_pool.map(_pow_hash_raw_header, raw_headers, sizes,
+                                  num_workers=num_workers, chunksize=chunksize)
+        if powhashes is not None:
+            return powhashes
+    return [pow_hash_header(header) for header in headers]
+
+
+class KotoDifficultyWindow:
+    """Rolling state for get_target_koto, fed headers one at a time in height order.
+
+    Keeps the last DIFFICULTY_WINDOW_SIZE headers: a running sum of the targets of the
+    newest AVERAGE_BLOCKS, and the sorted timestamps of the two MEDIAN_TIME_SPAN windows
+    whose medians give the actual timespan. Adding a header is O(log n); next_target()
+    gives the same result as Blockchain.get_target_koto(self.height + 1).
+    """
+
+    AVERAGE_BLOCKS = 17
+    MEDIAN_TIME_SPAN = 11
+    DIFFICULTY_WINDOW_SIZE = AVERAGE_BLOCKS + MEDIAN_TIME_SPAN  # 28
+
+    def __init__(self):
+        self.height = None  # type: Optional[int]  # height of newest header
+        self.last_hash = None  # type: Optional[str]  # hash of newest header
+        self._entries = deque()  # (timestamp, target) of newest headers; target is None if bits are invalid
+        self._target_sum = 0  # sum of targets of the newest AVERAGE_BLOCKS headers
+        self._num_invalid_targets = 0  # among the newest AVERAGE_BLOCKS headers
+        self._recent_times = []  # sorted timestamps of the newest MEDIAN_TIME_SPAN headers
+        self._old_times = []  # sorted timestamps of the MEDIAN_TIME_SPAN headers before the newest AVERAGE_BLOCKS
+
+    def add_header(self, header: dict) -> None:
+        height = header['block_height']
+        if self.height is not None and height != self.height + 1:
+            raise Exception(f"header at height {height} does not follow window at {self.height}")
+        try:
+            target = Blockchain.bits_to_target(header['bits'])
+        except Exception:
+            target = None
+        timestamp = header['timestamp']
+        entries = self._entries
+        entries.append((timestamp, target))
+        self.height = height
+        self.last_hash = hash_header(header)
+        # targets
+        if target is None:
+            self._num_invalid_targets += 1
+        else:
+            self._target_sum += target
+        if len(entries) > self.AVERAGE_BLOCKS:
+            ts, old_target = entries[-self.AVERAGE_BLOCKS - 1]
+            if old_target is None:
+                self._num_invalid_targets -= 1
+            else:
+                self._target_sum -= old_target
+            # this header moves from the target window into the old median window
+            bisect.insort(self._old_times, ts)
+        # recent median window
+        bisect.insort(self._recent_times, timestamp)
+        if len(entries) > self.MEDIAN_TIME_SPAN:
+            self._remove_time(self._recent_times, entries[-self.MEDIAN_TIME_SPAN - 1][0])
+        # old median window
+        if len(entries) > self.DIFFICULTY_WINDOW_SIZE:
+            ts, _ = entries.popleft()
+            self._remove_time(self._old_times, ts)
+
+    def copy(self) -> 'KotoDifficultyWindow':
+        window = KotoDifficultyWindow()
+        window.height = self.height
+        window.last_hash = self.last_hash
+        window._entries = deque(self._entries)
+        window._target_sum = self._target_sum
+        window._num_invalid_targets = self._num_invalid_targets
+        window._recent_times = list(self._recent_times)
+        window._old_times = list(self._old_times)
+        return window
+
+    @classmethod
+    def _remove_time(cls, times: List[int], timestamp: int) -> None:
+        del times[bisect.bisect_left(times, timestamp)]
+
+    def is_full(self) -> bool:
+        # note: get_median_timestamp never looks at the genesis block
+        return (len(self._entries) == self.DIFFICULTY_WINDOW_SIZE
+                and self.height - self.DIFFICULTY_WINDOW_SIZE + 1 >= 1)
+
+    def next_target(self) -> Optional[int]:
+        """Returns the target of the header at self.height + 1,
+        or None if the window cannot compute it (not full, or invalid bits).
+        """
+        if not self.is_full() or self._num_invalid_targets > 0:
+            return None
+        median = self.MEDIAN_TIME_SPAN // 2
+        actual_timespan = self._recent_times[median] - self._old_times[median]
+        return Blockchain.koto_retarget(self._target_sum, actual_timespan)
+
+
 # key: blockhash hex at forkpoint
 # the chain at some key is the best chain that includes the given hash
 blockchains = {}  # type: Dict[str, Blockchain]
@@ -100,6 +247,7 @@ blockchains_lock = threading.RLock()  # lock order: take this last; so after Blo
 
 
 def read_blockchains(config: 'SimpleConfig'):
+    load_chainwork_index(config)
     best_chain = Blockchain(config=config,
                             forkpoint=0,
                             parent=None,
@@ -111,6 +259,7 @@ def read_blockchains(config: 'SimpleConfig'):
         header_after_cp = best_chain.read_header(constants.net.max_checkpoint()+1)
         if not header_after_cp or not best_chain.can_connect(header_after_cp, check_height=False):
             _logger.info("[blockchain] deleting best chain. cannot connect header after last cp to last cp.")
+            best_chain.close_headers_file()
             os.unlink(best_chain.path())
             best_chain.update_size()
     # forks
@@ -148,9 +297,11 @@ def read_blockchains(config: 'SimpleConfig'):
         # consistency checks
         h = b.read_header(b.forkpoint)
         if first_hash != hash_header(h):
+            b.close_headers_file()
             delete_chain(filename, "incorrect first hash for chain")
             return
         if not b.parent.can_connect(h, check_height=False):
+            b.close_headers_file()
             delete_chain(filename, "cannot connect chain to parent")
             return
         chain_id = b.get_id()
@@ -159,6 +310,7 @@ def read_blockchains(config: 'SimpleConfig'):
 
     for filename in l:
         instantiate_chain(filename)
+    compact_chainwork_index()
 
 
 def get_best_chain() -> 'Blockchain':
@@ -169,6 +321,80 @@ _CHAINWORK_CACHE = {
     "0000000000000000000000000000000000000000000000000000000000000000": 0,  # virtual block at height -1
 }  # type: Dict[str, int]
 
+# The chainwork at chunk boundaries (last header of each chunk) is also persisted,
+# in an append-only file of (block hash, chainwork) records, so that it survives restarts.
+# Being keyed by block hash, the records stay valid when forks are swapped.
+# The file is compacted at startup, dropping records of blocks none of our chains have.
+_CHAINWORK_INDEX_RECORD = struct.Struct('32s32s')
+_chainwork_index_path = None  # type: Optional[str]
+_chainwork_index_lock = threading.Lock()
+
+
+def load_chainwork_index(config: 'SimpleConfig') -> None:
+    global _chainwork_index_path
+    path = os.path.join(util.get_headers_dir(config), 'chainwork_index')
+    with _chainwork_index_lock:
+        _chainwork_index_path = path
+        if not os.path.exists(path):
+            return
+        with open(path, 'rb') as f:
+            data = f.read()
+        record_size = _CHAINWORK_INDEX_RECORD.size
+        # note: a partially written last record is ignored
+        for pos in range(0, len(data) - record_size + 1, record_size):
+            block_hash, chainwork = _CHAINWORK_INDEX_RECORD.unpack_from(data, pos)
+            _CHAINWORK_CACHE[bh2u(block_hash)] = int.from_bytes(chainwork, byteorder='big')
+
+
+def compact_chainwork_index() -> None:
+    """Rewrites the chainwork index file, keeping one record for each chunk boundary
+    of our chains. Records of forks that were since deleted, duplicates, and a
+    partially written last record are dropped."""
+    live_hashes = set()
+    with blockchains_lock: chains = list(blockchains.values())
+    for chain in chains:
+        for index in range(chain.forkpoint // 2016, (chain.height() + 1) // 2016):
+            try:
+                live_hashes.add(chain.get_hash((index + 1) * 2016 - 1))
+            except (MissingHeader, InvalidHeader):
+                pass
+    with _chainwork_index_lock:
+        path = _chainwork_index_path
+        if path is None or not os.path.exists(path):
+            return
+        records = [(block_hash, chainwork) for block_hash, chainwork in _CHAINWORK_CACHE.items()
+                   if block_hash in live_hashes]
+        if os.path.getsize(path) == len(records) * _CHAINWORK_INDEX_RECORD.size:
+            return
+        temp_path = "%s.tmp.%s" % (path, os.getpid())
+        try:
+            with open(temp_path, 'wb') as f:
+                for block_hash, chainwork in records:
+                    f.write(_CHAINWORK_INDEX_RECORD.pack(bfh(block_hash), chainwork.to_bytes(32, byteorder='big')))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, path)
+        except OSError as e:
+            _logger.warning(f"failed to compact chainwork index: {repr(e)}")
+
+
+def _remember_chunk_chainwork(block_hash: str, chainwork: int) -> None:
+    """Stores the chainwork up to and including block_hash, which must be
+    the last block of a chunk. Persisted if load_chainwork_index was called.
+    Only pass chainwork computed here from our own headers (see get_chainwork),
+    never values from external sources such as snapshot metadata."""
+    with _chainwork_index_lock:
+        if _CHAINWORK_CACHE.get(block_hash) == chainwork:
+            return
+        _CHAINWORK_CACHE[block_hash] = chainwork
+        if _chainwork_index_path is None:
+            return
+        try:
+            with open(_chainwork_index_path, 'ab') as f:
+                f.write(_CHAINWORK_INDEX_RECORD.pack(bfh(block_hash), chainwork.to_bytes(32, byteorder='big')))
+        except OSError as e:
+            _logger.warning(f"failed to persist chainwork: {repr(e)}")
+
 
 def init_headers_file_for_best_chain():
     b = get_best_chain()
@@ -186,6 +412,8 @@ def init_headers_file_for_best_chain():
         length += (HEADER_SIZE * offset_sapling) + (HEADER_SIZE_SAPLING * (2016 - offset_sapling))
         length += HEADER_SIZE_SAPLING * (cp - index_sapling - 1) * 2016
     if not os.path.exists(filename) or os.path.getsize(filename) < length:
+        b.close_headers_file()
+        b.clear_header_cache()
         with open(filename, 'wb') as f:
             if length > 0:
                 f.seek(length - 1)
@@ -216,6 +444,14 @@ class Blockchain(Logger):
         self._forkpoint_hash = forkpoint_hash  # blockhash at forkpoint. "first hash"
         self._prev_hash = prev_hash  # blockhash immediately before forkpoint
         self.lock = threading.RLock()
+        # read-only memory map of our headers file; None until first needed.
+        # Closed whenever the file is written to, renamed or deleted.
+        self._headers_mmap = None  # type: Optional[mmap.mmap]
+        self._header_cache = LRUCache(maxsize=HEADER_CACHE_SIZE)  # height -> header dict
+        self._hash_cache = LRUCache(maxsize=HEADER_CACHE_SIZE)  # height -> block hash
+        self._difficulty_window = None  # type: Optional[KotoDifficultyWindow]
+        # last computed chainwork: (height, block hash, chainwork); valid while the hash matches
+        self._chainwork_memo = None  # type: Optional[Tuple[int, str, int]]
         self.update_size()
 
     def with_lock(func):
@@ -318,40 +554,57 @@ class Blockchain(Logger):
     def update_size(self) -> None:
         p = self.path()
         size = os.path.getsize(p) if os.path.exists(p) else 0
+        self._size = self._num_headers_in_bytes(size)
+
+    def _num_headers_in_bytes(self, size: int) -> int:
+        """Returns the number of (full) headers in the first size bytes of our file."""
         if constants.net.SAPLING_HEIGHT <= self.forkpoint:
-            self._size = size//HEADER_SIZE_SAPLING
+            return size//HEADER_SIZE_SAPLING
         elif size <= HEADER_SIZE * (constants.net.SAPLING_HEIGHT - self.forkpoint):
-            self._size = size//HEADER_SIZE
+            return size//HEADER_SIZE
         else:
-            self._size = (constants.net.SAPLING_HEIGHT - self.forkpoint) + (size - (constants.net.SAPLING_HEIGHT - self.forkpoint) * HEADER_SIZE)//HEADER_SIZE_SAPLING
+            return (constants.net.SAPLING_HEIGHT - self.forkpoint) + (size - (constants.net.SAPLING_HEIGHT - self.forkpoint) * HEADER_SIZE)//HEADER_SIZE_SAPLING
+
+    @classmethod
+    def requires_pow_check(cls, height: int) -> bool:
+        """Returns whether verify_header checks bits and PoW at this height."""
+        if (height == 20 or height == 22 or height == 26): # somehow wrong ???
+            return False
+        # nAverageBlocks + nMedianTimeSpan = 28 Because checkpoint don't have preblock data.
+        if height // 2016 < len(constants.net.CHECKPOINTS) and height % 2016 != 2015 or height >= len(constants.net.CHECKPOINTS)*2016 and height <= len(constants.net.CHECKPOINTS)*2016 + 28:
+            return False
+        if constants.net.TESTNET:
+            return False
+        return True
 
     @classmethod
-    def verify_header(cls, header: dict, prev_hash: str, target: int, expected_header_hash: str=None) -> None:
+    def verify_header(cls, header: dict, prev_hash: str, target: int, expected_header_hash: str=None,
+                      powhash: str=None) -> None:
+        """Raises if header is invalid. powhash, if given, must be pow_hash_header(header);
+        it lets callers compute PoW hashes in bulk."""
         height = header.get('block_height')
         if (height == 20 or height == 22 or height == 26): # somehow wrong ???
             return
         _hash = hash_header(header)
         if expected_header_hash and expected_header_hash != _hash:
             raise Exception("hash mismatches with expected: {} vs {}".format(expected_header_hash, _hash))
-        size = 80
-        if height >= constants.net.SAPLING_HEIGHT:
-            size = 112
-        _powhash = rev_hex(bh2u(yescrypt.getPoWHash(bfh(serialize_header(header)), size)))
         if prev_hash != header.get('prev_block_hash'):
             raise Exception("prev hash mismatch: %s vs %s" % (prev_hash, header.get('prev_block_hash')))
-        # nAverageBlocks + nMedianTimeSpan = 28 Because checkpoint don't have preblock data.
-        if height // 2016 < len(constants.net.CHECKPOINTS) and height % 2016 != 2015 or height >= len(constants.net.CHECKPOINTS)*2016 and height <= len(constants.net.CHECKPOINTS)*2016 + 28:
-            return
-        if constants.net.TESTNET:
+        if not cls.requires_pow_check(height):
             return
         bits = cls.target_to_bits(target)
         if bits != header.get('bits'):
             raise Exception("bits mismatch: %s vs %s" % (bits, header.get('bits')))
+        _powhash = powhash if powhash is not None else pow_hash_header(header)
         block_hash_as_num = int.from_bytes(bfh(_powhash), byteorder='big')
         if block_hash_as_num > target:
             raise Exception(f"insufficient proof of work: {block_hash_as_num} vs target {target}")
 
-    def verify_chunk(self, index: int, data: bytes) -> None:
+    def verify_chunk(self, index: int, data: bytes) -> KotoDifficultyWindow:
+        """Verifies the headers in data, and returns the difficulty window
+        that ends at the last of them. The chain's own window is not touched;
+        the caller may store the returned one once the chunk is saved.
+        """
         if index < self.index_sapling:
             num = len(data) // HEADER_SIZE
         elif index == self.index_sapling:
@@ -363,23 +616,41 @@ class Blockchain(Logger):
             num = len(data) // HEADER_SIZE_SAPLING
         start_height = index * 2016
         prev_hash = self.get_hash(start_height - 1)
-        headers = {}
+        chunk_headers = []
         for i in range(num):
             height = start_height + i
-            try:
-                expected_header_hash = self.get_hash(height)
-            except MissingHeader:
-                expected_header_hash = None
             start_position = self.get_delta_bytes(height) - self.get_delta_bytes(start_height)
             if height < constants.net.SAPLING_HEIGHT:
                 raw_header = data[start_position : start_position + HEADER_SIZE]
             else:
                 raw_header = data[start_position : start_position + HEADER_SIZE_SAPLING]
-            header = deserialize_header(raw_header, index*2016 + i)
-            headers[header.get('block_height')] = header
-            target = self.get_target(index*2016 + i, headers)
-            self.verify_header(header, prev_hash, target, expected_header_hash)
+            chunk_headers.append(deserialize_header(raw_header, height))
+        # The PoW hashes dominate the cost of verification; compute them in bulk first,
+        # then do the cheap sequential checks (prev hash, bits, target) below.
+        pow_headers = [h for h in chunk_headers if self.requires_pow_check(h['block_height'])]
+        powhashes = compute_pow_hashes(pow_headers, num_workers=self.get_num_pow_workers())
+        powhash_by_height = {h['block_height']: ph for h, ph in zip(pow_headers, powhashes)}
+        headers = {}
+        window = self.get_difficulty_window(start_height - 1)
+        for header in chunk_headers:
+            height = header['block_height']
+            try:
+                expected_header_hash = self.get_hash(height)
+            except MissingHeader:
+                expected_header_hash = None
+            headers[height] = header
+            target = self.get_target(height, headers, window=window)
+            self.verify_header(header, prev_hash, target, expected_header_hash,
+                               powhash=powhash_by_height.get(height))
             prev_hash = hash_header(header)
+            window.add_header(header)
+        return window
+
+    def get_num_pow_workers(self) -> int:
+        num_workers = self.config.get('header_verification_workers')
+        if num_workers is None:
+            num_workers = min(4, os.cpu_count() or 1)
+        return max(1, int(num_workers))
 
     @with_lock
     def path(self):
@@ -395,11 +666,10 @@ class Blockchain(Logger):
         return os.path.join(d, filename)
 
     def get_delta_bytes(self, height: int):
-        if height < constants.net.SAPLING_HEIGHT:
-            delta_bytes = height * HEADER_SIZE
-        else:
-            delta_bytes = constants.net.SAPLING_HEIGHT * HEADER_SIZE + (height - constants.net.SAPLING_HEIGHT) * HEADER_SIZE_SAPLING
-        return delta_bytes
+        return header_offset(height)
+
+    def _offset_in_file(self, height: int) -> int:
+        return header_offset(height) - header_offset(self.forkpoint)
 
     @with_lock
     def save_chunk(self, index: int, chunk: bytes):
@@ -411,25 +681,7 @@ class Blockchain(Logger):
             main_chain.save_chunk(index, chunk)
             return
 
-        if index < self.index_sapling:
-            delta_height = (index * 2016 - self.forkpoint)
-            delta_bytes = delta_height * HEADER_SIZE
-        elif index == self.index_sapling:
-            if self.forkpoint < constants.net.SAPLING_HEIGHT:
-                delta_height = (index * 2016 - self.forkpoint)
-                delta_bytes = delta_height * HEADER_SIZE
-            else:
-                delta_height = (index * 2016 - constants.net.SAPLING_HEIGHT)
-                delta_height2 = (constants.net.SAPLING_HEIGHT - self.forkpoint)
-                delta_bytes = delta_height * HEADER_SIZE_SAPLING + delta_height2 * HEADER_SIZE
-        else:
-            if self.forkpoint < constants.net.SAPLING_HEIGHT:
-                delta_height = (index * 2016 - constants.net.SAPLING_HEIGHT)
-                delta_height2 = (constants.net.SAPLING_HEIGHT - self.forkpoint)
-                delta_bytes = delta_height * HEADER_SIZE_SAPLING + delta_height2 * HEADER_SIZE
-            else:
-                delta_height = (index * 2016 - self.forkpoint)
-                delta_bytes = delta_height * HEADER_SIZE_SAPLING
+        delta_bytes = self._offset_in_file(index * 2016)
         # if this chunk contains our forkpoint, only save the part after forkpoint
         # (the part before is the responsibility of the parent)
         if delta_bytes < 0:
@@ -437,6 +689,8 @@ class Blockchain(Logger):
             delta_bytes = 0
         truncate = not chunk_within_checkpoint_region
         self.write(chunk, delta_bytes, truncate)
+        if not chunk_within_checkpoint_region:
+            self._update_chainwork()
         self.swap_with_parent()
 
     def swap_with_parent(self) -> None:
@@ -483,35 +737,26 @@ class Blockchain(Logger):
         self.assert_headers_file_available(parent.path())
         assert forkpoint > parent.forkpoint, (f"forkpoint of parent chain ({parent.forkpoint}) "
                                               f"should be at lower height than children's ({forkpoint})")
-        with open(parent.path(), 'rb') as f:
-            if forkpoint > constants.net.SAPLING_HEIGHT:
-                if constants.net.SAPLING_HEIGHT > parent.forkpoint:
-                    offset = (forkpoint - constants.net.SAPLING_HEIGHT)*HEADER_SIZE_SAPLING + (constants.net.SAPLING_HEIGHT-parent.forkpoint)*HEADER_SIZE
-                else:
-                    offset = (forkpoint - constants.net.SAPLING_HEIGHT)*HEADER_SIZE_SAPLING + (constants.net.SAPLING_HEIGHT-parent.forkpoint)*HEADER_SIZE_SAPLING
-                f.seek(offset)
-                parent_data = f.read(parent_branch_size*HEADER_SIZE_SAPLING)
-            else:
-                offset = (forkpoint - parent.forkpoint)*HEADER_SIZE
-                f.seek(offset)
-                if constants.net.SAPLING_HEIGHT > parent.height():
-                    parent_data = f.read(parent_branch_size*HEADER_SIZE)
-                else:
-                    parent_data = f.read((parent.height()-constants.net.SAPLING_HEIGHT+1)*HEADER_SIZE_SAPLING + (constants.net.SAPLING_HEIGHT-forkpoint)*HEADER_SIZE)
+        offset = parent._offset_in_file(forkpoint)
+        parent_data = parent._read_bytes(offset, header_offset(parent.height() + 1) - header_offset(forkpoint))
         self.write(parent_data, 0)
         parent.write(my_data, offset)
         # swap parameters
         self.parent, parent.parent = parent.parent, self  # type: Optional[Blockchain], Optional[Blockchain]
         self.forkpoint, parent.forkpoint = parent.forkpoint, self.forkpoint
-        if forkpoint < constants.net.SAPLING_HEIGHT:
-            self._forkpoint_hash, parent._forkpoint_hash = parent._forkpoint_hash, hash_raw_header(bh2u(parent_data[:HEADER_SIZE]))
-        else:
-            self._forkpoint_hash, parent._forkpoint_hash = parent._forkpoint_hash, hash_raw_header(bh2u(parent_data[:HEADER_SIZE_SAPLING]))
+        self._forkpoint_hash, parent._forkpoint_hash = parent._forkpoint_hash, hash_raw_header(bh2u(parent_data[:header_size_at_height(forkpoint)]))
         self._prev_hash, parent._prev_hash = parent._prev_hash, self._prev_hash
         # parent's new name
+        self.close_headers_file()
+        parent.close_headers_file()
         os.replace(child_old_name, parent.path())
         self.update_size()
         parent.update_size()
+        # heights now map to different headers
+        self.clear_header_cache()
+        parent.clear_header_cache()
+        self._chainwork_memo = None
+        parent._chainwork_memo = None
         # update pointers
         blockchains.pop(child_old_id, None)
         blockchains.pop(parent_old_id, None)
@@ -535,6 +780,9 @@ class Blockchain(Logger):
         filename = self.path()
         self.assert_headers_file_available(filename)
         size = os.path.getsize(filename) if os.path.exists(filename) else 0
+        # note: the file cannot be truncated while it is mapped (on Windows)
+        self.close_headers_file()
+        self.clear_header_cache(from_height=self.forkpoint + self._num_headers_in_bytes(offset))
         with open(filename, 'rb+') as f:
             if truncate and offset != size:
                 f.seek(offset)
@@ -555,8 +803,56 @@ class Blockchain(Logger):
         filename = self.path()
         size = os.path.getsize(filename) if os.path.exists(filename) else 0
         self.write(data, size)
+        self._update_chainwork()
         self.swap_with_parent()
 
+    @with_lock
+    def close_headers_file(self) -> None:
+        if self._headers_mmap is not None:
+            self._headers_mmap.close()
+            self._headers_mmap = None
+
+    @with_lock
+    def clear_header_cache(self, *, from_height: int = None) -> None:
+        if from_height is None:
+            self._header_cache.clear()
+            self._hash_cache.clear()
+            return
+        for cache in (self._header_cache, self._hash_cache):
+            for height in [h for h in cache if h >= from_height]:
+                del cache[height]
+
+    @with_lock
+    def _get_headers_mmap(self) -> Optional[mmap.mmap]:
+        if self._headers_mmap is None:
+            name = self.path()
+            self.assert_headers_file_available(name)
+            try:
+                with open(name, 'rb') as f:
+                    self._headers_mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except (ValueError, OSError) as e:
+                # empty file, or e.g. not enough address space on 32-bit
+                self.logger.info(f"cannot mmap headers file, falling back to reads: {repr(e)}")
+                return None
+        return self._headers_mmap
+
+    @with_lock
+    def _read_bytes(self, offset: int, size: int) -> bytes:
+        m = self._get_headers_mmap()
+        if m is not None and offset + size <= len(m):
+            return m[offset:offset+size]
+        name = self.path()
+        self.assert_headers_file_available(name)
+        with open(name, 'rb') as f:
+            f.seek(offset)
+            return f.read(size)
+
+    @with_lock
+    def read_raw_headers(self, height: int, count: int) -> bytes:
+        """Returns count consecutive headers from height, as stored in our file."""
+        assert self.forkpoint <= height and height + count - 1 <= self.height(), (height, count)
+        return self._read_bytes(self._offset_in_file(height), header_offset(height + count) - header_offset(height))
+
     @with_lock
     def read_header(self, height: int) -> Optional[dict]:
         if height < 0:
@@ -565,26 +861,18 @@ class Blockchain(Logger):
             return self.parent.read_header(height)
         if height > self.height():
             return
-        delta = height - self.forkpoint
-        name = self.path()
-        if height < constants.net.SAPLING_HEIGHT:
-            offset = delta * HEADER_SIZE
-            size = HEADER_SIZE
-        else:
-            if self.forkpoint > constants.net.SAPLING_HEIGHT:
-                offset = delta * HEADER_SIZE_SAPLING
-            else:
-                offset = (height - constants.net.SAPLING_HEIGHT) * HEADER_SIZE_SAPLING + (constants.net.SAPLING_HEIGHT - self.forkpoint) * HEADER_SIZE
-            size = HEADER_SIZE_SAPLING
-        self.assert_headers_file_available(name)
-        with open(name, 'rb') as f:
-            f.seek(offset)
-            h = f.read(size)
-            if len(h) < size:
-                raise Exception('Expected to read a full header. This was only {} bytes'.format(len(h)))
+        header = self._header_cache.get(height)
+        if header is not None:
+            return dict(header)
+        size = header_size_at_height(height)
+        h = self._read_bytes(self._offset_in_file(height), size)
+        if len(h) < size:
+            raise Exception('Expected to read a full header. This was only {} bytes'.format(len(h)))
         if h == bytes([0])*size:
             return None
-        return deserialize_header(h, height)
+        header = deserialize_header(h, height)
+        self._header_cache[height] = header
+        return dict(header)
 
     def header_at_tip(self) -> Optional[dict]:
         """Return latest header."""
@@ -620,10 +908,18 @@ class Blockchain(Logger):
             h, t, w = self.checkpoints[index]
             return h
         else:
-            header = self.read_header(height)
-            if header is None:
-                raise MissingHeader(height)
-            return hash_header(header)
+            if height < self.forkpoint:
+                return self.parent.get_hash(height)
+            with self.lock:
+                header_hash = self._hash_cache.get(height)
+                if header_hash is not None:
+                    return header_hash
+                header = self.read_header(height)
+                if header is None:
+                    raise MissingHeader(height)
+                header_hash = hash_header(header)
+                self._hash_cache[height] = header_hash
+                return header_hash
 
     def get_median_timestamp(self, height, chain):
         nMedianTimeSpan = 11
@@ -641,10 +937,79 @@ class Blockchain(Logger):
         return pmedian[i//2];
 
 
-    def get_target_koto(self, height, chain=None):
+    @with_lock
+    def get_difficulty_window(self, height: int) -> KotoDifficultyWindow:
+        """Returns a difficulty window that ends at height (inclusive), for our headers.
+        The returned window is a copy, and may be fed further headers by the caller.
+        """
+        size = KotoDifficultyWindow.DIFFICULTY_WINDOW_SIZE
+        window = self._difficulty_window
+        if (window is None or window.height is None
+                or not (height - size < window.height <= height)
+                or not self.check_hash(window.height, window.last_hash)):
+            window = KotoDifficultyWindow()
+        start = window.height + 1 if window.height is not None else max(0, height - size + 1)
+        for h in range(start, height + 1):
+            header = self.read_header(h)
+            if header is None:
+                # gap; start over after it
+                window = KotoDifficultyWindow()
+                continue
+            if window.height is not None and window.height != h - 1:
+                window = KotoDifficultyWindow()
+            window.add_header(header)
+        self._difficulty_window = window
+        return window.copy()
+
+    @with_lock
+    def set_difficulty_window(self, window: KotoDifficultyWindow) -> None:
+        """Remembers window, which must be for headers we already have saved."""
+        self._difficulty_window = window
+
+    @classmethod
+    def koto_retarget(cls, bnOldAvg: int, nActualTimespan: int) -> int:
+        """Returns the new target given the sum of the targets of the last
+        nAverageBlocks headers and the difference of their median times."""
+        nAverageBlocks = 17
+        nPowMaxAdjustDown = 32; # 32% adjustment down
+        nPowMaxAdjustUp = 16; # 16% adjustment up
+        nTargetTimespan = nAverageBlocks * 60 # 60 seconds
+        nMinActualTimespan =  (nTargetTimespan * (100 - nPowMaxAdjustUp)) // 100
+        nMaxActualTimespan = (nTargetTimespan * (100 + nPowMaxAdjustDown)) // 100
+
+        fix = 0
+        if (nActualTimespan - nTargetTimespan < 0 and (nActualTimespan - nTargetTimespan) % 4 != 0):
+            fix = 1
+        nActualTimespan = nTargetTimespan + (nActualTimespan - nTargetTimespan)//4
+        nActualTimespan += fix
+        nActualTimespan = max(nActualTimespan, nMinActualTimespan)
+        nActualTimespan = min(nActualTimespan, nMaxActualTimespan)
+
+        # retargets
+        bnNew = bnOldAvg // nAverageBlocks
+        bnNew //= nTargetTimespan
+        bnNew *= nActualTimespan
+
+        bnNew = min(bnNew, MAX_TARGET)
+
+        return bnNew
+
+    def get_target_koto(self, height, chain=None, *, window: KotoDifficultyWindow = None):
+        """If window is given and ends at height - 1, it is used instead of reading
+        the previous headers (from chain, or from disk)."""
         if chain is None:
             chain = {}
 
+        if window is not None and window.height == height - 1:
+            # nAverageBlocks + nMedianTimeSpan = 28 Because checkpoint don't have preblock data.
+            if height < len(self.checkpoints)*2016 + 28:
+                return 0
+            if height-1 <= window.AVERAGE_BLOCKS:
+                return MAX_TARGET
+            target = window.next_target()
+            if target is not None:
+                return target
+
         #last = self.read_header(height - 1)
         last = chain.get(height - 1)
         if last is None:
@@ -654,17 +1019,10 @@ class Blockchain(Logger):
         # params
         BlockReading = last
         nActualTimespan = 0
-        FistBlockTime = 0
         nAverageBlocks = 17
-        nPowMaxAdjustDown = 32; # 32% adjustment down
-        nPowMaxAdjustUp = 16; # 16% adjustment up
         CountBlocks = 0
-        bnNum = 0
         bnTmp = 0
         bnOldAvg = 0
-        nTargetTimespan = nAverageBlocks * 60 # 60 seconds
-        nMinActualTimespan =  (nTargetTimespan * (100 - nPowMaxAdjustUp)) // 100
-        nMaxActualTimespan = (nTargetTimespan * (100 + nPowMaxAdjustDown)) // 100
 
         # nAverageBlocks + nMedianTimeSpan = 28 Because checkpoint don't have preblock data.
         if height < len(self.checkpoints)*2016 + 28:
@@ -684,24 +1042,9 @@ class Blockchain(Logger):
                 BlockReading = self.read_header((height-1) - CountBlocks)
 
         nActualTimespan = self.get_median_timestamp(height - 1, chain) - self.get_median_timestamp((height-1) - CountBlocks, chain)
-        fix = 0
-        if (nActualTimespan - nTargetTimespan < 0 and (nActualTimespan - nTargetTimespan) % 4 != 0):
-            fix = 1
-        nActualTimespan = nTargetTimespan + (nActualTimespan - nTargetTimespan)//4
-        nActualTimespan += fix
-        nActualTimespan = max(nActualTimespan, nMinActualTimespan)
-        nActualTimespan = min(nActualTimespan, nMaxActualTimespan)
+        return self.koto_retarget(bnOldAvg, nActualTimespan)
 
-        # retargets
-        bnNew = bnOldAvg // nAverageBlocks
-        bnNew //= nTargetTimespan
-        bnNew *= nActualTimespan
-
-        bnNew = min(bnNew, MAX_TARGET)
-
-        return bnNew
-
-    def get_target(self, height: int, chain=None) -> int:
+    def get_target(self, height: int, chain=None, *, window: KotoDifficultyWindow = None) -> int:
         # compute target from chunk x, used in chunk x+1
         if constants.net.TESTNET:
             return 0
@@ -713,7 +1056,7 @@ class Blockchain(Logger):
         if height // 2016 < len(self.checkpoints) and (height) % 2016 != 2015:
             return 0
 # new target
-        return self.get_target_koto(height, chain)
+        return self.get_target_koto(height, chain, window=window)
 
     @classmethod
     def bits_to_target(cls, bits: int) -> int:
@@ -736,16 +1079,30 @@ class Blockchain(Logger):
             bitsBase >>= 8
         return bitsN << 24 | bitsBase
 
+    @classmethod
+    def work_of_header(cls, header: dict) -> int:
+        target = cls.bits_to_target(header.get('bits'))
+        return ((2 ** 256 - target - 1) // (target + 1)) + 1
+
     def chainwork_of_header_at_height(self, height: int) -> int:
         """work done by single header at given height"""
         header = self.read_header(height)
         work = 0
         if header:
-            bits = header.get('bits')
-            target = self.bits_to_target(bits)
-            work = ((2 ** 256 - target - 1) // (target + 1)) + 1
+            work = self.work_of_header(header)
         return work
 
+    def get_chainwork_with_headers(self, headers: Sequence[dict]) -> int:
+        """Returns the chainwork up to the last of headers, which must directly
+        follow our header at the height before the first one; without saving them.
+        Same as get_chainwork would return after saving them."""
+        height = headers[-1]['block_height']
+        if constants.net.TESTNET:
+            return height  # see get_chainwork
+        start_height = headers[0]['block_height']
+        chainwork = self.get_chainwork(start_height - 1) if start_height > 0 else 0
+        return chainwork + sum(self.work_of_header(header) for header in headers)
+
     @with_lock
     def get_chainwork(self, height=None) -> int:
         if height is None:
@@ -758,13 +1115,18 @@ class Blockchain(Logger):
             h, t, w = self.checkpoints[i]
             _CHAINWORK_CACHE[h] = w
         last_retarget = height // 2016 * 2016 - 1
-        cached_height = last_retarget
-        while _CHAINWORK_CACHE.get(self.get_hash(cached_height)) is None:
-            if cached_height <= -1:
-                break
-            cached_height -= 2016
-        assert cached_height >= -1, cached_height
-        running_total = _CHAINWORK_CACHE[self.get_hash(cached_height)]
+        memo = self._chainwork_memo
+        if memo is not None and last_retarget <= memo[0] <= height and self.check_hash(memo[0], memo[1]):
+            # typically the tip; answered without walking any headers
+            cached_height, running_total = memo[0], memo[2]
+        else:
+            cached_height = last_retarget
+            while _CHAINWORK_CACHE.get(self.get_hash(cached_height)) is None:
+                if cached_height <= -1:
+                    break
+                cached_height -= 2016
+            assert cached_height >= -1, cached_height
+            running_total = _CHAINWORK_CACHE[self.get_hash(cached_height)]
         while cached_height < height:
             cached_height += 1
             work_in_single_header = self.chainwork_of_header_at_height(cached_height)
@@ -773,9 +1135,21 @@ class Blockchain(Logger):
                 break
             running_total += work_in_single_header
             if cached_height % 2016 == 2015:
-                _CHAINWORK_CACHE[self.get_hash(cached_height)] = running_total
+                _remember_chunk_chainwork(self.get_hash(cached_height), running_total)
+        else:
+            if height >= 0:
+                self._chainwork_memo = (height, self.get_hash(height), running_total)
         return running_total
 
+    def _update_chainwork(self) -> None:
+        """Brings the chainwork of our tip (and of the chunk boundaries below it) up to date."""
+        if constants.net.TESTNET:
+            return
+        try:
+            self.get_chainwork()
+        except (MissingHeader, InvalidHeader) as e:
+            self.logger.info(f"could not update chainwork: {repr(e)}")
+
     def can_connect(self, header: dict, check_height: bool=True) -> bool:
         if header is None:
             return False
@@ -793,7 +1167,7 @@ class Blockchain(Logger):
         headers = {}
         headers[header.get('block_height')] = header
         try:
-            target = self.get_target(height, headers)
+            target = self.get_target(height, headers, window=self.get_difficulty_window(height - 1))
         except MissingHeader:
             return False
         try:
@@ -806,8 +1180,9 @@ class Blockchain(Logger):
         assert idx >= 0, idx
         try:
             data = bfh(hexdata)
-            self.verify_chunk(idx, data)
+            window = self.verify_chunk(idx, data)
             self.save_chunk(idx, data)
+            self.set_difficulty_window(window)
             return True
         except BaseException as e:
             self.logger.info(f'verify_chunk idx {idx} failed: {repr(e)}')
@@ -32,6 +32,8 @@ import binascii
 import base64
 import asyncio
 import threading
+import itertools
+from array import array
 from enum import IntEnum
 
 from aiorpcx import NetAddress
@@ -42,7 +44,7 @@ from .util import bh2u, profiler, get_headers_dir, is_ip_address, json_normalize
 from .logging import Logger
 from .lnutil import (LNPeerAddr, format_short_channel_id, ShortChannelID,
                      validate_features, IncompatibleOrInsaneFeatures)
-from .lnverifier import LNChannelVerifier, verify_sig_for_channel_update
+from .lnverifier import LNChannelVerifier, verify_sig_for_channel_update, verify_channel_update_payload
 from .lnmsg import decode_msg
 
 if TYPE_CHECKING:
@@ -143,11 +145,7 @@ class NodeInfo(NamedTuple):
                 peer_addrs.append(LNPeerAddr(host=host, port=port, pubkey=node_id))
             except ValueError:
                 pass
-        alias = payload['alias'].rstrip(b'\x00')
-        try:
-            alias = alias.decode('utf8')
-        except:
-            alias = ''
+        alias = NodeInfo.decode_alias(payload['alias'])
         timestamp = payload['timestamp']
         node_info = NodeInfo(node_id=node_id, features=features, timestamp=timestamp, alias=alias)
         return node_info, peer_addrs
@@ -157,6 +155,14 @@ class NodeInfo(NamedTuple):
         payload_dict = decode_msg(raw)[1]
         return NodeInfo.from_msg(payload_dict)
 
+    @staticmethod
+    def decode_alias(alias_field: bytes) -> str:
+        alias = alias_field.rstrip(b'\x00')
+        try:
+            return alias.decode('utf8')
+        except:
+            return ''
+
     @staticmethod
     def parse_addresses_field(addresses_field):
         buf = addresses_field
@@ -239,17 +245,33 @@ def get_mychannel_policy(short_channel_id: bytes, node_id: bytes,
         return Policy.from_msg(local_update_decoded)
 
 
+# Besides the raw message (msg, kept for re-broadcast), the tables store the
+# decoded fields, so that load_data does not need to decode the messages.
+# Databases created by older versions only have msg; load_data fills in
+# the missing columns.
 create_channel_info = """
 CREATE TABLE IF NOT EXISTS channel_info (
 short_channel_id BLOB(8),
 msg BLOB,
+node1_id BLOB(33),
+node2_id BLOB(33),
+features BLOB,
 PRIMARY KEY(short_channel_id)
 )"""
 
+# the columns after msg are in the order of the fields of Policy
 create_policy = """
 CREATE TABLE IF NOT EXISTS policy (
 key BLOB(41),
 msg BLOB,
+cltv_expiry_delta INTEGER,
+htlc_minimum_msat INTEGER,
+htlc_maximum_msat INTEGER,
+fee_base_msat INTEGER,
+fee_proportional_millionths INTEGER,
+channel_flags INTEGER,
+message_flags INTEGER,
+timestamp INTEGER,
 PRIMARY KEY(key)
 )"""
 
@@ -266,9 +288,247 @@ create_node_info = """
 CREATE TABLE IF NOT EXISTS node_info (
 node_id BLOB(33),
 msg BLOB,
+features BLOB,
+timestamp INTEGER,
+alias TEXT,
 PRIMARY KEY(node_id)
 )"""
 
+# columns added to the tables of older databases
+decoded_columns = {
+    'channel_info': [('node1_id', 'BLOB(33)'), ('node2_id', 'BLOB(33)'), ('features', 'BLOB')],
+    'policy': [('cltv_expiry_delta', 'INTEGER'), ('htlc_minimum_msat', 'INTEGER'),
+               ('htlc_maximum_msat', 'INTEGER'), ('fee_base_msat', 'INTEGER'),
+               ('fee_proportional_millionths', 'INTEGER'), ('channel_flags', 'INTEGER'),
+               ('message_flags', 'INTEGER'), ('timestamp', 'INTEGER')],
+    'node_info': [('features', 'BLOB'), ('timestamp', 'INTEGER'), ('alias', 'TEXT')],
+}
+
+SQLITE_MAX_INTEGER = (1 << 63) - 1
+
+
+def policy_to_db_row(policy: Policy) -> Optional[Tuple]:
+    """Returns the decoded columns of the policy table, or None if
+    the u64 fields of the policy do not fit in an SQLite integer.
+    """
+    if policy.htlc_minimum_msat > SQLITE_MAX_INTEGER:
+        return None
+    if policy.htlc_maximum_msat is not None and policy.htlc_maximum_msat > SQLITE_MAX_INTEGER:
+        return None
+    return tuple(policy[1:])
+
+
+class RoutingGraph:
+    """Compact copy of the public channel graph, for path finding.
+
+    Nodes and channels are numbered. Directed edge 2*c goes through
+    channel c from node1 to node2, using the policy of node1; edge 2*c+1
+    is the other direction. Policy fields are stored in parallel arrays,
+    indexed by edge. The incoming edges of each node are stored in CSR
+    form: the edges ending at node n are
+    in_edges[in_edge_offsets[n]:in_edge_offsets[n+1]].
+
+    Policy updates are applied in place. When channels are added or
+    removed, the CSR arrays are rebuilt on the next get_in_edges() call.
+    Modifications need ChannelDB.lock; readers don't lock, just like the
+    path finder did not lock ChannelDB.
+    """
+
+    MAX_MSAT = (1 << 63) - 1
+
+    def __init__(self):
+        self.node_ids = []  # type: List[bytes]
+        self.node_index = {}  # type: Dict[bytes, int]
+        # per channel:
+        self.scids = []  # type: List[Optional[ShortChannelID]]  # None for free slots
+        self.channel_index = {}  # type: Dict[ShortChannelID, int]
+        self.capacity_sat = array('q')  # -1 if unknown
+        self._free_channels = []  # type: List[int]
+        # per directed edge:
+        self.edge_start = array('l')  # node index
+        self.edge_end = array('l')
+        self.has_policy = array('b')
+        self.disabled = array('b')
+        # has_policy, the reverse edge has_policy too, and not disabled
+        self.usable = array('b')
+        self.fee_base_msat = array('q')
+        self.fee_proportional_millionths = array('q')
+        self.cltv_expiry_delta = array('l')
+        self.htlc_minimum_msat = array('q')
+        self.htlc_maximum_msat = array('q')  # -1 if not set
+        # CSR adjacency, by end node
+        self._in_edge_offsets = array('l', [0])
+        self._in_edges = array('l')
+        self._adjacency_dirty = False
+
+    def _get_node_index(self, node_id: bytes) -> int:
+        n = self.node_index.get(node_id)
+        if n is None:
+            n = self.node_index[node_id] = len(self.node_ids)
+            self.node_ids.append(node_id)
+        return n
+
+    def add_channel(self, channel_info: ChannelInfo) -> None:
+        short_channel_id = channel_info.short_channel_id
+        capacity_sat = channel_info.capacity_sat if channel_info.capacity_sat is not None else -1
+        c = self.channel_index.get(short_channel_id)
+        if c is not None:
+            self.capacity_sat[c] = capacity_sat
+            return
+        n1 = self._get_node_index(channel_info.node1_id)
+        n2 = self._get_node_index(channel_info.node2_id)
+        if self._free_channels:
+            c = self._free_channels.pop()
+            self.scids[c] = short_channel_id
+            self.capacity_sat[c] = capacity_sat
+            for e, (start, end) in ((2 * c, (n1, n2)), (2 * c + 1, (n2, n1))):
+                self.edge_start[e], self.edge_end[e] = start, end
+                self.has_policy[e] = self.usable[e] = 0
+        else:
+            c = len(self.scids)
+            self.scids.append(short_channel_id)
+            self.capacity_sat.append(capacity_sat)
+            for start, end in ((n1, n2), (n2, n1)):
+                self.edge_start.append(start)
+                self.edge_end.append(end)
+                self.has_policy.append(0)
+                for arr in (self.usable, self.disabled, self.fee_base_msat, self.fee_proportional_millionths,
+                            self.cltv_expiry_delta, self.htlc_minimum_msat, self.htlc_maximum_msat):
+                    arr.append(0)
+        self.channel_index[short_channel_id] = c
+        self._adjacency_dirty = True
+
+    def load(self, channel_infos: Sequence[ChannelInfo],
+             policies: Dict[Tuple[bytes, ShortChannelID], Policy]) -> None:
+        """Same as add_channel and set_policy, in bulk."""
+        if self.scids:
+            for channel_info in channel_infos:
+                self.add_channel(channel_info)
+            for policy in policies.values():
+                self.set_policy(policy)
+            return
+        get_node_index = self._get_node_index
+        edge_start = []
+        for channel_info in channel_infos:
+            n1 = get_node_index(channel_info.node1_id)
+            n2 = get_node_index(channel_info.node2_id)
+            edge_start += (n1, n2)
+        self.scids = [channel_info.short_channel_id for channel_info in channel_infos]
+        self.channel_index = {short_channel_id: c for c, short_channel_id in enumerate(self.scids)}
+        self.capacity_sat = array('q', [channel_info.capacity_sat if channel_info.capacity_sat is not None else -1
+                                        for channel_info in channel_infos])
+        self.edge_start = array('l', edge_start)
+        self.edge_end = array('l', [edge_start[e ^ 1] for e in range(len(edge_start))])
+        num_edges = len(edge_start)
+        has_policy = [0] * num_edges
+        disabled = [0] * num_edges
+        fee_base_msat = [0] * num_edges
+        fee_proportional_millionths = [0] * num_edges
+        cltv_expiry_delta = [0] * num_edges
+        htlc_minimum_msat = [0] * num_edges
+        htlc_maximum_msat = [0] * num_edges
+        channel_index = self.channel_index
+        node_index = self.node_index
+        max_msat = self.MAX_MSAT
+        for (start_node, short_channel_id), policy in policies.items():
+            c = channel_index.get(short_channel_id)
+            if c is None:
+                continue
+            n = node_index[start_node] if start_node in node_index else -1
+            if edge_start[2 * c] == n:
+                e = 2 * c
+            elif edge_start[2 * c + 1] == n:
+                e = 2 * c + 1
+            else:
+                continue
+            has_policy[e] = 1
+            disabled[e] = 1 if policy.is_disabled() else 0
+            fee_base_msat[e] = policy.fee_base_msat
+            fee_proportional_millionths[e] = policy.fee_proportional_millionths
+            cltv_expiry_delta[e] = policy.cltv_expiry_delta
+            htlc_minimum_msat[e] = min(policy.htlc_minimum_msat, max_msat)
+            htlc_maximum_msat[e] = min(policy.htlc_maximum_msat, max_msat) if policy.htlc_maximum_msat is not None else -1
+        self.has_policy = array('b', has_policy)
+        self.disabled = array('b', disabled)
+        self.usable = array('b', [has_policy[e] and has_policy[e ^ 1] and not disabled[e] for e in range(num_edges)])
+        self.fee_base_msat = array('q', fee_base_msat)
+        self.fee_proportional_millionths = array('q', fee_proportional_millionths)
+        self.cltv_expiry_delta = array('l', cltv_expiry_delta)
+        self.htlc_minimum_msat = array('q', htlc_minimum_msat)
+        self.htlc_maximum_msat = array('q', htlc_maximum_msat)
+        self._adjacency_dirty = True
+
+    def remove_channel(self, short_channel_id: ShortChannelID) -> None:
+        c = self.channel_index.pop(short_channel_id, None)
+        if c is None:
+            return
+        self.scids[c] = None
+        for e in (2 * c, 2 * c + 1):
+            self.edge_start[e] = self.edge_end[e] = -1
+            self.has_policy[e] = self.usable[e] = 0
+        self._free_channels.append(c)
+        self._adjacency_dirty = True
+
+    def _get_edge(self, start_node: bytes, short_channel_id: ShortChannelID) -> Optional[int]:
+        c = self.channel_index.get(short_channel_id)
+        if c is None:
+            return None
+        if self.node_ids[self.edge_start[2 * c]] == start_node:
+            return 2 * c
+        if self.node_ids[self.edge_start[2 * c + 1]] == start_node:
+            return 2 * c + 1
+        return None
+
+    def set_policy(self, policy: Policy) -> None:
+        e = self._get_edge(policy.start_node, policy.short_channel_id)
+        if e is None:
+            return
+        self.has_policy[e] = 1
+        self.disabled[e] = 1 if policy.is_disabled() else 0
+        self.fee_base_msat[e] = policy.fee_base_msat
+        self.fee_proportional_millionths[e] = policy.fee_proportional_millionths
+        self.cltv_expiry_delta[e] = policy.cltv_expiry_delta
+        # u64 values in the message; anything above int64 is as good as infinite
+        self.htlc_minimum_msat[e] = min(policy.htlc_minimum_msat, self.MAX_MSAT)
+        self.htlc_maximum_msat[e] = min(policy.htlc_maximum_msat, self.MAX_MSAT) if policy.htlc_maximum_msat is not None else -1
+        self._update_usable(e)
+
+    def remove_policy(self, start_node: bytes, short_channel_id: ShortChannelID) -> None:
+        e = self._get_edge(start_node, short_channel_id)
+        if e is not None:
+            self.has_policy[e] = 0
+            self._update_usable(e)
+
+    def _update_usable(self, e: int) -> None:
+        # channels that did not publish both policies often return temporary channel failure
+        for edge in (e, e ^ 1):
+            self.usable[edge] = self.has_policy[edge] and self.has_policy[edge ^ 1] and not self.disabled[edge]
+
+    def get_in_edges(self) -> Tuple[array, array]:
+        """Returns (in_edge_offsets, in_edges), the CSR adjacency by end node."""
+        if self._adjacency_dirty:
+            self._build_adjacency()
+        return self._in_edge_offsets, self._in_edges
+
+    def _build_adjacency(self) -> None:
+        num_nodes = len(self.node_ids)
+        counts = [0] * (num_nodes + 1)
+        edge_end = self.edge_end
+        for end in edge_end:
+            if end >= 0:
+                counts[end + 1] += 1
+        offsets = array('l', itertools.accumulate(counts))
+        in_edges = array('l', bytes(offsets[-1] * array('l').itemsize))
+        pos = list(offsets[:-1])
+        for e, end in enumerate(edge_end):
+            if end >= 0:
+                in_edges[pos[end]] = e
+                pos[end] += 1
+        # swap in new arrays only when complete, for readers in other threads
+        self._in_edges = in_edges
+        self._in_edge_offsets = offsets
+        self._adjacency_dirty = False
+
 
 class ChannelDB(SqlDB):
 
@@ -295,6 +555,7 @@ class ChannelDB(SqlDB):
         self._chans_with_0_policies = set()  # type: Set[ShortChannelID]
         self._chans_with_1_policies = set()  # type: Set[ShortChannelID]
         self._chans_with_2_policies = set()  # type: Set[ShortChannelID]
+        self.routing_graph = RoutingGraph()
 
         self.data_loaded = asyncio.Event()
         self.network = network # only for callback
@@ -387,9 +648,10 @@ class ChannelDB(SqlDB):
             self._channels[channel_info.short_channel_id] = channel_info
             self._channels_for_node[channel_info.node1_id].add(channel_info.short_channel_id)
             self._channels_for_node[channel_info.node2_id].add(channel_info.short_channel_id)
+            self._add_channel_to_routing_graph(channel_info)
         self._update_num_policies_for_chan(channel_info.short_channel_id)
         if 'raw' in msg:
-            self._db_save_channel(channel_info.short_channel_id, msg['raw'])
+            self._db_save_channel(channel_info, msg['features'], msg['raw'])
 
     def policy_changed(self, old_policy: Policy, new_policy: Policy, verbose: bool) -> bool:
         changed = False
@@ -425,6 +687,15 @@ class ChannelDB(SqlDB):
             self.logger.info(f'policy unchanged: {old_policy.timestamp} -> {new_policy.timestamp}')
         return changed
 
+    def get_start_node_of_channel_update(self, payload) -> Optional[bytes]:
+        """Returns the node that sent the channel_update, or None if the channel is unknown."""
+        channel_info = self._channels.get(ShortChannelID(payload['short_channel_id']))
+        if not channel_info:
+            return None
+        flags = int.from_bytes(payload['channel_flags'], 'big')
+        direction = flags & FLAG_DIRECTION
+        return channel_info.node1_id if direction == 0 else channel_info.node2_id
+
     def add_channel_update(self, payload, max_age=None, verify=False, verbose=True):
         now = int(time.time())
         short_channel_id = ShortChannelID(payload['short_channel_id'])
@@ -433,12 +704,9 @@ class ChannelDB(SqlDB):
             return UpdateStatus.EXPIRED
         if timestamp - now > 60:
             return UpdateStatus.DEPRECATED
-        channel_info = self._channels.get(short_channel_id)
-        if not channel_info:
+        start_node = self.get_start_node_of_channel_update(payload)
+        if start_node is None:
             return UpdateStatus.ORPHANED
-        flags = int.from_bytes(payload['channel_flags'], 'big')
-        direction = flags & FLAG_DIRECTION
-        start_node = channel_info.node1_id if direction == 0 else channel_info.node2_id
         payload['start_node'] = start_node
         # compare updates to existing database entries
         timestamp = payload['timestamp']
@@ -453,9 +721,10 @@ class ChannelDB(SqlDB):
         policy = Policy.from_msg(payload)
         with self.lock:
             self._policies[key] = policy
+            self.routing_graph.set_policy(policy)
         self._update_num_policies_for_chan(short_channel_id)
         if 'raw' in payload:
-            self._db_save_policy(policy.key, payload['raw'])
+            self._db_save_policy(policy, payload['raw'])
         if old_policy and not self.policy_changed(old_policy, policy, verbose):
             return UpdateStatus.UNCHANGED
         else:
@@ -494,13 +763,22 @@ class ChannelDB(SqlDB):
         c.execute(create_address)
         c.execute(create_policy)
         c.execute(create_channel_info)
+        for table, columns in decoded_columns.items():
+            c.execute(f"PRAGMA table_info({table})")
+            existing_columns = set(row[1] for row in c.fetchall())
+            for name, column_type in columns:
+                if name not in existing_columns:
+                    c.execute(f"ALTER TABLE {table} ADD COLUMN {name} {column_type}")
         self.conn.commit()
 
     @sql
-    def _db_save_policy(self, key: bytes, msg: bytes):
+    def _db_save_policy(self, policy: Policy, msg: bytes):
         # 'msg' is a 'channel_update' message
+        row = policy_to_db_row(policy) or (None,) * 8
         c = self.conn.cursor()
-        c.execute("""REPLACE INTO policy (key, msg) VALUES (?,?)""", [key, msg])
+        c.execute("""REPLACE INTO policy (key, msg, cltv_expiry_delta, htlc_minimum_msat, htlc_maximum_msat,
+                     fee_base_msat, fee_proportional_millionths, channel_flags, message_flags, timestamp)
+                     VALUES (?,?,?,?,?,?,?,?,?,?)""", (policy.key, msg) + row)
 
     @sql
     def _db_delete_policy(self, node_id: bytes, short_channel_id: ShortChannelID):
@@ -509,10 +787,11 @@ class ChannelDB(SqlDB):
         c.execute("""DELETE FROM policy WHERE key=?""", (key,))
 
     @sql
-    def _db_save_channel(self, short_channel_id: ShortChannelID, msg: bytes):
+    def _db_save_channel(self, channel_info: ChannelInfo, features: bytes, msg: bytes):
         # 'msg' is a 'channel_announcement' message
         c = self.conn.cursor()
-        c.execute("REPLACE INTO channel_info (short_channel_id, msg) VALUES (?,?)", [short_channel_id, msg])
+        c.execute("REPLACE INTO channel_info (short_channel_id, msg, node1_id, node2_id, features) VALUES (?,?,?,?,?)",
+                  [channel_info.short_channel_id, msg, channel_info.node1_id, channel_info.node2_id, features])
 
     @sql
     def _db_delete_channel(self, short_channel_id: ShortChannelID):
@@ -520,10 +799,11 @@ class ChannelDB(SqlDB):
         c.execute("""DELETE FROM channel_info WHERE short_channel_id=?""", (short_channel_id,))
 
     @sql
-    def _db_save_node_info(self, node_id: bytes, msg: bytes):
+    def _db_save_node_info(self, node_info: NodeInfo, features: bytes, msg: bytes):
         # 'msg' is a 'node_announcement' message
         c = self.conn.cursor()
-        c.execute("REPLACE INTO node_info (node_id, msg) VALUES (?,?)", [node_id, msg])
+        c.execute("REPLACE INTO node_info (node_id, msg, features, timestamp, alias) VALUES (?,?,?,?,?)",
+                  [node_info.node_id, msg, features, node_info.timestamp, node_info.alias])
 
     @sql
     def _db_save_node_address(self, peer: LNPeerAddr, timestamp: int):
@@ -543,9 +823,7 @@ class ChannelDB(SqlDB):
     def verify_channel_update(self, payload):
         short_channel_id = payload['short_channel_id']
         short_channel_id = ShortChannelID(short_channel_id)
-        if constants.net.rev_genesis_bytes() != payload['chain_hash']:
-            raise Exception('wrong chain hash')
-        if not verify_sig_for_channel_update(payload, payload['start_node']):
+        if not verify_channel_update_payload(payload):
             raise Exception(f'failed verifying channel update for {short_channel_id}')
 
     def add_node_announcement(self, msg_payloads):
@@ -573,7 +851,7 @@ class ChannelDB(SqlDB):
             with self.lock:
                 self._nodes[node_id] = node_info
             if 'raw' in msg_payload:
-                self._db_save_node_info(node_id, msg_payload['raw'])
+                self._db_save_node_info(node_info, msg_payload['features'], msg_payload['raw'])
             with self.lock:
                 for addr in node_addresses:
                     net_addr = NetAddress(addr.host, addr.port)
@@ -596,6 +874,7 @@ class ChannelDB(SqlDB):
                 node_id, scid = key
                 with self.lock:
                     self._policies.pop(key)
+                    self.routing_graph.remove_policy(node_id, scid)
                 self._db_delete_policy(*key)
                 self._update_num_policies_for_chan(scid)
             self.update_counts()
@@ -624,6 +903,7 @@ class ChannelDB(SqlDB):
             if channel_info:
                 self._channels_for_node[channel_info.node1_id].remove(channel_info.short_channel_id)
                 self._channels_for_node[channel_info.node2_id].remove(channel_info.short_channel_id)
+            self.routing_graph.remove_channel(short_channel_id)
         self._update_num_policies_for_chan(short_channel_id)
         # delete from database
         self._db_delete_channel(short_channel_id)
@@ -641,8 +921,8 @@ class ChannelDB(SqlDB):
     def load_data(self):
         if self.data_loaded.is_set():
             return
-        # Note: this method takes several seconds... mostly due to lnmsg.decode_msg being slow.
         c = self.conn.cursor()
+        self._decode_old_rows(c)
         c.execute("""SELECT * FROM address""")
         for x in c:
             node_id, host, port, timestamp = x
@@ -658,29 +938,50 @@ class ChannelDB(SqlDB):
             return newest_ts
         sorted_node_ids = sorted(self._addresses.keys(), key=newest_ts_for_node_id, reverse=True)
         self._recent_peers = sorted_node_ids[:self.NUM_MAX_RECENT_PEERS]
-        c.execute("""SELECT * FROM channel_info""")
-        for short_channel_id, msg in c:
-            try:
-                ci = ChannelInfo.from_raw_msg(msg)
-            except IncompatibleOrInsaneFeatures:
+        valid_features = {}  # type: Dict[bytes, bool]
+        def are_features_valid(features: bytes) -> bool:
+            is_valid = valid_features.get(features)
+            if is_valid is None:
+                try:
+                    validate_features(int.from_bytes(features, 'big'))
+                    is_valid = True
+                except IncompatibleOrInsaneFeatures:
+                    is_valid = False
+                valid_features[features] = is_valid
+            return is_valid
+        c.execute("""SELECT short_channel_id, node1_id, node2_id, features FROM channel_info""")
+        for short_channel_id, node1_id, node2_id, features in c:
+            if features and not are_features_valid(features):
                 continue
-            self._channels[ShortChannelID.normalize(short_channel_id)] = ci
-        c.execute("""SELECT * FROM node_info""")
-        for node_id, msg in c:
-            try:
-                node_info, node_addresses = NodeInfo.from_raw_msg(msg)
-            except IncompatibleOrInsaneFeatures:
+            short_channel_id = ShortChannelID(short_channel_id)
+            self._channels[short_channel_id] = ChannelInfo(short_channel_id, node1_id, node2_id, None)
+        c.execute("""SELECT node_id, features, timestamp, alias FROM node_info""")
+        for node_id, features, timestamp, alias in c:
+            if not are_features_valid(features):
                 continue
             # don't load node_addresses because they dont have timestamps
-            self._nodes[node_id] = node_info
-        c.execute("""SELECT * FROM policy""")
+            self._nodes[node_id] = NodeInfo(node_id, int.from_bytes(features, 'big'), timestamp, alias)
+        c.execute("""SELECT key, cltv_expiry_delta, htlc_minimum_msat, htlc_maximum_msat, fee_base_msat,
+                     fee_proportional_millionths, channel_flags, message_flags, timestamp
+                     FROM policy WHERE timestamp IS NOT NULL""")
+        for row in c:
+            key = row[0]
+            self._policies[(key[8:], ShortChannelID(key[0:8]))] = Policy._make(row)
+        # policies with values that do not fit in the decoded columns
+        c.execute("""SELECT key, msg FROM policy WHERE timestamp IS NULL""")
         for key, msg in c:
             p = Policy.from_raw_msg(key, msg)
             self._policies[(p.start_node, p.short_channel_id)] = p
-        for channel_info in self._channels.values():
-            self._channels_for_node[channel_info.node1_id].add(channel_info.short_channel_id)
-            self._channels_for_node[channel_info.node2_id].add(channel_info.short_channel_id)
-            self._update_num_policies_for_chan(channel_info.short_channel_id)
+        chans_with_n_policies = (self._chans_with_0_policies, self._chans_with_1_policies,
+                                 self._chans_with_2_policies)
+        for short_channel_id, channel_info in self._channels.items():
+            self._channels_for_node[channel_info.node1_id].add(short_channel_id)
+            self._channels_for_node[channel_info.node2_id].add(short_channel_id)
+            num_policies = (((channel_info.node1_id, short_channel_id) in self._policies)
+                            + ((channel_info.node2_id, short_channel_id) in self._policies))
+            chans_with_n_policies[num_policies].add(short_channel_id)
+        with self.lock:
+            self.routing_graph.load(list(self._channels.values()), self._policies)
         self.logger.info(f'load data {len(self._channels)} {len(self._policies)} {len(self._channels_for_node)}')
         self.update_counts()
         (nchans_with_0p, nchans_with_1p, nchans_with_2p) = self.get_num_channels_partitioned_by_policy_count()
@@ -689,6 +990,46 @@ class ChannelDB(SqlDB):
         self.data_loaded.set()
         util.trigger_callback('gossip_db_loaded')
 
+    def _decode_old_rows(self, c) -> None:
+        """Fills in the decoded columns of the rows written by older versions,
+        which only stored the raw messages.
+        """
+        c.execute("""SELECT short_channel_id, msg FROM channel_info WHERE node1_id IS NULL""")
+        channel_rows = []
+        for short_channel_id, msg in c.fetchall():
+            payload = decode_msg(msg)[1]
+            channel_rows.append((payload['node_id_1'], payload['node_id_2'], payload['features'], short_channel_id))
+        c.executemany("""UPDATE channel_info SET node1_id=?, node2_id=?, features=? WHERE short_channel_id=?""",
+                      channel_rows)
+        c.execute("""SELECT node_id, msg FROM node_info WHERE timestamp IS NULL""")
+        node_rows = []
+        for node_id, msg in c.fetchall():
+            payload = decode_msg(msg)[1]
+            alias = NodeInfo.decode_alias(payload['alias'])
+            node_rows.append((payload['features'], payload['timestamp'], alias, node_id))
+        c.executemany("""UPDATE node_info SET features=?, timestamp=?, alias=? WHERE node_id=?""", node_rows)
+        c.execute("""SELECT key, msg FROM policy WHERE timestamp IS NULL""")
+        policy_rows = []
+        for key, msg in c.fetchall():
+            row = policy_to_db_row(Policy.from_raw_msg(key, msg))
+            if row is not None:
+                policy_rows.append(row + (key,))
+        c.executemany("""UPDATE policy SET cltv_expiry_delta=?, htlc_minimum_msat=?, htlc_maximum_msat=?,
+                         fee_base_msat=?, fee_proportional_millionths=?, channel_flags=?, message_flags=?,
+                         timestamp=? WHERE key=?""", policy_rows)
+        self.conn.commit()
+        if channel_rows or node_rows or policy_rows:
+            self.logger.info(f'decoded {len(channel_rows)} channels, {len(node_rows)} nodes '
+                             f'and {len(policy_rows)} policies of old database rows')
+
+    def _add_channel_to_routing_graph(self, channel_info: ChannelInfo) -> None:
+        # note: policies are not removed with their channel, and they apply again if it is re-added
+        self.routing_graph.add_channel(channel_info)
+        for node_id in (channel_info.node1_id, channel_info.node2_id):
+            policy = self._policies.get((node_id, channel_info.short_channel_id))
+            if policy is not None:
+                self.routing_graph.set_policy(policy)
+
     def _update_num_policies_for_chan(self, short_channel_id: ShortChannelID) -> None:
         channel_info = self.get_channel_info(short_channel_id)
         if channel_info is None:
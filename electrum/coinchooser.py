@@ -23,8 +23,10 @@
 # CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 from collections import defaultdict
+import itertools
+import time
 from math import floor, log10
-from typing import NamedTuple, List, Callable, Sequence, Union, Dict, Tuple
+from typing import NamedTuple, List, Callable, Sequence, Union, Dict, Tuple, Optional
 from decimal import Decimal
 
 from .bitcoin import sha256, COIN, is_address
@@ -48,17 +50,20 @@ class PRNG:
         while len(self.pool) < n:
             self.pool.extend(self.sha)
             self.sha = sha256(self.sha)
-        result, self.pool = self.pool[:n], self.pool[n:]
-        return bytes(result)
+        result = bytes(self.pool[:n])
+        del self.pool[:n]
+        return result
 
     def randint(self, start, end):
         # Returns random integer in [start, end)
         n = end - start
-        r = 0
+        num_bytes = 0
         p = 1
         while p < n:
-            r = self.get_bytes(1)[0] + (r << 8)
+            num_bytes += 1
             p = p << 8
+        # same as reading the bytes one by one, most significant first
+        r = int.from_bytes(self.get_bytes(num_bytes), 'big')
         return start + (r % n)
 
     def choice(self, seq):
@@ -83,8 +88,8 @@ class Bucket(NamedTuple):
 
 class ScoredCandidate(NamedTuple):
     penalty: float
-    tx: PartialTransaction
     buckets: List[Bucket]
+    change_amounts: List[int]     # values of the change outputs of the tx spending the buckets
 
 
 def strip_unneeded(bkts: List[Bucket], sufficient_funds) -> List[Bucket]:
@@ -149,20 +154,21 @@ class CoinChooserBase(Logger):
         return list(map(make_Bucket, buckets.keys(), buckets.values()))
 
     def penalty_func(self, base_tx, *,
-                     tx_from_buckets: Callable[[List[Bucket]], Tuple[PartialTransaction, List[PartialTxOutput]]]) \
+                     change_from_buckets: Callable[[List[Bucket]], List[int]]) \
             -> Callable[[List[Bucket]], ScoredCandidate]:
         raise NotImplementedError
 
-    def _change_amounts(self, tx: PartialTransaction, count: int, fee_estimator_numchange) -> List[int]:
+    def _change_amounts(self, output_amounts: Sequence[int], fee: int, count: int,
+                        fee_estimator_numchange) -> List[int]:
+        # fee: what would be paid as fee without change, i.e. inputs minus outputs
         # Break change up if bigger than max_change
-        output_amounts = [o.value for o in tx.outputs()]
         # Don't split change of less than 0.02 BTC
         max_change = max(max(output_amounts) * 1.25, 0.02 * COIN)
 
         # Use N change outputs
         for n in range(1, count + 1):
             # How much is left if we add this many change outputs?
-            change_amount = max(0, tx.get_fee() - fee_estimator_numchange(n))
+            change_amount = max(0, fee - fee_estimator_numchange(n))
             if change_amount // n <= max_change:
                 break
 
@@ -207,43 +213,36 @@ class CoinChooserBase(Logger):
 
         return amounts
 
-    def _change_outputs(self, tx: PartialTransaction, change_addrs, fee_estimator_numchange,
-                        dust_threshold) -> List[PartialTxOutput]:
-        amounts = self._change_amounts(tx, len(change_addrs), fee_estimator_numchange)
+    def _change_for_selected_buckets(self, *, buckets: Sequence[Bucket], input_value: int,
+                                     output_amounts: Sequence[int], change_addrs: Sequence[str],
+                                     fee_estimator_w, dust_threshold, base_weight) -> List[int]:
+        """Returns the values of the change outputs of the tx that would spend
+        the given buckets, in addition to the inputs and outputs of the base tx.
+        Only the bucket aggregates are used, no transaction is constructed.
+        """
+        tx_weight = self._get_tx_weight(buckets, base_weight=base_weight)
+        fee = input_value + sum(bucket.value for bucket in buckets) - sum(output_amounts)
+        # This takes a count of change outputs and returns a tx fee
+        output_weight = 4 * Transaction.estimated_output_size(change_addrs[0])
+        fee_estimator_numchange = lambda count: fee_estimator_w(tx_weight + count * output_weight)
+        amounts = self._change_amounts(output_amounts, fee, len(change_addrs), fee_estimator_numchange)
         assert min(amounts) >= 0
         assert len(change_addrs) >= len(amounts)
         assert all([isinstance(amt, int) for amt in amounts])
         # If change is above dust threshold after accounting for the
         # size of the change output, add it to the transaction.
-        amounts = [amount for amount in amounts if amount >= dust_threshold]
-        change = [PartialTxOutput.from_address_and_value(addr, amount)
-                  for addr, amount in zip(change_addrs, amounts)]
-        return change
+        return [amount for amount in amounts if amount >= dust_threshold]
 
     def _construct_tx_from_selected_buckets(self, *, buckets: Sequence[Bucket],
-                                            base_tx: PartialTransaction, change_addrs,
-                                            fee_estimator_w, dust_threshold,
-                                            base_weight) -> Tuple[PartialTransaction, List[PartialTxOutput]]:
+                                            base_tx: PartialTransaction, change_addrs: Sequence[str],
+                                            change_amounts: Sequence[int]) -> PartialTransaction:
         # make a copy of base_tx so it won't get mutated
         tx = PartialTransaction.from_io(base_tx.inputs()[:], base_tx.outputs()[:])
-
         tx.add_inputs([coin for b in buckets for coin in b.coins])
-        tx_weight = self._get_tx_weight(buckets, base_weight=base_weight)
-
-        # change is sent back to sending address unless specified
-        if not change_addrs:
-            change_addrs = [tx.inputs()[0].address]
-            # note: this is not necessarily the final "first input address"
-            # because the inputs had not been sorted at this point
-            assert is_address(change_addrs[0])
-
-        # This takes a count of change outputs and returns a tx fee
-        output_weight = 4 * Transaction.estimated_output_size(change_addrs[0])
-        fee_estimator_numchange = lambda count: fee_estimator_w(tx_weight + count * output_weight)
-        change = self._change_outputs(tx, change_addrs, fee_estimator_numchange, dust_threshold)
+        change = [PartialTxOutput.from_address_and_value(addr, amount)
+                  for addr, amount in zip(change_addrs, change_amounts)]
         tx.add_outputs(change)
-
-        return tx, change
+        return tx
 
     def _get_tx_weight(self, buckets: Sequence[Bucket], *, base_weight: int) -> int:
         """Given a collection of buckets, return the total weight of the
@@ -295,7 +294,8 @@ class CoinChooserBase(Logger):
         # marker and flag are excluded, which is compensated in get_tx_weight()
         # FIXME calculation will be off by this (2 wu) in case of RBF batching
         base_weight = base_tx.estimated_weight()
-        spent_amount = base_tx.output_value()
+        output_amounts = [o.value for o in base_tx.outputs()]
+        spent_amount = sum(output_amounts)
 
         def fee_estimator_w(weight):
             return fee_estimator_vb(Transaction.virtual_size_from_weight(weight))
@@ -312,13 +312,25 @@ class CoinChooserBase(Logger):
             total_weight = self._get_tx_weight(buckets, base_weight=base_weight)
             return total_input >= spent_amount + fee_estimator_w(total_weight)
 
-        def tx_from_buckets(buckets):
-            return self._construct_tx_from_selected_buckets(buckets=buckets,
-                                                            base_tx=base_tx,
-                                                            change_addrs=change_addrs,
-                                                            fee_estimator_w=fee_estimator_w,
-                                                            dust_threshold=dust_threshold,
-                                                            base_weight=base_weight)
+        def change_addrs_for_buckets(buckets):
+            # change is sent back to sending address unless specified
+            if change_addrs:
+                return change_addrs
+            # the first input of the tx. As before candidates were scored without
+            # constructing txs: PartialTransaction.add_inputs BIP69-sorts the inputs.
+            first_input = min(itertools.chain(base_tx.inputs(), (coin for b in buckets for coin in b.coins)),
+                              key=lambda txin: (txin.prevout.txid, txin.prevout.out_idx))
+            assert is_address(first_input.address)
+            return [first_input.address]
+
+        def change_from_buckets(buckets):
+            return self._change_for_selected_buckets(buckets=buckets,
+                                                     input_value=input_value,
+                                                     output_amounts=output_amounts,
+                                                     change_addrs=change_addrs_for_buckets(buckets),
+                                                     fee_estimator_w=fee_estimator_w,
+                                                     dust_threshold=dust_threshold,
+                                                     base_weight=base_weight)
 
         # Collect the coins into buckets
         all_buckets = self.bucketize_coins(coins, fee_estimator_vb=fee_estimator_vb)
@@ -329,8 +341,12 @@ class CoinChooserBase(Logger):
         all_buckets = list(filter(lambda b: b.effective_value > 0, all_buckets))
         # Choose a subset of the buckets
         scored_candidate = self.choose_buckets(all_buckets, sufficient_funds,
-                                               self.penalty_func(base_tx, tx_from_buckets=tx_from_buckets))
-        tx = scored_candidate.tx
+                                               self.penalty_func(base_tx, change_from_buckets=change_from_buckets))
+        # Only now construct the tx, for the winning candidate
+        tx = self._construct_tx_from_selected_buckets(buckets=scored_candidate.buckets,
+                                                      base_tx=base_tx,
+                                                      change_addrs=change_addrs_for_buckets(scored_candidate.buckets),
+                                                      change_amounts=scored_candidate.change_amounts)
 
         self.logger.info(f"using {len(tx.inputs())} inputs")
         self.logger.info(f"using buckets: {[bucket.desc for bucket in scored_candidate.buckets]}")
@@ -444,17 +460,29 @@ class CoinChooserPrivacy(CoinChooserRandom):
     """
 
     def keys(self, coins):
-        return [coin.scriptpubkey.hex() for coin in coins]
-
-    def penalty_func(self, base_tx, *, tx_from_buckets):
+        # many coins typically share an address; only convert each address once
+        scripts = {}  # type: Dict[str, str]
+        keys = []
+        for coin in coins:
+            address = coin.address
+            if address is None:
+                keys.append(coin.scriptpubkey.hex())
+                continue
+            script = scripts.get(address)
+            if script is None:
+                script = scripts[address] = coin.scriptpubkey.hex()
+            keys.append(script)
+        return keys
+
+    def penalty_func(self, base_tx, *, change_from_buckets):
         min_change = min(o.value for o in base_tx.outputs()) * 0.75
         max_change = max(o.value for o in base_tx.outputs()) * 1.33
 
         def penalty(buckets: List[Bucket]) -> ScoredCandidate:
             # Penalize using many buckets (~inputs)
             badness = len(buckets) - 1
-            tx, change_outputs = tx_from_buckets(buckets)
-            change = sum(o.value for o in change_outputs)
+            change_amounts = change_from_buckets(buckets)
+            change = sum(change_amounts)
             # Penalize change not roughly in output range
             if change == 0:
                 pass  # no change is great!
@@ -467,7 +495,7 @@ class CoinChooserPrivacy(CoinChooserRandom):
                 badness += (change - max_change) / (max_change + 10000)
                 # Penalize large change; 5 BTC excess ~= using 1 more input
                 badness += change / (COIN * 5)
-            return ScoredCandidate(badness, tx, buckets)
+            return ScoredCandidate(badness, buckets, change_amounts)
 
         return penalty
 
@@ -517,9 +545,128 @@ class CoinChooserOldestFirst(CoinChooserPrivacy):
         return [strip_unneeded(c, sufficient_funds) for c in candidates]
 
 
+class ChangelessTarget(NamedTuple):
+    target: int                   # effective value the selected buckets need to add up to
+    cost_of_change: int           # creating and later spending a change output costs this much in fees
+    excess_func: Callable[[List[Bucket], int], int]  # exact leftover for (buckets, bucket_value_sum)
+
+
+class CoinChooserBnB(CoinChooserPrivacy):
+    """Tries to avoid creating a change output.
+    Searches for a set of coins whose value matches the spent amount plus
+    fees, up to the cost of creating and later spending a change output;
+    any such excess is added to the fee. This saves fees and does not grow
+    the UTXO set.  As with Privacy, if any coin is spent from an address,
+    all coins are.  If no such set is found in time, behaves like Privacy.
+    """
+
+    # same limit as Bitcoin Core
+    max_tries = 100000
+
+    def __init__(self, *, enable_output_value_rounding: bool, time_budget: float = 0.5):
+        CoinChooserPrivacy.__init__(self, enable_output_value_rounding=enable_output_value_rounding)
+        self.time_budget = time_budget  # in seconds
+        self.changeless_target = None  # type: Optional[ChangelessTarget]
+
+    def make_tx(self, *, coins, inputs, outputs, change_addrs, fee_estimator_vb, dust_threshold):
+        base_tx = PartialTransaction.from_io(inputs[:], outputs[:])
+        input_value = base_tx.input_value()
+        spent_amount = base_tx.output_value()
+        base_weight = base_tx.estimated_weight()
+
+        def fee_estimator_w(weight):
+            return fee_estimator_vb(Transaction.virtual_size_from_weight(weight))
+
+        def excess_func(buckets, bucket_value_sum):
+            total_weight = self._get_tx_weight(buckets, base_weight=base_weight)
+            return input_value + bucket_value_sum - spent_amount - fee_estimator_w(total_weight)
+
+        if coins:
+            # estimate the weight of the change output, and of later spending it
+            change_addr = change_addrs[0] if change_addrs else coins[0].address
+            change_weight = (4 * Transaction.estimated_output_size(change_addr)
+                             + Transaction.estimated_input_weight(coins[0], False))
+            cost_of_change = fee_estimator_w(base_weight + change_weight) - fee_estimator_w(base_weight)
+            self.changeless_target = ChangelessTarget(target=-excess_func([], 0),
+                                                      cost_of_change=cost_of_change,
+                                                      excess_func=excess_func)
+        try:
+            return CoinChooserPrivacy.make_tx(self, coins=coins, inputs=inputs, outputs=outputs,
+                                              change_addrs=change_addrs, fee_estimator_vb=fee_estimator_vb,
+                                              dust_threshold=dust_threshold)
+        finally:
+            self.changeless_target = None
+
+    def choose_buckets(self, buckets, sufficient_funds, penalty_func):
+        if self.changeless_target is not None:
+            deadline = time.monotonic() + self.time_budget
+            # prefer confirmed coins, as in bucket_candidates_prefer_confirmed
+            conf_buckets = [bkt for bkt in buckets if bkt.min_height > 0]
+            unconf_buckets = [bkt for bkt in buckets if bkt.min_height == 0]
+            for bkts_choose_from in (conf_buckets, conf_buckets + unconf_buckets, buckets):
+                selected = self.bnb_search(bkts_choose_from, self.changeless_target, deadline=deadline)
+                if selected is not None:
+                    self.logger.info(f"found changeless selection of {len(selected)} buckets")
+                    return ScoredCandidate(len(selected) - 1, selected, [])
+                if time.monotonic() > deadline:
+                    break
+            self.logger.info("no changeless selection found")
+        return CoinChooserPrivacy.choose_buckets(self, buckets, sufficient_funds, penalty_func)
+
+    def bnb_search(self, buckets: List[Bucket], changeless_target: ChangelessTarget, *,
+                   deadline: float) -> Optional[List[Bucket]]:
+        """Depth-first branch and bound search for the set of buckets with the
+        least excess over the target, within the cost of change.
+        Returns None if there is no such set, or if we run out of time.
+        """
+        target = changeless_target.target
+        upper_bound = target + changeless_target.cost_of_change
+        buckets = sorted(buckets, key=lambda b: b.effective_value, reverse=True)
+        values = [bkt.effective_value for bkt in buckets]
+        # remaining[i]: what the buckets from index i on can still add
+        remaining = list(itertools.accumulate(reversed(values)))[::-1] + [0]
+        if remaining[0] < target:
+            return None
+        best, best_excess = None, None
+        selection = []  # indices into buckets, increasing
+        value = 0
+        i = 0
+        for tries in range(self.max_tries):
+            if tries % 1000 == 999 and time.monotonic() > deadline:
+                break
+            backtrack = False
+            if value > upper_bound or value + remaining[i] < target:
+                backtrack = True
+            elif value >= target:
+                # the effective values are estimates; check with the actual fee of this tx
+                selected = [buckets[j] for j in selection]
+                excess = changeless_target.excess_func(selected, sum(bkt.value for bkt in selected))
+                if 0 <= excess <= changeless_target.cost_of_change and (best is None or excess < best_excess):
+                    best, best_excess = selected, excess
+                    if excess == 0:
+                        break
+                backtrack = True
+            if backtrack:
+                if not selection:
+                    break  # searched everything
+                # exclude the last selected bucket, and try the ones after it
+                j = selection.pop()
+                value -= values[j]
+                i = j + 1
+            elif i > 0 and values[i] == values[i - 1] and (not selection or selection[-1] != i - 1):
+                # same value as a bucket we excluded: including this one instead would be a repeat
+                i += 1
+            else:
+                selection.append(i)
+                value += values[i]
+                i += 1
+        return best
+
+
 COIN_CHOOSERS = {
     'Privacy': CoinChooserPrivacy,
-    'Priotiry': CoinChooserOldestFirst
+    'Priotiry': CoinChooserOldestFirst,
+    'BranchAndBound': CoinChooserBnB,
 }
 
 def get_name(config):
@@ -535,7 +682,11 @@ def get_coin_chooser(config):
     #       + it gives better privacy for the user re change output
     #       + it also helps the network as a whole as fees will become noisier
     #         (trying to counter the heuristic that "whole integer sat/byte feerates" are common)
+    kwargs = {}
+    if issubclass(klass, CoinChooserBnB):
+        kwargs['time_budget'] = config.get('coin_chooser_bnb_time_budget', 0.5)
     coinchooser = klass(
         enable_output_value_rounding=config.get('coin_chooser_output_rounding', True),
+        **kwargs,
     )
     return coinchooser
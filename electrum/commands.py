@@ -38,6 +38,8 @@ from itertools import repeat
 from decimal import Decimal
 from typing import Optional, TYPE_CHECKING, Dict, List
 
+from aiorpcx import run_in_thread
+
 from .import util, ecc
 from .util import (bfh, bh2u, format_satoshis, json_decode, json_normalize,
                    is_hash256_str, is_hex_str, to_bytes)
@@ -50,6 +52,8 @@ from .transaction import (Transaction, multisig_script, TxOutput, PartialTransac
 from .invoices import PR_PAID, PR_UNPAID, PR_UNKNOWN, PR_EXPIRED
 from .synchronizer import Notifier
 from .wallet import Abstract_Wallet, create_new_wallet, restore_wallet_from_text, Deterministic_Wallet
+from .storage import WalletStorage
+from .sqlite_wallet_db import convert_to_sqlite, get_sqlite_path
 from .address_synchronizer import TX_HEIGHT_LOCAL
 from .mnemonic import Mnemonic
 from .lnutil import SENT, RECEIVED
@@ -58,6 +62,8 @@ from .lnutil import ln_dummy_address
 from .lnpeer import channel_id_from_funding_tx
 from .plugin import run_hook
 from .version import ELECTRUM_VERSION
+from . import blockchain
+from . import header_snapshot
 from .simple_config import SimpleConfig
 from .invoices import LNInvoice
 from . import submarine_swaps
@@ -269,6 +275,23 @@ class Commands:
             'msg': d['msg'],
         }
 
+    @command('')
+    async def convert_wallet_to_sqlite(self, wallet_path=None):
+        """Move the transaction history of a wallet to an SQLite database,
+        so that it does not need to be loaded into memory when the wallet is opened.
+        The wallet file must not be encrypted, and the wallet must not be loaded.
+        """
+        if self.daemon and self.daemon.get_wallet(wallet_path):
+            raise Exception('wallet is loaded, close it first')
+        storage = WalletStorage(wallet_path)
+        if not storage.file_exists():
+            raise Exception('wallet file not found')
+        num_txs = convert_to_sqlite(storage)
+        return {
+            'path': get_sqlite_path(storage.path),
+            'num_txs': num_txs,
+        }
+
     @command('wp')
     async def password(self, password=None, new_password=None, wallet: Abstract_Wallet = None):
         """Change wallet password. """
@@ -512,6 +535,34 @@ class Commands:
         uses this to verify transactions (Simple Payment Verification)."""
         return await self.network.get_merkle_for_transaction(txid, int(height))
 
+    async def _run_on_best_chain(self, func):
+        """Runs func(best_chain) in a thread; under the network's header lock if we have a network."""
+        if self.network:
+            async with self.network.bhi_lock:
+                result = await run_in_thread(partial(func, blockchain.get_best_chain()))
+            util.trigger_callback('blockchain_updated')
+            util.trigger_callback('network_updated')
+            return result
+        blockchain.read_blockchains(self.config)
+        blockchain.init_headers_file_for_best_chain()
+        return await run_in_thread(partial(func, blockchain.get_best_chain()))
+
+    @command('')
+    async def exportheaders(self, path):
+        """Export the block headers after the checkpoints to a snapshot file.
+        Other instances can bootstrap from it with importheaders."""
+        num_headers = await self._run_on_best_chain(partial(header_snapshot.export_snapshot, path=path))
+        return {'path': path, 'headers': num_headers}
+
+    @command('')
+    async def importheaders(self, path, trust_checkpoints=False):
+        """Import block headers from a snapshot file created with exportheaders.
+        Headers are fully verified, unless trust_checkpoints is set."""
+        def do_import(chain):
+            return header_snapshot.import_snapshot(chain, path, trust_checkpoints=trust_checkpoints)
+        height = await self._run_on_best_chain(do_import)
+        return {'height': height}
+
     @command('n')
     async def getservers(self):
         """Return the list of known servers (candidates for connecting)."""
@@ -1171,6 +1222,7 @@ param_descriptions = {
     'address': 'Koto address',
     'seed': 'Seed phrase',
     'txid': 'Transaction ID',
+    'path': 'File path',
     'pos': 'Position',
     'height': 'Block height',
     'tx': 'Serialized transaction (hexadecimal)',
@@ -1233,6 +1285,7 @@ command_options = {
     'to_height':   (None, "Only show transactions that confirmed before given block height"),
     'iknowwhatimdoing': (None, "Acknowledge that I understand the full implications of what I am about to do"),
     'gossip':      (None, "Apply command to gossip node instead of wallet"),
+    'trust_checkpoints': (None, "Only check that the headers link up with the checkpoints; skip proof-of-work verification"),
 }
 
 
@@ -1258,6 +1311,7 @@ arg_types = {
     'fee_method': str,
     'fee_level': json_loads,
     'encrypt_file': eval_bool,
+    'trust_checkpoints': eval_bool,
     'rbf': eval_bool,
     'timeout': float,
     'attempts': int,
@@ -376,6 +376,37 @@ def chacha20_poly1305_decrypt(
     raise Exception("no chacha20 backend found")
 
 
+class ChaCha20Poly1305Cipher:
+    """chacha20-poly1305 with a fixed key, for encrypting or decrypting
+    many messages with different nonces (e.g. the LN transport).
+    """
+
+    def __init__(self, key: bytes):
+        assert isinstance(key, (bytes, bytearray))
+        self.key = bytes(key)
+        self._cg_aead = None
+
+    def _get_cg_aead(self):
+        # unlike with pycryptodomex, the key setup can be reused for all nonces,
+        # which makes encrypting short messages several times faster
+        if self._cg_aead is None:
+            self._cg_aead = CG_aead.ChaCha20Poly1305(self.key)
+        return self._cg_aead
+
+    def encrypt(self, *, nonce: bytes, associated_data: bytes = None, data: bytes) -> bytes:
+        if HAS_CRYPTOGRAPHY:
+            return self._get_cg_aead().encrypt(nonce, data, associated_data)
+        return chacha20_poly1305_encrypt(key=self.key, nonce=nonce, associated_data=associated_data, data=data)
+
+    def decrypt(self, *, nonce: bytes, associated_data: bytes = None, data: bytes) -> bytes:
+        if HAS_CRYPTOGRAPHY:
+            try:
+                return self._get_cg_aead().decrypt(nonce, data, associated_data)
+            except cryptography.exceptions.InvalidTag as e:
+                raise ValueError("invalid tag") from e
+        return chacha20_poly1305_decrypt(key=self.key, nonce=nonce, associated_data=associated_data, data=data)
+
+
 def chacha20_encrypt(*, key: bytes, nonce: bytes, data: bytes) -> bytes:
     assert isinstance(key, (bytes, bytearray))
     assert isinstance(nonce, (bytes, bytearray))
@@ -47,7 +47,8 @@ from .invoices import PR_PAID, PR_EXPIRED
 from .util import log_exceptions, ignore_exceptions, randrange
 from .wallet import Wallet, Abstract_Wallet
 from .storage import WalletStorage
-from .wallet_db import WalletDB
+from .wallet_db import open_wallet_db
+from .transaction import shutdown_signing_executor
 from .commands import known_commands, Commands
 from .simple_config import SimpleConfig
 from .exchange_rate import FxThread
@@ -485,7 +486,7 @@ class Daemon(Logger):
                 return
             storage.decrypt(password)
         # read data, pass it to db
-        db = WalletDB(storage.read(), manual_upgrades=manual_upgrades)
+        db = open_wallet_db(storage, manual_upgrades=manual_upgrades)
         if db.requires_split():
             return
         if db.requires_upgrade():
@@ -551,6 +552,7 @@ class Daemon(Logger):
         if self.network:
             self.logger.info("shutting down network")
             self.network.stop()
+        shutdown_signing_executor()
         self.logger.info("stopping taskgroup")
         fut = asyncio.run_coroutine_threadsafe(self.taskgroup.cancel_remaining(), self.asyncio_loop)
         try:
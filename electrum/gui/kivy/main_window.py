@@ -10,7 +10,7 @@ import asyncio
 from typing import TYPE_CHECKING, Optional, Union, Callable, Sequence
 
 from electrum.storage import WalletStorage, StorageReadWriteError
-from electrum.wallet_db import WalletDB
+from electrum.wallet_db import open_wallet_db
 from electrum.wallet import Wallet, InternalAddressCorruption, Abstract_Wallet
 from electrum.wallet import check_password_for_directory, update_password_for_directory
 
@@ -678,7 +678,7 @@ class ElectrumWindow(App, Logger):
             wizard.run('new')
         else:
             assert storage.is_past_initial_decryption()
-            db = WalletDB(storage.read(), manual_upgrades=False)
+            db = open_wallet_db(storage, manual_upgrades=False)
             assert not db.requires_upgrade()
             self.on_wizard_success(storage, db, password)
 
@@ -48,7 +48,7 @@ from electrum.base_wizard import GoBack
 from electrum.util import (UserCancelled, profiler,
                            WalletFileException, BitcoinException, get_new_wallet_name)
 from electrum.wallet import Wallet, Abstract_Wallet
-from electrum.wallet_db import WalletDB
+from electrum.wallet_db import open_wallet_db
 from electrum.logging import Logger
 
 from .installwizard import InstallWizard, WalletAlreadyOpenInMemory
@@ -311,7 +311,7 @@ class ElectrumGui(Logger):
                 wizard.run('new')
                 storage, db = wizard.create_storage(path)
             else:
-                db = WalletDB(storage.read(), manual_upgrades=False)
+                db = open_wallet_db(storage, manual_upgrades=False)
                 wizard.run_upgrades(storage, db)
         except (UserCancelled, GoBack):
             return
@@ -0,0 +1,201 @@
+# Copyright (C) 2026 The Electrum developers
+# Distributed under the MIT software license, see the accompanying
+# file LICENCE or http://www.opensource.org/licenses/mit-license.php
+#
+# Header snapshots: a compact binary file holding the block headers after the
+# hardcoded checkpoints, together with per-chunk metadata (hash of the last
+# header, target and cumulative chainwork, as in checkpoints_koto.json).
+# They allow bootstrapping a new instance from a local file instead of
+# downloading and verifying all post-checkpoint headers over the network.
+#
+# File format (integers are little-endian unless noted):
+#   magic                  8 bytes   SNAPSHOT_MAGIC
+#   version                uint32
+#   genesis hash           32 bytes  (in RPC byte order)
+#   first chunk index      uint32
+#   number of chunks       uint32
+#   for each chunk:
+#     number of headers    uint16
+#     hash of last header  32 bytes  (in RPC byte order)
+#     target               32 bytes  big-endian; from the bits of the last header
+#     chainwork            32 bytes  big-endian; cumulative, up to the last header
+#     raw headers          80 bytes each before SAPLING_HEIGHT, 112 bytes after
+#   sha256 of all the above  32 bytes
+
+import hashlib
+import struct
+from typing import NamedTuple, List, Tuple
+
+from . import constants
+from .blockchain import Blockchain, deserialize_header, hash_header, header_offset, header_size_at_height
+from .logging import get_logger
+from .util import bfh, bh2u
+
+
+_logger = get_logger(__name__)
+
+SNAPSHOT_MAGIC = b'KOTOHDRS'
+SNAPSHOT_VERSION = 1
+
+_FILE_HEADER = struct.Struct('<8sI32sII')
+_CHUNK_HEADER = struct.Struct('<H32s32s32s')
+
+
+class SnapshotError(Exception): pass
+
+
+class SnapshotChunk(NamedTuple):
+    index: int
+    num_headers: int
+    last_hash: str
+    target: int
+    chainwork: int
+    data: bytes  # raw headers
+
+
+def _chunk_data_size(index: int, num_headers: int) -> int:
+    start_height = index * 2016
+    return header_offset(start_height + num_headers) - header_offset(start_height)
+
+
+def export_snapshot(chain: Blockchain, path: str) -> int:
+    """Writes the headers of chain after the checkpoints to path.
+    Returns the number of headers written.
+    """
+    if chain.parent is not None:
+        raise SnapshotError('can only export the best chain')
+    first_index = len(constants.net.CHECKPOINTS)
+    height = chain.height()
+    chunks = []  # type: List[SnapshotChunk]
+    for index in range(first_index, height // 2016 + 1):
+        start_height = index * 2016
+        num_headers = min(2016, height - start_height + 1)
+        last_height = start_height + num_headers - 1
+        last_header = chain.read_header(last_height)
+        if last_header is None:
+            raise SnapshotError(f'missing header at height {last_height}')
+        chunks.append(SnapshotChunk(
+            index=index,
+            num_headers=num_headers,
+            last_hash=chain.get_hash(last_height),
+            target=Blockchain.bits_to_target(last_header['bits']),
+            chainwork=chain.get_chainwork(last_height),
+            data=chain.read_raw_headers(start_height, num_headers),
+        ))
+    h = hashlib.sha256()
+    with open(path, 'wb') as f:
+        def write(b: bytes):
+            h.update(b)
+            f.write(b)
+        write(_FILE_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, bfh(constants.net.GENESIS),
+                                first_index, len(chunks)))
+        for chunk in chunks:
+            write(_CHUNK_HEADER.pack(chunk.num_headers, bfh(chunk.last_hash),
+                                     chunk.target.to_bytes(32, 'big'), chunk.chainwork.to_bytes(32, 'big')))
+            write(chunk.data)
+        f.write(h.digest())
+    return sum(chunk.num_headers for chunk in chunks)
+
+
+def read_snapshot(path: str) -> List[SnapshotChunk]:
+    with open(path, 'rb') as f:
+        raw = f.read()
+    if len(raw) < _FILE_HEADER.size + 32:
+        raise SnapshotError('file too short')
+    body, checksum = memoryview(raw)[:-32], raw[-32:]
+    if hashlib.sha256(body).digest() != checksum:
+        raise SnapshotError('checksum mismatch')
+    magic, version, genesis, first_index, num_chunks = _FILE_HEADER.unpack_from(body, 0)
+    if magic != SNAPSHOT_MAGIC:
+        raise SnapshotError('not a header snapshot')
+    if version != SNAPSHOT_VERSION:
+        raise SnapshotError(f'unsupported snapshot version: {version}')
+    if bh2u(genesis) != constants.net.GENESIS:
+        raise SnapshotError('snapshot is for a different network')
+    pos = _FILE_HEADER.size
+    chunks = []
+    for index in range(first_index, first_index + num_chunks):
+        num_headers, last_hash, target, chainwork = _CHUNK_HEADER.unpack_from(body, pos)
+        pos += _CHUNK_HEADER.size
+        if not 0 < num_headers <= 2016:
+            raise SnapshotError(f'invalid number of headers in chunk {index}: {num_headers}')
+        size = _chunk_data_size(index, num_headers)
+        if pos + size > len(body):
+            raise SnapshotError('file truncated')
+        chunks.append(SnapshotChunk(
+            index=index,
+            num_headers=num_headers,
+            last_hash=bh2u(last_hash),
+            target=int.from_bytes(target, 'big'),
+            chainwork=int.from_bytes(chainwork, 'big'),
+            data=bytes(body[pos:pos+size]),
+        ))
+        pos += size
+    if pos != len(body):
+        raise SnapshotError('trailing data in snapshot')
+    return chunks
+
+
+def _check_chunk_links(chain: Blockchain, chunk: SnapshotChunk) -> Tuple[str, int]:
+    """Checks that the headers of chunk link up with each other and with chain,
+    without checking proof-of-work.
+    Returns the hash of the last header, and the chainwork up to it."""
+    start_height = chunk.index * 2016
+    prev_hash = chain.get_hash(start_height - 1)
+    headers = []
+    pos = 0
+    for height in range(start_height, start_height + chunk.num_headers):
+        size = header_size_at_height(height)
+        header = deserialize_header(chunk.data[pos:pos+size], height)
+        pos += size
+        if header['prev_block_hash'] != prev_hash:
+            raise SnapshotError(f'header at height {height} does not connect')
+        prev_hash = hash_header(header)
+        headers.append(header)
+    return prev_hash, chain.get_chainwork_with_headers(headers)
+
+
+def import_snapshot(chain: Blockchain, path: str, *, trust_checkpoints: bool = False) -> int:
+    """Imports the headers of the snapshot at path into chain (the best chain).
+
+    By default all headers are verified as if they came from the network.
+    With trust_checkpoints, only the hash links back to the hardcoded checkpoints
+    and the per-chunk metadata are checked, which is much faster.
+    Returns the height of the chain tip afterwards.
+    """
+    if chain.parent is not None:
+        raise SnapshotError('can only import into the best chain')
+    chunks = read_snapshot(path)
+    if chunks and chunks[0].index > len(constants.net.CHECKPOINTS):
+        raise SnapshotError('snapshot was made with newer checkpoints; '
+                            f'it starts at height {chunks[0].index * 2016}')
+    for chunk in chunks:
+        start_height = chunk.index * 2016
+        last_height = start_height + chunk.num_headers - 1
+        if chunk.index < len(constants.net.CHECKPOINTS):
+            # covered by our checkpoints
+            h, t, w = constants.net.CHECKPOINTS[chunk.index]
+            if chunk.num_headers == 2016 and chunk.last_hash != h:
+                raise SnapshotError(f'snapshot conflicts with checkpoint {chunk.index}')
+            continue
+        if last_height <= chain.height() and chain.check_hash(last_height, chunk.last_hash):
+            continue  # already have it
+        if start_height > chain.height() + 1:
+            raise SnapshotError(f'gap before chunk {chunk.index}')
+        if trust_checkpoints:
+            # check everything before saving: the headers are not verified
+            last_hash, chainwork = _check_chunk_links(chain, chunk)
+            if last_hash != chunk.last_hash:
+                raise SnapshotError(f'hash of last header in chunk {chunk.index} does not match')
+            if chainwork != chunk.chainwork:
+                raise SnapshotError(f'chainwork mismatch in chunk {chunk.index}')
+            chain.save_chunk(chunk.index, chunk.data)
+        else:
+            if not chain.connect_chunk(chunk.index, bh2u(chunk.data)):
+                raise SnapshotError(f'verification of chunk {chunk.index} failed')
+            if chain.get_hash(last_height) != chunk.last_hash:
+                raise SnapshotError(f'hash of last header in chunk {chunk.index} does not match')
+            if chain.get_chainwork(last_height) != chunk.chainwork:
+                raise SnapshotError(f'chainwork mismatch in chunk {chunk.index}')
+        _logger.info(f'imported headers up to height {last_height}')
+    return chain.height()
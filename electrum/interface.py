@@ -29,7 +29,7 @@ import sys
 import traceback
 import asyncio
 import socket
-from typing import Tuple, Union, List, TYPE_CHECKING, Optional, Set, NamedTuple, Any, Sequence
+from typing import Tuple, Union, List, TYPE_CHECKING, Optional, Set, NamedTuple, Any, Sequence, Dict
 from collections import defaultdict
 from ipaddress import IPv4Network, IPv6Network, ip_address, IPv6Address, IPv4Address
 import itertools
@@ -70,6 +70,9 @@ BUCKET_NAME_OF_ONION_SERVERS = 'onion'
 
 MAX_INCOMING_MSG_SIZE = 2_000_000  # in bytes
 
+# number of 'blockchain.block.headers' requests kept in flight during header catch-up
+DEFAULT_CHUNKS_IN_FLIGHT = 4
+
 _KNOWN_NETWORK_PROTOCOLS = {'t', 's'}
 PREFERRED_NETWORK_PROTOCOL = 's'
 assert PREFERRED_NETWORK_PROTOCOL in _KNOWN_NETWORK_PROTOCOLS
@@ -180,6 +183,32 @@ class NotificationSession(RPCSession):
             self.maybe_log(f"--> {response} (id: {msg_id})")
             return response
 
+    async def send_batch_requests(self, method: str, params_list: Sequence[List], *, timeout=None) -> List:
+        """Sends a request for each item of params_list, as a single JSON-RPC batch.
+        Returns the results in the same order. Requests the server returned an
+        error for are not raised; their RPCError is returned in place of the result.
+        """
+        if len(params_list) == 1:  # not worth the overhead of a batch
+            try:
+                return [await self.send_request(method, params_list[0], timeout=timeout)]
+            except aiorpcx.jsonrpc.RPCError as e:
+                return [e]
+        msg_id = next(self._msg_counter)
+        self.maybe_log(f"<-- batch of {len(params_list)} {method} (id: {msg_id})")
+
+        async def send_batch():
+            async with self.send_batch() as batch:
+                for params in params_list:
+                    batch.add_request(method, params)
+            return batch.results
+
+        try:
+            results = await asyncio.wait_for(send_batch(), timeout)
+        except (TaskTimeout, asyncio.TimeoutError) as e:
+            raise RequestTimedOut(f'request timed out: batch of {len(params_list)} {method} (id: {msg_id})') from e
+        self.maybe_log(f"--> {results} (id: {msg_id})")
+        return list(results)
+
     def set_default_timeout(self, timeout):
         self.sent_request_timeout = timeout
         self.max_send_delay = timeout
@@ -196,6 +225,29 @@ class NotificationSession(RPCSession):
             self.cache[key] = result
         await queue.put(params + [result])
 
+    async def subscribe_batch(self, method: str, params_list: Sequence[List], queue: asyncio.Queue):
+        """Like subscribe, for many params at once; the uncached ones are requested as a batch."""
+        to_request = []
+        for params in params_list:
+            key = self.get_hashable_key_for_rpc_call(method, params)
+            self.subscriptions[key].append(queue)
+            if key in self.cache:
+                await queue.put(params + [self.cache[key]])
+            else:
+                to_request.append(params)
+        if not to_request:
+            return
+        results = await self.send_batch_requests(method, to_request)
+        error = None
+        for params, result in zip(to_request, results):
+            if isinstance(result, Exception):
+                error = error or result
+                continue
+            self.cache[self.get_hashable_key_for_rpc_call(method, params)] = result
+            await queue.put(params + [result])
+        if error is not None:
+            raise error
+
     def unsubscribe(self, queue):
         """Unsubscribe a callback to free object references to enable GC."""
         # note: we can't unsubscribe from the server, so we keep receiving
@@ -591,15 +643,29 @@ class Interface(Logger):
         if can_return_early and index in self._requested_chunks:
             return
         self.logger.info(f"requesting chunk from height {height}")
-        size = 2016
-        if tip is not None:
-            size = min(size, tip - index * 2016 + 1)
-            size = max(size, 0)
+        size = self._chunk_size(index, tip)
         try:
             self._requested_chunks.add(index)
-            res = await self.session.send_request('blockchain.block.headers', [index * 2016, size])
+            hexdata = await self._fetch_chunk(index, size)
         finally:
             self._requested_chunks.discard(index)
+        conn = self.blockchain.connect_chunk(index, hexdata)
+        if not conn:
+            return conn, 0
+        return conn, size
+
+    @classmethod
+    def _chunk_size(cls, index: int, tip: Optional[int]) -> int:
+        size = 2016
+        if tip is not None:
+            size = min(size, tip - index * 2016 + 1)
+            size = max(size, 0)
+        return size
+
+    async def _fetch_chunk(self, index: int, size: int) -> str:
+        """Requests size headers starting at chunk index, and returns them as hex."""
+        height = index * 2016
+        res = await self.session.send_request('blockchain.block.headers', [height, size])
         assert_dict_contains_field(res, field_name='count')
         assert_dict_contains_field(res, field_name='hex')
         assert_dict_contains_field(res, field_name='max')
@@ -617,10 +683,74 @@ class Interface(Logger):
                 raise RequestCorrupted('inconsistent chunk hex and count')
         if res['count'] != size:
             raise RequestCorrupted(f"expected {size} headers but only got {res['count']}")
-        conn = self.blockchain.connect_chunk(index, res['hex'])
-        if not conn:
-            return conn, 0
-        return conn, res['count']
+        return res['hex']
+
+    def _get_interfaces_for_catchup(self) -> Sequence['Interface']:
+        """Returns the interfaces we can spread chunk requests over: ourselves,
+        and the other interfaces that claim the same tip as we do."""
+        ifaces = [self]
+        with self.network.interfaces_lock:
+            others = list(self.network.interfaces.values())
+        for iface in others:
+            if iface is self or not iface.session or iface.session.is_closing():
+                continue
+            if iface.tip == self.tip and iface.tip_header == self.tip_header:
+                ifaces.append(iface)
+        return ifaces
+
+    async def request_chunks(self, height: int, tip: int) -> Tuple[bool, int]:
+        """Catches up from height to tip, keeping several chunk requests in flight,
+        spread over the interfaces that are on our tip. Chunks are verified and
+        saved in order as they arrive, so verification overlaps with download.
+
+        Returns whether the first chunk could be connected, and the height
+        of the first header not connected.
+        """
+        if not is_non_negative_integer(height):
+            raise Exception(f"{repr(height)} is not a block height")
+        num_in_flight = max(1, self.network.config.get('header_chunks_in_flight', DEFAULT_CHUNKS_IN_FLIGHT))
+        ifaces = self._get_interfaces_for_catchup()
+        first_index = height // 2016
+        last_index = tip // 2016
+        next_to_request = first_index
+        self.logger.info(f"requesting chunks {first_index}..{last_index} "
+                         f"(in flight: {num_in_flight}, interfaces: {len(ifaces)})")
+
+        async def fetch(index: int, iface: 'Interface') -> Tuple[str, 'Interface']:
+            size = self._chunk_size(index, tip)
+            if iface is not self:
+                try:
+                    return await iface._fetch_chunk(index, size), iface
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    self.logger.info(f"failed to get chunk {index} from {iface.server}: {repr(e)}")
+            return await self._fetch_chunk(index, size), self
+
+        pending = {}  # type: Dict[int, asyncio.Future]
+        try:
+            for index in range(first_index, last_index + 1):
+                while next_to_request <= last_index and len(pending) < num_in_flight:
+                    iface = ifaces[next_to_request % len(ifaces)]
+                    # so that request_chunk(can_return_early=True) skips it
+                    self._requested_chunks.add(next_to_request)
+                    pending[next_to_request] = asyncio.ensure_future(fetch(next_to_request, iface))
+                    next_to_request += 1
+                hexdata, iface = await pending.pop(index)
+                conn = self.blockchain.connect_chunk(index, hexdata)
+                if not conn and iface is not self:
+                    # do not trust the other server; ask ours
+                    conn = self.blockchain.connect_chunk(index, await self._fetch_chunk(index, self._chunk_size(index, tip)))
+                self._requested_chunks.discard(index)
+                if not conn:
+                    return index != first_index, index * 2016
+                util.trigger_callback('network_updated')
+            return True, tip + 1
+        finally:
+            for fut in pending.values():
+                fut.cancel()
+            for index in range(first_index, next_to_request):
+                self._requested_chunks.discard(index)
 
     def is_main_server(self) -> bool:
         return (self.network.interface == self or
@@ -732,14 +862,18 @@ class Interface(Logger):
         while last is None or height <= next_height:
             prev_last, prev_height = last, height
             if next_height > height + 10:
-                could_connect, num_headers = await self.request_chunk(height, next_height)
+                if next_height // 2016 > height // 2016:
+                    could_connect, new_height = await self.request_chunks(height, next_height)
+                else:
+                    could_connect, num_headers = await self.request_chunk(height, next_height)
+                    new_height = (height // 2016 * 2016) + num_headers
                 if not could_connect:
                     if height <= constants.net.max_checkpoint():
                         raise GracefulDisconnect('server chain conflicts with checkpoints or genesis')
                     last, height = await self.step(height)
                     continue
                 util.trigger_callback('network_updated')
-                height = (height // 2016 * 2016) + num_headers
+                height = new_height
                 assert height <= next_height+1, (height, self.tip)
                 last = 'catchup'
             else:
@@ -923,7 +1057,28 @@ class Interface(Logger):
         if not is_hash256_str(tx_hash):
             raise Exception(f"{repr(tx_hash)} is not a txid")
         raw = await self.session.send_request('blockchain.transaction.get', [tx_hash], timeout=timeout)
-        # validate response
+        self._check_raw_transaction(raw, tx_hash)
+        return raw
+
+    async def get_transactions(self, tx_hashes: Sequence[str], *, timeout=None) -> List[Union[str, Exception]]:
+        """Batched get_transaction. Returns the raw txs in order; for txs the server
+        could not give us, the exception (RPCError or RequestCorrupted) is returned instead."""
+        for tx_hash in tx_hashes:
+            if not is_hash256_str(tx_hash):
+                raise Exception(f"{repr(tx_hash)} is not a txid")
+        results = await self.session.send_batch_requests(
+            'blockchain.transaction.get', [[tx_hash] for tx_hash in tx_hashes], timeout=timeout)
+        for i, (tx_hash, raw) in enumerate(zip(tx_hashes, results)):
+            if isinstance(raw, Exception):
+                continue
+            try:
+                self._check_raw_transaction(raw, tx_hash)
+            except RequestCorrupted as e:
+                results[i] = e
+        return results
+
+    @classmethod
+    def _check_raw_transaction(cls, raw: str, tx_hash: str) -> None:
         tx = Transaction(raw)
         try:
             tx.deserialize()  # see if raises
@@ -931,14 +1086,30 @@ class Interface(Logger):
             raise RequestCorrupted(f"cannot deserialize received transaction (txid {tx_hash})") from e
         if tx.txid() != tx_hash:
             raise RequestCorrupted(f"received tx does not match expected txid {tx_hash} (got {tx.txid()})")
-        return raw
 
     async def get_history_for_scripthash(self, sh: str) -> List[dict]:
         if not is_hash256_str(sh):
             raise Exception(f"{repr(sh)} is not a scripthash")
         # do request
         res = await self.session.send_request('blockchain.scripthash.get_history', [sh])
-        # check response
+        self._check_history(res)
+        return res
+
+    async def get_history_for_scripthashes(self, shs: Sequence[str]) -> List[Union[List[dict], Exception]]:
+        """Batched get_history_for_scripthash. Errors returned by the server
+        are returned in place of the respective history."""
+        for sh in shs:
+            if not is_hash256_str(sh):
+                raise Exception(f"{repr(sh)} is not a scripthash")
+        results = await self.session.send_batch_requests(
+            'blockchain.scripthash.get_history', [[sh] for sh in shs])
+        for res in results:
+            if not isinstance(res, Exception):
+                self._check_history(res)
+        return results
+
+    @classmethod
+    def _check_history(cls, res) -> None:
         assert_list_or_tuple(res)
         for tx_item in res:
             assert_dict_contains_field(tx_item, field_name='height')
@@ -948,7 +1119,6 @@ class Interface(Logger):
             if tx_item['height'] in (-1, 0):
                 assert_dict_contains_field(tx_item, field_name='fee')
                 assert_non_negative_integer(tx_item['fee'])
-        return res
 
     async def listunspent_for_scripthash(self, sh: str) -> List[dict]:
         if not is_hash256_str(sh):
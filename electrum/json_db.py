@@ -25,12 +25,73 @@
 import threading
 import copy
 import json
+from typing import List, Tuple
 
 from . import util
-from .logging import Logger
+from .logging import Logger, get_logger
+
+_logger = get_logger(__name__)
 
 JsonDBJsonEncoder = util.MyEncoder
 
+
+# Journal of modifications, used to save changes without rewriting the whole file.
+# Each record is a JSON list of patches, on its own line after the JSON of the full db.
+# A patch is one of:
+#   ['s', path, value]  set value at path
+#   ['d', path]         delete path
+#   ['a', path, value]  append value to the list at path
+# where path is the list of keys leading to the item, from the root.
+
+def split_journal(s: str) -> Tuple[str, List[str]]:
+    """Splits the contents of a db file into the JSON of the full db
+    and the journal records appended after it."""
+    # the db is a dict, so a line starting with '[' can only be a journal record
+    pos = s.find('\n[')
+    if pos == -1:
+        return s, []
+    return s[:pos], s[pos+1:].split('\n')
+
+
+def apply_patch(data: dict, patch: list) -> None:
+    op, path = patch[0], patch[1]
+    if not path:
+        assert op == 's', patch
+        data.clear()
+        data.update(patch[2])
+        return
+    parent = data
+    for key in path[:-1]:
+        parent = parent[key]
+    key = path[-1]
+    if op == 's':
+        parent[key] = patch[2]
+    elif op == 'd':
+        parent.pop(key, None)
+    elif op == 'a':
+        parent[key].append(patch[2])
+    else:
+        raise ValueError(f'unknown journal op: {op!r}')
+
+
+def load_json_with_journal(s: str):
+    """Parses the contents of a db file, applying the journal records."""
+    snapshot, records = split_journal(s)
+    data = json.loads(snapshot)
+    for i, record in enumerate(records):
+        try:
+            patches = json.loads(record)
+        except ValueError:
+            if i == len(records) - 1:
+                # we were probably interrupted while appending it
+                _logger.warning('ignoring truncated journal record')
+                break
+            raise
+        for patch in patches:
+            apply_patch(data, patch)
+    return data
+
+
 def modifier(func):
     def wrapper(self, *args, **kwargs):
         with self.lock:
@@ -76,7 +137,7 @@ class StoredDict(dict):
         self.path = path
         # recursively convert dicts to StoredDict
         for k, v in list(data.items()):
-            self.__setitem__(k, v)
+            self._setitem(k, v, record=False)
 
     def convert_key(self, key):
         """Convert int keys to str keys, as only those are allowed in json."""
@@ -87,17 +148,23 @@ class StoredDict(dict):
 
     @locked
     def __setitem__(self, key, v):
+        self._setitem(key, v, record=True)
+
+    def _setitem(self, key, v, *, record: bool):
+        """record: whether to add the change to the journal of the db.
+        Not needed while converting dicts that are already stored."""
         key = self.convert_key(key)
         is_new = key not in self
-        # early return to prevent unnecessary disk writes
-        if not is_new and self[key] == v:
+        # early return to prevent unnecessary disk writes.
+        # (the same object might have been modified in place though)
+        if not is_new and self[key] == v and (self[key] is not v or not record):
             return
         # recursively set db and path
         if isinstance(v, StoredDict):
             v.db = self.db
             v.path = self.path + [key]
             for k, vv in v.items():
-                v[k] = vv
+                v._setitem(k, vv, record=False)
         # recursively convert dict to StoredDict.
         # _convert_dict is called breadth-first
         elif isinstance(v, dict):
@@ -115,14 +182,17 @@ class StoredDict(dict):
         # set item
         dict.__setitem__(self, key, v)
         if self.db:
-            self.db.set_modified(True)
+            if record:
+                self.db._add_patch(['s', self.path + [key], v])
+            else:
+                self.db._modified = True
 
     @locked
     def __delitem__(self, key):
         key = self.convert_key(key)
         dict.__delitem__(self, key)
         if self.db:
-            self.db.set_modified(True)
+            self.db._add_patch(['d', self.path + [key]])
 
     @locked
     def __getitem__(self, key):
@@ -139,12 +209,20 @@ class StoredDict(dict):
         key = self.convert_key(key)
         if v is _RaiseKeyError:
             r = dict.pop(self, key)
+        elif key in self:
+            r = dict.pop(self, key)
         else:
-            r = dict.pop(self, key, v)
+            return v
         if self.db:
-            self.db.set_modified(True)
+            self.db._add_patch(['d', self.path + [key]])
         return r
 
+    @locked
+    def clear(self):
+        dict.clear(self)
+        if self.db:
+            self.db._add_patch(['s', self.path, {}])
+
     @locked
     def get(self, key, default=None):
         key = self.convert_key(key)
@@ -160,14 +238,44 @@ class JsonDB(Logger):
         self.lock = threading.RLock()
         self.data = data
         self._modified = False
+        # journal
+        self._journal_enabled = False
+        self._pending_patches = []  # type: List[str]  # serialized patches
+        self._needs_consolidation = False  # changes not in _pending_patches
 
     def set_modified(self, b):
+        """Note: changes marked this way are only saved by writing the whole db.
+        Changes to a StoredDict are recorded in the journal instead."""
         with self.lock:
             self._modified = b
+            if b:
+                self._needs_consolidation = True
 
     def modified(self):
         return self._modified
 
+    def enable_journal(self) -> None:
+        """Start recording changes, so that they can be saved
+        by appending them to the db file."""
+        with self.lock:
+            self._journal_enabled = True
+
+    def _add_patch(self, patch: list) -> None:
+        with self.lock:
+            self._modified = True
+            if self._journal_enabled:
+                # serialize now, the value might be modified in place later
+                self._pending_patches.append(json.dumps(patch, cls=JsonDBJsonEncoder))
+
+    def _pop_journal_record(self) -> str:
+        record = '[' + ','.join(self._pending_patches) + ']'
+        self._pending_patches = []
+        return record
+
+    def _clear_journal(self) -> None:
+        self._pending_patches = []
+        self._needs_consolidation = False
+
     @locked
     def get(self, key, default=None):
         v = self.data.get(key)
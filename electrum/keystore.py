@@ -33,7 +33,8 @@ from abc import ABC, abstractmethod
 
 from . import bitcoin, ecc, constants, bip32
 from .bitcoin import deserialize_privkey, serialize_privkey, BaseDecodeError
-from .transaction import Transaction, PartialTransaction, PartialTxInput, PartialTxOutput, TxInput
+from .transaction import (Transaction, PartialTransaction, PartialTxInput, PartialTxOutput, TxInput,
+                          signing_pool)
 from .bip32 import (convert_bip32_path_to_list_of_uint32, BIP32_PRIME,
                     is_xpub, is_xprv, BIP32Node, normalize_bip32_derivation,
                     convert_bip32_intpath_to_strpath, is_xkey_consistent_with_key_origin_info)
@@ -183,18 +184,23 @@ class Software_KeyStore(KeyStore):
         decrypted = ec.decrypt_message(message)
         return decrypted
 
-    def sign_transaction(self, tx, password):
+    def sign_transaction(self, tx, password, *, num_workers: int = 1):
+        """If num_workers > 1, key derivation and signing are spread over a process pool."""
         if self.is_watching_only():
             return
         # Raise if password is not correct.
         self.check_password(password)
         # Add private keys
-        keypairs = self._get_tx_derivations(tx)
-        for k, v in keypairs.items():
-            keypairs[k] = self.get_private_key(v, password)
+        keypairs = self._get_private_keys(self._get_tx_derivations(tx), password, num_workers=num_workers)
         # Sign
         if keypairs:
-            tx.sign(keypairs)
+            tx.sign(keypairs, num_workers=num_workers)
+
+    def _get_private_keys(self, derivations: Dict[str, Union[Sequence[int], str]], password, *,
+                          num_workers: int = 1) -> Dict[str, Tuple[bytes, bool]]:
+        """Returns pubkey_hex -> (privkey, is_compressed), for the given derivations."""
+        return {pubkey: self.get_private_key(derivation, password)
+                for pubkey, derivation in derivations.items()}
 
     @abstractmethod
     def update_password(self, old_password, new_password):
@@ -534,6 +540,21 @@ class Xpub(MasterPublicKeyMixin):
         return node.eckey.get_public_key_bytes(compressed=True)
 
 
+def _derive_bip32_privkeys(xprv: str, sequences: Sequence[Sequence[int]]) -> List[bytes]:
+    # note: this also runs in the worker processes of the signing executor
+    root = BIP32Node.from_xkey(xprv)
+    parents = {}  # type: Dict[Tuple[int, ...], BIP32Node]
+    privkeys = []
+    for sequence in sequences:
+        # typically the paths are [change, index]; derive the shared parents only once
+        parent_path = tuple(sequence[:-1])
+        parent = parents.get(parent_path)
+        if parent is None:
+            parent = parents[parent_path] = root.subkey_at_private_derivation(parent_path)
+        privkeys.append(parent.subkey_at_private_derivation(sequence[-1:]).eckey.get_secret_bytes())
+    return privkeys
+
+
 class BIP32_KeyStore(Xpub, Deterministic_KeyStore):
 
     type = 'bip32'
@@ -608,6 +629,23 @@ class BIP32_KeyStore(Xpub, Deterministic_KeyStore):
         pk = node.eckey.get_secret_bytes()
         return pk, True
 
+    def _get_private_keys(self, derivations, password, *, num_workers=1):
+        # decrypt the master key only once
+        xprv = self.get_master_private_key(password)
+        sequences = [list(sequence) for sequence in derivations.values()]
+        privkeys = None
+        if num_workers > 1 and len(sequences) >= 2 * num_workers:
+            chunks = [sequences[i::num_workers] for i in range(num_workers)]
+            results = signing_pool.map(_derive_bip32_privkeys, [xprv] * num_workers, chunks,
+                                       num_workers=num_workers)
+            if results is not None:
+                privkeys = [None] * len(sequences)
+                for i, chunk_privkeys in enumerate(results):
+                    privkeys[i::num_workers] = chunk_privkeys
+        if privkeys is None:
+            privkeys = _derive_bip32_privkeys(xprv, sequences)
+        return {pubkey: (privkey, True) for pubkey, privkey in zip(derivations, privkeys)}
+
     def get_keypair(self, sequence, password):
         k, _ = self.get_private_key(sequence, password)
         cK = ecc.ECPrivkey(k).get_public_key_bytes()
@@ -1,6 +1,7 @@
 import os
 import csv
 import io
+import struct
 from typing import Callable, Tuple, Any, Dict, List, Sequence, Union, Optional
 from collections import OrderedDict
 
@@ -270,6 +271,168 @@ def _resolve_field_count(field_count_str: str, *, vars_dict: dict, allow_any=Fal
     return field_count
 
 
+# fixed-size types, by length of one item
+_BYTES_TYPE_LEN = {
+    'byte': 1,
+    'chain_hash': 32,
+    'channel_id': 32,
+    'sha256': 32,
+    'signature': 64,
+    'point': 33,
+    'short_channel_id': 8,
+}
+_UINT_STRUCT_FORMAT = {'u8': 'B', 'u16': 'H', 'u32': 'I', 'u64': 'Q'}
+_UINT_TYPE_LEN = {'u8': 1, 'u16': 2, 'u32': 4, 'u64': 8}
+
+_OPTIONAL_FIELD_NOT_PRESENT = object()
+
+
+def _parse_literal_field_count(field_count_str: str) -> Optional[int]:
+    """Returns the field count if it does not depend on other fields."""
+    if field_count_str == "":
+        return 1
+    try:
+        return int(field_count_str)
+    except ValueError:
+        return None
+
+
+def _make_fixed_width_reader(fields: Sequence[Tuple[str, str]]) -> Callable[[bytes, int, dict], int]:
+    """Returns a reader for consecutive fixed-width fields,
+    given as (field_name, struct_format) pairs.
+    """
+    field_names = tuple(field_name for field_name, struct_format in fields)
+    layout = struct.Struct('>' + ''.join(struct_format for field_name, struct_format in fields))
+    unpack_from = layout.unpack_from
+    size = layout.size
+
+    def read(data: bytes, pos: int, parsed: dict) -> int:
+        end = pos + size
+        if end > len(data):
+            raise UnexpectedEndOfStream(f"wants to read {size} bytes but only {len(data) - pos} bytes left")
+        parsed.update(zip(field_names, unpack_from(data, pos)))
+        return end
+    return read
+
+
+def _make_field_reader(field_name: str, field_type: str, field_count_str: str) -> Callable[[bytes, int, dict], int]:
+    field_count = _parse_literal_field_count(field_count_str)
+    if field_type in _BYTES_TYPE_LEN and field_count_str != "...":
+        type_len = _BYTES_TYPE_LEN[field_type]
+
+        def read(data: bytes, pos: int, parsed: dict) -> int:
+            count = field_count
+            if count is None:
+                count = _resolve_field_count(field_count_str, vars_dict=parsed)
+            end = pos + count * type_len
+            if end > len(data):
+                raise UnexpectedEndOfStream()
+            parsed[field_name] = data[pos:end]
+            return end
+        return read
+    if field_type in _UINT_STRUCT_FORMAT and field_count == 1:
+        unpack_from = struct.Struct('>' + _UINT_STRUCT_FORMAT[field_type]).unpack_from
+        type_len = _UINT_TYPE_LEN[field_type]
+
+        def read(data: bytes, pos: int, parsed: dict) -> int:
+            end = pos + type_len
+            if end > len(data):
+                raise UnexpectedEndOfStream()
+            parsed[field_name] = unpack_from(data, pos)[0]
+            return end
+        return read
+
+    def read(data: bytes, pos: int, parsed: dict) -> int:
+        count = _resolve_field_count(field_count_str, vars_dict=parsed)
+        with io.BytesIO(data) as fd:
+            fd.seek(pos)
+            parsed[field_name] = _read_field(fd=fd, field_type=field_type, count=count)
+            return fd.tell()
+    return read
+
+
+def _make_field_writer(field_name: str, field_type: str, field_count_str: str,
+                       default: Any) -> Callable[[list, dict], bool]:
+    """Returns a writer that appends the encoded field to a list of parts.
+    The writer returns False if the field is optional and not present.
+    """
+    field_count = _parse_literal_field_count(field_count_str)
+    type_len = _BYTES_TYPE_LEN.get(field_type) or _UINT_TYPE_LEN.get(field_type)
+    if type_len is None or field_count_str == "...":
+        def write(parts: list, kwargs: dict) -> bool:
+            value = kwargs.get(field_name, default)
+            if value is _OPTIONAL_FIELD_NOT_PRESENT:
+                return False
+            count = _resolve_field_count(field_count_str, vars_dict=kwargs)
+            with io.BytesIO() as fd:
+                _write_field(fd=fd, field_type=field_type, count=count, value=value)
+                parts.append(fd.getvalue())
+            return True
+        return write
+
+    def write(parts: list, kwargs: dict) -> bool:
+        value = kwargs.get(field_name, default)
+        if value is _OPTIONAL_FIELD_NOT_PRESENT:
+            return False
+        count = field_count
+        if count is None:
+            count = _resolve_field_count(field_count_str, vars_dict=kwargs)
+        if count == 0:
+            return True
+        total_len = count * type_len
+        if isinstance(value, int) and (count == 1 or field_type == 'byte'):
+            value = int.to_bytes(value, length=total_len, byteorder="big", signed=False)
+        if not isinstance(value, (bytes, bytearray)):
+            raise Exception(f"can only write bytes into fd. got: {value!r}")
+        if total_len != len(value):
+            raise UnexpectedFieldSizeForEncoder(f"expected: {total_len}, got {len(value)}")
+        parts.append(value)
+        return True
+    return write
+
+
+def _make_fixed_width_writer(fields: Sequence[Tuple[str, str, Callable[[list, dict], bool]]]) -> Callable[[list, dict], bool]:
+    """Returns a writer for consecutive mandatory fixed-width fields,
+    given as (field_name, struct_format, field_writer) triples.
+    """
+    field_names = tuple(field_name for field_name, struct_format, field_writer in fields)
+    field_writers = tuple(field_writer for field_name, struct_format, field_writer in fields)
+    # struct silently pads or truncates bytes, so their size is checked here
+    bytes_fields = tuple((i, int(struct_format[:-1]))
+                         for i, (field_name, struct_format, field_writer) in enumerate(fields)
+                         if struct_format.endswith('s'))
+    pack = struct.Struct('>' + ''.join(struct_format for field_name, struct_format, field_writer in fields)).pack
+
+    def write(parts: list, kwargs: dict) -> bool:
+        values = [kwargs.get(field_name, 0) for field_name in field_names]
+        for i, size in bytes_fields:
+            value = values[i]
+            if not isinstance(value, (bytes, bytearray)) or len(value) != size:
+                break
+        else:
+            try:
+                parts.append(pack(*values))
+                return True
+            except struct.error:
+                pass
+        # e.g. ints given for bytes fields: let the field writers convert them, or raise
+        for field_writer in field_writers:
+            field_writer(parts, kwargs)
+        return True
+    return write
+
+
+def _get_struct_format(field_type: str, field_count: Optional[int]) -> Optional[str]:
+    """Returns the struct format of a non-empty fixed-width field, if it has one."""
+    if not field_count:
+        return None
+    if field_type in _BYTES_TYPE_LEN:
+        return f'{field_count * _BYTES_TYPE_LEN[field_type]}s'
+    if field_type in _UINT_STRUCT_FORMAT and field_count == 1:
+        return _UINT_STRUCT_FORMAT[field_type]
+    return None
+
+
 def _parse_msgtype_intvalue_for_onion_wire(value: str) -> int:
     msg_type_int = 0
     for component in value.split("|"):
@@ -343,6 +506,15 @@ class LNSerializer:
                 else:
                     pass  # TODO
 
+        # the schemes are compiled once, so that encoding and decoding
+        # does not have to interpret them row by row for every message
+        self._msg_decoders = {}  # type: Dict[bytes, Tuple[str, Callable[[bytes], dict]]]
+        self._msg_encoders = {}  # type: Dict[str, Callable[[dict], bytes]]
+        for msg_type_bytes, scheme in self.msg_scheme_from_type.items():
+            msg_type_name = scheme[0][1]
+            self._msg_decoders[msg_type_bytes] = msg_type_name, self._compile_msg_decoder(scheme)
+            self._msg_encoders[msg_type_name] = self._compile_msg_encoder(msg_type_bytes, scheme)
+
     def write_tlv_stream(self, *, fd: io.BytesIO, tlv_stream_name: str, **kwargs) -> None:
         scheme_map = self.in_tlv_stream_get_tlv_record_scheme_from_type[tlv_stream_name]
         for tlv_record_type, scheme in scheme_map.items():  # note: tlv_record_type is monotonically increasing
@@ -418,47 +590,127 @@ class LNSerializer:
                     raise MsgTrailingGarbage(f"TLV record ({tlv_stream_name}/{tlv_record_name}) has extra trailing garbage")
         return parsed
 
+    def _compile_msg_decoder(self, scheme: List[Sequence[str]]) -> Callable[[bytes], dict]:
+        """Compiles the scheme of a message type into a decoder function.
+
+        Runs of fixed-width fields are read with a single precomputed
+        struct layout; other fields get a specialised reader.
+        """
+        steps = []  # type: List[Tuple[Callable[[bytes, int, dict], int], bool]]
+        run = []  # type: List[Tuple[str, str]]  # fixed-width fields not yet added to steps
+
+        def flush_run():
+            if run:
+                steps.append((_make_fixed_width_reader(run), False))
+                run.clear()
+
+        for row in scheme[1:]:
+            if row[0] != "msgdata":
+                raise Exception(f"unexpected row in scheme: {row!r}")
+            # msgdata,<msgname>,<fieldname>,<typename>,[<count>][,<option>]
+            field_name = row[2]
+            field_type = row[3]
+            field_count_str = row[4]
+            is_optional = len(row) > 5
+            if field_name == "tlvs":
+                flush_run()
+                steps.append((self._make_tlv_stream_reader(field_type), False))
+                continue
+            field_count = _parse_literal_field_count(field_count_str)
+            struct_format = '0s' if field_count == 0 else _get_struct_format(field_type, field_count)
+            if struct_format is not None and not is_optional:
+                run.append((field_name, struct_format))
+                continue
+            flush_run()
+            steps.append((_make_field_reader(field_name, field_type, field_count_str), is_optional))
+        flush_run()
+
+        def decode(data: bytes) -> dict:
+            parsed = {}
+            pos = 2
+            for step, is_optional in steps:
+                if is_optional:
+                    try:
+                        pos = step(data, pos, parsed)
+                    except UnexpectedEndOfStream:
+                        break  # optional feature field not present
+                else:
+                    pos = step(data, pos, parsed)
+            return parsed
+        return decode
+
+    def _make_tlv_stream_reader(self, tlv_stream_name: str) -> Callable[[bytes, int, dict], int]:
+        def read(data: bytes, pos: int, parsed: dict) -> int:
+            with io.BytesIO(data[pos:]) as fd:
+                parsed[tlv_stream_name] = self.read_tlv_stream(fd=fd, tlv_stream_name=tlv_stream_name)
+            return len(data)
+        return read
+
+    def _compile_msg_encoder(self, msg_type_bytes: bytes, scheme: List[Sequence[str]]) -> Callable[[dict], bytes]:
+        """Compiles the scheme of a message type into an encoder function.
+
+        Runs of mandatory fixed-width fields are packed with a single
+        precomputed struct layout.
+        """
+        writers = []  # type: List[Callable[[list, dict], bool]]
+        run = []  # type: List[Tuple[str, str, Callable[[list, dict], bool]]]  # fixed-width fields not yet added to writers
+
+        def flush_run():
+            if len(run) > 1:
+                writers.append(_make_fixed_width_writer(run))
+            elif run:
+                writers.append(run[0][2])
+            run.clear()
+
+        for row in scheme[1:]:
+            if row[0] != "msgdata":
+                raise Exception(f"unexpected row in scheme: {row!r}")
+            # msgdata,<msgname>,<fieldname>,<typename>,[<count>][,<option>]
+            field_name = row[2]
+            field_type = row[3]
+            field_count_str = row[4]
+            if field_name == "tlvs":
+                flush_run()
+                writers.append(self._make_tlv_stream_writer(field_type))
+                continue
+            if len(row) > 5:
+                flush_run()
+                writers.append(_make_field_writer(field_name, field_type, field_count_str,
+                                                  _OPTIONAL_FIELD_NOT_PRESENT))
+                continue
+            # default mandatory fields to zero
+            field_writer = _make_field_writer(field_name, field_type, field_count_str, 0)
+            struct_format = _get_struct_format(field_type, _parse_literal_field_count(field_count_str))
+            if struct_format is not None:
+                run.append((field_name, struct_format, field_writer))
+                continue
+            flush_run()
+            writers.append(field_writer)
+        flush_run()
+
+        def encode(kwargs: dict) -> bytes:
+            parts = [msg_type_bytes]
+            for write in writers:
+                if not write(parts, kwargs):
+                    break  # optional feature field not present
+            return b"".join(parts)
+        return encode
+
+    def _make_tlv_stream_writer(self, tlv_stream_name: str) -> Callable[[list, dict], bool]:
+        def write(parts: list, kwargs: dict) -> bool:
+            if tlv_stream_name in kwargs:
+                with io.BytesIO() as fd:
+                    self.write_tlv_stream(fd=fd, tlv_stream_name=tlv_stream_name, **(kwargs[tlv_stream_name]))
+                    parts.append(fd.getvalue())
+            return True
+        return write
+
     def encode_msg(self, msg_type: str, **kwargs) -> bytes:
         """
         Encode kwargs into a Lightning message (bytes)
         of the type given in the msg_type string
         """
-        #print(f">>> encode_msg. msg_type={msg_type}, payload={kwargs!r}")
-        msg_type_bytes = self.msg_type_from_name[msg_type]
-        scheme = self.msg_scheme_from_type[msg_type_bytes]
-        with io.BytesIO() as fd:
-            fd.write(msg_type_bytes)
-            for row in scheme:
-                if row[0] == "msgtype":
-                    pass
-                elif row[0] == "msgdata":
-                    # msgdata,<msgname>,<fieldname>,<typename>,[<count>][,<option>]
-                    field_name = row[2]
-                    field_type = row[3]
-                    field_count_str = row[4]
-                    #print(f">>> encode_msg. msgdata. field_name={field_name!r}. field_type={field_type!r}. field_count_str={field_count_str!r}")
-                    field_count = _resolve_field_count(field_count_str, vars_dict=kwargs)
-                    if field_name == "tlvs":
-                        tlv_stream_name = field_type
-                        if tlv_stream_name in kwargs:
-                            self.write_tlv_stream(fd=fd, tlv_stream_name=tlv_stream_name, **(kwargs[tlv_stream_name]))
-                        continue
-                    try:
-                        field_value = kwargs[field_name]
-                    except KeyError:
-                        if len(row) > 5:
-                            break  # optional feature field not present
-                        else:
-                            field_value = 0  # default mandatory fields to zero
-                    #print(f">>> encode_msg. writing field: {field_name}. value={field_value!r}. field_type={field_type!r}. count={field_count!r}")
-                    _write_field(fd=fd,
-                                 field_type=field_type,
-                                 count=field_count,
-                                 value=field_value)
-                    #print(f">>> encode_msg. so far: {fd.getvalue().hex()}")
-                else:
-                    raise Exception(f"unexpected row in scheme: {row!r}")
-            return fd.getvalue()
+        return self._msg_encoders[msg_type](kwargs)
 
     def decode_msg(self, data: bytes) -> Tuple[str, dict]:
         """
@@ -467,42 +719,11 @@ class LNSerializer:
 
         Returns message type string and parsed message contents dict
         """
-        #print(f"decode_msg >>> {data.hex()}")
         assert len(data) >= 2
-        msg_type_bytes = data[:2]
-        msg_type_int = int.from_bytes(msg_type_bytes, byteorder="big", signed=False)
-        scheme = self.msg_scheme_from_type[msg_type_bytes]
-        assert scheme[0][2] == msg_type_int
-        msg_type_name = scheme[0][1]
-        parsed = {}
-        with io.BytesIO(data[2:]) as fd:
-            for row in scheme:
-                #print(f"row: {row!r}")
-                if row[0] == "msgtype":
-                    pass
-                elif row[0] == "msgdata":
-                    field_name = row[2]
-                    field_type = row[3]
-                    field_count_str = row[4]
-                    field_count = _resolve_field_count(field_count_str, vars_dict=parsed)
-                    if field_name == "tlvs":
-                        tlv_stream_name = field_type
-                        d = self.read_tlv_stream(fd=fd, tlv_stream_name=tlv_stream_name)
-                        parsed[tlv_stream_name] = d
-                        continue
-                    #print(f">> count={field_count}. parsed={parsed}")
-                    try:
-                        parsed[field_name] = _read_field(fd=fd,
-                                                         field_type=field_type,
-                                                         count=field_count)
-                    except UnexpectedEndOfStream as e:
-                        if len(row) > 5:
-                            break  # optional feature field not present
-                        else:
-                            raise
-                else:
-                    raise Exception(f"unexpected row in scheme: {row!r}")
-        return msg_type_name, parsed
+        if not isinstance(data, bytes):
+            data = bytes(data)
+        msg_type_name, decode = self._msg_decoders[data[:2]]
+        return msg_type_name, decode(data)
 
 
 _inst = LNSerializer()
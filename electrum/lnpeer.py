@@ -324,26 +324,9 @@ class Peer(Logger):
                 if self.gossip_queue.empty():
                     break
             # verify in peer's TaskGroup so that we fail the connection
-            self.verify_channel_announcements(chan_anns)
-            self.verify_node_announcements(node_anns)
-            await self.network.lngossip.process_gossip(chan_anns, node_anns, chan_upds)
-
-    def verify_channel_announcements(self, chan_anns):
-        for payload in chan_anns:
-            h = sha256d(payload['raw'][2+256:])
-            pubkeys = [payload['node_id_1'], payload['node_id_2'], payload['bitcoin_key_1'], payload['bitcoin_key_2']]
-            sigs = [payload['node_signature_1'], payload['node_signature_2'], payload['bitcoin_signature_1'], payload['bitcoin_signature_2']]
-            for pubkey, sig in zip(pubkeys, sigs):
-                if not ecc.verify_signature(pubkey, sig, h):
-                    raise Exception('signature failed')
-
-    def verify_node_announcements(self, node_anns):
-        for payload in node_anns:
-            pubkey = payload['node_id']
-            signature = payload['signature']
-            h = sha256d(payload['raw'][66:])
-            if not ecc.verify_signature(pubkey, signature, h):
-                raise Exception('signature failed')
+            lngossip = self.network.lngossip
+            await lngossip.gossip_verifier.verify_announcements(chan_anns, node_anns)
+            await lngossip.process_gossip(chan_anns, node_anns, chan_upds)
 
     async def query_gossip(self):
         try:
@@ -953,16 +936,15 @@ class Peer(Logger):
         # e.g. for watchtowers, hence we must ensure these ctxs coincide.
         # We replay the local updates even if they were not yet committed.
         unacked = chan.hm.get_unacked_local_updates()
-        n_replayed_msgs = 0
+        replayed_msgs = []
         for ctn, messages in unacked.items():
             if ctn < their_next_local_ctn:
                 # They claim to have received these messages and the corresponding
                 # commitment_signed, hence we must not replay them.
                 continue
-            for raw_upd_msg in messages:
-                self.transport.send_bytes(raw_upd_msg)
-                n_replayed_msgs += 1
-        self.logger.info(f'channel_reestablish ({chan.get_id_for_log()}): replayed {n_replayed_msgs} unacked messages')
+            replayed_msgs.extend(messages)
+        self.transport.send_messages(replayed_msgs)
+        self.logger.info(f'channel_reestablish ({chan.get_id_for_log()}): replayed {len(replayed_msgs)} unacked messages')
 
         we_are_ahead = False
         they_are_ahead = False
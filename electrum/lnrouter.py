@@ -23,9 +23,9 @@
 # CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
-import queue
+import heapq
 from collections import defaultdict
-from typing import Sequence, List, Tuple, Optional, Dict, NamedTuple, TYPE_CHECKING, Set
+from typing import Sequence, List, Tuple, Optional, Dict, NamedTuple, TYPE_CHECKING, Set, Callable
 import time
 import attr
 
@@ -62,6 +62,10 @@ class PathEdge:
 
 @attr.s
 class RouteEdge(PathEdge):
+    # TODO revise ad-hoc heuristics
+    # cltv cannot be more than 2 weeks
+    MAX_CLTV_EXPIRY_DELTA = 14 * 144
+
     fee_base_msat = attr.ib(type=int, kw_only=True)
     fee_proportional_millionths = attr.ib(type=int, kw_only=True)
     cltv_expiry_delta = attr.ib(type=int, kw_only=True)
@@ -86,9 +90,7 @@ class RouteEdge(PathEdge):
                          node_features=node_info.features if node_info else 0)
 
     def is_sane_to_use(self, amount_msat: int) -> bool:
-        # TODO revise ad-hoc heuristics
-        # cltv cannot be more than 2 weeks
-        if self.cltv_expiry_delta > 14 * 144:
+        if self.cltv_expiry_delta > self.MAX_CLTV_EXPIRY_DELTA:
             return False
         total_fee = self.fee_for_edge(amount_msat)
         if not is_fee_sane(total_fee, payment_amount_msat=amount_msat):
@@ -138,6 +140,14 @@ def is_fee_sane(fee_msat: int, *, payment_amount_msat: int) -> bool:
 
 class LNPathFinder(Logger):
 
+    # Distance metric notes:  # TODO constants are ad-hoc
+    # ( somewhat based on https://github.com/lightningnetwork/lnd/pull/1358 )
+    # - Edges have a base cost. (more edges -> less likely none will fail)
+    # - The larger the payment amount, and the longer the CLTV,
+    #   the more irritating it is if the HTLC gets stuck.
+    # - Paying lower fees is better. :)
+    BASE_EDGE_COST = 500  # one more edge ~ paying 500 msat more fees
+
     def __init__(self, channel_db: ChannelDB):
         Logger.__init__(self)
         self.channel_db = channel_db
@@ -174,13 +184,8 @@ class LNPathFinder(Logger):
         if not route_edge.is_sane_to_use(payment_amt_msat):
             return float('inf'), 0  # thanks but no thanks
 
-        # Distance metric notes:  # TODO constants are ad-hoc
-        # ( somewhat based on https://github.com/lightningnetwork/lnd/pull/1358 )
-        # - Edges have a base cost. (more edges -> less likely none will fail)
-        # - The larger the payment amount, and the longer the CLTV,
-        #   the more irritating it is if the HTLC gets stuck.
-        # - Paying lower fees is better. :)
-        base_cost = 500  # one more edge ~ paying 500 msat more fees
+        # note: keep in sync with the inlined version in _get_prev_edges
+        base_cost = self.BASE_EDGE_COST
         if ignore_costs:
             return base_cost, 0
         fee_msat = route_edge.fee_for_edge(payment_amt_msat)
@@ -191,60 +196,162 @@ class LNPathFinder(Logger):
     def get_distances(self, nodeA: bytes, nodeB: bytes, invoice_amount_msat: int, *,
                       my_channels: Dict[ShortChannelID, 'Channel'] = None,
                       blacklist: Set[ShortChannelID] = None) -> Dict[bytes, PathEdge]:
+        prev_edges, start_index, end_index, node_id_of = self._get_prev_edges(
+            nodeA, nodeB, invoice_amount_msat, my_channels=my_channels, blacklist=blacklist)
+        return {node_id_of(start_node): PathEdge(node_id=node_id_of(end_node),
+                                                 short_channel_id=ShortChannelID(short_channel_id))
+                for start_node, (end_node, short_channel_id) in prev_edges.items()}
+
+    def _get_prev_edges(self, nodeA: bytes, nodeB: bytes, invoice_amount_msat: int, *,
+                        my_channels: Dict[ShortChannelID, 'Channel'] = None,
+                        blacklist: Set[ShortChannelID] = None) \
+            -> Tuple[Dict[int, Tuple[int, bytes]], int, int, Callable[[int], bytes]]:
+        """Runs Dijkstra over the routing graph of channel_db.
+        Returns (prev_edges, index of nodeA, index of nodeB, node_id_of), where prev_edges maps
+        node index -> (node index, short_channel_id) of the next hop on the way to nodeB,
+        and node_id_of converts node indices to node ids.
+        """
         # note: we don't lock self.channel_db, so while the path finding runs,
         #       the underlying graph could potentially change... (not good but maybe ~OK?)
+        if my_channels is None:
+            my_channels = {}
+        graph = self.channel_db.routing_graph
+        in_edge_offsets, in_edges = graph.get_in_edges()
+        graph_node_ids = graph.node_ids
+        num_graph_nodes = len(in_edge_offsets) - 1
+        inf = float('inf')
+        distance_from_start = [inf] * num_graph_nodes  # type: List[float]
+        # nodes that are not in the public graph (e.g. our own node) get indices after the public ones
+        extra_node_ids = []  # type: List[bytes]
+        extra_node_index = {}  # type: Dict[bytes, int]
+
+        def node_index_of(node_id: bytes) -> int:
+            n = graph.node_index.get(node_id)
+            if n is not None and n < num_graph_nodes:
+                return n
+            n = extra_node_index.get(node_id)
+            if n is None:
+                n = extra_node_index[node_id] = num_graph_nodes + len(extra_node_ids)
+                extra_node_ids.append(node_id)
+                distance_from_start.append(inf)
+            return n
+
+        def node_id_of(n: int) -> bytes:
+            return graph_node_ids[n] if n < num_graph_nodes else extra_node_ids[n - num_graph_nodes]
+
+        # our channels are not taken from the routing graph, but handled by _edge_cost
+        my_channels_for_node = defaultdict(list)  # type: Dict[bytes, List[ShortChannelID]]
+        for chan in my_channels.values():
+            for node_id in (chan.node_id, chan.get_local_pubkey()):
+                my_channels_for_node[node_id].append(chan.short_channel_id)
+
+        scids = graph.scids
+        edge_start = graph.edge_start
+        edge_end = graph.edge_end
+        usable = graph.usable
+        capacity_sat = graph.capacity_sat
+        fee_base_msat = graph.fee_base_msat
+        fee_proportional_millionths = graph.fee_proportional_millionths
+        cltv_expiry_delta = graph.cltv_expiry_delta
+        htlc_minimum_msat = graph.htlc_minimum_msat
+        htlc_maximum_msat = graph.htlc_maximum_msat
+        max_cltv_expiry_delta = RouteEdge.MAX_CLTV_EXPIRY_DELTA
+        base_edge_cost = self.BASE_EDGE_COST
 
         # run Dijkstra
         # The search is run in the REVERSE direction, from nodeB to nodeA,
         # to properly calculate compound routing fees.
-        distance_from_start = defaultdict(lambda: float('inf'))
-        distance_from_start[nodeB] = 0
-        prev_node = {}  # type: Dict[bytes, PathEdge]
-        nodes_to_explore = queue.PriorityQueue()
-        nodes_to_explore.put((0, invoice_amount_msat, nodeB))  # order of fields (in tuple) matters!
+        start_index = node_index_of(nodeA)
+        end_index = node_index_of(nodeB)
+        distance_from_start[end_index] = 0
+        prev_edges = {}  # type: Dict[int, Tuple[int, bytes]]
+        nodes_to_explore = [(0, invoice_amount_msat, end_index)]  # order of fields (in tuple) matters!
 
         # main loop of search
-        while nodes_to_explore.qsize() > 0:
-            dist_to_edge_endnode, amount_msat, edge_endnode = nodes_to_explore.get()
-            if edge_endnode == nodeA:
+        while nodes_to_explore:
+            dist_to_edge_endnode, amount_msat, edge_endnode = heapq.heappop(nodes_to_explore)
+            if edge_endnode == start_index:
                 break
             if dist_to_edge_endnode != distance_from_start[edge_endnode]:
-                # queue.PriorityQueue does not implement decrease_priority,
+                # heapq does not implement decrease_priority,
                 # so instead of decreasing priorities, we add items again into the queue.
                 # so there are duplicates in the queue, that we discard now:
                 continue
-            for edge_channel_id in self.channel_db.get_channels_for_node(edge_endnode, my_channels=my_channels):
-                assert isinstance(edge_channel_id, bytes)
+            # public channels, see _edge_cost for the meaning of the checks
+            if edge_endnode < num_graph_nodes:
+                for i in range(in_edge_offsets[edge_endnode], in_edge_offsets[edge_endnode + 1]):
+                    e = in_edges[i]
+                    edge_startnode = edge_start[e]
+                    # gossip may have freed or reused the channel slot after in_edges was built
+                    if edge_end[e] != edge_endnode or not 0 <= edge_startnode < num_graph_nodes:
+                        continue
+                    # the cost of any edge is at least base_edge_cost
+                    if dist_to_edge_endnode + base_edge_cost >= distance_from_start[edge_startnode]:
+                        continue
+                    if not usable[e]:
+                        continue
+                    short_channel_id = scids[e >> 1]
+                    if short_channel_id is None:
+                        continue  # removed meanwhile
+                    if blacklist and short_channel_id in blacklist:
+                        continue
+                    if my_channels and short_channel_id in my_channels:
+                        continue
+                    if amount_msat < htlc_minimum_msat[e]:
+                        continue  # payment amount too little
+                    capacity = capacity_sat[e >> 1]
+                    if capacity >= 0 and amount_msat // 1000 > capacity:
+                        continue  # payment amount too large
+                    htlc_maximum = htlc_maximum_msat[e]
+                    if htlc_maximum >= 0 and amount_msat > htlc_maximum:
+                        continue  # payment amount too large
+                    cltv = cltv_expiry_delta[e]
+                    if cltv > max_cltv_expiry_delta:
+                        continue
+                    fee_msat = fee_base_msat[e] + amount_msat * fee_proportional_millionths[e] // 1_000_000
+                    if not is_fee_sane(fee_msat, payment_amount_msat=amount_msat):
+                        continue
+                    if edge_startnode == start_index:
+                        edge_cost, fee_msat = base_edge_cost, 0
+                    else:
+                        edge_cost = base_edge_cost + fee_msat + cltv * amount_msat * 15 / 1_000_000_000
+                    alt_dist_to_neighbour = dist_to_edge_endnode + edge_cost
+                    if alt_dist_to_neighbour < distance_from_start[edge_startnode]:
+                        distance_from_start[edge_startnode] = alt_dist_to_neighbour
+                        prev_edges[edge_startnode] = (edge_endnode, short_channel_id)
+                        heapq.heappush(nodes_to_explore,
+                                       (alt_dist_to_neighbour, amount_msat + fee_msat, edge_startnode))
+            # our own channels
+            edge_endnode_id = node_id_of(edge_endnode)
+            for edge_channel_id in my_channels_for_node.get(edge_endnode_id, ()):
                 if blacklist and edge_channel_id in blacklist:
                     continue
                 channel_info = self.channel_db.get_channel_info(edge_channel_id, my_channels=my_channels)
-                edge_startnode = channel_info.node2_id if channel_info.node1_id == edge_endnode else channel_info.node1_id
-                is_mine = edge_channel_id in my_channels
-                if is_mine:
-                    if edge_startnode == nodeA:  # payment outgoing, on our channel
-                        if not my_channels[edge_channel_id].can_pay(amount_msat, check_frozen=True):
-                            continue
-                    else:  # payment incoming, on our channel. (funny business, cycle weirdness)
-                        assert edge_endnode == nodeA, (bh2u(edge_startnode), bh2u(edge_endnode))
-                        if not my_channels[edge_channel_id].can_receive(amount_msat, check_frozen=True):
-                            continue
+                edge_startnode_id = channel_info.node2_id if channel_info.node1_id == edge_endnode_id else channel_info.node1_id
+                if edge_startnode_id == nodeA:  # payment outgoing, on our channel
+                    if not my_channels[edge_channel_id].can_pay(amount_msat, check_frozen=True):
+                        continue
+                else:  # payment incoming, on our channel. (funny business, cycle weirdness)
+                    assert edge_endnode_id == nodeA, (bh2u(edge_startnode_id), bh2u(edge_endnode_id))
+                    if not my_channels[edge_channel_id].can_receive(amount_msat, check_frozen=True):
+                        continue
                 edge_cost, fee_for_edge_msat = self._edge_cost(
                     edge_channel_id,
-                    start_node=edge_startnode,
-                    end_node=edge_endnode,
+                    start_node=edge_startnode_id,
+                    end_node=edge_endnode_id,
                     payment_amt_msat=amount_msat,
-                    ignore_costs=(edge_startnode == nodeA),
-                    is_mine=is_mine,
+                    ignore_costs=(edge_startnode_id == nodeA),
+                    is_mine=True,
                     my_channels=my_channels)
-                alt_dist_to_neighbour = distance_from_start[edge_endnode] + edge_cost
+                edge_startnode = node_index_of(edge_startnode_id)
+                alt_dist_to_neighbour = dist_to_edge_endnode + edge_cost
                 if alt_dist_to_neighbour < distance_from_start[edge_startnode]:
                     distance_from_start[edge_startnode] = alt_dist_to_neighbour
-                    prev_node[edge_startnode] = PathEdge(node_id=edge_endnode,
-                                                         short_channel_id=ShortChannelID(edge_channel_id))
-                    amount_to_forward_msat = amount_msat + fee_for_edge_msat
-                    nodes_to_explore.put((alt_dist_to_neighbour, amount_to_forward_msat, edge_startnode))
+                    prev_edges[edge_startnode] = (edge_endnode, edge_channel_id)
+                    heapq.heappush(nodes_to_explore,
+                                   (alt_dist_to_neighbour, amount_msat + fee_for_edge_msat, edge_startnode))
 
-        return prev_node
+        return prev_edges, start_index, end_index, node_id_of
 
     @profiler
     def find_path_for_payment(self, nodeA: bytes, nodeB: bytes,
@@ -259,19 +366,20 @@ class LNPathFinder(Logger):
         if my_channels is None:
             my_channels = {}
 
-        prev_node = self.get_distances(nodeA, nodeB, invoice_amount_msat, my_channels=my_channels, blacklist=blacklist)
+        prev_edges, start_index, end_index, node_id_of = self._get_prev_edges(
+            nodeA, nodeB, invoice_amount_msat, my_channels=my_channels, blacklist=blacklist)
 
-        if nodeA not in prev_node:
+        if start_index not in prev_edges:
             return None  # no path found
 
         # backtrack from search_end (nodeA) to search_start (nodeB)
         # FIXME paths cannot be longer than 20 edges (onion packet)...
-        edge_startnode = nodeA
+        edge_startnode = start_index
         path = []
-        while edge_startnode != nodeB:
-            edge = prev_node[edge_startnode]
-            path += [edge]
-            edge_startnode = edge.node_id
+        while edge_startnode != end_index:
+            edge_endnode, short_channel_id = prev_edges[edge_startnode]
+            path += [PathEdge(node_id=node_id_of(edge_endnode), short_channel_id=ShortChannelID(short_channel_id))]
+            edge_startnode = edge_endnode
         return path
 
     def create_route_from_path(self, path: Optional[LNPaymentPath], from_node_id: bytes, *,
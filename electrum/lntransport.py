@@ -8,9 +8,10 @@
 import hashlib
 import asyncio
 from asyncio import StreamReader, StreamWriter
-from typing import Optional
+from typing import Optional, Iterable, Tuple
 
-from .crypto import sha256, hmac_oneshot, chacha20_poly1305_encrypt, chacha20_poly1305_decrypt
+from .crypto import (sha256, hmac_oneshot, chacha20_poly1305_encrypt, chacha20_poly1305_decrypt,
+                     ChaCha20Poly1305Cipher)
 from .lnutil import (get_ecdh, privkey_to_pubkey, LightningPeerConnectionClosed,
                      HandshakeFailed, LNPeerAddr)
 from . import ecc
@@ -96,52 +97,73 @@ class LNTransportBase:
     def name(self) -> str:
         raise NotImplementedError()
 
+    # max number of bytes read from the socket at once
+    READ_SIZE = 2**16
+
     def send_bytes(self, msg: bytes) -> None:
-        l = len(msg).to_bytes(2, 'big')
-        lc = aead_encrypt(self.sk, self.sn(), b'', l)
-        c = aead_encrypt(self.sk, self.sn(), b'', msg)
-        assert len(lc) == 18
-        assert len(c) == len(msg) + 16
-        self.writer.write(lc+c)
+        self.send_messages([msg])
+
+    def send_messages(self, msgs: Iterable[bytes]) -> None:
+        """Encrypts the messages, and writes all of them at once."""
+        frames = []
+        try:
+            for msg in msgs:
+                l = len(msg).to_bytes(2, 'big')
+                nonce, cipher = self.sn()
+                frames.append(cipher.encrypt(nonce=nonce, data=l))
+                nonce, cipher = self.sn()
+                frames.append(cipher.encrypt(nonce=nonce, data=msg))
+        finally:
+            # the nonces are used up, so what was encrypted must be sent
+            if frames:
+                self.writer.write(b''.join(frames))
 
     async def read_messages(self):
-        read_buffer = b''
+        read_buffer = bytearray()
+        pos = 0  # start of the data in read_buffer that has not been decrypted yet
+        length = None  # of the next message, once the length prefix is decrypted
         while True:
-            rn_l, rk_l = self.rn()
-            rn_m, rk_m = self.rn()
-            while True:
-                if len(read_buffer) >= 18:
-                    lc = read_buffer[:18]
-                    l = aead_decrypt(rk_l, rn_l, b'', lc)
-                    length = int.from_bytes(l, 'big')
-                    offset = 18 + length + 16
-                    if len(read_buffer) >= offset:
-                        c = read_buffer[18:offset]
-                        read_buffer = read_buffer[offset:]
-                        msg = aead_decrypt(rk_m, rn_m, b'', c)
-                        yield msg
-                        break
-                try:
-                    s = await self.reader.read(2**10)
-                except:
-                    s = None
-                if not s:
-                    raise LightningPeerConnectionClosed()
-                read_buffer += s
-
-    def rn(self):
-        o = self._rn, self.rk
+            if length is None and len(read_buffer) - pos >= 18:
+                nonce, cipher = self.rn()
+                l = cipher.decrypt(nonce=nonce, data=bytes(read_buffer[pos:pos+18]))
+                length = int.from_bytes(l, 'big')
+                pos += 18
+            if length is not None and len(read_buffer) - pos >= length + 16:
+                nonce, cipher = self.rn()
+                offset = pos + length + 16
+                with memoryview(read_buffer) as view:
+                    c = bytes(view[pos:offset])
+                pos = offset
+                length = None
+                yield cipher.decrypt(nonce=nonce, data=c)
+                continue
+            # all complete messages have been consumed: drop them
+            # from the buffer (only once per read), and read more
+            del read_buffer[:pos]
+            pos = 0
+            try:
+                s = await self.reader.read(self.READ_SIZE)
+            except:
+                s = None
+            if not s:
+                raise LightningPeerConnectionClosed()
+            read_buffer += s
+
+    def rn(self) -> Tuple[bytes, ChaCha20Poly1305Cipher]:
+        o = get_nonce_bytes(self._rn), self.r_cipher
         self._rn += 1
         if self._rn == 1000:
             self.r_ck, self.rk = get_bolt8_hkdf(self.r_ck, self.rk)
+            self.r_cipher = ChaCha20Poly1305Cipher(self.rk)
             self._rn = 0
         return o
 
-    def sn(self):
-        o = self._sn
+    def sn(self) -> Tuple[bytes, ChaCha20Poly1305Cipher]:
+        o = get_nonce_bytes(self._sn), self.s_cipher
         self._sn += 1
         if self._sn == 1000:
             self.s_ck, self.sk = get_bolt8_hkdf(self.s_ck, self.sk)
+            self.s_cipher = ChaCha20Poly1305Cipher(self.sk)
             self._sn = 0
         return o
 
@@ -151,6 +173,8 @@ class LNTransportBase:
         self._rn = 0
         self.r_ck = ck
         self.s_ck = ck
+        self.r_cipher = ChaCha20Poly1305Cipher(self.rk)
+        self.s_cipher = ChaCha20Poly1305Cipher(self.sk)
 
     def close(self):
         self.writer.close()
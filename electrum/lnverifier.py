@@ -24,15 +24,20 @@
 # SOFTWARE.
 
 import asyncio
+import itertools
+import os
 import threading
-from typing import TYPE_CHECKING, Dict, Set
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Dict, Set, List, Sequence, Callable, Optional
 
 import aiorpcx
 
 from . import bitcoin
 from . import ecc
 from . import constants
-from .util import bh2u, bfh, NetworkJobOnDefaultServer
+from .util import bh2u, bfh, NetworkJobOnDefaultServer, chunks
+from .logging import Logger
 from .lnutil import funding_output_script_from_keys, ShortChannelID
 from .verifier import verify_tx_is_in_block, MerkleVerificationFailure
 from .transaction import Transaction
@@ -183,3 +188,114 @@ def verify_sig_for_channel_update(chan_upd: dict, node_id: bytes) -> bool:
     if not ecc.verify_signature(node_id, sig, h):
         return False
     return True
+
+
+def verify_sigs_for_channel_announcement(chan_ann: dict) -> bool:
+    msg_bytes = chan_ann['raw']
+    pre_hash = msg_bytes[2+256:]
+    h = sha256d(pre_hash)
+    pubkeys = [chan_ann['node_id_1'], chan_ann['node_id_2'], chan_ann['bitcoin_key_1'], chan_ann['bitcoin_key_2']]
+    sigs = [chan_ann['node_signature_1'], chan_ann['node_signature_2'], chan_ann['bitcoin_signature_1'], chan_ann['bitcoin_signature_2']]
+    for pubkey, sig in zip(pubkeys, sigs):
+        if not ecc.verify_signature(pubkey, sig, h):
+            return False
+    return True
+
+
+def verify_sig_for_node_announcement(node_ann: dict) -> bool:
+    msg_bytes = node_ann['raw']
+    pre_hash = msg_bytes[2+64:]
+    h = sha256d(pre_hash)
+    if not ecc.verify_signature(node_ann['node_id'], node_ann['signature'], h):
+        return False
+    return True
+
+
+def verify_channel_update_payload(chan_upd: dict) -> bool:
+    """Checks the chain hash and the signature of a channel_update.
+    chan_upd['start_node'] must be set to the node that signed it."""
+    if constants.net.rev_genesis_bytes() != chan_upd['chain_hash']:
+        return False
+    return verify_sig_for_channel_update(chan_upd, chan_upd['start_node'])
+
+
+def _verify_all(verify_func: Callable[[dict], bool], payloads: Sequence[dict]) -> List[bool]:
+    return [verify_func(payload) for payload in payloads]
+
+
+class GossipVerifier(Logger):
+    """ Verify the signatures of gossip messages in a thread pool
+
+    Signatures are checked with libsecp256k1, through ctypes, which releases
+    the GIL during the call; so the workers do not block the asyncio loop,
+    and they verify in parallel on multi-core machines.
+    """
+
+    CHUNK_SIZE = 100  # messages per job submitted to the pool
+
+    def __init__(self, *, num_workers: int = None):
+        Logger.__init__(self)
+        if num_workers is None:
+            num_workers = min(4, os.cpu_count() or 1)
+        self.num_workers = max(1, num_workers)
+        self.executor = ThreadPoolExecutor(max_workers=self.num_workers,
+                                           thread_name_prefix='gossip_verifier')
+        # throughput metrics
+        self.num_messages = 0
+        self.num_invalid = 0
+        self.time_spent = 0.0  # wall time of the batches, in seconds
+
+    def stop(self) -> None:
+        self.executor.shutdown(wait=False)
+
+    def get_messages_per_second(self) -> Optional[float]:
+        if not self.time_spent:
+            return None
+        return self.num_messages / self.time_spent
+
+    def log_stats(self) -> None:
+        rate = self.get_messages_per_second()
+        if rate is None:
+            return
+        self.logger.info(f'verified {self.num_messages} gossip messages ({self.num_invalid} invalid) '
+                         f'in {self.time_spent:.2f} s, {rate:.0f} msg/s, {self.num_workers} workers')
+
+    async def _verify(self, verify_func: Callable[[dict], bool], payloads: Sequence[dict]) -> List[bool]:
+        if not payloads:
+            return []
+        loop = asyncio.get_event_loop()
+        t0 = time.monotonic()
+        jobs = [loop.run_in_executor(self.executor, _verify_all, verify_func, chunk)
+                for chunk in chunks(payloads, self.CHUNK_SIZE)]
+        results = list(itertools.chain.from_iterable(await asyncio.gather(*jobs)))
+        dt = time.monotonic() - t0
+        self.num_messages += len(payloads)
+        self.num_invalid += results.count(False)
+        self.time_spent += dt
+        self.logger.debug(f'verified {len(payloads)} messages in {dt:.3f} s')
+        return results
+
+    async def verify_announcements(self, chan_anns: Sequence[dict], node_anns: Sequence[dict]) -> None:
+        """Raises if any of the announcements has an invalid signature."""
+        results = await self._verify(verify_sigs_for_channel_announcement, chan_anns)
+        results += await self._verify(verify_sig_for_node_announcement, node_anns)
+        if not all(results):
+            raise Exception('signature failed')
+
+    async def verify_channel_updates(self, chan_upds: Sequence[dict], channel_db: 'ChannelDB') -> List[dict]:
+        """Returns chan_upds without the ones that have an invalid signature.
+        Updates for channels that are not in channel_db cannot be verified,
+        and are kept; channel_db will not add them.
+        """
+        known = []
+        for payload in chan_upds:
+            start_node = channel_db.get_start_node_of_channel_update(payload)
+            if start_node is not None:
+                payload['start_node'] = start_node
+                known.append(payload)
+        results = await self._verify(verify_channel_update_payload, known)
+        invalid = set(id(payload) for payload, is_valid in zip(known, results) if not is_valid)
+        if not invalid:
+            return list(chan_upds)
+        self.logger.info(f'dropping {len(invalid)} channel updates with invalid signature')
+        return [payload for payload in chan_upds if id(payload) not in invalid]
@@ -73,6 +73,7 @@ from .lnutil import ChannelBackupStorage
 from .lnchannel import ChannelBackup
 from .channel_db import UpdateStatus
 from .channel_db import get_mychannel_info, get_mychannel_policy
+from .lnverifier import GossipVerifier
 from .submarine_swaps import SwapManager
 
 if TYPE_CHECKING:
@@ -298,9 +299,10 @@ class LNWorker(Logger, NetworkRetryManager[LNPeerAddr]):
         asyncio.run_coroutine_threadsafe(self.main_loop(), self.network.asyncio_loop)
 
     def stop(self):
-        if self.listen_server:
-            self.network.asyncio_loop.call_soon_threadsafe(self.listen_server.close)
-        asyncio.run_coroutine_threadsafe(self.taskgroup.cancel_remaining(), self.network.asyncio_loop)
+        if self.network:  # else start_network was never called
+            if self.listen_server:
+                self.network.asyncio_loop.call_soon_threadsafe(self.listen_server.close)
+            asyncio.run_coroutine_threadsafe(self.taskgroup.cancel_remaining(), self.network.asyncio_loop)
         util.unregister_callback(self.on_proxy_changed)
 
     def _add_peers_from_config(self):
@@ -476,18 +478,26 @@ class LNGossip(LNWorker):
         xprv = node.to_xprv()
         super().__init__(xprv, LNGOSSIP_FEATURES)
         self.unknown_ids = set()
+        self.gossip_verifier = None  # type: Optional[GossipVerifier]
 
     def start_network(self, network: 'Network'):
         assert network
+        self.gossip_verifier = GossipVerifier(num_workers=network.config.get('gossip_verification_workers'))
         super().start_network(network)
         asyncio.run_coroutine_threadsafe(self.taskgroup.spawn(self.maintain_db()), self.network.asyncio_loop)
 
+    def stop(self):
+        super().stop()
+        if self.gossip_verifier:
+            self.gossip_verifier.stop()
+
     async def maintain_db(self):
         await self.channel_db.data_loaded.wait()
         while True:
             if len(self.unknown_ids) == 0:
                 self.channel_db.prune_old_policies(self.max_age)
                 self.channel_db.prune_orphaned_channels()
+            self.gossip_verifier.log_stats()
             await asyncio.sleep(120)
 
     async def add_new_ids(self, ids):
@@ -541,6 +551,8 @@ class LNGossip(LNWorker):
             self.channel_db.add_node_announcement(node_anns_chunk)
         # channel updates
         for chan_upds_chunk in chunks(chan_upds, 1000):
+            # now that the announcements are added, we know who signed the updates
+            chan_upds_chunk = await self.gossip_verifier.verify_channel_updates(chan_upds_chunk, self.channel_db)
             categorized_chan_upds = self.channel_db.add_channel_updates(
                 chan_upds_chunk, max_age=self.max_age)
             orphaned = categorized_chan_upds.orphaned
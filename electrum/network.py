@@ -60,6 +60,7 @@ from .simple_config import SimpleConfig
 from .i18n import _
 from .logging import get_logger, Logger
 from .lnutil import ChannelBlackList
+from .tx_cache import TxCache, DEFAULT_TX_CACHE_SIZE_MB
 
 if TYPE_CHECKING:
     from .channel_db import ChannelDB
@@ -319,6 +320,13 @@ class Network(Logger, NetworkRetryManager[ServerAddr]):
         dir_path = os.path.join(self.config.path, 'certs')
         util.make_dir(dir_path)
 
+        # raw transactions, shared by all wallets
+        self.tx_cache = None  # type: Optional[TxCache]
+        tx_cache_size_mb = self.config.get('tx_cache_size_mb', DEFAULT_TX_CACHE_SIZE_MB)
+        if tx_cache_size_mb:
+            self.tx_cache = TxCache(os.path.join(self.config.path, 'tx_cache'),
+                                    max_size=int(tx_cache_size_mb * 1_000_000))
+
         # the main server we are currently communicating with
         self.interface = None
         self.default_server_changed_event = asyncio.Event()
@@ -826,6 +834,8 @@ class Network(Logger, NetworkRetryManager[ServerAddr]):
         else:
             length = HEADER_SIZE * constants.net.SAPLING_HEIGHT + HEADER_SIZE_SAPLING * (checkpoint_len - constants.net.SAPLING_HEIGHT + 1)
         if not os.path.exists(filename) or os.path.getsize(filename) < length:
+            b.close_headers_file()
+            b.clear_header_cache()
             with open(filename, 'wb') as f:
                 if length > 0:
                     f.seek(length-1)
@@ -1204,6 +1214,11 @@ class Network(Logger, NetworkRetryManager[ServerAddr]):
         self.interfaces = {}
         self._connecting_ifaces.clear()
         self._closing_ifaces.clear()
+        if full_shutdown:
+            blockchain.shutdown_pow_executor()
+            if self.tx_cache:
+                tx_cache, self.tx_cache = self.tx_cache, None
+                tx_cache.close()
         if not full_shutdown:
             util.trigger_callback('network_updated')
 
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+#
+# Benchmarks ChannelDB.load_data, i.e. the startup of the gossip DB.
+# A gossip_db is filled with synthetic channel announcements, channel
+# updates and node announcements, then loaded a few times.
+#
+# usage: bench_channel_db_load.py [num_channels] [num_loads]
+
+import asyncio
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+from electrum import constants
+from electrum.channel_db import ChannelDB
+from electrum.lnmsg import encode_msg, decode_msg
+from electrum.simple_config import SimpleConfig
+
+
+def start_loop() -> asyncio.AbstractEventLoop:
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    while not loop.is_running():
+        time.sleep(0.001)
+    return loop
+
+
+def stop_channel_db(channel_db: ChannelDB) -> None:
+    while not channel_db.db_requests.empty():
+        time.sleep(0.01)
+    channel_db.asyncio_loop.call_soon_threadsafe(channel_db.asyncio_loop.stop)
+    channel_db.sql_thread.join()
+
+
+def open_channel_db(electrum_path: str) -> ChannelDB:
+    network = type('fake_network', (), {
+        'asyncio_loop': start_loop(),
+        'interface': None,
+        'config': SimpleConfig({'electrum_path': electrum_path}),
+    })()
+    return ChannelDB(network)
+
+
+def decoded(raw: bytes) -> dict:
+    payload = decode_msg(raw)[1]
+    payload['raw'] = raw
+    return payload
+
+
+def fill_channel_db(electrum_path: str, num_channels: int) -> None:
+    rand = random.Random(42)
+    channel_db = open_channel_db(electrum_path)
+    channel_db.data_loaded.set()
+    node_ids = sorted(b'\x02' + rand.getrandbits(256).to_bytes(32, 'big')
+                      for i in range(max(2, num_channels // 4)))
+    now = int(time.time())
+    chan_anns, chan_upds = [], []
+    for i in range(num_channels):
+        node1, node2 = sorted(rand.sample(node_ids, 2))
+        scid = (100000 + i).to_bytes(3, 'big') + (1).to_bytes(3, 'big') + (0).to_bytes(2, 'big')
+        chan_anns.append(decoded(encode_msg(
+            'channel_announcement',
+            len=0,
+            features=b'',
+            chain_hash=constants.net.rev_genesis_bytes(),
+            short_channel_id=scid,
+            node_id_1=node1,
+            node_id_2=node2,
+            bitcoin_key_1=node1,
+            bitcoin_key_2=node2)))
+        for direction in (0, 1):
+            chan_upds.append(decoded(encode_msg(
+                'channel_update',
+                chain_hash=constants.net.rev_genesis_bytes(),
+                short_channel_id=scid,
+                timestamp=now - rand.randint(0, 1000),
+                message_flags=b'\x01',
+                channel_flags=bytes([direction]),
+                cltv_expiry_delta=144,
+                htlc_minimum_msat=1000,
+                htlc_maximum_msat=rand.randint(1, 10) * 1_000_000_000,
+                fee_base_msat=1000,
+                fee_proportional_millionths=rand.randint(1, 2000))))
+    node_anns = [decoded(encode_msg(
+        'node_announcement',
+        flen=2,
+        features=(0x2200).to_bytes(2, 'big'),
+        timestamp=now,
+        node_id=node_id,
+        rgb_color=b'\x00' * 3,
+        alias=b'node'.ljust(32, b'\x00'),
+        addrlen=7,
+        addresses=b'\x01' + bytes([10, 0, i >> 8 & 255, i & 255]) + (9735).to_bytes(2, 'big')))
+        for i, node_id in enumerate(node_ids)]
+    channel_db.add_channel_announcement(chan_anns)
+    channel_db.add_channel_updates(chan_upds)
+    channel_db.add_node_announcement(node_anns)
+    stop_channel_db(channel_db)
+
+
+def load_channel_db(electrum_path: str) -> float:
+    channel_db = open_channel_db(electrum_path)
+    t0 = time.monotonic()
+    channel_db.load_data()
+    while not channel_db.data_loaded.is_set():
+        time.sleep(0.001)
+    dt = time.monotonic() - t0
+    print(f"loaded {channel_db.num_channels} channels, {channel_db.num_policies} policies, "
+          f"{channel_db.num_nodes} nodes in {dt:.3f} s")
+    stop_channel_db(channel_db)
+    return dt
+
+
+def main():
+    num_channels = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    num_loads = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    electrum_path = tempfile.mkdtemp()
+    try:
+        t0 = time.monotonic()
+        fill_channel_db(electrum_path, num_channels)
+        print(f"filled gossip_db in {time.monotonic() - t0:.2f} s")
+        for i in range(num_loads):
+            load_channel_db(electrum_path)
+    finally:
+        shutil.rmtree(electrum_path)
+
+
+if __name__ == '__main__':
+    main()
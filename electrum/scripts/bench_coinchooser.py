@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+#
+# Benchmarks the make_tx of the coin choosers on a wallet with many UTXOs
+# spread over many addresses.
+#
+# usage: bench_coinchooser.py [num_utxos] [num_addresses]
+
+import sys
+import time
+
+from electrum import bitcoin
+from electrum.coinchooser import CoinChooserPrivacy, CoinChooserBnB
+from electrum.ecc import ECPrivkey
+from electrum.transaction import PartialTxInput, PartialTxOutput, TxOutpoint
+
+
+def make_coins(num_utxos: int, num_addresses: int):
+    addresses = []
+    for i in range(num_addresses):
+        pubkey = ECPrivkey((i + 1).to_bytes(32, 'big')).get_public_key_bytes(compressed=True)
+        addresses.append((pubkey, bitcoin.pubkey_to_address('p2pkh', pubkey.hex())))
+    coins = []
+    for i in range(num_utxos):
+        pubkey, address = addresses[i % num_addresses]
+        coin = PartialTxInput(prevout=TxOutpoint(bitcoin.sha256(i.to_bytes(4, 'big')), i % 3))
+        coin._trusted_address = address
+        coin._trusted_value_sats = 10000 + (i * 7919) % 5000000
+        coin.block_height = 1000 + i if i % 10 else 0
+        coin.script_type = 'p2pkh'
+        coin.pubkeys = [pubkey]
+        coin.num_sig = 1
+        coins.append(coin)
+    return coins, [address for pubkey, address in addresses[:3]]
+
+
+def main():
+    num_utxos = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    num_addresses = int(sys.argv[2]) if len(sys.argv) > 2 else num_utxos // 5
+    coins, change_addrs = make_coins(num_utxos, num_addresses)
+    dest = 'k112pHc1rbsM4fQDiyUFzkUdtdzr4AQBa2r'
+    total = sum(coin.value_sats() for coin in coins)
+    for klass in (CoinChooserPrivacy, CoinChooserBnB):
+        for fraction in (0.001, 0.01, 0.1):
+            amount = int(total * fraction)
+            for num_change_addrs in (1, 3):
+                outputs = [PartialTxOutput.from_address_and_value(dest, amount)]
+                coin_chooser = klass(enable_output_value_rounding=True)
+                t0 = time.monotonic()
+                tx = coin_chooser.make_tx(coins=coins, inputs=[], outputs=outputs,
+                                          change_addrs=change_addrs[:num_change_addrs],
+                                          fee_estimator_vb=lambda size: 10 * size,
+                                          dust_threshold=546)
+                dt = time.monotonic() - t0
+                print(f"{klass.__name__:18s}  utxos={num_utxos}  amount={amount:12d}  "
+                      f"change_addrs={num_change_addrs}  {dt:7.3f} s  "
+                      f"inputs={len(tx.inputs())} outputs={len(tx.outputs())} fee={tx.get_fee()}")
+
+
+if __name__ == '__main__':
+    main()
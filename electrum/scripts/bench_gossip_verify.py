@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+#
+# Benchmarks the signature verification of gossip messages: inline on the
+# asyncio loop (as Peer.process_gossip used to do) vs GossipVerifier with
+# a growing number of worker threads. Besides the throughput, it reports
+# how long the asyncio loop was blocked at most.
+#
+# usage: bench_gossip_verify.py [num_channels]
+
+import asyncio
+import random
+import sys
+import time
+from typing import List, Tuple
+
+from electrum import constants
+from electrum.ecc import ECPrivkey, sig_string_from_r_and_s
+from electrum.crypto import sha256d
+from electrum.lnmsg import encode_msg, decode_msg
+from electrum.lnverifier import (GossipVerifier, verify_sigs_for_channel_announcement,
+                                 verify_sig_for_node_announcement)
+
+
+def sign_msg(privkey: ECPrivkey, raw: bytes, sig_offset: int) -> bytes:
+    return privkey.sign(sha256d(raw[sig_offset:]), sig_string_from_r_and_s)
+
+
+def decode(raw: bytes) -> dict:
+    msg_type, payload = decode_msg(raw)
+    payload['raw'] = raw
+    return payload
+
+
+def make_gossip(num_channels: int) -> Tuple[List[dict], List[dict]]:
+    rand = random.Random(42)
+    keys = [ECPrivkey.from_secret_scalar(rand.getrandbits(255) + 1) for i in range(200)]
+    chan_anns = []
+    for i in range(num_channels):
+        node1, node2, bitcoin1, bitcoin2 = rand.sample(keys, 4)
+        if node1.get_public_key_bytes() > node2.get_public_key_bytes():
+            node1, node2 = node2, node1
+        fields = dict(
+            len=0,
+            features=b'',
+            chain_hash=constants.net.rev_genesis_bytes(),
+            short_channel_id=(100000 + i).to_bytes(3, 'big') + bytes(5),
+            node_id_1=node1.get_public_key_bytes(),
+            node_id_2=node2.get_public_key_bytes(),
+            bitcoin_key_1=bitcoin1.get_public_key_bytes(),
+            bitcoin_key_2=bitcoin2.get_public_key_bytes(),
+        )
+        raw = encode_msg('channel_announcement', **fields)
+        raw = encode_msg('channel_announcement',
+                         node_signature_1=sign_msg(node1, raw, 2 + 256),
+                         node_signature_2=sign_msg(node2, raw, 2 + 256),
+                         bitcoin_signature_1=sign_msg(bitcoin1, raw, 2 + 256),
+                         bitcoin_signature_2=sign_msg(bitcoin2, raw, 2 + 256),
+                         **fields)
+        chan_anns.append(decode(raw))
+    node_anns = []
+    for key in keys:
+        fields = dict(
+            flen=0,
+            features=b'',
+            timestamp=int(time.time()),
+            node_id=key.get_public_key_bytes(),
+            rgb_color=b'\x00' * 3,
+            alias=b'bench'.ljust(32, b'\x00'),
+            addrlen=0,
+            addresses=b'',
+        )
+        raw = encode_msg('node_announcement', **fields)
+        raw = encode_msg('node_announcement', signature=sign_msg(key, raw, 2 + 64), **fields)
+        node_anns.append(decode(raw))
+    return chan_anns, node_anns
+
+
+class LoopLag:
+    """Measures the longest time the asyncio loop did not run a ticker."""
+
+    def __init__(self):
+        self.max_lag = 0.0
+
+    async def run(self):
+        while True:
+            t0 = time.monotonic()
+            await asyncio.sleep(0.001)
+            self.max_lag = max(self.max_lag, time.monotonic() - t0)
+
+
+async def verify_inline(chan_anns, node_anns):
+    for payload in chan_anns:
+        assert verify_sigs_for_channel_announcement(payload)
+    for payload in node_anns:
+        assert verify_sig_for_node_announcement(payload)
+
+
+async def run(coro):
+    lag = LoopLag()
+    ticker = asyncio.ensure_future(lag.run())
+    await asyncio.sleep(0.01)
+    t0 = time.monotonic()
+    await coro
+    dt = time.monotonic() - t0
+    await asyncio.sleep(0.01)
+    ticker.cancel()
+    return dt, lag.max_lag
+
+
+def main():
+    num_channels = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    chan_anns, node_anns = make_gossip(num_channels)
+    num_messages = len(chan_anns) + len(node_anns)
+    loop = asyncio.get_event_loop()
+    dt, lag = loop.run_until_complete(run(verify_inline(chan_anns, node_anns)))
+    print(f"{'inline':10s}  {num_messages / dt:8.0f} msg/s  max loop lag {1000 * lag:8.1f} ms")
+    for num_workers in (1, 2, 4):
+        verifier = GossipVerifier(num_workers=num_workers)
+        try:
+            dt, lag = loop.run_until_complete(run(verifier.verify_announcements(chan_anns, node_anns)))
+        finally:
+            verifier.stop()
+        print(f"{num_workers:2d} workers  {num_messages / dt:8.0f} msg/s  max loop lag {1000 * lag:8.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+#
+# Benchmarks encode_msg and decode_msg of lnmsg for a few message types
+# that are frequent on the wire: gossip and channel state updates.
+#
+# usage: bench_lnmsg.py [num_iterations]
+
+import sys
+import time
+
+from electrum import constants
+from electrum.lnmsg import encode_msg, decode_msg
+
+
+MESSAGES = {
+    'channel_update': dict(
+        signature=bytes(64),
+        chain_hash=constants.net.rev_genesis_bytes(),
+        short_channel_id=bytes(range(8)),
+        timestamp=1600000000,
+        message_flags=b'\x01',
+        channel_flags=b'\x00',
+        cltv_expiry_delta=144,
+        htlc_minimum_msat=1000,
+        fee_base_msat=1000,
+        fee_proportional_millionths=100,
+        htlc_maximum_msat=1_000_000_000),
+    'channel_announcement': dict(
+        node_signature_1=bytes(64),
+        node_signature_2=bytes(64),
+        bitcoin_signature_1=bytes(64),
+        bitcoin_signature_2=bytes(64),
+        len=2,
+        features=b'\x01\x00',
+        chain_hash=constants.net.rev_genesis_bytes(),
+        short_channel_id=bytes(range(8)),
+        node_id_1=b'\x02' * 33,
+        node_id_2=b'\x03' * 33,
+        bitcoin_key_1=b'\x02' * 33,
+        bitcoin_key_2=b'\x03' * 33),
+    'node_announcement': dict(
+        signature=bytes(64),
+        flen=2,
+        features=(0x2200).to_bytes(2, 'big'),
+        timestamp=1600000000,
+        node_id=b'\x02' * 33,
+        rgb_color=b'\x00' * 3,
+        alias=b'node'.ljust(32, b'\x00'),
+        addrlen=7,
+        addresses=b'\x01\x0a\x00\x00\x01\x26\x07'),
+    'update_add_htlc': dict(
+        channel_id=bytes(32),
+        id=1,
+        amount_msat=1_000_000,
+        payment_hash=bytes(32),
+        cltv_expiry=700000,
+        onion_routing_packet=bytes(1366)),
+    'commitment_signed': dict(
+        channel_id=bytes(32),
+        signature=bytes(64),
+        num_htlcs=3,
+        htlc_signature=bytes(3 * 64)),
+    'init': dict(
+        gflen=0,
+        globalfeatures=b'',
+        flen=2,
+        features=(0x2200).to_bytes(2, 'big'),
+        init_tlvs={'networks': {'chains': constants.net.rev_genesis_bytes()}}),
+}
+
+
+def bench(f, num_iterations: int) -> float:
+    t0 = time.perf_counter()
+    for i in range(num_iterations):
+        f()
+    return (time.perf_counter() - t0) / num_iterations
+
+
+def main():
+    num_iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    total_encode, total_decode = 0.0, 0.0
+    for msg_type, fields in MESSAGES.items():
+        raw = encode_msg(msg_type, **fields)
+        assert decode_msg(raw)[0] == msg_type
+        dt_encode = bench(lambda: encode_msg(msg_type, **fields), num_iterations)
+        dt_decode = bench(lambda: decode_msg(raw), num_iterations)
+        total_encode += dt_encode
+        total_decode += dt_decode
+        print(f"{msg_type:22s}  encode {1e6 * dt_encode:6.2f} us  decode {1e6 * dt_decode:6.2f} us")
+    print(f"{'total':22s}  encode {1e6 * total_encode:6.2f} us  decode {1e6 * total_decode:6.2f} us")
+
+
+if __name__ == '__main__':
+    main()
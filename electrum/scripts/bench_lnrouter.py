@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+#
+# Benchmarks LNPathFinder.find_route on a synthetic gossip graph,
+# with a few hub nodes, similar in size to the public LN graph.
+#
+# usage: bench_lnrouter.py [num_nodes] [num_channels] [num_routes]
+
+import asyncio
+import random
+import shutil
+import sys
+import tempfile
+import time
+from typing import List, Tuple
+
+from electrum.channel_db import ChannelDB
+from electrum.lnrouter import LNPathFinder
+from electrum.simple_config import SimpleConfig
+
+
+def make_channel_db(electrum_path: str, num_nodes: int, num_channels: int) -> Tuple[ChannelDB, List[bytes]]:
+    rand = random.Random(42)
+    network = type('fake_network', (), {
+        'asyncio_loop': asyncio.get_event_loop(),
+        'config': SimpleConfig({'electrum_path': electrum_path}),
+    })()
+    channel_db = ChannelDB(network)
+    node_ids = [b'\x02' + rand.getrandbits(256).to_bytes(32, 'big') for i in range(num_nodes)]
+    hubs = node_ids[:max(1, num_nodes // 100)]
+    now = int(time.time())
+    for i in range(num_channels):
+        node1 = rand.choice(hubs) if rand.random() < 0.5 else rand.choice(node_ids)
+        node2 = rand.choice(node_ids)
+        if node1 == node2:
+            continue
+        node1, node2 = sorted([node1, node2])
+        scid = (100000 + i).to_bytes(3, 'big') + (1).to_bytes(3, 'big') + (0).to_bytes(2, 'big')
+        channel_db.add_verified_channel_info({
+            'short_channel_id': scid,
+            'node_id_1': node1,
+            'node_id_2': node2,
+            'features': b'',
+        }, capacity_sat=rand.randint(100_000, 10_000_000))
+        for direction in (0, 1):
+            if rand.random() < 0.05:
+                continue  # some channels only have one policy
+            channel_db.add_channel_update({
+                'short_channel_id': scid,
+                'timestamp': now - rand.randint(0, 1000),
+                'channel_flags': bytes([direction | (2 if rand.random() < 0.02 else 0)]),
+                'message_flags': b'\x01',
+                'cltv_expiry_delta': rand.choice([40, 144, 288]),
+                'htlc_minimum_msat': 1000,
+                'htlc_maximum_msat': 5_000_000_000,
+                'fee_base_msat': rand.choice([0, 1000]),
+                'fee_proportional_millionths': rand.randint(1, 2000),
+            }, verbose=False)
+    channel_db.data_loaded.set()
+    return channel_db, node_ids
+
+
+def main():
+    num_nodes = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    num_channels = int(sys.argv[2]) if len(sys.argv) > 2 else 40000
+    num_routes = int(sys.argv[3]) if len(sys.argv) > 3 else 20
+    electrum_path = tempfile.mkdtemp()
+    try:
+        t0 = time.monotonic()
+        channel_db, node_ids = make_channel_db(electrum_path, num_nodes, num_channels)
+        print(f"built graph: {num_nodes} nodes, {len(channel_db.get_channel_ids())} channels "
+              f"in {time.monotonic() - t0:.2f} s")
+        path_finder = LNPathFinder(channel_db)
+        rand = random.Random(1)
+        found = 0
+        times = []
+        for i in range(num_routes):
+            node_a, node_b = rand.sample(node_ids, 2)
+            t0 = time.monotonic()
+            route = path_finder.find_route(node_a, node_b, 100_000_000, my_channels={})
+            times.append(time.monotonic() - t0)
+            found += bool(route)
+        times.sort()
+        print(f"routes: {found}/{num_routes} found, median {1000 * times[len(times) // 2]:.1f} ms, "
+              f"mean {1000 * sum(times) / len(times):.1f} ms, max {1000 * times[-1]:.1f} ms")
+    finally:
+        shutil.rmtree(electrum_path)
+
+
+if __name__ == '__main__':
+    main()
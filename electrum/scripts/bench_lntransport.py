@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+#
+# Benchmarks the throughput of the BOLT-8 transport over a local socket
+# pair: messages are encrypted and sent one by one (send_bytes) or in
+# batches (send_messages), and decrypted on the other end by read_messages.
+#
+# usage: bench_lntransport.py [num_messages]
+
+import asyncio
+import os
+import socket
+import sys
+import time
+
+from electrum.lntransport import LNTransportBase
+from electrum.lnutil import LightningPeerConnectionClosed
+
+
+def make_transport(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> LNTransportBase:
+    transport = LNTransportBase()
+    transport.reader = reader
+    transport.writer = writer
+    transport.sk = transport.rk = bytes(range(32))
+    transport.init_counters(bytes(32))
+    return transport
+
+
+async def receive(transport: LNTransportBase, num_messages: int) -> int:
+    num_bytes = 0
+    try:
+        async for msg in transport.read_messages():
+            num_bytes += len(msg)
+            num_messages -= 1
+            if num_messages == 0:
+                break
+    except LightningPeerConnectionClosed:
+        pass
+    return num_bytes
+
+
+async def run(msgs, batch_size: int) -> float:
+    sock1, sock2 = socket.socketpair()
+    reader1, writer1 = await asyncio.open_connection(sock=sock1)
+    reader2, writer2 = await asyncio.open_connection(sock=sock2)
+    sender, receiver = make_transport(reader1, writer1), make_transport(reader2, writer2)
+    t0 = time.perf_counter()
+    receiving = asyncio.ensure_future(receive(receiver, len(msgs)))
+    for i in range(0, len(msgs), batch_size):
+        if batch_size == 1:
+            sender.send_bytes(msgs[i])
+        else:
+            sender.send_messages(msgs[i:i + batch_size])
+        await writer1.drain()
+    num_bytes = await receiving
+    dt = time.perf_counter() - t0
+    assert num_bytes == sum(len(msg) for msg in msgs)
+    writer1.close()
+    writer2.close()
+    return dt
+
+
+def main():
+    num_messages = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    loop = asyncio.get_event_loop()
+    # sizes typical for gossip, HTLC updates, and large replies
+    for msg_size in (150, 1500, 60000):
+        n = num_messages if msg_size < 60000 else num_messages // 20
+        msgs = [os.urandom(msg_size) for i in range(min(n, 100))] * (n // min(n, 100))
+        for batch_size in (1, 100):
+            dt = loop.run_until_complete(run(msgs, batch_size))
+            print(f"msg size {msg_size:5d}  batch {batch_size:3d}  "
+                  f"{len(msgs) / dt:8.0f} msg/s  {len(msgs) * msg_size / dt / 1e6:7.1f} MB/s")
+
+
+if __name__ == '__main__':
+    main()
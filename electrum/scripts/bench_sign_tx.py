@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+#
+# Benchmarks PartialTransaction.sign for transparent (p2pkh) Koto
+# transactions with a growing number of inputs.
+#
+# usage: bench_sign_tx.py [--workers N] [num_inputs ...]
+
+import sys
+import time
+
+from electrum import bitcoin
+from electrum.ecc import ECPrivkey
+from electrum.transaction import (PartialTransaction, PartialTxInput, PartialTxOutput, TxOutpoint,
+                                  shutdown_signing_executor)
+
+
+PRIVKEY = ECPrivkey(bytes([0x42] * 32))
+PUBKEY = PRIVKEY.get_public_key_bytes(compressed=True)
+ADDRESS = bitcoin.pubkey_to_address('p2pkh', PUBKEY.hex())
+
+
+def make_tx(num_inputs: int) -> PartialTransaction:
+    inputs = []
+    for i in range(num_inputs):
+        txin = PartialTxInput(prevout=TxOutpoint(i.to_bytes(32, 'big'), i % 4))
+        txin.script_type = 'p2pkh'
+        txin.pubkeys = [PUBKEY]
+        txin.num_sig = 1
+        txin._trusted_value_sats = 100000
+        inputs.append(txin)
+    outputs = [PartialTxOutput.from_address_and_value(ADDRESS, 50000 * num_inputs)]
+    return PartialTransaction.from_io(inputs, outputs, locktime=0)
+
+
+def main():
+    args = sys.argv[1:]
+    num_workers = 1
+    if args[:1] == ['--workers']:
+        num_workers = int(args[1])
+        args = args[2:]
+    sizes = [int(x) for x in args] or [1, 100, 1000]
+    keypairs = {PUBKEY.hex(): (PRIVKEY.get_secret_bytes(), True)}
+    try:
+        for num_inputs in sizes:
+            tx = make_tx(num_inputs)
+            t0 = time.monotonic()
+            tx.sign(keypairs, num_workers=num_workers)
+            dt = time.monotonic() - t0
+            assert tx.is_complete()
+            print(f"inputs={num_inputs:5d}  workers={num_workers}  {dt:8.3f} s  {1000 * dt / num_inputs:7.3f} ms/input")
+    finally:
+        shutdown_signing_executor()
+
+
+if __name__ == '__main__':
+    main()
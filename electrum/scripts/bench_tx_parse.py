@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+#
+# Micro-benchmark of transaction parsing: BCDataStream reads, raw tx
+# deserialization (v1, v2, overwinter and sapling txs) and PSBT parsing.
+#
+# The v1 and v2 txs are real network txs; the overwinter and sapling ones
+# are built and signed here, the latter with shielded spend/output sections.
+#
+# usage: bench_tx_parse.py [iterations]
+
+import sys
+import time
+
+from electrum import bitcoin
+from electrum.ecc import ECPrivkey
+from electrum.transaction import (Transaction, PartialTransaction, PartialTxInput, PartialTxOutput,
+                                  TxOutpoint, BCDataStream, KOTO_SAPLING_SPEND_SIZE,
+                                  KOTO_SAPLING_OUTPUT_SIZE)
+
+
+V1_TX = '01000000012a5c9a94fcde98f5581cd00162c60a13936ceb75389ea65bf38633b424eb4031000000006c493046022100a82bbc57a0136751e5433f41cf000b3f1a99c6744775e76ec764fb78c54ee100022100f9e80b7de89de861dc6fb0c1429d5da72c2b6b2ee2406bc9bfb1beedd729d985012102e61d176da16edd1d258a200ad9759ef63adf8e14cd97f53227bae35cdb84d2f6ffffffff0140420f00000000001976a914230ac37834073a42146f11ef8414ae929feaafc388ac00000000'
+V2_TX = '0200000001191601a44a81e061502b7bfbc6eaa1cef6d1e6af5308ef96c9342f71dbf4b9b5000000006b483045022100a6d44d0a651790a477e75334adfb8aae94d6612d01187b2c02526e340a7fd6c8022028bdf7a64a54906b13b145cd5dab21a26bd4b85d6044e9b97bceab5be44c2a9201210253e8e0254b0c95776786e40984c1aa32a7d03efa6bdacdea5f421b774917d346feffffff026b20fa04000000001976a914024db2e87dd7cfd0e5f266c5f212e21a31d805a588aca0860100000000001976a91421919b94ae5cefcdf0271191459157cdb41c4cbf88aca624070000'
+
+PRIVKEY = ECPrivkey(bytes([0x42] * 32))
+PUBKEY = PRIVKEY.get_public_key_bytes(compressed=True)
+ADDRESS = bitcoin.pubkey_to_address('p2pkh', PUBKEY.hex())
+
+
+def make_unsigned_tx(num_inputs: int, num_outputs: int) -> PartialTransaction:
+    inputs = []
+    for i in range(num_inputs):
+        txin = PartialTxInput(prevout=TxOutpoint(i.to_bytes(32, 'big'), i % 4))
+        txin.script_type = 'p2pkh'
+        txin.pubkeys = [PUBKEY]
+        txin.num_sig = 1
+        txin._trusted_value_sats = 100000
+        inputs.append(txin)
+    outputs = [PartialTxOutput.from_address_and_value(ADDRESS, 1000 + i) for i in range(num_outputs)]
+    return PartialTransaction.from_io(inputs, outputs, locktime=0)
+
+
+def sign(tx: PartialTransaction) -> bytes:
+    tx.sign({PUBKEY.hex(): (PRIVKEY.get_secret_bytes(), True)})
+    return tx.serialize_as_bytes()
+
+
+def make_corpus():
+    overwinter_tx = make_unsigned_tx(2, 2)
+    overwinter_tx.version = 3
+    overwinter_tx.saplinged = False
+    sapling_tx = sign(make_unsigned_tx(2, 2))
+    # replace the empty sapling section with one shielded spend and one shielded output
+    shielded_tx = (sapling_tx[:-11] + (-10000).to_bytes(8, 'little', signed=True)
+                   + b'\x01' + bytes(KOTO_SAPLING_SPEND_SIZE)
+                   + b'\x01' + bytes(KOTO_SAPLING_OUTPUT_SIZE)
+                   + b'\x00' + bytes(64))
+    return [
+        ('v1', bytes.fromhex(V1_TX)),
+        ('v2', bytes.fromhex(V2_TX)),
+        ('overwinter', sign(overwinter_tx)),
+        ('sapling', sapling_tx),
+        ('sapling-shielded', shielded_tx),
+        ('sapling-50in', sign(make_unsigned_tx(50, 2))),
+    ]
+
+
+def timeit(func, iterations: int, repeat: int = 5) -> float:
+    """Returns the best time per call over `repeat` rounds."""
+    best = None
+    for r in range(repeat):
+        t0 = time.perf_counter()
+        for i in range(iterations):
+            func()
+        dt = (time.perf_counter() - t0) / iterations
+        best = dt if best is None else min(best, dt)
+    return best
+
+
+def bench_datastream(iterations: int) -> None:
+    vds = BCDataStream()
+    for i in range(1000):
+        vds.write_compact_size(i * 70)
+        vds.write_uint32(i)
+        vds.write_int64(-i)
+        vds.write_bytes(b'\x00' * 32, 32)
+    raw = bytes(vds.input)
+
+    def read_all():
+        vds = BCDataStream()
+        vds.write(raw)
+        for i in range(1000):
+            vds.read_compact_size()
+            vds.read_uint32()
+            vds.read_int64()
+            vds.read_bytes(32)
+    dt = timeit(read_all, max(1, iterations // 10))
+    print(f"{'BCDataStream':18s}  {1e6 * dt / 4000:8.3f} us/read")
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    bench_datastream(iterations)
+    for name, raw in make_corpus():
+        raw_hex = raw.hex()
+
+        def parse():
+            tx = Transaction(raw_hex)
+            tx.inputs()
+            tx.outputs()
+            tx.txid()
+        dt = timeit(parse, iterations)
+        print(f"{name:18s}  {1e6 * dt:8.1f} us/tx  ({len(raw)} bytes)")
+    psbt = make_unsigned_tx(50, 2).serialize_as_bytes()
+    dt = timeit(lambda: PartialTransaction.from_raw_psbt(psbt), max(1, iterations // 10))
+    print(f"{'psbt-50in':18s}  {1e6 * dt:8.1f} us/tx  ({len(psbt)} bytes)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+#
+# Benchmarks the PoW hashing stage of Blockchain.verify_chunk,
+# serial vs spread over a process pool, for one full chunk of headers.
+#
+# usage: bench_verify_chunk.py [max_workers]
+
+import os
+import sys
+import time
+
+from electrum import blockchain
+from electrum.blockchain import deserialize_header
+from electrum.util import bfh
+
+
+# Koto block header #1334541 (sapling-sized); the chunk is made of copies with varying nonces.
+RAW_HEADER = "05000000a8c37bcbf4aa6697e617391eb8fa9d740797db313fc1516f45ee6f93ead10999b82ce3068a1012c894b780057a750847f133bbb705a51ed7d77ac077553d6fa66e47fc5eb9a71f1d00002f8ead6b998975bb4415209950812cd41f881f9fef0b51bec0a3b0b1e822d5850524"
+HEIGHT = 1334541
+CHUNK_SIZE = 2016
+
+
+def make_chunk():
+    template = deserialize_header(bfh(RAW_HEADER), HEIGHT)
+    headers = []
+    for i in range(CHUNK_SIZE):
+        header = dict(template)
+        header['nonce'] = i
+        headers.append(header)
+    return headers
+
+
+def main():
+    max_workers = int(sys.argv[1]) if len(sys.argv) > 1 else (os.cpu_count() or 1)
+    headers = make_chunk()
+    reference = None
+    workers = 1
+    while True:
+        # warm up the pool, so that process startup is not counted
+        blockchain.compute_pow_hashes(headers[:4 * workers], num_workers=workers)
+        t0 = time.monotonic()
+        result = blockchain.compute_pow_hashes(headers, num_workers=workers)
+        dt = time.monotonic() - t0
+        if reference is None:
+            reference = result
+        assert result == reference, "parallel result differs from serial result"
+        print(f"workers={workers:2d}  {dt:7.3f} s/chunk  {CHUNK_SIZE / dt:8.1f} headers/s")
+        if workers >= max_workers:
+            break
+        workers = min(2 * workers, max_workers)
+    blockchain.shutdown_pow_executor()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,476 @@
+# Copyright (C) 2026 The Electrum developers
+# Distributed under the MIT software license, see the accompanying
+# file LICENCE or http://www.opensource.org/licenses/mit-license.php
+#
+# A WalletDB that keeps the transaction-related tables of the wallet
+# (txi, txo, spent_outpoints, addr_history, verified_tx3, tx_fees,
+# prevouts_by_scripthash and transactions) in an SQLite database next to
+# the wallet file, instead of in the JSON. They are queried on demand,
+# so they do not need to be loaded into memory at startup.
+# Everything else stays in the (small) JSON wallet file.
+
+import json
+import os
+import sqlite3
+from typing import Optional, Sequence, Tuple, Dict, Iterable, List, Set, Union, TYPE_CHECKING
+
+from .json_db import StoredDict, locked, modifier
+from .transaction import Transaction, PartialTransaction, TxOutpoint, tx_from_any
+from .util import TxMinedInfo, WalletFileException, LRUCache
+from .wallet_db import WalletDB, TxFeesValue
+
+if TYPE_CHECKING:
+    from .storage import WalletStorage
+
+
+SQLITE_SUFFIX = '.sqlite'
+# JSON db key, set in wallets that use this backend
+SQLITE_TABLES_KEY = 'sqlite_tables'
+
+_TABLE_KEYS = ['txi', 'txo', 'spent_outpoints', 'addr_history', 'verified_tx3',
+               'tx_fees', 'prevouts_by_scripthash', 'transactions']
+
+_SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS txi (tx_hash TEXT NOT NULL, addr TEXT NOT NULL, prevout TEXT NOT NULL, value INTEGER NOT NULL, PRIMARY KEY (tx_hash, addr, prevout))",
+    "CREATE TABLE IF NOT EXISTS txo (tx_hash TEXT NOT NULL, addr TEXT NOT NULL, n INTEGER NOT NULL, value INTEGER NOT NULL, is_coinbase INTEGER NOT NULL, PRIMARY KEY (tx_hash, addr, n))",
+    "CREATE TABLE IF NOT EXISTS spent_outpoints (prevout_hash TEXT NOT NULL, prevout_n INTEGER NOT NULL, spending_txid TEXT NOT NULL, PRIMARY KEY (prevout_hash, prevout_n))",
+    "CREATE INDEX IF NOT EXISTS spent_outpoints_spending_txid ON spent_outpoints (spending_txid)",
+    "CREATE TABLE IF NOT EXISTS addr_history (addr TEXT PRIMARY KEY, history TEXT NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS verified_tx (txid TEXT PRIMARY KEY, height INTEGER, timestamp INTEGER, txpos INTEGER, header_hash TEXT)",
+    "CREATE TABLE IF NOT EXISTS tx_fees (txid TEXT PRIMARY KEY, fee INTEGER, is_calculated_by_us INTEGER NOT NULL, num_inputs INTEGER)",
+    "CREATE TABLE IF NOT EXISTS prevouts_by_scripthash (scripthash TEXT NOT NULL, prevout TEXT NOT NULL, value INTEGER NOT NULL, PRIMARY KEY (scripthash, prevout, value))",
+    "CREATE TABLE IF NOT EXISTS transactions (txid TEXT PRIMARY KEY, tx TEXT NOT NULL)",
+]
+
+# deserialized transactions we keep in memory
+TX_CACHE_SIZE = 1000
+
+# for INSERT ... ON CONFLICT DO UPDATE (upsert)
+MIN_SQLITE_VERSION = (3, 24, 0)
+
+
+def check_sqlite_version() -> None:
+    if sqlite3.sqlite_version_info < MIN_SQLITE_VERSION:
+        raise WalletFileException(
+            f'SQLite wallets need SQLite {".".join(map(str, MIN_SQLITE_VERSION))} or newer; '
+            f'this Python uses {sqlite3.sqlite_version}')
+
+
+def get_sqlite_path(wallet_path: str) -> str:
+    return wallet_path + SQLITE_SUFFIX
+
+
+class SqliteWalletDB(WalletDB):
+    """WalletDB with the transaction-related tables stored in SQLite.
+    Changes are committed when the db is written, together with the JSON part.
+    """
+
+    def __init__(self, raw, *, manual_upgrades: bool, sqlite_path: str):
+        self.sqlite_path = sqlite_path
+        self.conn = None  # type: Optional[sqlite3.Connection]
+        self._tx_cache = LRUCache(maxsize=TX_CACHE_SIZE)  # type: Dict[str, Transaction]
+        WalletDB.__init__(self, raw, manual_upgrades=manual_upgrades)
+
+    def _load_transactions(self):
+        self.data = StoredDict(self.data, self, [])
+        for key in _TABLE_KEYS:
+            if self.data.get(key):
+                raise WalletFileException(f'wallet file has both {key} and an SQLite database')
+        check_sqlite_version()
+        # all connection use is serialized by self.lock
+        self.conn = sqlite3.connect(self.sqlite_path, check_same_thread=False)
+        for statement in _SCHEMA:
+            self.conn.execute(statement)
+        # remove unreferenced tx
+        c = self.conn.execute("DELETE FROM transactions WHERE txid NOT IN (SELECT tx_hash FROM txi) "
+                              "AND txid NOT IN (SELECT tx_hash FROM txo)")
+        if c.rowcount:
+            self.logger.info(f"removed {c.rowcount} unreferenced txs")
+        # remove unreferenced outpoints
+        c = self.conn.execute("DELETE FROM spent_outpoints WHERE spending_txid NOT IN (SELECT txid FROM transactions)")
+        if c.rowcount:
+            self.logger.info(f"removed {c.rowcount} unreferenced spent outpoints")
+        self.conn.commit()
+
+    def _execute(self, sql: str, params: Sequence = ()) -> sqlite3.Cursor:
+        return self.conn.execute(sql, params)
+
+    def _column(self, sql: str, params: Sequence = ()) -> list:
+        return [row[0] for row in self.conn.execute(sql, params)]
+
+    def _exists(self, sql: str, params: Sequence = ()) -> bool:
+        return self.conn.execute(sql, params).fetchone() is not None
+
+    def _write(self, storage: 'WalletStorage', *, consolidate: bool = False):
+        if self.modified():
+            self.conn.commit()
+        WalletDB._write(self, storage, consolidate=consolidate)
+
+    def close(self):
+        with self.lock:
+            if self.conn:
+                self.conn.close()
+                self.conn = None
+
+    @locked
+    def get_txi_addresses(self, tx_hash: str) -> List[str]:
+        assert isinstance(tx_hash, str)
+        return self._column("SELECT addr FROM txi WHERE tx_hash=? GROUP BY addr ORDER BY MIN(rowid)", (tx_hash,))
+
+    @locked
+    def get_txo_addresses(self, tx_hash: str) -> List[str]:
+        assert isinstance(tx_hash, str)
+        return self._column("SELECT addr FROM txo WHERE tx_hash=? GROUP BY addr ORDER BY MIN(rowid)", (tx_hash,))
+
+    @locked
+    def get_txi_addr(self, tx_hash: str, address: str) -> Iterable[Tuple[str, int]]:
+        assert isinstance(tx_hash, str)
+        assert isinstance(address, str)
+        return list(self._execute("SELECT prevout, value FROM txi WHERE tx_hash=? AND addr=? ORDER BY rowid",
+                                  (tx_hash, address)))
+
+    @locked
+    def get_txo_addr(self, tx_hash: str, address: str) -> Dict[int, Tuple[int, bool]]:
+        assert isinstance(tx_hash, str)
+        assert isinstance(address, str)
+        rows = self._execute("SELECT n, value, is_coinbase FROM txo WHERE tx_hash=? AND addr=? ORDER BY rowid",
+                             (tx_hash, address))
+        return {n: (v, bool(cb)) for (n, v, cb) in rows}
+
+    @modifier
+    def add_txi_addr(self, tx_hash: str, addr: str, ser: str, v: int) -> None:
+        assert isinstance(tx_hash, str)
+        assert isinstance(addr, str)
+        assert isinstance(ser, str)
+        assert isinstance(v, int)
+        self._execute("INSERT INTO txi (tx_hash, addr, prevout, value) VALUES (?,?,?,?) "
+                      "ON CONFLICT (tx_hash, addr, prevout) DO UPDATE SET value=excluded.value",
+                      (tx_hash, addr, ser, v))
+
+    @modifier
+    def add_txo_addr(self, tx_hash: str, addr: str, n: Union[int, str], v: int, is_coinbase: bool) -> None:
+        n = int(n)
+        assert isinstance(tx_hash, str)
+        assert isinstance(addr, str)
+        assert isinstance(v, int)
+        assert isinstance(is_coinbase, bool)
+        self._execute("INSERT INTO txo (tx_hash, addr, n, value, is_coinbase) VALUES (?,?,?,?,?) "
+                      "ON CONFLICT (tx_hash, addr, n) DO UPDATE SET value=excluded.value, is_coinbase=excluded.is_coinbase",
+                      (tx_hash, addr, n, v, is_coinbase))
+
+    @locked
+    def list_txi(self) -> Sequence[str]:
+        return self._column("SELECT tx_hash FROM txi GROUP BY tx_hash ORDER BY MIN(rowid)")
+
+    @locked
+    def list_txo(self) -> Sequence[str]:
+        return self._column("SELECT tx_hash FROM txo GROUP BY tx_hash ORDER BY MIN(rowid)")
+
+    @modifier
+    def remove_txi(self, tx_hash: str) -> None:
+        assert isinstance(tx_hash, str)
+        self._execute("DELETE FROM txi WHERE tx_hash=?", (tx_hash,))
+
+    @modifier
+    def remove_txo(self, tx_hash: str) -> None:
+        assert isinstance(tx_hash, str)
+        self._execute("DELETE FROM txo WHERE tx_hash=?", (tx_hash,))
+
+    @locked
+    def list_spent_outpoints(self) -> Sequence[Tuple[str, str]]:
+        return [(h, str(n)) for (h, n) in self._execute(
+            "SELECT prevout_hash, prevout_n FROM spent_outpoints ORDER BY rowid")]
+
+    @locked
+    def get_spent_outpoints(self, prevout_hash: str) -> Sequence[str]:
+        assert isinstance(prevout_hash, str)
+        return [str(n) for n in self._column(
+            "SELECT prevout_n FROM spent_outpoints WHERE prevout_hash=? ORDER BY rowid", (prevout_hash,))]
+
+    @locked
+    def get_spent_outpoint(self, prevout_hash: str, prevout_n: Union[int, str]) -> Optional[str]:
+        assert isinstance(prevout_hash, str)
+        row = self._execute("SELECT spending_txid FROM spent_outpoints WHERE prevout_hash=? AND prevout_n=?",
+                            (prevout_hash, int(prevout_n))).fetchone()
+        return row[0] if row else None
+
+    @modifier
+    def remove_spent_outpoint(self, prevout_hash: str, prevout_n: Union[int, str]) -> None:
+        assert isinstance(prevout_hash, str)
+        self._execute("DELETE FROM spent_outpoints WHERE prevout_hash=? AND prevout_n=?",
+                      (prevout_hash, int(prevout_n)))
+
+    @modifier
+    def set_spent_outpoint(self, prevout_hash: str, prevout_n: Union[int, str], tx_hash: str) -> None:
+        assert isinstance(prevout_hash, str)
+        assert isinstance(tx_hash, str)
+        self._execute("INSERT INTO spent_outpoints (prevout_hash, prevout_n, spending_txid) VALUES (?,?,?) "
+                      "ON CONFLICT (prevout_hash, prevout_n) DO UPDATE SET spending_txid=excluded.spending_txid",
+                      (prevout_hash, int(prevout_n), tx_hash))
+
+    @modifier
+    def add_prevout_by_scripthash(self, scripthash: str, *, prevout: TxOutpoint, value: int) -> None:
+        assert isinstance(scripthash, str)
+        assert isinstance(prevout, TxOutpoint)
+        assert isinstance(value, int)
+        self._execute("INSERT OR IGNORE INTO prevouts_by_scripthash (scripthash, prevout, value) VALUES (?,?,?)",
+                      (scripthash, prevout.to_str(), value))
+
+    @modifier
+    def remove_prevout_by_scripthash(self, scripthash: str, *, prevout: TxOutpoint, value: int) -> None:
+        assert isinstance(scripthash, str)
+        assert isinstance(prevout, TxOutpoint)
+        assert isinstance(value, int)
+        self._execute("DELETE FROM prevouts_by_scripthash WHERE scripthash=? AND prevout=? AND value=?",
+                      (scripthash, prevout.to_str(), value))
+
+    @locked
+    def get_prevouts_by_scripthash(self, scripthash: str) -> Set[Tuple[TxOutpoint, int]]:
+        assert isinstance(scripthash, str)
+        rows = self._execute("SELECT prevout, value FROM prevouts_by_scripthash WHERE scripthash=?", (scripthash,))
+        return {(TxOutpoint.from_str(prevout), value) for prevout, value in rows}
+
+    @modifier
+    def add_transaction(self, tx_hash: str, tx: Transaction) -> None:
+        assert isinstance(tx_hash, str)
+        assert isinstance(tx, Transaction), tx
+        # note that tx might be a PartialTransaction
+        if not tx_hash:
+            raise Exception("trying to add tx to db without txid")
+        if tx_hash != tx.txid():
+            raise Exception(f"trying to add tx to db with inconsistent txid: {tx_hash} != {tx.txid()}")
+        # don't allow overwriting complete tx with partial tx
+        tx_we_already_have = self.get_transaction(tx_hash)
+        if tx_we_already_have is None or isinstance(tx_we_already_have, PartialTransaction):
+            self._execute("INSERT INTO transactions (txid, tx) VALUES (?,?) "
+                          "ON CONFLICT (txid) DO UPDATE SET tx=excluded.tx",
+                          (tx_hash, tx.serialize()))
+            self._tx_cache[tx_hash] = tx
+
+    @modifier
+    def remove_transaction(self, tx_hash: str) -> Optional[Transaction]:
+        assert isinstance(tx_hash, str)
+        tx = self.get_transaction(tx_hash)
+        if tx is not None:
+            self._execute("DELETE FROM transactions WHERE txid=?", (tx_hash,))
+            self._tx_cache.pop(tx_hash, None)
+        return tx
+
+    @locked
+    def get_transaction(self, tx_hash: Optional[str]) -> Optional[Transaction]:
+        if tx_hash is None:
+            return None
+        assert isinstance(tx_hash, str)
+        tx = self._tx_cache.get(tx_hash)
+        if tx is None:
+            row = self._execute("SELECT tx FROM transactions WHERE txid=?", (tx_hash,)).fetchone()
+            if row is None:
+                return None
+            # note: for performance, "deserialize=False" so that we will deserialize these on-demand
+            tx = tx_from_any(row[0], deserialize=False)
+            self._tx_cache[tx_hash] = tx
+        return tx
+
+    @locked
+    def list_transactions(self) -> Sequence[str]:
+        return self._column("SELECT txid FROM transactions ORDER BY rowid")
+
+    @locked
+    def get_history(self) -> Sequence[str]:
+        return self._column("SELECT addr FROM addr_history ORDER BY rowid")
+
+    @locked
+    def is_addr_in_history(self, addr: str) -> bool:
+        # does not mean history is non-empty!
+        assert isinstance(addr, str)
+        return self._exists("SELECT 1 FROM addr_history WHERE addr=?", (addr,))
+
+    @locked
+    def get_addr_history(self, addr: str) -> Sequence[Tuple[str, int]]:
+        assert isinstance(addr, str)
+        row = self._execute("SELECT history FROM addr_history WHERE addr=?", (addr,)).fetchone()
+        return json.loads(row[0]) if row else []
+
+    @modifier
+    def set_addr_history(self, addr: str, hist) -> None:
+        assert isinstance(addr, str)
+        self._execute("INSERT INTO addr_history (addr, history) VALUES (?,?) "
+                      "ON CONFLICT (addr) DO UPDATE SET history=excluded.history",
+                      (addr, json.dumps(hist)))
+
+    @modifier
+    def remove_addr_history(self, addr: str) -> None:
+        assert isinstance(addr, str)
+        self._execute("DELETE FROM addr_history WHERE addr=?", (addr,))
+
+    @locked
+    def list_verified_tx(self) -> Sequence[str]:
+        return self._column("SELECT txid FROM verified_tx ORDER BY rowid")
+
+    @locked
+    def get_verified_tx(self, txid: str) -> Optional[TxMinedInfo]:
+        assert isinstance(txid, str)
+        row = self._execute("SELECT height, timestamp, txpos, header_hash FROM verified_tx WHERE txid=?",
+                            (txid,)).fetchone()
+        if row is None:
+            return None
+        height, timestamp, txpos, header_hash = row
+        return TxMinedInfo(height=height,
+                           conf=None,
+                           timestamp=timestamp,
+                           txpos=txpos,
+                           header_hash=header_hash)
+
+    @modifier
+    def add_verified_tx(self, txid: str, info: TxMinedInfo):
+        assert isinstance(txid, str)
+        assert isinstance(info, TxMinedInfo)
+        self._execute("INSERT INTO verified_tx (txid, height, timestamp, txpos, header_hash) VALUES (?,?,?,?,?) "
+                      "ON CONFLICT (txid) DO UPDATE SET height=excluded.height, timestamp=excluded.timestamp, "
+                      "txpos=excluded.txpos, header_hash=excluded.header_hash",
+                      (txid, info.height, info.timestamp, info.txpos, info.header_hash))
+
+    @modifier
+    def remove_verified_tx(self, txid: str):
+        assert isinstance(txid, str)
+        self._execute("DELETE FROM verified_tx WHERE txid=?", (txid,))
+
+    @locked
+    def is_in_verified_tx(self, txid: str) -> bool:
+        assert isinstance(txid, str)
+        return self._exists("SELECT 1 FROM verified_tx WHERE txid=?", (txid,))
+
+    def _get_tx_fees_value(self, txid: str) -> Optional[TxFeesValue]:
+        row = self._execute("SELECT fee, is_calculated_by_us, num_inputs FROM tx_fees WHERE txid=?",
+                            (txid,)).fetchone()
+        if row is None:
+            return None
+        fee, is_calculated_by_us, num_inputs = row
+        return TxFeesValue(fee=fee, is_calculated_by_us=bool(is_calculated_by_us), num_inputs=num_inputs)
+
+    def _set_tx_fees_value(self, txid: str, value: TxFeesValue) -> None:
+        self._execute("INSERT INTO tx_fees (txid, fee, is_calculated_by_us, num_inputs) VALUES (?,?,?,?) "
+                      "ON CONFLICT (txid) DO UPDATE SET fee=excluded.fee, "
+                      "is_calculated_by_us=excluded.is_calculated_by_us, num_inputs=excluded.num_inputs",
+                      (txid, value.fee, value.is_calculated_by_us, value.num_inputs))
+
+    @modifier
+    def add_tx_fee_from_server(self, txid: str, fee_sat: Optional[int]) -> None:
+        assert isinstance(txid, str)
+        # note: when called with (fee_sat is None), rm currently saved value
+        tx_fees_value = self._get_tx_fees_value(txid) or TxFeesValue()
+        if tx_fees_value.is_calculated_by_us:
+            return
+        self._set_tx_fees_value(txid, tx_fees_value._replace(fee=fee_sat, is_calculated_by_us=False))
+
+    @modifier
+    def add_tx_fee_we_calculated(self, txid: str, fee_sat: Optional[int]) -> None:
+        assert isinstance(txid, str)
+        if fee_sat is None:
+            return
+        assert isinstance(fee_sat, int)
+        tx_fees_value = self._get_tx_fees_value(txid) or TxFeesValue()
+        self._set_tx_fees_value(txid, tx_fees_value._replace(fee=fee_sat, is_calculated_by_us=True))
+
+    @locked
+    def get_tx_fee(self, txid: str, *, trust_server: bool = False) -> Optional[int]:
+        assert isinstance(txid, str)
+        tx_fees_value = self._get_tx_fees_value(txid)
+        if tx_fees_value is None:
+            return None
+        if not trust_server and not tx_fees_value.is_calculated_by_us:
+            return None
+        return tx_fees_value.fee
+
+    @modifier
+    def add_num_inputs_to_tx(self, txid: str, num_inputs: int) -> None:
+        assert isinstance(txid, str)
+        assert isinstance(num_inputs, int)
+        tx_fees_value = self._get_tx_fees_value(txid) or TxFeesValue()
+        self._set_tx_fees_value(txid, tx_fees_value._replace(num_inputs=num_inputs))
+
+    @locked
+    def get_num_all_inputs_of_tx(self, txid: str) -> Optional[int]:
+        assert isinstance(txid, str)
+        tx_fees_value = self._get_tx_fees_value(txid)
+        if tx_fees_value is None:
+            return None
+        return tx_fees_value.num_inputs
+
+    @locked
+    def get_num_ismine_inputs_of_tx(self, txid: str) -> int:
+        assert isinstance(txid, str)
+        return self._execute("SELECT COUNT(*) FROM txi WHERE tx_hash=?", (txid,)).fetchone()[0]
+
+    @modifier
+    def remove_tx_fee(self, txid: str) -> None:
+        assert isinstance(txid, str)
+        self._execute("DELETE FROM tx_fees WHERE txid=?", (txid,))
+
+    @modifier
+    def clear_history(self):
+        for table in ['txi', 'txo', 'spent_outpoints', 'transactions', 'addr_history',
+                      'verified_tx', 'tx_fees', 'prevouts_by_scripthash']:
+            self._execute(f"DELETE FROM {table}")
+        self._tx_cache.clear()
+
+
+def convert_to_sqlite(storage: 'WalletStorage') -> int:
+    """Moves the transaction-related tables of the JSON wallet file of storage
+    (which must be decrypted) to a new SQLite database. Returns the number of txs moved.
+    """
+    if storage.is_encrypted():
+        # the SQLite database would hold the wallet history unencrypted
+        raise WalletFileException('cannot use SQLite for wallets with an encrypted file')
+    check_sqlite_version()
+    db = WalletDB(storage.read(), manual_upgrades=True)
+    if db.get(SQLITE_TABLES_KEY):
+        raise WalletFileException('wallet already uses SQLite')
+    if db.requires_split() or db.requires_upgrade():
+        raise WalletFileException('wallet file needs to be upgraded first')
+    sqlite_path = get_sqlite_path(storage.path)
+    if os.path.exists(sqlite_path):
+        raise WalletFileException(f'file already exists: {sqlite_path}')
+    conn = sqlite3.connect(sqlite_path)
+    try:
+        for statement in _SCHEMA:
+            conn.execute(statement)
+        conn.executemany(
+            "INSERT INTO txi (tx_hash, addr, prevout, value) VALUES (?,?,?,?)",
+            ((tx_hash, addr, ser, v)
+             for tx_hash, d in db.txi.items() for addr, d2 in d.items() for ser, v in d2.items()))
+        conn.executemany(
+            "INSERT INTO txo (tx_hash, addr, n, value, is_coinbase) VALUES (?,?,?,?,?)",
+            ((tx_hash, addr, int(n), v, bool(cb))
+             for tx_hash, d in db.txo.items() for addr, d2 in d.items() for n, (v, cb) in d2.items()))
+        conn.executemany(
+            "INSERT INTO spent_outpoints (prevout_hash, prevout_n, spending_txid) VALUES (?,?,?)",
+            ((h, int(n), txid) for h, d in db.spent_outpoints.items() for n, txid in d.items()))
+        conn.executemany(
+            "INSERT INTO addr_history (addr, history) VALUES (?,?)",
+            ((addr, json.dumps(hist)) for addr, hist in db.history.items()))
+        conn.executemany(
+            "INSERT INTO verified_tx (txid, height, timestamp, txpos, header_hash) VALUES (?,?,?,?,?)",
+            ((txid, *info) for txid, info in db.verified_tx.items()))
+        conn.executemany(
+            "INSERT INTO tx_fees (txid, fee, is_calculated_by_us, num_inputs) VALUES (?,?,?,?)",
+            ((txid, v.fee, v.is_calculated_by_us, v.num_inputs) for txid, v in db.tx_fees.items()))
+        conn.executemany(
+            "INSERT INTO prevouts_by_scripthash (scripthash, prevout, value) VALUES (?,?,?)",
+            ((sh, prevout, value) for sh, s in db._prevouts_by_scripthash.items() for prevout, value in s))
+        conn.executemany(
+            "INSERT INTO transactions (txid, tx) VALUES (?,?)",
+            ((txid, tx.serialize()) for txid, tx in db.transactions.items()))
+        conn.commit()
+    except BaseException:
+        conn.close()
+        os.unlink(sqlite_path)
+        raise
+    conn.close()
+    num_txs = len(db.transactions)
+    # only write the wallet file once the database is complete
+    for key in _TABLE_KEYS:
+        db.data.pop(key, None)
+    db.put(SQLITE_TABLES_KEY, True)
+    db.write(storage, consolidate=True)
+    return num_txs
@@ -35,6 +35,7 @@ from .util import (profiler, InvalidPassword, WalletFileException, bfh, standard
                    test_read_write_permissions)
 
 from .wallet_db import WalletDB
+from .json_db import split_journal
 from .logging import Logger
 
 
@@ -53,6 +54,11 @@ class StorageEncryptionVersion(IntEnum):
 class StorageReadWriteError(Exception): pass
 
 
+# the journal is consolidated into the full file once it gets larger than this
+# or than the full file
+JOURNAL_MIN_CONSOLIDATION_SIZE = 1_000_000
+
+
 # TODO: Rename to Storage
 class WalletStorage(Logger):
 
@@ -74,6 +80,13 @@ class WalletStorage(Logger):
         else:
             self.raw = ''
             self._encryption_version = StorageEncryptionVersion.PLAINTEXT
+        # sizes of the full db and of the journal appended to it
+        if self.is_encrypted():
+            pos = self.raw.find('\n')
+            self._snapshot_size = pos if pos != -1 else len(self.raw)
+        else:
+            self._snapshot_size = len(split_journal(self.raw)[0])
+        self._journal_size = len(self.raw) - self._snapshot_size
 
     def read(self):
         return self.decrypted if self.is_encrypted() else self.raw
@@ -97,8 +110,28 @@ class WalletStorage(Logger):
         os.replace(temp_path, self.path)
         os.chmod(self.path, mode)
         self._file_exists = True
+        self._snapshot_size = len(s)
+        self._journal_size = 0
         self.logger.info(f"saved {self.path}")
 
+    def append(self, data: str) -> None:
+        """Appends a journal record to the file.
+        If the storage is encrypted, the record is encrypted on its own."""
+        assert self.file_exists()
+        assert '\n' not in data
+        s = '\n' + self.encrypt_before_writing(data)
+        with open(self.path, "a", encoding='utf-8') as f:
+            f.write(s)
+            f.flush()
+            os.fsync(f.fileno())
+        self._journal_size += len(s)
+
+    def has_journal(self) -> bool:
+        return self._journal_size > 0
+
+    def should_consolidate(self) -> bool:
+        return self._journal_size > max(JOURNAL_MIN_CONSOLIDATION_SIZE, self._snapshot_size)
+
     def file_exists(self) -> bool:
         return self._file_exists
 
@@ -134,7 +167,8 @@ class WalletStorage(Logger):
 
     def _init_encryption_version(self):
         try:
-            magic = base64.b64decode(self.raw)[0:4]
+            # note: journal records might follow on the next lines
+            magic = base64.b64decode(self.raw.split('\n', 1)[0])[0:4]
             if magic == b'BIE1':
                 return StorageEncryptionVersion.USER_PASSWORD
             elif magic == b'BIE2':
@@ -165,8 +199,20 @@ class WalletStorage(Logger):
         ec_key = self.get_eckey_from_password(password)
         if self.raw:
             enc_magic = self._get_encryption_magic()
-            s = zlib.decompress(ec_key.decrypt_message(self.raw, enc_magic))
-            s = s.decode('utf8')
+            # the full db, followed by the journal records, each encrypted separately
+            lines = self.raw.split('\n')
+            parts = []
+            for i, line in enumerate(lines):
+                try:
+                    s = zlib.decompress(ec_key.decrypt_message(line, enc_magic))
+                except Exception:
+                    if i == 0 or i < len(lines) - 1:
+                        raise
+                    # we were probably interrupted while appending it
+                    self.logger.warning('ignoring truncated journal record')
+                    break
+                parts.append(s.decode('utf8'))
+            s = '\n'.join(parts)
         else:
             s = ''
         self.pubkey = ec_key.get_public_key_hex()
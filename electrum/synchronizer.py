@@ -24,7 +24,7 @@
 # SOFTWARE.
 import asyncio
 import hashlib
-from typing import Dict, List, TYPE_CHECKING, Tuple
+from typing import Dict, List, TYPE_CHECKING, Tuple, Sequence
 from collections import defaultdict
 import logging
 
@@ -42,6 +42,10 @@ if TYPE_CHECKING:
     from .address_synchronizer import AddressSynchronizer
 
 
+# max number of requests sent to the server as a single JSON-RPC batch
+DEFAULT_BATCH_SIZE = 100
+
+
 class SynchronizerFailure(Exception): pass
 
 
@@ -60,6 +64,7 @@ class SynchronizerBase(NetworkJobOnDefaultServer):
     """
     def __init__(self, network: 'Network'):
         self.asyncio_loop = network.asyncio_loop
+        self.batch_size = max(1, int(network.config.get('synchronizer_batch_size', DEFAULT_BATCH_SIZE)))
         self._reset_request_counters()
         NetworkJobOnDefaultServer.__init__(self, network)
 
@@ -86,6 +91,7 @@ class SynchronizerBase(NetworkJobOnDefaultServer):
     def _reset_request_counters(self):
         self._requests_sent = 0
         self._requests_answered = 0
+        self._batches_sent = 0
 
     def add(self, addr):
         asyncio.run_coroutine_threadsafe(self._add_address(addr), self.asyncio_loop)
@@ -100,34 +106,58 @@ class SynchronizerBase(NetworkJobOnDefaultServer):
         """Handle the change of the status of an address."""
         raise NotImplementedError()  # implemented by subclasses
 
+    async def _on_address_statuses(self, statuses: Sequence[Tuple[str, str]]):
+        """Handle a batch of status changes. Subclasses can override this
+        to process them together."""
+        for addr, status in statuses:
+            await self.taskgroup.spawn(self._on_address_status, addr, status)
+
+    async def _get_batch(self, queue: asyncio.Queue) -> list:
+        """Waits for an item of queue, and returns it together with
+        whatever else is already queued, up to batch_size items."""
+        items = [await queue.get()]
+        while len(items) < self.batch_size and not queue.empty():
+            items.append(queue.get_nowait())
+        return items
+
     async def send_subscriptions(self):
-        async def subscribe_to_address(addr):
-            h = address_to_scripthash(addr)
-            self.scripthash_to_address[h] = addr
-            self._requests_sent += 1
+        async def subscribe_to_addresses(addrs):
+            hashes = []
+            for addr in addrs:
+                h = address_to_scripthash(addr)
+                self.scripthash_to_address[h] = addr
+                hashes.append(h)
+            self._requests_sent += len(addrs)
+            self._batches_sent += 1
             try:
-                await self.session.subscribe('blockchain.scripthash.subscribe', [h], self.status_queue)
+                await self.session.subscribe_batch('blockchain.scripthash.subscribe',
+                                                   [[h] for h in hashes], self.status_queue)
             except RPCError as e:
                 if e.message == 'history too large':  # no unique error code
                     raise GracefulDisconnect(e, log_level=logging.ERROR) from e
                 raise
-            self._requests_answered += 1
-            self.requested_addrs.remove(addr)
+            self._requests_answered += len(addrs)
+            for addr in addrs:
+                self.requested_addrs.remove(addr)
 
         while True:
-            addr = await self.add_queue.get()
-            await self.taskgroup.spawn(subscribe_to_address, addr)
+            addrs = await self._get_batch(self.add_queue)
+            await self.taskgroup.spawn(subscribe_to_addresses, addrs)
 
     async def handle_status(self):
         while True:
-            h, status = await self.status_queue.get()
-            addr = self.scripthash_to_address[h]
-            await self.taskgroup.spawn(self._on_address_status, addr, status)
+            items = await self._get_batch(self.status_queue)
+            statuses = [(self.scripthash_to_address[h], status) for h, status in items]
+            await self.taskgroup.spawn(self._on_address_statuses, statuses)
             self._processed_some_notifications = True
 
     def num_requests_sent_and_answered(self) -> Tuple[int, int]:
         return self._requests_sent, self._requests_answered
 
+    def num_batches_sent(self) -> int:
+        """Number of requests/batches sent; compare with num_requests_sent_and_answered."""
+        return self._batches_sent
+
     async def main(self):
         raise NotImplementedError()  # implemented by subclasses
 
@@ -158,37 +188,52 @@ class Synchronizer(SynchronizerBase):
                 and not self.requested_tx)
 
     async def _on_address_status(self, addr, status):
-        history = self.wallet.db.get_addr_history(addr)
-        if history_status(history) == status:
-            return
-        if (addr, status) in self.requested_histories:
+        await self._on_address_statuses([(addr, status)])
+
+    async def _on_address_statuses(self, statuses):
+        to_request = []
+        for addr, status in statuses:
+            history = self.wallet.db.get_addr_history(addr)
+            if history_status(history) == status:
+                continue
+            if (addr, status) in self.requested_histories:
+                continue
+            self.requested_histories.add((addr, status))
+            to_request.append((addr, status))
+        if not to_request:
             return
-        # request address history
-        self.requested_histories.add((addr, status))
-        h = address_to_scripthash(addr)
-        self._requests_sent += 1
-        result = await self.interface.get_history_for_scripthash(h)
-        self._requests_answered += 1
-        self.logger.info(f"receiving history {addr} {len(result)}")
-        hashes = set(map(lambda item: item['tx_hash'], result))
-        hist = list(map(lambda item: (item['tx_hash'], item['height']), result))
-        # tx_fees
-        tx_fees = [(item['tx_hash'], item.get('fee')) for item in result]
-        tx_fees = dict(filter(lambda x:x[1] is not None, tx_fees))
-        # Check that txids are unique
-        if len(hashes) != len(result):
-            self.logger.info(f"error: server history has non-unique txids: {addr}")
-        # Check that the status corresponds to what was announced
-        elif history_status(hist) != status:
-            self.logger.info(f"error: status mismatch: {addr}")
-        else:
-            # Store received history
-            self.wallet.receive_history_callback(addr, hist, tx_fees)
-            # Request transactions we don't have
-            await self._request_missing_txs(hist)
-
-        # Remove request; this allows up_to_date to be True
-        self.requested_histories.discard((addr, status))
+        # request address histories
+        self._requests_sent += len(to_request)
+        self._batches_sent += 1
+        results = await self.interface.get_history_for_scripthashes(
+            [address_to_scripthash(addr) for addr, status in to_request])
+        self._requests_answered += len(to_request)
+        missing_txs = []
+        for (addr, status), result in zip(to_request, results):
+            if isinstance(result, Exception):
+                raise result
+            self.logger.info(f"receiving history {addr} {len(result)}")
+            hashes = set(map(lambda item: item['tx_hash'], result))
+            hist = list(map(lambda item: (item['tx_hash'], item['height']), result))
+            # tx_fees
+            tx_fees = [(item['tx_hash'], item.get('fee')) for item in result]
+            tx_fees = dict(filter(lambda x:x[1] is not None, tx_fees))
+            # Check that txids are unique
+            if len(hashes) != len(result):
+                self.logger.info(f"error: server history has non-unique txids: {addr}")
+            # Check that the status corresponds to what was announced
+            elif history_status(hist) != status:
+                self.logger.info(f"error: status mismatch: {addr}")
+            else:
+                # Store received history
+                self.wallet.receive_history_callback(addr, hist, tx_fees)
+                missing_txs.extend(hist)
+        # Request transactions we don't have
+        await self._request_missing_txs(missing_txs)
+
+        # Remove requests; this allows up_to_date to be True
+        for addr, status in to_request:
+            self.requested_histories.discard((addr, status))
 
     async def _request_missing_txs(self, hist, *, allow_server_not_finding_tx=False):
         # "hist" is a list of [tx_hash, tx_height] lists
@@ -203,29 +248,59 @@ class Synchronizer(SynchronizerBase):
             self.requested_tx[tx_hash] = tx_height
 
         if not transaction_hashes: return
+        # look in the tx cache shared with the other wallets first
+        tx_cache = self.wallet.get_tx_cache()
+        if tx_cache:
+            cached = await run_in_thread(tx_cache.get_txs, transaction_hashes)
+            for tx_hash, raw_tx in cached.items():
+                try:
+                    tx = Transaction(raw_tx)
+                    tx_ok = tx.txid() == tx_hash
+                except Exception:
+                    tx_ok = False
+                if not tx_ok:
+                    self.logger.info(f"dropping corrupt tx from tx cache: {tx_hash}")
+                    await run_in_thread(tx_cache.remove_tx, tx_hash)
+                    continue
+                self._receive_transaction(tx_hash, tx, len(raw_tx))
+            transaction_hashes = [tx_hash for tx_hash in transaction_hashes if tx_hash in self.requested_tx]
+        if not transaction_hashes: return
         async with TaskGroup() as group:
-            for tx_hash in transaction_hashes:
-                await group.spawn(self._get_transaction(tx_hash, allow_server_not_finding_tx=allow_server_not_finding_tx))
+            for i in range(0, len(transaction_hashes), self.batch_size):
+                await group.spawn(self._get_transactions(transaction_hashes[i:i+self.batch_size],
+                                                         allow_server_not_finding_tx=allow_server_not_finding_tx))
 
-    async def _get_transaction(self, tx_hash, *, allow_server_not_finding_tx=False):
-        self._requests_sent += 1
+    async def _get_transactions(self, tx_hashes, *, allow_server_not_finding_tx=False):
+        self._requests_sent += len(tx_hashes)
+        self._batches_sent += 1
         try:
-            raw_tx = await self.interface.get_transaction(tx_hash)
-        except RPCError as e:
-            # most likely, "No such mempool or blockchain transaction"
-            if allow_server_not_finding_tx:
-                self.requested_tx.pop(tx_hash)
-                return
-            else:
-                raise
+            raw_txs = await self.interface.get_transactions(tx_hashes)
         finally:
-            self._requests_answered += 1
-        tx = Transaction(raw_tx)
-        if tx_hash != tx.txid():
-            raise SynchronizerFailure(f"received tx does not match expected txid ({tx_hash} != {tx.txid()})")
+            self._requests_answered += len(tx_hashes)
+        received = {}
+        try:
+            for tx_hash, raw_tx in zip(tx_hashes, raw_txs):
+                if isinstance(raw_tx, RPCError):
+                    # most likely, "No such mempool or blockchain transaction"
+                    if allow_server_not_finding_tx:
+                        self.requested_tx.pop(tx_hash)
+                        continue
+                if isinstance(raw_tx, Exception):
+                    raise raw_tx
+                tx = Transaction(raw_tx)
+                if tx_hash != tx.txid():
+                    raise SynchronizerFailure(f"received tx does not match expected txid ({tx_hash} != {tx.txid()})")
+                self._receive_transaction(tx_hash, tx, len(raw_tx))
+                received[tx_hash] = raw_tx
+        finally:
+            tx_cache = self.wallet.get_tx_cache()
+            if received and tx_cache:
+                await run_in_thread(tx_cache.add_txs, received)
+
+    def _receive_transaction(self, tx_hash: str, tx: Transaction, size: int):
         tx_height = self.requested_tx.pop(tx_hash)
         self.wallet.receive_tx_callback(tx_hash, tx, tx_height)
-        self.logger.info(f"received tx {tx_hash} height: {tx_height} bytes: {len(raw_tx)}")
+        self.logger.info(f"received tx {tx_hash} height: {tx_height} bytes: {size}")
         # callbacks
         util.trigger_callback('new_transaction', self.wallet, tx)
 
@@ -250,6 +325,9 @@ class Synchronizer(SynchronizerBase):
                     or up_to_date and self._processed_some_notifications):
                 self._processed_some_notifications = False
                 if up_to_date:
+                    if self._batches_sent:
+                        self.logger.info(f"synchronized: {self._requests_sent} requests "
+                                         f"in {self._batches_sent} batches")
                     self._reset_request_counters()
                 self.wallet.set_up_to_date(up_to_date)
                 util.trigger_callback('wallet_updated', self.wallet)
@@ -301,6 +301,22 @@ class Test_bitcoin(ElectrumTestCase):
         self.assertEqual(bytes.fromhex('4a6cd75da76cedf0a8a47e3a5734a328'),
                          crypto.chacha20_poly1305_decrypt(key=key, nonce=nonce, data=data, associated_data=b''))
 
+    @needs_test_with_all_chacha20_implementations
+    def test_chacha20_poly1305_cipher(self):
+        key = bytes.fromhex('37326d9d69a83b815ddfd947d21b0dd39111e5b6a5a44042c44d570ea03e3179')
+        nonce = bytes.fromhex('010203040506070809101112')
+        associated_data = bytes.fromhex('30c9572d4305d4f3ccb766b1db884da6f1e0086f55136a39740700c272095717')
+        cipher = crypto.ChaCha20Poly1305Cipher(key)
+        for i in range(2):
+            self.assertEqual(bytes.fromhex('90fb51fcde1fbe4013500bd7a32280445d80ee21f0aa3acd30df72cf609de064'),
+                             cipher.encrypt(nonce=nonce, associated_data=associated_data,
+                                            data=bytes.fromhex('4a6cd75da76cedf0a8a47e3a5734a328')))
+            self.assertEqual(bytes.fromhex('4a6cd75da76cedf0a8a47e3a5734a328'),
+                             cipher.decrypt(nonce=nonce, data=bytes.fromhex('90fb51fcde1fbe4013500bd7a322804469c2be9b1385bc5ded5cd96be510280f')))
+        with self.assertRaises(ValueError):
+            cipher.decrypt(nonce=nonce, data=bytes.fromhex('90fb51fcde1fbe4013500bd7a322804469c2be9b1385bc5ded5cd96be510280f'),
+                           associated_data=associated_data)
+
     @needs_test_with_all_chacha20_implementations
     def test_chacha20_encrypt(self):
         key = bytes.fromhex('37326d9d69a83b815ddfd947d21b0dd39111e5b6a5a44042c44d570ea03e3179')
@@ -1,6 +1,7 @@
 import shutil
 import tempfile
 import os
+import random
 
 from electrum import constants, blockchain
 from electrum.simple_config import SimpleConfig
@@ -42,3 +43,265 @@ class TestVerifyHeader(ElectrumTestCase):
         with self.assertRaises(Exception):
             self.header["nonce"] = 100
             Blockchain.verify_header(self.header, self.prev_hash, self.target)
+
+    def test_valid_header_with_precomputed_powhash(self):
+        powhash = blockchain.pow_hash_header(self.header)
+        Blockchain.verify_header(self.header, self.prev_hash, self.target, powhash=powhash)
+        with self.assertRaises(Exception):
+            Blockchain.verify_header(self.header, self.prev_hash, self.target, powhash="ff" * 32)
+
+    def test_parallel_pow_hashes_match_serial(self):
+        headers = []
+        for nonce in range(8):
+            header = dict(self.header)
+            header['nonce'] = nonce
+            headers.append(header)
+        serial = [blockchain.pow_hash_header(header) for header in headers]
+        self.assertEqual(serial, blockchain.compute_pow_hashes(headers, num_workers=1))
+        try:
+            self.assertEqual(serial, blockchain.compute_pow_hashes(headers, num_workers=2))
+        finally:
+            blockchain.shutdown_pow_executor()
+
+
+class TestHeaderStore(ElectrumTestCase):
+
+    # header #1334541 with the sapling root cut off, so that it fits pre-sapling heights
+    raw_header = bfh("04000000" + TestVerifyHeader.valid_header[8:160])
+
+    def setUp(self):
+        super().setUp()
+        self.config = SimpleConfig({'electrum_path': self.electrum_path})
+        self.chain = Blockchain(config=self.config, forkpoint=0, parent=None,
+                                forkpoint_hash=constants.net.GENESIS, prev_hash=None)
+        open(self.chain.path(), 'wb').close()
+
+    def tearDown(self):
+        self.chain.close_headers_file()
+        super().tearDown()
+
+    def _raw_header_with_nonce(self, nonce: int) -> bytes:
+        return self.raw_header[:76] + nonce.to_bytes(4, byteorder='little')
+
+    def test_read_header(self):
+        data = b''.join(self._raw_header_with_nonce(i) for i in range(3))
+        self.chain.write(data, 0)
+        self.assertEqual(2, self.chain.height())
+        for height in range(3):
+            expected = deserialize_header(self._raw_header_with_nonce(height), height)
+            self.assertEqual(expected, self.chain.read_header(height))
+            # second read is served from the cache
+            self.assertEqual(expected, self.chain.read_header(height))
+        self.assertEqual(hash_header(deserialize_header(self._raw_header_with_nonce(2), 2)),
+                         self.chain.get_hash(2))
+        self.assertIsNone(self.chain.read_header(3))
+
+    def test_cached_header_is_not_shared(self):
+        self.chain.write(self._raw_header_with_nonce(0) + self._raw_header_with_nonce(1), 0)
+        header = self.chain.read_header(1)
+        header['nonce'] = 12345
+        self.assertEqual(1, self.chain.read_header(1)['nonce'])
+
+    def test_write_invalidates_cache(self):
+        self.chain.write(b''.join(self._raw_header_with_nonce(i) for i in range(3)), 0)
+        old_hash = self.chain.get_hash(2)
+        self.assertEqual(2, self.chain.read_header(2)['nonce'])
+        self.chain.write(self._raw_header_with_nonce(7), 2 * blockchain.HEADER_SIZE)
+        self.assertEqual(7, self.chain.read_header(2)['nonce'])
+        self.assertNotEqual(old_hash, self.chain.get_hash(2))
+        self.assertEqual(1, self.chain.read_header(1)['nonce'])
+        # truncating write
+        self.chain.write(self._raw_header_with_nonce(9), blockchain.HEADER_SIZE)
+        self.assertEqual(1, self.chain.height())
+        self.assertEqual(9, self.chain.read_header(1)['nonce'])
+        self.assertIsNone(self.chain.read_header(2))
+
+    def test_header_offset(self):
+        sapling_height = constants.net.SAPLING_HEIGHT
+        self.assertEqual(10 * blockchain.HEADER_SIZE, blockchain.header_offset(10))
+        self.assertEqual(sapling_height * blockchain.HEADER_SIZE,
+                         blockchain.header_offset(sapling_height))
+        self.assertEqual(sapling_height * blockchain.HEADER_SIZE + 2 * blockchain.HEADER_SIZE_SAPLING,
+                         blockchain.header_offset(sapling_height + 2))
+
+
+class TestDifficultyWindow(ElectrumTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.config = SimpleConfig({'electrum_path': self.electrum_path})
+        self.chain = Blockchain(config=self.config, forkpoint=0, parent=None,
+                                forkpoint_hash=constants.net.GENESIS, prev_hash=None)
+
+    def _make_headers(self, start_height: int, count: int) -> dict:
+        rng = random.Random(42)
+        headers = {}
+        timestamp = 1600000000
+        for height in range(start_height, start_height + count):
+            # timestamps are not monotonic, so that the medians matter
+            timestamp += rng.randint(-60, 180)
+            headers[height] = {
+                'version': 5,
+                'prev_block_hash': '00' * 32,
+                'merkle_root': '00' * 32,
+                'timestamp': timestamp,
+                'bits': rng.choice([0x1d1fa7b9, 0x1d300000, 0x1d0a1234, 0x1c7fffff]),
+                'nonce': height,
+                'finalsapling_root': '00' * 32,
+                'block_height': height,
+            }
+        return headers
+
+    def test_window_matches_get_target_koto(self):
+        start_height = len(constants.net.CHECKPOINTS) * 2016
+        headers = self._make_headers(start_height, 300)
+        window = blockchain.KotoDifficultyWindow()
+        for height in range(start_height, start_height + 300):
+            if height - 1 in headers:
+                self.assertEqual(self.chain.get_target_koto(height, headers),
+                                 self.chain.get_target_koto(height, headers, window=window),
+                                 msg=f"height {height}")
+            window.add_header(headers[height])
+        self.assertTrue(window.is_full())
+        self.assertIsNotNone(window.next_target())
+
+    def test_window_not_full(self):
+        window = blockchain.KotoDifficultyWindow()
+        for header in self._make_headers(1000, 27).values():
+            window.add_header(header)
+        self.assertFalse(window.is_full())
+        self.assertIsNone(window.next_target())
+
+    def test_window_rejects_gap(self):
+        headers = self._make_headers(1000, 3)
+        window = blockchain.KotoDifficultyWindow()
+        window.add_header(headers[1000])
+        with self.assertRaises(Exception):
+            window.add_header(headers[1002])
+
+    def test_get_difficulty_window_returns_copy(self):
+        headers = self._make_headers(0, 40)
+        for header in headers.values():
+            header['version'] = 4
+        open(self.chain.path(), 'wb').close()
+        self.chain.write(b''.join(bfh(blockchain.serialize_header(headers[h])) for h in range(35)), 0)
+        try:
+            window = self.chain.get_difficulty_window(30)
+            self.assertEqual(30, window.height)
+            # feeding the returned window does not change the chain's own one
+            window.add_header(headers[31])
+            self.assertEqual(31, window.height)
+            self.assertEqual(30, self.chain._difficulty_window.height)
+            self.assertEqual(30, self.chain.get_difficulty_window(30).height)
+            self.chain.set_difficulty_window(window)
+            self.assertIs(window, self.chain._difficulty_window)
+            self.assertEqual(window.next_target(), self.chain.get_difficulty_window(31).next_target())
+        finally:
+            self.chain.close_headers_file()
+
+
+class TestChainwork(ElectrumTestCase):
+
+    NUM_HEADERS = 2016 + 50
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.headers = []
+        prev_hash = '00' * 32
+        for height in range(cls.NUM_HEADERS):
+            header = {
+                'version': 4,
+                'prev_block_hash': prev_hash,
+                'merkle_root': '%064x' % height,
+                'timestamp': 1600000000 + 60 * height,
+                'bits': 0x1f07ffff if height % 2 else 0x1e0fffff,
+                'nonce': height,
+                'block_height': height,
+            }
+            prev_hash = hash_header(header)
+            cls.headers.append(header)
+        genesis = hash_header(cls.headers[0])
+        class Net(constants.KotoMainnet):
+            GENESIS = genesis
+            CHECKPOINTS = []
+        constants.net = Net
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        constants.set_mainnet()
+
+    def setUp(self):
+        super().setUp()
+        self.config = SimpleConfig({'electrum_path': self.electrum_path})
+        make_dir(os.path.join(self.electrum_path, 'forks'))
+        blockchain.load_chainwork_index(self.config)
+        self.chain = Blockchain(config=self.config, forkpoint=0, parent=None,
+                                forkpoint_hash=constants.net.GENESIS, prev_hash=None)
+        open(self.chain.path(), 'wb').close()
+        self.chain.update_size()
+
+    def tearDown(self):
+        self.chain.close_headers_file()
+        blockchain._chainwork_index_path = None
+        for block_hash in [h for h in blockchain._CHAINWORK_CACHE if h != '00' * 32]:
+            del blockchain._CHAINWORK_CACHE[block_hash]
+        super().tearDown()
+
+    def _expected_chainwork(self, height: int) -> int:
+        return sum(self.chain.chainwork_of_header_at_height(h) for h in range(height + 1))
+
+    def test_chainwork_is_memoized_and_persisted(self):
+        data = b''.join(bfh(blockchain.serialize_header(h)) for h in self.headers[:2016])
+        self.chain.save_chunk(0, data)
+        last_hash = hash_header(self.headers[2015])
+        chainwork = self._expected_chainwork(2015)
+        self.assertEqual(chainwork, blockchain._CHAINWORK_CACHE[last_hash])
+        self.assertEqual((2015, last_hash, chainwork), self.chain._chainwork_memo)
+        # the chunk boundary is read back from disk
+        del blockchain._CHAINWORK_CACHE[last_hash]
+        blockchain.load_chainwork_index(self.config)
+        self.assertEqual(chainwork, blockchain._CHAINWORK_CACHE[last_hash])
+        # appending headers extends the memo
+        for header in self.headers[2016:]:
+            self.chain.save_header(header)
+        self.assertEqual(self._expected_chainwork(self.NUM_HEADERS - 1), self.chain.get_chainwork())
+        self.assertEqual(self.NUM_HEADERS - 1, self.chain._chainwork_memo[0])
+        # earlier heights are still computed correctly
+        self.assertEqual(self._expected_chainwork(2020), self.chain.get_chainwork(2020))
+
+    def test_chainwork_index_is_compacted(self):
+        data = b''.join(bfh(blockchain.serialize_header(h)) for h in self.headers[:2016])
+        self.chain.save_chunk(0, data)
+        last_hash = hash_header(self.headers[2015])
+        chainwork = self._expected_chainwork(2015)
+        path = blockchain._chainwork_index_path
+        record_size = blockchain._CHAINWORK_INDEX_RECORD.size
+        # a record of a block we no longer have, and a partially written one
+        stale_hash = '11' * 32
+        blockchain._remember_chunk_chainwork(stale_hash, 12345)
+        with open(path, 'ab') as f:
+            f.write(b'\x00' * (record_size // 2))
+        self.assertEqual(2 * record_size + record_size // 2, os.path.getsize(path))
+        blockchain.blockchains[constants.net.GENESIS] = self.chain
+        try:
+            blockchain.compact_chainwork_index()
+        finally:
+            del blockchain.blockchains[constants.net.GENESIS]
+        self.assertEqual(record_size, os.path.getsize(path))
+        del blockchain._CHAINWORK_CACHE[last_hash]
+        del blockchain._CHAINWORK_CACHE[stale_hash]
+        blockchain.load_chainwork_index(self.config)
+        self.assertEqual(chainwork, blockchain._CHAINWORK_CACHE[last_hash])
+        self.assertNotIn(stale_hash, blockchain._CHAINWORK_CACHE)
+
+    def test_memo_is_invalidated_by_reorg(self):
+        data = b''.join(bfh(blockchain.serialize_header(h)) for h in self.headers[:30])
+        self.chain.write(data, 0)
+        self.assertEqual(self._expected_chainwork(29), self.chain.get_chainwork())
+        # replace the tip with a header of different difficulty
+        header = dict(self.headers[29])
+        header['bits'] = 0x1d0fffff
+        self.chain.write(bfh(blockchain.serialize_header(header)), 29 * blockchain.HEADER_SIZE)
+        self.assertEqual(self._expected_chainwork(29), self.chain.get_chainwork())
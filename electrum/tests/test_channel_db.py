@@ -0,0 +1,188 @@
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+
+from electrum import constants, util
+from electrum.channel_db import ChannelDB, RoutingGraph
+from electrum.lnmsg import encode_msg, decode_msg
+from electrum.simple_config import SimpleConfig
+from electrum.util import get_headers_dir
+
+from . import ElectrumTestCase
+
+
+NODE_IDS = [b'\x02' + bytes([i]) * 32 for i in range(1, 5)]
+NOW = int(time.time())
+
+
+def decoded(raw: bytes) -> dict:
+    payload = decode_msg(raw)[1]
+    payload['raw'] = raw
+    return payload
+
+
+def channel_announcement(scid: bytes, node1: bytes, node2: bytes, *, features: bytes = b'') -> dict:
+    return decoded(encode_msg(
+        'channel_announcement',
+        len=len(features),
+        features=features,
+        chain_hash=constants.net.rev_genesis_bytes(),
+        short_channel_id=scid,
+        node_id_1=node1,
+        node_id_2=node2,
+        bitcoin_key_1=node1,
+        bitcoin_key_2=node2))
+
+
+def channel_update(scid: bytes, direction: int, *, htlc_maximum_msat: int = None, disabled: bool = False) -> dict:
+    fields = {}
+    if htlc_maximum_msat is not None:
+        fields['htlc_maximum_msat'] = htlc_maximum_msat
+    return decoded(encode_msg(
+        'channel_update',
+        chain_hash=constants.net.rev_genesis_bytes(),
+        short_channel_id=scid,
+        timestamp=NOW - 100,
+        message_flags=b'\x01' if htlc_maximum_msat is not None else b'\x00',
+        channel_flags=bytes([direction | (2 if disabled else 0)]),
+        cltv_expiry_delta=144 + direction,
+        htlc_minimum_msat=1000,
+        fee_base_msat=1000 * direction,
+        fee_proportional_millionths=scid[0],
+        **fields))
+
+
+def node_announcement(node_id: bytes, alias: bytes) -> dict:
+    return decoded(encode_msg(
+        'node_announcement',
+        flen=2,
+        features=(0x2200).to_bytes(2, 'big'),
+        timestamp=NOW - 50,
+        node_id=node_id,
+        rgb_color=b'\x00' * 3,
+        alias=alias.ljust(32, b'\x00'),
+        addrlen=0,
+        addresses=b''))
+
+
+def graph_edges(graph: RoutingGraph) -> dict:
+    edges = {}
+    for c, scid in enumerate(graph.scids):
+        if scid is None:
+            continue
+        for e in (2 * c, 2 * c + 1):
+            edges[(scid, graph.node_ids[graph.edge_start[e]], graph.node_ids[graph.edge_end[e]])] = (
+                graph.capacity_sat[c], graph.has_policy[e], graph.disabled[e], graph.usable[e],
+                graph.fee_base_msat[e], graph.fee_proportional_millionths[e], graph.cltv_expiry_delta[e],
+                graph.htlc_minimum_msat[e], graph.htlc_maximum_msat[e])
+    return edges
+
+
+class TestChannelDBStorage(ElectrumTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.config = SimpleConfig({'electrum_path': self.electrum_path})
+        self.db_path = os.path.join(get_headers_dir(self.config), 'gossip_db')
+
+    def open_channel_db(self) -> ChannelDB:
+        loop = asyncio.new_event_loop()
+        threading.Thread(target=loop.run_forever, daemon=True).start()
+        while not loop.is_running():
+            time.sleep(0.001)
+        network = type('fake_network', (), {'asyncio_loop': loop, 'interface': None, 'config': self.config})()
+        return ChannelDB(network)
+
+    def close_channel_db(self, channel_db: ChannelDB) -> None:
+        while not channel_db.db_requests.empty():
+            time.sleep(0.01)
+        channel_db.asyncio_loop.call_soon_threadsafe(channel_db.asyncio_loop.stop)
+        channel_db.sql_thread.join()
+        util.unregister_callback(channel_db.ca_verifier._restart)
+
+    def load_channel_db(self) -> ChannelDB:
+        channel_db = self.open_channel_db()
+        channel_db.load_data()
+        while not channel_db.data_loaded.is_set():
+            time.sleep(0.001)
+        self.close_channel_db(channel_db)
+        return channel_db
+
+    def make_gossip(self):
+        chan_anns = [
+            channel_announcement(b'\x01' * 8, NODE_IDS[0], NODE_IDS[1]),
+            channel_announcement(b'\x02' * 8, NODE_IDS[1], NODE_IDS[2]),
+            channel_announcement(b'\x03' * 8, NODE_IDS[0], NODE_IDS[3]),
+        ]
+        chan_upds = [
+            channel_update(b'\x01' * 8, 0, htlc_maximum_msat=5_000_000_000),
+            channel_update(b'\x01' * 8, 1),
+            channel_update(b'\x02' * 8, 1, disabled=True),
+            # does not fit in an SQLite integer
+            channel_update(b'\x03' * 8, 0, htlc_maximum_msat=2**64 - 1),
+        ]
+        node_anns = [node_announcement(NODE_IDS[0], b'alice'), node_announcement(NODE_IDS[1], b'\xff')]
+        return chan_anns, chan_upds, node_anns
+
+    def fill_channel_db(self, chan_anns, chan_upds, node_anns) -> ChannelDB:
+        channel_db = self.open_channel_db()
+        channel_db.data_loaded.set()
+        channel_db.add_channel_announcement(chan_anns)
+        channel_db.add_channel_updates(chan_upds)
+        channel_db.add_node_announcement(node_anns)
+        self.close_channel_db(channel_db)
+        return channel_db
+
+    def assert_same_data(self, expected: ChannelDB, channel_db: ChannelDB) -> None:
+        self.assertEqual(expected._channels, channel_db._channels)
+        self.assertEqual(expected._policies, channel_db._policies)
+        self.assertEqual(expected._nodes, channel_db._nodes)
+        self.assertEqual(dict(expected._channels_for_node), dict(channel_db._channels_for_node))
+        self.assertEqual(expected.get_num_channels_partitioned_by_policy_count(),
+                         channel_db.get_num_channels_partitioned_by_policy_count())
+        self.assertEqual(graph_edges(expected.routing_graph), graph_edges(channel_db.routing_graph))
+
+    def test_save_and_load(self):
+        filled = self.fill_channel_db(*self.make_gossip())
+        self.assertEqual((0, 2, 1), filled.get_num_channels_partitioned_by_policy_count())
+        self.assertEqual('', filled._nodes[NODE_IDS[1]].alias)
+        loaded = self.load_channel_db()
+        self.assert_same_data(filled, loaded)
+        with sqlite3.connect(self.db_path) as conn:
+            # only the policy with the u64 value is decoded from msg
+            self.assertEqual([(b'\x03' * 8 + NODE_IDS[0],)],
+                             conn.execute("SELECT key FROM policy WHERE timestamp IS NULL").fetchall())
+
+    def test_load_old_database(self):
+        chan_anns, chan_upds, node_anns = self.make_gossip()
+        filled = self.fill_channel_db(chan_anns, chan_upds, node_anns)
+        os.remove(self.db_path)
+        # the schema of older versions, with only the raw messages
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("CREATE TABLE node_info (node_id BLOB(33), msg BLOB, PRIMARY KEY(node_id))")
+            conn.execute("CREATE TABLE policy (key BLOB(41), msg BLOB, PRIMARY KEY(key))")
+            conn.execute("CREATE TABLE channel_info (short_channel_id BLOB(8), msg BLOB, PRIMARY KEY(short_channel_id))")
+            for payload in chan_anns:
+                conn.execute("INSERT INTO channel_info VALUES (?,?)", (payload['short_channel_id'], payload['raw']))
+            for payload in chan_upds:
+                conn.execute("INSERT INTO policy VALUES (?,?)",
+                             (payload['short_channel_id'] + payload['start_node'], payload['raw']))
+            for payload in node_anns:
+                conn.execute("INSERT INTO node_info VALUES (?,?)", (payload['node_id'], payload['raw']))
+        loaded = self.load_channel_db()
+        self.assert_same_data(filled, loaded)
+        with sqlite3.connect(self.db_path) as conn:
+            self.assertEqual([], conn.execute("SELECT * FROM channel_info WHERE node1_id IS NULL").fetchall())
+            self.assertEqual([], conn.execute("SELECT * FROM node_info WHERE timestamp IS NULL").fetchall())
+            self.assertEqual(1, len(conn.execute("SELECT * FROM policy WHERE timestamp IS NULL").fetchall()))
+        # loading again uses the decoded columns
+        self.assert_same_data(filled, self.load_channel_db())
+
+    def test_unknown_features_are_not_loaded(self):
+        filled = self.fill_channel_db(*self.make_gossip())
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("UPDATE channel_info SET features=? WHERE short_channel_id=?", (b'\x01' + bytes(12), b'\x02' * 8))
+        loaded = self.load_channel_db()
+        self.assertEqual(set(filled._channels) - {b'\x02' * 8}, set(loaded._channels))
@@ -1,4 +1,10 @@
-from electrum.coinchooser import CoinChooserPrivacy
+from unittest import mock
+
+from electrum import bitcoin
+from electrum.coinchooser import CoinChooserPrivacy, CoinChooserBnB, PRNG, get_coin_chooser
+from electrum.simple_config import SimpleConfig
+from electrum.ecc import ECPrivkey
+from electrum.transaction import PartialTxInput, PartialTxOutput, TxOutpoint
 from electrum.util import NotEnoughFunds
 
 from . import ElectrumTestCase
@@ -6,6 +12,24 @@ from . import ElectrumTestCase
 
 class TestCoinChooser(ElectrumTestCase):
 
+    def _make_coins(self):
+        addresses = []
+        for i in range(4):
+            pubkey = ECPrivkey(bytes([i + 1]) * 32).get_public_key_bytes(compressed=True)
+            addresses.append((pubkey, bitcoin.pubkey_to_address('p2pkh', pubkey.hex())))
+        coins = []
+        for i in range(12):
+            pubkey, address = addresses[i % 4]
+            coin = PartialTxInput(prevout=TxOutpoint(bytes([i + 1]) * 32, 0))
+            coin._trusted_address = address
+            coin._trusted_value_sats = 1000000 * (i + 1)
+            coin.block_height = 100 + i
+            coin.script_type = 'p2pkh'
+            coin.pubkeys = [pubkey]
+            coin.num_sig = 1
+            coins.append(coin)
+        return coins, [address for pubkey, address in addresses]
+
     def test_bucket_candidates_with_empty_buckets(self):
         def sufficient_funds(buckets, *, bucket_value_sum):
             return True
@@ -18,3 +42,95 @@ class TestCoinChooser(ElectrumTestCase):
             coin_chooser.bucket_candidates_any([], sufficient_funds)
         with self.assertRaises(NotEnoughFunds):
             coin_chooser.bucket_candidates_prefer_confirmed([], sufficient_funds)
+
+    def test_prng_randint(self):
+        # reads big-endian bytes, as many as needed for the range
+        p = PRNG(b'x')
+        self.assertEqual([1, 113, 22, 117, 15492, 90748],
+                         [p.randint(0, n) for n in (2, 255, 256, 257, 70000, 1 << 24)])
+
+    def test_make_tx_privacy(self):
+        coins, addresses = self._make_coins()
+        coin_chooser = CoinChooserPrivacy(enable_output_value_rounding=False)
+        outputs = [PartialTxOutput.from_address_and_value('k112pHc1rbsM4fQDiyUFzkUdtdzr4AQBa2r', 5000000)]
+        construct_tx = coin_chooser._construct_tx_from_selected_buckets
+        with mock.patch.object(coin_chooser, '_construct_tx_from_selected_buckets',
+                               wraps=construct_tx) as mock_construct_tx:
+            tx = coin_chooser.make_tx(coins=coins, inputs=[], outputs=outputs,
+                                      change_addrs=addresses[:2],
+                                      fee_estimator_vb=lambda size: 10 * size,
+                                      dust_threshold=546)
+        # candidates are scored without constructing txs; only the winner is constructed
+        self.assertEqual(1, mock_construct_tx.call_count)
+        # all coins of the chosen address are spent
+        self.assertEqual([bytes([i + 1]) * 32 for i in (0, 4, 8)], [txin.prevout.txid for txin in tx.inputs()])
+        self.assertEqual([(addresses[1], 3994250),
+                          ('k112pHc1rbsM4fQDiyUFzkUdtdzr4AQBa2r', 5000000),
+                          (addresses[0], 6000000)],
+                         [(o.address, o.value) for o in tx.outputs()])
+        self.assertEqual(5750, tx.get_fee())
+
+    def test_make_tx_change_to_first_input_address(self):
+        coins, addresses = self._make_coins()
+        coin_chooser = CoinChooserPrivacy(enable_output_value_rounding=False)
+        outputs = [PartialTxOutput.from_address_and_value('k112pHc1rbsM4fQDiyUFzkUdtdzr4AQBa2r', 5000000)]
+        tx = coin_chooser.make_tx(coins=coins, inputs=[], outputs=outputs, change_addrs=[],
+                                  fee_estimator_vb=lambda size: 10 * size,
+                                  dust_threshold=546)
+        change_outputs = [o for o in tx.outputs() if o.address != 'k112pHc1rbsM4fQDiyUFzkUdtdzr4AQBa2r']
+        self.assertEqual([tx.inputs()[0].address], [o.address for o in change_outputs])
+        # also with inputs given by the caller, which need not come first after sorting
+        base_input = coins[-1]
+        coins = [coin for coin in coins if coin.address != base_input.address]
+        outputs = [PartialTxOutput.from_address_and_value('k112pHc1rbsM4fQDiyUFzkUdtdzr4AQBa2r', 20000000)]
+        tx = coin_chooser.make_tx(coins=coins, inputs=[base_input], outputs=outputs, change_addrs=[],
+                                  fee_estimator_vb=lambda size: 10 * size,
+                                  dust_threshold=546)
+        self.assertNotEqual(base_input.prevout, tx.inputs()[0].prevout)
+        self.assertNotEqual(base_input.address, tx.inputs()[0].address)
+        change_outputs = [o for o in tx.outputs() if o.address != 'k112pHc1rbsM4fQDiyUFzkUdtdzr4AQBa2r']
+        self.assertEqual([tx.inputs()[0].address], [o.address for o in change_outputs])
+
+    def test_make_tx_bnb_changeless(self):
+        coins, addresses = self._make_coins()
+        outputs = [PartialTxOutput.from_address_and_value('k112pHc1rbsM4fQDiyUFzkUdtdzr4AQBa2r', 17994000)]
+        kwargs = dict(coins=coins, inputs=[], outputs=outputs, change_addrs=addresses[:1],
+                      fee_estimator_vb=lambda size: 10 * size, dust_threshold=546)
+        # the 18 mBTC bucket of the second address leaves 930 sat over the fee, less than
+        # the cost of creating and spending a change output. It is spent without change.
+        tx = CoinChooserBnB(enable_output_value_rounding=False).make_tx(**kwargs)
+        self.assertEqual([bytes([i + 1]) * 32 for i in (1, 5, 9)], [txin.prevout.txid for txin in tx.inputs()])
+        self.assertEqual([('k112pHc1rbsM4fQDiyUFzkUdtdzr4AQBa2r', 17994000)],
+                         [(o.address, o.value) for o in tx.outputs()])
+        self.assertEqual(6000, tx.get_fee())
+        # Privacy creates change instead
+        tx = CoinChooserPrivacy(enable_output_value_rounding=False).make_tx(**kwargs)
+        self.assertEqual(2, len(tx.outputs()))
+
+    def test_make_tx_bnb_falls_back_to_privacy(self):
+        coins, addresses = self._make_coins()
+        for amount in (5000000, 17000000):
+            outputs = [PartialTxOutput.from_address_and_value('k112pHc1rbsM4fQDiyUFzkUdtdzr4AQBa2r', amount)]
+            kwargs = dict(coins=coins, inputs=[], outputs=outputs, change_addrs=addresses[:1],
+                          fee_estimator_vb=lambda size: 10 * size, dust_threshold=546)
+            tx1 = CoinChooserBnB(enable_output_value_rounding=False).make_tx(**kwargs)
+            tx2 = CoinChooserPrivacy(enable_output_value_rounding=False).make_tx(**kwargs)
+            self.assertEqual(2, len(tx1.outputs()))
+            self.assertEqual(tx2.serialize_as_bytes(), tx1.serialize_as_bytes())
+
+    def test_make_tx_bnb_search_limit(self):
+        coins, addresses = self._make_coins()
+        coin_chooser = CoinChooserBnB(enable_output_value_rounding=False, time_budget=0)
+        coin_chooser.max_tries = 1
+        outputs = [PartialTxOutput.from_address_and_value('k112pHc1rbsM4fQDiyUFzkUdtdzr4AQBa2r', 17994000)]
+        tx = coin_chooser.make_tx(coins=coins, inputs=[], outputs=outputs, change_addrs=addresses[:1],
+                                  fee_estimator_vb=lambda size: 10 * size, dust_threshold=546)
+        self.assertEqual(2, len(tx.outputs()))
+
+    def test_get_coin_chooser(self):
+        config = SimpleConfig({'electrum_path': self.electrum_path,
+                               'coin_chooser': 'BranchAndBound',
+                               'coin_chooser_bnb_time_budget': 2})
+        coin_chooser = get_coin_chooser(config)
+        self.assertIsInstance(coin_chooser, CoinChooserBnB)
+        self.assertEqual(2, coin_chooser.time_budget)
@@ -0,0 +1,141 @@
+import os
+from unittest import mock
+
+from electrum import constants, blockchain, header_snapshot
+from electrum.blockchain import Blockchain, hash_header, serialize_header
+from electrum.header_snapshot import SnapshotError
+from electrum.simple_config import SimpleConfig
+from electrum.util import bfh, make_dir
+
+from . import ElectrumTestCase
+
+
+def make_headers(count: int):
+    headers = []
+    prev_hash = '00' * 32
+    for height in range(count):
+        header = {
+            'version': 4,
+            'prev_block_hash': prev_hash,
+            'merkle_root': '%064x' % height,
+            'timestamp': 1600000000 + 60 * height,
+            'bits': 0x1f07ffff,
+            'nonce': height,
+            'block_height': height,
+        }
+        prev_hash = hash_header(header)
+        headers.append(header)
+    return headers
+
+
+class TestHeaderSnapshot(ElectrumTestCase):
+
+    NUM_HEADERS = 2016 + 100
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.headers = make_headers(cls.NUM_HEADERS)
+        genesis = hash_header(cls.headers[0])
+        class Net(constants.KotoRegtest):
+            GENESIS = genesis
+        constants.net = Net
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        constants.set_mainnet()
+
+    def _make_chain(self, name: str) -> Blockchain:
+        path = os.path.join(self.electrum_path, name)
+        make_dir(path)
+        config = SimpleConfig({'electrum_path': path})
+        chain = Blockchain(config=config, forkpoint=0, parent=None,
+                           forkpoint_hash=constants.net.GENESIS, prev_hash=None)
+        open(chain.path(), 'wb').close()
+        chain.update_size()
+        return chain
+
+    def _make_source_chain(self) -> Blockchain:
+        chain = self._make_chain('source')
+        chain.write(b''.join(bfh(serialize_header(h)) for h in self.headers), 0)
+        return chain
+
+    def _assert_same_chain(self, chain: Blockchain):
+        self.assertEqual(self.NUM_HEADERS - 1, chain.height())
+        for height in (1, 2015, 2016, self.NUM_HEADERS - 1):
+            self.assertEqual(hash_header(self.headers[height]), chain.get_hash(height))
+
+    def test_export_import_verified(self):
+        source = self._make_source_chain()
+        path = os.path.join(self.electrum_path, 'snapshot')
+        self.assertEqual(self.NUM_HEADERS, header_snapshot.export_snapshot(source, path))
+        target = self._make_chain('target')
+        self.assertEqual(self.NUM_HEADERS - 1, header_snapshot.import_snapshot(target, path))
+        self._assert_same_chain(target)
+        # importing again is a no-op
+        self.assertEqual(self.NUM_HEADERS - 1, header_snapshot.import_snapshot(target, path))
+
+    def test_export_import_trusted(self):
+        source = self._make_source_chain()
+        path = os.path.join(self.electrum_path, 'snapshot')
+        header_snapshot.export_snapshot(source, path)
+        target = self._make_chain('target')
+        header_snapshot.import_snapshot(target, path, trust_checkpoints=True)
+        self._assert_same_chain(target)
+
+    def test_corrupted_snapshot(self):
+        source = self._make_source_chain()
+        path = os.path.join(self.electrum_path, 'snapshot')
+        header_snapshot.export_snapshot(source, path)
+        with open(path, 'r+b') as f:
+            f.seek(200)
+            b = f.read(1)
+            f.seek(200)
+            f.write(bytes([b[0] ^ 1]))
+        with self.assertRaises(SnapshotError):
+            header_snapshot.read_snapshot(path)
+
+    def test_broken_links_are_rejected_in_trusted_mode(self):
+        source = self._make_source_chain()
+        # replace a header in the middle; its successor no longer links to it
+        bad = dict(self.headers[1000])
+        bad['nonce'] = 123456789
+        source.write(bfh(serialize_header(bad)), 1000 * blockchain.HEADER_SIZE, truncate=False)
+        path = os.path.join(self.electrum_path, 'snapshot')
+        header_snapshot.export_snapshot(source, path)
+        target = self._make_chain('target')
+        with self.assertRaises(SnapshotError):
+            header_snapshot.import_snapshot(target, path, trust_checkpoints=True)
+        with self.assertRaises(SnapshotError):
+            header_snapshot.import_snapshot(target, path)
+
+    def test_bad_metadata_is_rejected_in_trusted_mode(self):
+        source = self._make_source_chain()
+        path = os.path.join(self.electrum_path, 'snapshot')
+        header_snapshot.export_snapshot(source, path)
+        chunk = header_snapshot.read_snapshot(path)[0]
+        # a wrong last hash is caught before anything is saved
+        target = self._make_chain('target')
+        with mock.patch.object(header_snapshot, 'read_snapshot',
+                               return_value=[chunk._replace(last_hash='00' * 32)]):
+            with self.assertRaises(SnapshotError):
+                header_snapshot.import_snapshot(target, path, trust_checkpoints=True)
+        self.assertEqual(-1, target.height())
+        # so is a wrong chainwork; it is recomputed, not taken from the snapshot
+        with mock.patch.object(header_snapshot, 'read_snapshot',
+                               return_value=[chunk._replace(chainwork=chunk.chainwork + 1)]):
+            with self.assertRaises(SnapshotError):
+                header_snapshot.import_snapshot(target, path, trust_checkpoints=True)
+        self.assertEqual(-1, target.height())
+        # and the bogus value does not end up in the chainwork index
+        self.assertNotEqual(chunk.chainwork + 1, blockchain._CHAINWORK_CACHE.get(chunk.last_hash))
+
+    def test_chainwork_with_headers(self):
+        source = self._make_source_chain()
+        headers = self.headers[2016:]
+        with mock.patch.object(constants.net, 'TESTNET', False):
+            self.assertEqual(source.get_chainwork(self.NUM_HEADERS - 1),
+                             source.get_chainwork_with_headers(headers))
+            self.assertEqual(source.get_chainwork(2015),
+                             source.get_chainwork_with_headers(self.headers[:2016]))
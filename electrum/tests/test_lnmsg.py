@@ -0,0 +1,93 @@
+from electrum import constants
+from electrum.lnmsg import (encode_msg, decode_msg, OnionWireSerializer, UnexpectedEndOfStream,
+                            UnexpectedFieldSizeForEncoder, FieldEncodingNotMinimal)
+
+from . import ElectrumTestCase
+
+
+CHANNEL_UPDATE = dict(
+    signature=bytes(range(64)),
+    chain_hash=constants.net.rev_genesis_bytes(),
+    short_channel_id=bytes(range(8)),
+    timestamp=1600000000,
+    message_flags=b'\x01',
+    channel_flags=b'\x00',
+    cltv_expiry_delta=144,
+    htlc_minimum_msat=1000,
+    fee_base_msat=1000,
+    fee_proportional_millionths=100,
+)
+
+
+class TestLNMsg(ElectrumTestCase):
+
+    def test_channel_update(self):
+        raw = encode_msg('channel_update', **CHANNEL_UPDATE)
+        self.assertEqual(2 + 128, len(raw))
+        self.assertEqual(b'\x01\x02' + bytes(range(64)) + constants.net.rev_genesis_bytes() + bytes(range(8)),
+                         raw[:106])
+        self.assertEqual(('channel_update', CHANNEL_UPDATE), decode_msg(raw))
+        # optional trailing field
+        fields = dict(CHANNEL_UPDATE, htlc_maximum_msat=2**64 - 1)
+        raw = encode_msg('channel_update', **fields)
+        self.assertEqual(b'\xff' * 8, raw[-8:])
+        self.assertEqual(('channel_update', fields), decode_msg(raw))
+        # a truncated optional field is ignored
+        self.assertEqual(('channel_update', CHANNEL_UPDATE), decode_msg(raw[:-3]))
+        # bytes-like input
+        self.assertEqual(('channel_update', fields), decode_msg(memoryview(bytearray(raw))))
+
+    def test_truncated_msg(self):
+        raw = encode_msg('channel_update', **CHANNEL_UPDATE)
+        for i in range(2, len(raw)):
+            with self.assertRaises(UnexpectedEndOfStream):
+                decode_msg(raw[:i])
+
+    def test_variable_length_fields(self):
+        raw = encode_msg('commitment_signed',
+                         channel_id=bytes(32),
+                         signature=bytes(64),
+                         num_htlcs=2,
+                         htlc_signature=b'\x01' * 128)
+        msg_type, payload = decode_msg(raw)
+        self.assertEqual(2, payload['num_htlcs'])
+        self.assertEqual(b'\x01' * 128, payload['htlc_signature'])
+        with self.assertRaises(UnexpectedEndOfStream):
+            decode_msg(raw[:-1])
+        with self.assertRaises(UnexpectedFieldSizeForEncoder):
+            encode_msg('commitment_signed', num_htlcs=2, htlc_signature=b'\x01' * 64)
+
+    def test_encode_defaults_and_ints(self):
+        # missing mandatory fields default to zero, ints are accepted for bytes fields
+        raw = encode_msg('channel_update', short_channel_id=1, timestamp=1)
+        msg_type, payload = decode_msg(raw)
+        self.assertEqual(bytes(64), payload['signature'])
+        self.assertEqual(b'\x00' * 7 + b'\x01', payload['short_channel_id'])
+        self.assertEqual(1, payload['timestamp'])
+        self.assertEqual(0, payload['fee_base_msat'])
+        self.assertNotIn('htlc_maximum_msat', payload)
+        with self.assertRaises(UnexpectedFieldSizeForEncoder):
+            encode_msg('channel_update', **dict(CHANNEL_UPDATE, chain_hash=bytes(31)))
+        with self.assertRaises(OverflowError):
+            encode_msg('channel_update', **dict(CHANNEL_UPDATE, cltv_expiry_delta=2**16))
+        with self.assertRaises(KeyError):
+            encode_msg('no_such_msg')
+
+    def test_tlv_stream(self):
+        chains = constants.net.rev_genesis_bytes()
+        raw = encode_msg('init', gflen=0, flen=1, features=b'\x02',
+                         init_tlvs={'networks': {'chains': chains}})
+        self.assertEqual(('init', {'gflen': 0, 'globalfeatures': b'', 'flen': 1, 'features': b'\x02',
+                                   'init_tlvs': {'networks': {'chains': chains}}}),
+                         decode_msg(raw))
+        self.assertEqual({}, decode_msg(encode_msg('init', gflen=0, flen=0))[1]['init_tlvs'])
+
+    def test_onion_wire(self):
+        raw = OnionWireSerializer.encode_msg('amount_below_minimum', htlc_msat=1000, len=2, channel_update=b'\x01\x02')
+        self.assertEqual(('amount_below_minimum', {'htlc_msat': 1000, 'len': 2, 'channel_update': b'\x01\x02'}),
+                         OnionWireSerializer.decode_msg(raw))
+        raw = OnionWireSerializer.encode_msg('invalid_onion_payload', type=300, offset=5)
+        self.assertEqual(b'\xfd\x01\x2c\x00\x05', raw[2:])
+        self.assertEqual(('invalid_onion_payload', {'type': 300, 'offset': 5}), OnionWireSerializer.decode_msg(raw))
+        with self.assertRaises(FieldEncodingNotMinimal):
+            OnionWireSerializer.decode_msg(raw[:2] + b'\xfd\x00\x05\x00\x05')
@@ -0,0 +1,135 @@
+import asyncio
+import time
+from unittest import mock
+
+from electrum import util
+from electrum.channel_db import ChannelDB
+from electrum.lnrouter import LNPathFinder
+from electrum.lnutil import ShortChannelID
+from electrum.simple_config import SimpleConfig
+
+from . import ElectrumTestCase
+
+
+def node(character: str) -> bytes:
+    return b'\x02' + bytes(character, 'ascii') * 32
+
+
+def channel(number: int) -> ShortChannelID:
+    return ShortChannelID(bytes([number]) * 8)
+
+
+class Test_LNRouter(ElectrumTestCase):
+
+    def setUp(self):
+        super().setUp()
+        network = type('fake_network', (), {
+            'asyncio_loop': asyncio.get_event_loop(),
+            'config': SimpleConfig({'electrum_path': self.electrum_path}),
+        })()
+        self.cdb = ChannelDB(network)
+        self.cdb.data_loaded.set()
+        self.path_finder = LNPathFinder(self.cdb)
+        self.now = int(time.time()) - 100_000
+
+    def tearDown(self):
+        self.cdb.sql_thread.join()
+        util.unregister_callback(self.cdb.ca_verifier._restart)
+        super().tearDown()
+
+    def add_channel(self, scid: ShortChannelID, node1: bytes, node2: bytes, *, capacity_sat: int = 1_000_000) -> None:
+        assert node1 < node2
+        self.cdb.add_verified_channel_info({
+            'short_channel_id': scid,
+            'node_id_1': node1,
+            'node_id_2': node2,
+            'features': b'',
+        }, capacity_sat=capacity_sat)
+        self.add_policy(scid, 0)
+        self.add_policy(scid, 1)
+
+    def add_policy(self, scid: ShortChannelID, direction: int, *, fee_base_msat: int = 1000,
+                   disabled: bool = False) -> None:
+        self.now += 100
+        self.cdb.add_channel_update({
+            'short_channel_id': scid,
+            'timestamp': self.now,
+            'channel_flags': bytes([direction | (2 if disabled else 0)]),
+            'message_flags': b'\x00',
+            'cltv_expiry_delta': 40,
+            'htlc_minimum_msat': 1000,
+            'htlc_maximum_msat': None,
+            'fee_base_msat': fee_base_msat,
+            'fee_proportional_millionths': 1,
+        }, verbose=False)
+
+    def find_path(self, nodeA: bytes, nodeB: bytes, amount_msat: int = 100_000, **kwargs):
+        path = self.path_finder.find_path_for_payment(nodeA, nodeB, amount_msat, my_channels={}, **kwargs)
+        return [edge.short_channel_id for edge in path] if path else None
+
+    def add_graph(self) -> None:
+        # a - b - e, with b cheaper than c
+        #  \- c -/
+        #      \-- d (leaf)
+        self.add_channel(channel(1), node('a'), node('b'))
+        self.add_channel(channel(2), node('b'), node('e'))
+        self.add_channel(channel(3), node('a'), node('c'))
+        self.add_channel(channel(4), node('c'), node('e'))
+        self.add_channel(channel(5), node('c'), node('d'))
+        self.add_policy(channel(4), 0, fee_base_msat=5000)
+
+    def test_cheapest_path(self):
+        self.add_graph()
+        self.assertEqual([channel(1), channel(2)], self.find_path(node('a'), node('e')))
+        self.assertEqual([channel(3), channel(5)], self.find_path(node('a'), node('d')))
+        # the fee of the first hop is not paid
+        self.assertEqual([channel(2), channel(1)], self.find_path(node('e'), node('a')))
+        self.assertEqual(None, self.find_path(node('a'), node('f')))
+
+    def test_blacklist(self):
+        self.add_graph()
+        self.assertEqual([channel(3), channel(4)], self.find_path(node('a'), node('e'), blacklist={channel(2)}))
+        self.assertEqual(None, self.find_path(node('a'), node('e'), blacklist={channel(2), channel(4)}))
+
+    def test_policy_updates(self):
+        self.add_graph()
+        self.add_policy(channel(2), 0, fee_base_msat=10000)
+        self.assertEqual([channel(3), channel(4)], self.find_path(node('a'), node('e')))
+        self.add_policy(channel(2), 0, fee_base_msat=0)
+        self.assertEqual([channel(1), channel(2)], self.find_path(node('a'), node('e')))
+        self.add_policy(channel(2), 0, disabled=True)
+        self.assertEqual([channel(3), channel(4)], self.find_path(node('a'), node('e')))
+        # only the disabled direction is unusable
+        self.assertEqual([channel(2), channel(1)], self.find_path(node('e'), node('a')))
+        # channels need both policies
+        self.add_policy(channel(2), 0)
+        self.cdb.routing_graph.remove_policy(node('e'), channel(2))
+        self.assertEqual([channel(3), channel(4)], self.find_path(node('a'), node('e')))
+
+    def test_topology_changes(self):
+        self.add_graph()
+        self.cdb.remove_channel(channel(2))
+        self.assertEqual([channel(3), channel(4)], self.find_path(node('a'), node('e')))
+        # the free slot is reused
+        self.add_channel(channel(6), node('b'), node('e'))
+        self.assertEqual(len(self.cdb.routing_graph.scids), 5)
+        self.assertEqual([channel(1), channel(6)], self.find_path(node('a'), node('e')))
+        self.add_channel(channel(7), node('a'), node('e'))
+        self.assertEqual([channel(7)], self.find_path(node('a'), node('e')))
+
+    def test_topology_changes_during_path_finding(self):
+        self.add_graph()
+        graph = self.cdb.routing_graph
+        in_edges = graph.get_in_edges()
+        # the path finder runs in a thread: the graph may change after it got the adjacency
+        self.cdb.remove_channel(channel(2))
+        self.add_channel(channel(6), node('0'), node('e'))  # reuses the free slot, with a new node
+        with mock.patch.object(graph, 'get_in_edges', return_value=in_edges):
+            self.assertEqual([channel(3), channel(4)], self.find_path(node('a'), node('e')))
+
+    def test_capacity(self):
+        self.add_graph()
+        self.add_channel(channel(6), node('b'), node('d'), capacity_sat=100)
+        self.add_policy(channel(6), 0, fee_base_msat=0)
+        self.assertEqual([channel(1), channel(6)], self.find_path(node('a'), node('d'), 50_000))
+        self.assertEqual([channel(3), channel(5)], self.find_path(node('a'), node('d'), 500_000))
@@ -0,0 +1,130 @@
+import asyncio
+
+from electrum.ecc import ECPrivkey
+from electrum.lnutil import LNPeerAddr, LightningPeerConnectionClosed
+from electrum.lntransport import LNTransportBase, LNResponderTransport, LNTransport
+
+from . import ElectrumTestCase
+
+
+class MockWriter:
+
+    def __init__(self):
+        self.data = bytearray()
+
+    def write(self, data):
+        self.data += data
+
+
+class MockReader:
+
+    def __init__(self, data: bytes, chunk_size: int):
+        self.data = data
+        self.chunk_size = chunk_size
+        self.pos = 0
+
+    async def read(self, n):
+        s = self.data[self.pos:self.pos + min(n, self.chunk_size)]
+        self.pos += len(s)
+        return s
+
+
+def make_transport(reader=None, writer=None) -> LNTransportBase:
+    # keys after the handshake of the BOLT 8 test vectors
+    transport = LNTransportBase()
+    transport.reader = reader
+    transport.writer = writer
+    transport.sk = bytes.fromhex('969ab31b4d288cedf6218839b27a3e2140827047f2c0f01bf5c04435d43511a9')
+    transport.rk = transport.sk
+    transport.init_counters(bytes.fromhex('919219dbb2920afa8db80f9a51787a840bcf111ed8d588caf9ab4be716e42b01'))
+    return transport
+
+
+async def read_all(transport: LNTransportBase) -> list:
+    msgs = []
+    try:
+        async for msg in transport.read_messages():
+            msgs.append(msg)
+    except LightningPeerConnectionClosed:
+        pass
+    return msgs
+
+
+class TestLNTransport(ElectrumTestCase):
+
+    def run_coro(self, coro):
+        return asyncio.get_event_loop().run_until_complete(coro)
+
+    def test_encryption_test_vectors(self):
+        writer = MockWriter()
+        transport = make_transport(writer=writer)
+        frames = []
+        for i in range(1002):
+            transport.send_bytes(b'hello')
+            frames.append(bytes(writer.data))
+            writer.data.clear()
+        self.assertEqual('cf2b30ddf0cf3f80e7c35a6e6730b59fe802473180f396d88a8fb0db8cbcf25d2f214cf9ea1d95', frames[0].hex())
+        self.assertEqual('72887022101f0b6753e0c7de21657d35a4cb2a1f5cde2650528bbc8f837d0f0d7ad833b1a256a1', frames[1].hex())
+        self.assertEqual('178cb9d7387190fa34db9c2d50027d21793c9bc2d40b1e14dcf30ebeeeb220f48364f7a4c68bf8', frames[500].hex())
+        self.assertEqual('1b186c57d44eb6de4c057c49940d79bb838a145cb528d6e8fd26dbe50a60ca2c104b56b60e45bd', frames[501].hex())
+        self.assertEqual('4a2f3cc3b5e78ddb83dcb426d9863d9d9a723b0337c89dd0b005d89f8d3c05c52b76b29b740f09', frames[1000].hex())
+        self.assertEqual('2ecd8c8a5629d0d02ab457a0fdd0f7b90a192cd46be5ecb6ca570bfc5e268338b1a16cf4ef2d36', frames[1001].hex())
+        # batched sending produces the same stream
+        writer = MockWriter()
+        transport = make_transport(writer=writer)
+        transport.send_messages([b'hello'] * 1002)
+        self.assertEqual(b''.join(frames), writer.data)
+
+    def test_read_messages(self):
+        msgs = [bytes([i % 256]) * (i * 37 % 3000) for i in range(1500)] + [b'\x01' * 65535]
+        writer = MockWriter()
+        make_transport(writer=writer).send_messages(msgs)
+        for chunk_size in (1000, 2**20):
+            reader = MockReader(bytes(writer.data), chunk_size)
+            self.assertEqual(msgs, self.run_coro(read_all(make_transport(reader=reader))))
+        # frames split at every possible position
+        num_bytes = sum(18 + len(msg) + 16 for msg in msgs[:20])
+        for chunk_size in (1, 17):
+            reader = MockReader(bytes(writer.data[:num_bytes]), chunk_size)
+            self.assertEqual(msgs[:20], self.run_coro(read_all(make_transport(reader=reader))))
+        # a tampered message
+        data = bytearray(writer.data)
+        data[-1] ^= 1
+        with self.assertRaises(ValueError):
+            self.run_coro(read_all(make_transport(reader=MockReader(bytes(data), 2**20))))
+
+    def test_loop(self):
+        responder_key = ECPrivkey.generate_random_key()
+        initiator_key = ECPrivkey.generate_random_key()
+        msgs = [bytes([i % 256]) * (i * 101 % 5000) for i in range(300)]
+        server_shaked = asyncio.Event()
+        received = []
+
+        async def cb(reader, writer):
+            t = LNResponderTransport(responder_key.get_secret_bytes(), reader, writer)
+            self.assertEqual(await t.handshake(), initiator_key.get_public_key_bytes())
+            server_shaked.set()
+            async for msg in t.read_messages():
+                received.append(msg)
+                if len(received) == len(msgs):
+                    break
+            t.close()
+
+        async def f():
+            server = await asyncio.start_server(cb, '127.0.0.1', 0)
+            port = server.sockets[0].getsockname()[1]
+            peer_addr = LNPeerAddr('127.0.0.1', port, responder_key.get_public_key_bytes())
+            t = LNTransport(initiator_key.get_secret_bytes(), peer_addr, proxy=None)
+            await t.handshake()
+            await server_shaked.wait()
+            t.send_bytes(msgs[0])
+            t.send_messages(msgs[1:])
+            await t.writer.drain()
+            # the responder closes the connection after reading all messages
+            self.assertEqual([], await read_all(t))
+            t.close()
+            server.close()
+            await server.wait_closed()
+
+        self.run_coro(asyncio.wait_for(f(), 10))
+        self.assertEqual(msgs, received)
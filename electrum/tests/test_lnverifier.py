@@ -0,0 +1,140 @@
+import asyncio
+
+from electrum import constants
+from electrum.crypto import sha256d
+from electrum.ecc import ECPrivkey, sig_string_from_r_and_s
+from electrum.lnmsg import encode_msg, decode_msg
+from electrum.lnverifier import GossipVerifier
+from electrum.lnworker import LNGossip
+
+from . import ElectrumTestCase
+
+
+KEYS = [ECPrivkey(bytes([i + 1]) * 32) for i in range(4)]
+
+
+def sign_and_decode(msg_type: str, keys, sig_names, sig_offset: int, **fields) -> dict:
+    raw = encode_msg(msg_type, **fields)
+    h = sha256d(raw[sig_offset:])
+    sigs = {name: key.sign(h, sig_string_from_r_and_s) for key, name in zip(keys, sig_names)}
+    raw = encode_msg(msg_type, **sigs, **fields)
+    msg_type, payload = decode_msg(raw)
+    payload['raw'] = raw
+    return payload
+
+
+def make_channel_announcement(scid: bytes) -> dict:
+    node1, node2 = sorted(KEYS[:2], key=lambda key: key.get_public_key_bytes())
+    return sign_and_decode(
+        'channel_announcement', [node1, node2, KEYS[2], KEYS[3]],
+        ['node_signature_1', 'node_signature_2', 'bitcoin_signature_1', 'bitcoin_signature_2'], 2 + 256,
+        len=0,
+        features=b'',
+        chain_hash=constants.net.rev_genesis_bytes(),
+        short_channel_id=scid,
+        node_id_1=node1.get_public_key_bytes(),
+        node_id_2=node2.get_public_key_bytes(),
+        bitcoin_key_1=KEYS[2].get_public_key_bytes(),
+        bitcoin_key_2=KEYS[3].get_public_key_bytes())
+
+
+def make_node_announcement(key: ECPrivkey) -> dict:
+    return sign_and_decode(
+        'node_announcement', [key], ['signature'], 2 + 64,
+        flen=0,
+        features=b'',
+        timestamp=1600000000,
+        node_id=key.get_public_key_bytes(),
+        rgb_color=b'\x00' * 3,
+        alias=b'\x00' * 32,
+        addrlen=0,
+        addresses=b'')
+
+
+def make_channel_update(key: ECPrivkey, scid: bytes, direction: int) -> dict:
+    return sign_and_decode(
+        'channel_update', [key], ['signature'], 2 + 64,
+        chain_hash=constants.net.rev_genesis_bytes(),
+        short_channel_id=scid,
+        timestamp=1600000000,
+        message_flags=b'\x00',
+        channel_flags=bytes([direction]),
+        cltv_expiry_delta=144,
+        htlc_minimum_msat=1000,
+        fee_base_msat=1000,
+        fee_proportional_millionths=1)
+
+
+def tamper(payload: dict, field: str) -> dict:
+    sig = payload[field]
+    payload[field] = sig[:-1] + bytes([sig[-1] ^ 1])
+    return payload
+
+
+class MockChannelDB:
+
+    def __init__(self, channels):
+        self.channels = channels  # scid -> (node1_id, node2_id)
+
+    def get_start_node_of_channel_update(self, payload):
+        node_ids = self.channels.get(payload['short_channel_id'])
+        if node_ids is None:
+            return None
+        return node_ids[payload['channel_flags'][0] & 1]
+
+
+class TestGossipVerifier(ElectrumTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.verifier = GossipVerifier(num_workers=2)
+        self.verifier.CHUNK_SIZE = 3
+
+    def tearDown(self):
+        self.verifier.stop()
+        super().tearDown()
+
+    def run_coro(self, coro):
+        return asyncio.get_event_loop().run_until_complete(coro)
+
+    def test_verify_announcements(self):
+        chan_anns = [make_channel_announcement(bytes([i]) * 8) for i in range(7)]
+        node_anns = [make_node_announcement(key) for key in KEYS]
+        self.run_coro(self.verifier.verify_announcements(chan_anns, node_anns))
+        self.run_coro(self.verifier.verify_announcements([], []))
+        self.assertEqual(11, self.verifier.num_messages)
+        self.assertEqual(0, self.verifier.num_invalid)
+        self.assertTrue(self.verifier.get_messages_per_second() > 0)
+
+    def test_invalid_channel_announcement(self):
+        chan_anns = [make_channel_announcement(bytes([i]) * 8) for i in range(7)]
+        tamper(chan_anns[5], 'bitcoin_signature_2')
+        with self.assertRaises(Exception):
+            self.run_coro(self.verifier.verify_announcements(chan_anns, []))
+        self.assertEqual(1, self.verifier.num_invalid)
+
+    def test_invalid_node_announcement(self):
+        node_anns = [make_node_announcement(key) for key in KEYS]
+        node_anns[0]['raw'] = node_anns[0]['raw'][:-1] + b'\x01'
+        with self.assertRaises(Exception):
+            self.run_coro(self.verifier.verify_announcements([], node_anns))
+
+    def test_verify_channel_updates(self):
+        node1, node2 = KEYS[0], KEYS[1]
+        scid, unknown_scid = b'\x01' * 8, b'\x02' * 8
+        channel_db = MockChannelDB({scid: (node1.get_public_key_bytes(), node2.get_public_key_bytes())})
+        good = [make_channel_update(node1, scid, 0), make_channel_update(node2, scid, 1)]
+        wrong_signer = make_channel_update(node2, scid, 0)
+        wrong_sig = tamper(make_channel_update(node1, scid, 0), 'signature')
+        orphan = make_channel_update(node1, unknown_scid, 0)
+        chan_upds = [good[0], wrong_signer, orphan, wrong_sig, good[1]]
+        result = self.run_coro(self.verifier.verify_channel_updates(chan_upds, channel_db))
+        self.assertEqual([good[0], orphan, good[1]], result)
+        self.assertEqual(node2.get_public_key_bytes(), good[1]['start_node'])
+        self.assertEqual(4, self.verifier.num_messages)
+        self.assertEqual(2, self.verifier.num_invalid)
+
+    def test_stop_lngossip_that_never_started(self):
+        lngossip = LNGossip()
+        self.assertIsNone(lngossip.gossip_verifier)
+        lngossip.stop()
@@ -1,5 +1,6 @@
 import asyncio
 import tempfile
+import threading
 import unittest
 
 from electrum import constants
@@ -18,6 +19,8 @@ class MockTaskGroup:
 class MockNetwork:
     taskgroup = MockTaskGroup()
     asyncio_loop = asyncio.get_event_loop()
+    interfaces = {}
+    interfaces_lock = threading.Lock()
 
 class MockInterface(Interface):
     def __init__(self, config):
@@ -116,6 +119,47 @@ class TestNetwork(ElectrumTestCase):
         self.assertEqual(('catchup', 7), asyncio.get_event_loop().run_until_complete(ifa.sync_until(8, next_height=6)))
         self.assertEqual(self.interface.q.qsize(), 0)
 
+    def test_pipelined_catchup(self):
+        ifa = self.interface
+        ifa.tip = 5 * 2016 + 100
+        in_flight = set()
+        max_in_flight = 0
+        connected = []
+        async def mock_fetch_chunk(index, size):
+            nonlocal max_in_flight
+            in_flight.add(index)
+            max_in_flight = max(max_in_flight, len(in_flight))
+            self.assertIn(index, ifa._requested_chunks)
+            # a concurrent request for the same chunk returns early
+            self.assertIsNone(await ifa.request_chunk(index * 2016, can_return_early=True))
+            await asyncio.sleep(0.01 * (6 - index))  # later chunks arrive first
+            in_flight.discard(index)
+            return f"{index}:{size}"
+        def mock_connect_chunk(index, hexdata):
+            connected.append((index, hexdata))
+            return True
+        ifa._fetch_chunk = mock_fetch_chunk
+        ifa.blockchain.connect_chunk = mock_connect_chunk
+        self.assertEqual((True, ifa.tip + 1),
+                         asyncio.get_event_loop().run_until_complete(ifa.request_chunks(2016 + 5, ifa.tip)))
+        self.assertEqual([(1, "1:2016"), (2, "2:2016"), (3, "3:2016"), (4, "4:2016"), (5, "5:101")], connected)
+        self.assertGreater(max_in_flight, 1)
+        self.assertEqual(set(), ifa._requested_chunks)
+
+    def test_pipelined_catchup_stops_at_bad_chunk(self):
+        ifa = self.interface
+        ifa.tip = 5 * 2016 + 100
+        async def mock_fetch_chunk(index, size):
+            return str(index)
+        ifa._fetch_chunk = mock_fetch_chunk
+        ifa.blockchain.connect_chunk = lambda index, hexdata: index < 3
+        self.assertEqual((True, 3 * 2016),
+                         asyncio.get_event_loop().run_until_complete(ifa.request_chunks(2016, ifa.tip)))
+        ifa.blockchain.connect_chunk = lambda index, hexdata: False
+        self.assertEqual(False,
+                         asyncio.get_event_loop().run_until_complete(ifa.request_chunks(2016, ifa.tip))[0])
+        self.assertEqual(set(), ifa._requested_chunks)
+
 
 if __name__=="__main__":
     constants.set_regtest()
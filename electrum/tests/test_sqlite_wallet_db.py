@@ -0,0 +1,145 @@
+import os
+import sqlite3
+from unittest import mock
+
+from electrum.simple_config import SimpleConfig
+from electrum.storage import WalletStorage
+from electrum.wallet_db import WalletDB, TxFeesValue, open_wallet_db
+from electrum.sqlite_wallet_db import SqliteWalletDB, convert_to_sqlite, get_sqlite_path, SQLITE_TABLES_KEY
+from electrum.transaction import Transaction, TxOutpoint
+from electrum.util import TxMinedInfo, WalletFileException
+from electrum.wallet import Wallet, restore_wallet_from_text
+
+from . import ElectrumTestCase
+from .test_transaction import signed_blob
+
+
+ADDR1 = 'k1GceERXeDFM5Dz8umDPgCb7Yy9AG9amjdj'
+ADDR2 = 'k1Fhdcy8sY7XgJSLeMpcdyrsiEhjAaCeeAB'
+
+
+def fill_db(db, txid):
+    db.add_transaction(txid, Transaction(signed_blob))
+    db.add_txi_addr(txid, ADDR1, 'ab' * 32 + ':1', 1000)
+    db.add_txo_addr(txid, ADDR2, 0, 2000, False)
+    db.add_txo_addr(txid, ADDR2, '1', 3000, True)
+    db.set_spent_outpoint('ab' * 32, 1, txid)
+    db.set_addr_history(ADDR1, [(txid, 100)])
+    db.set_addr_history(ADDR2, [])
+    db.add_verified_tx(txid, TxMinedInfo(height=100, conf=None, timestamp=1234, txpos=2, header_hash='cd' * 32))
+    db.add_tx_fee_from_server(txid, 500)
+    db.add_num_inputs_to_tx(txid, 1)
+    db.add_prevout_by_scripthash('ef' * 32, prevout=TxOutpoint.from_str(txid + ':0'), value=2000)
+
+
+def dump_tables(db, txid):
+    return {
+        'txi_addresses': db.get_txi_addresses(txid),
+        'txo_addresses': db.get_txo_addresses(txid),
+        'txi_addr': db.get_txi_addr(txid, ADDR1),
+        'txo_addr': db.get_txo_addr(txid, ADDR2),
+        'list_txi': db.list_txi(),
+        'list_txo': db.list_txo(),
+        'spent_outpoints': db.list_spent_outpoints(),
+        'spent_outpoint': db.get_spent_outpoint('ab' * 32, '1'),
+        'history': db.get_history(),
+        'addr_history': [list(item) for item in db.get_addr_history(ADDR1)],
+        'in_history': (db.is_addr_in_history(ADDR2), db.is_addr_in_history('x')),
+        'verified_tx': db.get_verified_tx(txid),
+        'list_verified_tx': db.list_verified_tx(),
+        'fee': (db.get_tx_fee(txid), db.get_tx_fee(txid, trust_server=True)),
+        'num_inputs': (db.get_num_all_inputs_of_tx(txid), db.get_num_ismine_inputs_of_tx(txid)),
+        'prevouts': db.get_prevouts_by_scripthash('ef' * 32),
+        'transactions': db.list_transactions(),
+        'tx': db.get_transaction(txid).serialize(),
+    }
+
+
+class TestSqliteWalletDB(ElectrumTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.txid = Transaction(signed_blob).txid()
+        self.wallet_path = os.path.join(self.electrum_path, 'somewallet')
+
+    def _open_sqlite_db(self, raw=''):
+        return SqliteWalletDB(raw, manual_upgrades=False, sqlite_path=get_sqlite_path(self.wallet_path))
+
+    def test_same_results_as_json_db(self):
+        json_db = WalletDB('', manual_upgrades=False)
+        sqlite_db = self._open_sqlite_db()
+        fill_db(json_db, self.txid)
+        fill_db(sqlite_db, self.txid)
+        self.assertEqual(dump_tables(json_db, self.txid), dump_tables(sqlite_db, self.txid))
+        for db in (json_db, sqlite_db):
+            db.remove_spent_outpoint('ab' * 32, 1)
+            db.remove_verified_tx(self.txid)
+            db.add_tx_fee_we_calculated(self.txid, 600)
+            db.remove_prevout_by_scripthash('ef' * 32, prevout=TxOutpoint.from_str(self.txid + ':0'), value=2000)
+            db.remove_addr_history(ADDR2)
+        self.assertEqual(dump_tables(json_db, self.txid), dump_tables(sqlite_db, self.txid))
+        sqlite_db.clear_history()
+        self.assertEqual([], sqlite_db.list_transactions())
+        self.assertIsNone(sqlite_db.get_transaction(self.txid))
+        sqlite_db.close()
+
+    def test_tables_are_saved_on_write(self):
+        storage = WalletStorage(self.wallet_path)
+        db = self._open_sqlite_db()
+        db.put(SQLITE_TABLES_KEY, True)
+        fill_db(db, self.txid)
+        expected = dump_tables(db, self.txid)
+        db.write(storage)
+        db.close()
+        # the tables are not in the wallet file
+        with open(self.wallet_path, 'r') as f:
+            self.assertNotIn(self.txid, f.read())
+        db = open_wallet_db(WalletStorage(self.wallet_path), manual_upgrades=False)
+        self.assertIsInstance(db, SqliteWalletDB)
+        self.assertEqual(expected, dump_tables(db, self.txid))
+        db.close()
+
+    def test_convert_to_sqlite(self):
+        storage = WalletStorage(self.wallet_path)
+        db = WalletDB('', manual_upgrades=False)
+        fill_db(db, self.txid)
+        db.write(storage)
+        expected = dump_tables(WalletDB(WalletStorage(self.wallet_path).read(), manual_upgrades=False), self.txid)
+        self.assertIs(WalletDB, type(open_wallet_db(WalletStorage(self.wallet_path), manual_upgrades=False)))
+        self.assertEqual(1, convert_to_sqlite(WalletStorage(self.wallet_path)))
+        self.assertTrue(os.path.exists(get_sqlite_path(self.wallet_path)))
+        db = open_wallet_db(WalletStorage(self.wallet_path), manual_upgrades=False)
+        self.assertIsInstance(db, SqliteWalletDB)
+        self.assertEqual(expected, dump_tables(db, self.txid))
+        self.assertEqual(TxFeesValue(fee=500, is_calculated_by_us=False, num_inputs=1),
+                         db._get_tx_fees_value(self.txid))
+        db.close()
+        with self.assertRaises(WalletFileException):
+            convert_to_sqlite(WalletStorage(self.wallet_path))
+
+    def test_wallet_stop_closes_db(self):
+        config = SimpleConfig({'electrum_path': self.electrum_path})
+        wallet = restore_wallet_from_text(ADDR1, path=self.wallet_path, config=config)['wallet']
+        wallet.stop()
+        convert_to_sqlite(WalletStorage(self.wallet_path))
+        storage = WalletStorage(self.wallet_path)
+        db = open_wallet_db(storage, manual_upgrades=False)
+        self.assertIsInstance(db, SqliteWalletDB)
+        wallet = Wallet(db, storage, config=config)
+        self.assertEqual([ADDR1], wallet.get_addresses())
+        wallet.stop()
+        self.assertIsNone(db.conn)
+
+    def test_old_sqlite_is_refused(self):
+        storage = WalletStorage(self.wallet_path)
+        db = WalletDB('', manual_upgrades=False)
+        fill_db(db, self.txid)
+        db.write(storage)
+        with mock.patch.object(sqlite3, 'sqlite_version_info', (3, 22, 0)):
+            with self.assertRaises(WalletFileException):
+                convert_to_sqlite(WalletStorage(self.wallet_path))
+        self.assertFalse(os.path.exists(get_sqlite_path(self.wallet_path)))
+        convert_to_sqlite(WalletStorage(self.wallet_path))
+        with mock.patch.object(sqlite3, 'sqlite_version_info', (3, 22, 0)):
+            with self.assertRaises(WalletFileException):
+                open_wallet_db(WalletStorage(self.wallet_path), manual_upgrades=False)
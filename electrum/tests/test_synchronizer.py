@@ -0,0 +1,138 @@
+import asyncio
+import os
+
+from aiorpcx import RPCError
+
+from electrum.simple_config import SimpleConfig
+from electrum.synchronizer import Synchronizer, history_status
+from electrum.transaction import Transaction
+from electrum.tx_cache import TxCache
+from electrum.bitcoin import address_to_scripthash
+
+from . import ElectrumTestCase
+from .test_transaction import signed_blob
+
+
+ADDR1 = 'k1GceERXeDFM5Dz8umDPgCb7Yy9AG9amjdj'
+ADDR2 = 'k1Fhdcy8sY7XgJSLeMpcdyrsiEhjAaCeeAB'
+
+
+class MockInterface:
+
+    def __init__(self, histories, raw_txs):
+        self.histories = histories  # scripthash -> history
+        self.raw_txs = raw_txs  # txid -> raw tx
+        self.history_batches = []
+        self.tx_batches = []
+
+    async def get_history_for_scripthashes(self, shs):
+        self.history_batches.append(list(shs))
+        return [self.histories[sh] for sh in shs]
+
+    async def get_transactions(self, tx_hashes):
+        self.tx_batches.append(list(tx_hashes))
+        return [self.raw_txs.get(tx_hash) or RPCError(1, 'no such tx') for tx_hash in tx_hashes]
+
+
+class MockDB:
+
+    def get_addr_history(self, addr):
+        return []
+
+    def get_transaction(self, tx_hash):
+        return None
+
+
+class MockWallet:
+
+    def __init__(self, network):
+        self.network = network
+        self.db = MockDB()
+        self.received_histories = {}
+        self.received_txs = {}
+
+    def diagnostic_name(self):
+        return 'mockwallet'
+
+    def get_tx_cache(self):
+        return self.network.tx_cache
+
+    def receive_history_callback(self, addr, hist, tx_fees):
+        self.received_histories[addr] = hist
+
+    def receive_tx_callback(self, tx_hash, tx, tx_height):
+        self.received_txs[tx_hash] = tx_height
+
+
+class MockNetwork:
+
+    def __init__(self, config, loop):
+        self.config = config
+        self.asyncio_loop = loop
+        self.interface = None
+        self.tx_cache = None
+
+
+class TestSynchronizerBatching(ElectrumTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.loop = asyncio.get_event_loop()
+        config = SimpleConfig({'electrum_path': self.electrum_path, 'synchronizer_batch_size': 2})
+        self.wallet = MockWallet(MockNetwork(config, self.loop))
+        self.synchronizer = Synchronizer(self.wallet)
+        self.txid = Transaction(signed_blob).txid()
+        self.missing_txid = 'ab' * 32
+
+    def tearDown(self):
+        self.loop.run_until_complete(self.synchronizer.stop())
+        super().tearDown()
+
+    def test_histories_and_txs_are_batched(self):
+        hist1 = [{'tx_hash': self.txid, 'height': 100}]
+        hist2 = [{'tx_hash': self.txid, 'height': 100}, {'tx_hash': self.missing_txid, 'height': 101}]
+        interface = MockInterface(
+            histories={address_to_scripthash(ADDR1): hist1, address_to_scripthash(ADDR2): hist2},
+            raw_txs={self.txid: signed_blob})
+        self.synchronizer.interface = interface
+        status1 = history_status([(self.txid, 100)])
+        status2 = history_status([(self.txid, 100), (self.missing_txid, 101)])
+        with self.assertRaises(RPCError):
+            self.loop.run_until_complete(
+                self.synchronizer._on_address_statuses([(ADDR1, status1), (ADDR2, status2)]))
+        self.assertEqual([[address_to_scripthash(ADDR1), address_to_scripthash(ADDR2)]],
+                         interface.history_batches)
+        # each tx is only requested once, in a single batch
+        self.assertEqual([[self.txid, self.missing_txid]], interface.tx_batches)
+        self.assertEqual({self.txid: 100}, self.wallet.received_txs)
+        self.assertEqual((4, 4), self.synchronizer.num_requests_sent_and_answered())
+        self.assertEqual(2, self.synchronizer.num_batches_sent())
+
+    def test_missing_txs_are_split_by_batch_size(self):
+        interface = MockInterface(histories={}, raw_txs={self.txid: signed_blob})
+        self.synchronizer.interface = interface
+        hist = [(self.txid, 100)] + [('%064x' % i, 100) for i in range(3)]
+        self.loop.run_until_complete(
+            self.synchronizer._request_missing_txs(hist, allow_server_not_finding_tx=True))
+        self.assertEqual(2, len(interface.tx_batches))
+        self.assertEqual(sorted(tx_hash for tx_hash, height in hist),
+                         sorted(sum(interface.tx_batches, [])))
+        self.assertEqual({self.txid: 100}, self.wallet.received_txs)
+        self.assertEqual({}, self.synchronizer.requested_tx)
+
+    def test_tx_cache_is_used(self):
+        tx_cache = TxCache(os.path.join(self.electrum_path, 'tx_cache'), max_size=10**6)
+        self.wallet.network.tx_cache = tx_cache
+        try:
+            interface = MockInterface(histories={}, raw_txs={self.txid: signed_blob})
+            self.synchronizer.interface = interface
+            self.loop.run_until_complete(self.synchronizer._request_missing_txs([(self.txid, 100)]))
+            self.assertEqual([[self.txid]], interface.tx_batches)
+            self.assertEqual(signed_blob, tx_cache.get_tx(self.txid))
+            # another wallet gets it from the cache
+            self.wallet.received_txs.clear()
+            self.loop.run_until_complete(self.synchronizer._request_missing_txs([(self.txid, 100)]))
+            self.assertEqual([[self.txid]], interface.tx_batches)
+            self.assertEqual({self.txid: 100}, self.wallet.received_txs)
+        finally:
+            tx_cache.close()
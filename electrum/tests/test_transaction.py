@@ -1,10 +1,11 @@
 from typing import NamedTuple, Union
+from unittest import mock
 
 from electrum import transaction, bitcoin
 from electrum.transaction import (convert_raw_tx_to_hex, tx_from_any, Transaction,
                                   PartialTransaction, TxOutpoint, PartialTxInput,
                                   PartialTxOutput)
-from electrum.util import bh2u, bfh
+from electrum.util import bh2u, bfh, SpawnProcessPool
 from electrum.bitcoin import (deserialize_privkey, opcodes,
                               construct_script, construct_witness)
 from electrum.ecc import ECPrivkey
@@ -61,6 +62,8 @@ class TestBCDataStream(ElectrumTestCase):
         self.assertEqual(s.read_bytes(0), b'')
         self.assertEqual(s.read_bytes(1), b'r')
         self.assertEqual(s.read_bytes(0), b'')
+        s.write(b'baz')
+        self.assertEqual(s.read_bytes(3), b'baz')
 
     def test_bool(self):
         s = transaction.BCDataStream()
@@ -94,6 +97,140 @@ class TestTransaction(ElectrumTestCase):
         self.assertEqual(1000000, tx.outputs()[0].value)
         self.assertEqual(tx.serialize(), signed_blob)
 
+    def _make_unsigned_p2pkh_tx(self, privkey: ECPrivkey, num_inputs: int = 2) -> PartialTransaction:
+        pubkey = privkey.get_public_key_bytes(compressed=True)
+        inputs = []
+        for i in range(num_inputs):
+            txin = PartialTxInput(prevout=TxOutpoint(bytes([i + 1]) * 32, i))
+            txin.script_type = 'p2pkh'
+            txin.pubkeys = [pubkey]
+            txin.num_sig = 1
+            txin._trusted_value_sats = 100000
+            inputs.append(txin)
+        outputs = [PartialTxOutput.from_address_and_value('k112pHc1rbsM4fQDiyUFzkUdtdzr4AQBa2r', 150000)]
+        return PartialTransaction.from_io(inputs, outputs, locktime=0)
+
+    def test_sign_p2pkh_zip243_preimage(self):
+        privkey = ECPrivkey(bytes([0x42] * 32))
+        pubkey = privkey.get_public_key_bytes(compressed=True)
+        tx = self._make_unsigned_p2pkh_tx(privkey)
+        self.assertEqual('040000800ae52390964c12271bee0ef002207b24e006e2130643580cee8022a18776921dc6f32979c63f091e21503fc09c4a371601e6559ac026180991a098dbe9f4ac694cd089554c091ff96ba2da0404b5f4baa4ede75d5f1bfec78ea26e912672b368880fe3ba00000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000010000000202020202020202020202020202020202020202020202020202020202020202010000001976a91414db4138d56a2ecfb10881a9be394d9f321985b288aca086010000000000feffffff',
+                         tx.serialize_preimage(1))
+        shared_fields = tx._calc_zip243_shared_txdigest_fields()
+        for i in range(2):
+            self.assertEqual(bfh(tx.serialize_preimage(i)),
+                             tx.serialize_preimage_to_bytes(i, zip243_shared_txdigest_fields=shared_fields))
+        tx.sign({pubkey.hex(): (privkey.get_secret_bytes(), True)})
+        self.assertTrue(tx.is_complete())
+        self.assertEqual('5dac25bcead203ca52a122442f5f70dfe96bba9a0bfb88e672b5dc9424be2aee', tx.txid())
+
+    def test_parallel_sign_matches_serial(self):
+        privkey = ECPrivkey(bytes([0x42] * 32))
+        keypairs = {privkey.get_public_key_hex(compressed=True): (privkey.get_secret_bytes(), True)}
+        serial_tx = self._make_unsigned_p2pkh_tx(privkey, num_inputs=6)
+        serial_tx.sign(keypairs, num_workers=1)
+        self.assertTrue(serial_tx.is_complete())
+        parallel_tx = self._make_unsigned_p2pkh_tx(privkey, num_inputs=6)
+        try:
+            parallel_tx.sign(keypairs, num_workers=2)
+        finally:
+            transaction.shutdown_signing_executor()
+        self.assertTrue(parallel_tx.is_complete())
+        self.assertEqual(serial_tx.serialize(), parallel_tx.serialize())
+
+    def test_parallel_sign_falls_back_to_serial_once(self):
+        privkey = ECPrivkey(bytes([0x42] * 32))
+        keypairs = {privkey.get_public_key_hex(compressed=True): (privkey.get_secret_bytes(), True)}
+        serial_tx = self._make_unsigned_p2pkh_tx(privkey, num_inputs=6)
+        serial_tx.sign(keypairs, num_workers=1)
+        broken_executor = mock.Mock()
+        broken_executor.map.side_effect = OSError('broken pool')
+        with mock.patch.object(transaction, 'signing_pool', SpawnProcessPool('signing')), \
+                mock.patch('concurrent.futures.ProcessPoolExecutor', return_value=broken_executor):
+            for i in range(2):
+                tx = self._make_unsigned_p2pkh_tx(privkey, num_inputs=6)
+                tx.sign(keypairs, num_workers=2)
+                self.assertEqual(serial_tx.serialize(), tx.serialize())
+            self.assertEqual(1, broken_executor.map.call_count)
+
+    def test_txid_from_raw_bytes_matches_serialization(self):
+        privkey = ECPrivkey(bytes([0x42] * 32))
+        tx = self._make_unsigned_p2pkh_tx(privkey)
+        tx.sign({privkey.get_public_key_hex(compressed=True): (privkey.get_secret_bytes(), True)})
+        raw_bytes = tx.serialize_as_bytes()
+        for raw in (raw_bytes, raw_bytes.hex()):
+            tx2 = Transaction(raw)
+            self.assertEqual(tx.txid(), tx2.txid())
+            self.assertEqual(raw_bytes.hex(), tx2.serialize())
+            self.assertEqual(raw_bytes, tx2.serialize_as_bytes())
+            self.assertEqual(len(raw_bytes), tx2.estimated_total_size())
+            # the hex serialization is only computed once
+            self.assertIs(tx2.serialize(), tx2.serialize())
+        # after a modification, the txid is computed from the re-serialized tx
+        tx2.locktime = 1
+        self.assertNotEqual(tx.txid(), tx2.txid())
+        self.assertEqual(Transaction(tx2.serialize()).txid(), tx2.txid())
+
+    def test_deserialize_is_lazy(self):
+        tx = Transaction(signed_blob)
+        tx.deserialize()
+        self.assertIsNone(tx._inputs)
+        self.assertIsNone(tx._outputs)
+        self.assertEqual(1000000, tx.outputs()[0].value)
+        self.assertIsNone(tx._inputs)
+        self.assertEqual(4294967295, tx.inputs()[0].nsequence)
+        # inputs/outputs survive invalidating the raw tx
+        tx = Transaction(signed_blob)
+        tx.deserialize()
+        tx.locktime = 1
+        self.assertEqual(1, len(tx.inputs()))
+        self.assertEqual('k112pHc1rbsM4fQDiyUFzkUdtdzr4AQBa2r', tx.outputs()[0].address)
+        with self.assertRaises(AttributeError):
+            tx.inputs()[0].foo = 1
+        for bad_raw in (signed_blob + '00', signed_blob[:-2], signed_blob[:60]):
+            with self.assertRaises(transaction.SerializationError):
+                Transaction(bad_raw).deserialize()
+
+    def test_deserialize_sapling_shielded_spend(self):
+        privkey = ECPrivkey(bytes([0x42] * 32))
+        tx = self._make_unsigned_p2pkh_tx(privkey)
+        tx.sign({privkey.get_public_key_hex(compressed=True): (privkey.get_secret_bytes(), True)})
+        raw = tx.serialize_as_bytes()
+        # replace the empty sapling section with one shielded spend
+        value_balance = (-5000).to_bytes(8, 'little', signed=True)
+        spend = bytes(range(32)) + bytes(transaction.KOTO_SAPLING_SPEND_SIZE - 32)
+        raw = raw[:-11] + value_balance + b'\x01' + spend + b'\x00' + b'\x00' + bytes(64)
+        tx2 = Transaction(raw)
+        self.assertEqual(-5000, tx2.valueBalance())
+        self.assertEqual(2, len(tx2.inputs()))
+        self.assertEqual(1, len(tx2.shieldedSpend))
+        self.assertEqual(bytes(range(32)), tx2.shieldedSpend[0]['cv'])
+        self.assertEqual([], tx2.shieldedOutput)
+        self.assertIs(tx2.shieldedSpend, tx2.shieldedSpend)
+        self.assertEqual(bytes(64), tx2.bindingSig)
+        self.assertEqual(raw.hex(), tx2.serialize())
+        with self.assertRaises(transaction.SerializationError):
+            Transaction(raw[:-1]).deserialize()
+
+    def test_psbt_roundtrip(self):
+        privkey = ECPrivkey(bytes([0x42] * 32))
+        pubkey = privkey.get_public_key_bytes(compressed=True)
+        tx = self._make_unsigned_p2pkh_tx(privkey)
+        tx.inputs()[1].bip32_paths[pubkey] = (bfh('01020304'), [0, 1])
+        sig = tx.sign_txin(0, privkey.get_secret_bytes())
+        tx.add_signature_to_txin(txin_idx=0, signing_pubkey=pubkey.hex(), sig=sig)
+        self.assertFalse(tx.is_complete())
+        raw_psbt = tx.serialize_as_bytes()
+        tx2 = tx_from_any(raw_psbt)
+        self.assertEqual(tx.serialize(), tx2.serialize())
+        # the signed input got finalized
+        self.assertIsNotNone(tx2.inputs()[0].script_sig)
+        self.assertEqual(tx.inputs()[0].script_sig, tx2.inputs()[0].script_sig)
+        self.assertEqual((bfh('01020304'), [0, 1]), tx2.inputs()[1].bip32_paths[pubkey])
+        for bad_psbt in (raw_psbt[:-1], raw_psbt + b'\x00'):
+            with self.assertRaises(transaction.SerializationError):
+                PartialTransaction.from_raw_psbt(bad_psbt)
+
     def test_estimated_tx_size(self):
         tx = transaction.Transaction(signed_blob)
 
@@ -0,0 +1,56 @@
+import os
+
+from electrum.tx_cache import TxCache
+
+from . import ElectrumTestCase
+
+
+class TestTxCache(ElectrumTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.path = os.path.join(self.electrum_path, 'tx_cache')
+
+    def test_add_and_get(self):
+        cache = TxCache(self.path, max_size=10**6)
+        cache.add_txs({'00' * 32: 'aabb', '11' * 32: 'ccdd'})
+        self.assertEqual('aabb', cache.get_tx('00' * 32))
+        self.assertIsNone(cache.get_tx('22' * 32))
+        self.assertEqual({'11' * 32: 'ccdd'}, cache.get_txs(['11' * 32, '22' * 32]))
+        self.assertEqual(4, cache.total_size())
+        cache.remove_tx('00' * 32)
+        self.assertIsNone(cache.get_tx('00' * 32))
+        self.assertEqual(2, cache.total_size())
+        cache.close()
+        # persisted
+        cache = TxCache(self.path, max_size=10**6)
+        self.assertEqual('ccdd', cache.get_tx('11' * 32))
+        self.assertEqual(2, cache.total_size())
+        cache.close()
+
+    def test_least_recently_used_are_evicted(self):
+        cache = TxCache(self.path, max_size=1000)
+        txids = ['%064x' % i for i in range(10)]
+        for txid in txids:
+            cache.add_tx(txid, 'ff' * 100)
+        self.assertEqual(1000, cache.total_size())
+        cache.get_tx(txids[0])  # now the most recently used
+        cache.add_tx('%064x' % 10, 'ff' * 100)
+        self.assertLessEqual(cache.total_size(), 900)
+        self.assertIsNotNone(cache.get_tx(txids[0]))
+        self.assertIsNone(cache.get_tx(txids[1]))
+        self.assertIsNotNone(cache.get_tx('%064x' % 10))
+        cache.close()
+
+    def test_last_used_is_written_in_batches(self):
+        cache = TxCache(self.path, max_size=10**6)
+        cache.add_txs({'00' * 32: 'aabb', '11' * 32: 'ccdd'})
+        cache.get_tx('00' * 32)
+        last_used = cache.conn.execute("SELECT last_used FROM txs WHERE txid=?", (bytes(32),)).fetchone()[0]
+        self.assertEqual(1, last_used)
+        cache.close()
+        # pending updates are written on close
+        cache = TxCache(self.path, max_size=10**6)
+        last_used = cache.conn.execute("SELECT last_used FROM txs WHERE txid=?", (bytes(32),)).fetchone()[0]
+        self.assertEqual(3, last_used)
+        cache.close()
@@ -1,10 +1,11 @@
 from decimal import Decimal
+from unittest import mock
 
 from electrum.util import (format_satoshis, format_fee_satoshis, parse_URI,
                            is_hash256_str, chunks, is_ip_address, list_enabled_bits,
                            format_satoshis_plain, is_private_netaddress, is_hex_str,
                            is_integer, is_non_negative_integer, is_int_or_float,
-                           is_non_negative_int_or_float)
+                           is_non_negative_int_or_float, LRUCache, SpawnProcessPool)
 
 from . import ElectrumTestCase
 
@@ -219,6 +220,39 @@ class TestUtil(ElectrumTestCase):
         self.assertEqual((0, 2, 3, 6), list_enabled_bits(77))
         self.assertEqual((), list_enabled_bits(0))
 
+    def test_lru_cache(self):
+        cache = LRUCache(maxsize=2)
+        cache['a'] = 1
+        cache['b'] = 2
+        self.assertEqual(1, cache.get('a'))  # 'b' is now least recently used
+        cache['c'] = 3
+        self.assertEqual(['a', 'c'], list(cache))
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(5, cache.get('b', 5))
+
+    def test_spawn_process_pool(self):
+        pool = SpawnProcessPool('test')
+        try:
+            self.assertEqual([4, 9, 16], pool.map(pow, [2, 3, 4], [2] * 3, num_workers=2))
+        finally:
+            pool.shutdown()
+
+    def test_spawn_process_pool_failure(self):
+        broken_executor = mock.Mock()
+        broken_executor.map.side_effect = OSError('broken pool')
+        pool = SpawnProcessPool('test')
+        with mock.patch('concurrent.futures.ProcessPoolExecutor', return_value=broken_executor):
+            self.assertIsNone(pool.map(pow, [2, 3], [2, 2], num_workers=2))
+            # not retried
+            self.assertIsNone(pool.map(pow, [2, 3], [2, 2], num_workers=2))
+        self.assertEqual(1, broken_executor.map.call_count)
+        self.assertFalse(pool.is_usable())
+        # python < 3.7: ProcessPoolExecutor does not take mp_context
+        with mock.patch('sys.version_info', (3, 6, 1)):
+            pool = SpawnProcessPool('test')
+        self.assertFalse(pool.is_usable())
+        self.assertIsNone(pool.map(pow, [2, 3], [2, 2], num_workers=2))
+
     def test_is_ip_address(self):
         self.assertTrue(is_ip_address("127.0.0.1"))
         self.assertTrue(is_ip_address("127.000.000.1"))
@@ -5,17 +5,21 @@ import os
 import json
 from decimal import Decimal
 import time
+from unittest import mock
 
 from io import StringIO
-from electrum.storage import WalletStorage
+from electrum.storage import WalletStorage, StorageEncryptionVersion
 from electrum.wallet_db import FINAL_SEED_VERSION
 from electrum.wallet import (Abstract_Wallet, Standard_Wallet, create_new_wallet,
                              restore_wallet_from_text, Imported_Wallet, Wallet)
 from electrum.exchange_rate import ExchangeBase, FxThread
-from electrum.util import TxMinedInfo, InvalidPassword
+from electrum.util import TxMinedInfo, InvalidPassword, bfh
 from electrum.bitcoin import COIN
 from electrum.wallet_db import WalletDB
 from electrum.simple_config import SimpleConfig
+from electrum.transaction import (Transaction, PartialTransaction, PartialTxInput, PartialTxOutput,
+                                  TxOutpoint)
+from electrum.address_synchronizer import TX_HEIGHT_UNCONFIRMED
 
 from . import ElectrumTestCase
 
@@ -83,6 +87,60 @@ class TestWalletStorage(WalletTestCase):
         for key, value in some_dict.items():
             self.assertEqual(d[key], value)
 
+    def _write_with_journal(self, storage):
+        db = WalletDB('', manual_upgrades=True)
+        db.enable_journal()
+        db.put('a', 'b')
+        db.write(storage)  # first write is always a full write
+        self.assertFalse(storage.has_journal())
+        db.put('c', {'d': 1, 'e': [1, 2]})
+        db.write(storage)
+        db.get_dict('c')['d'] = 2
+        db.get_dict('c').pop('e')
+        db.put('a', None)
+        db.write(storage)
+        self.assertTrue(storage.has_journal())
+        return db
+
+    def test_journal(self):
+        storage = WalletStorage(self.wallet_path)
+        db = self._write_with_journal(storage)
+        with open(self.wallet_path, "r") as f:
+            self.assertEqual(2, f.read().count('\n['))
+        storage = WalletStorage(self.wallet_path)
+        self.assertTrue(storage.has_journal())
+        db2 = WalletDB(storage.read(), manual_upgrades=True)
+        self.assertIsNone(db2.get('a'))
+        self.assertEqual({'d': 2}, db2.get('c'))
+        self.assertEqual(db.dump(), db2.dump())
+        # consolidation leaves a plain json file
+        db2.write(storage, consolidate=True)
+        self.assertFalse(storage.has_journal())
+        with open(self.wallet_path, "r") as f:
+            self.assertEqual({'d': 2}, json.loads(f.read())['c'])
+
+    def test_journal_with_truncated_record(self):
+        storage = WalletStorage(self.wallet_path)
+        self._write_with_journal(storage)
+        with open(self.wallet_path, "a") as f:
+            f.write('\n[["s", ["a"], "interrupted')
+        db = WalletDB(WalletStorage(self.wallet_path).read(), manual_upgrades=True)
+        self.assertEqual({'d': 2}, db.get('c'))
+        self.assertIsNone(db.get('a'))
+
+    def test_journal_encrypted(self):
+        storage = WalletStorage(self.wallet_path)
+        storage.set_password('secret', enc_version=StorageEncryptionVersion.USER_PASSWORD)
+        db = self._write_with_journal(storage)
+        storage = WalletStorage(self.wallet_path)
+        self.assertTrue(storage.is_encrypted_with_user_pw())
+        with self.assertRaises(InvalidPassword):
+            storage.decrypt('wrong')
+        storage.decrypt('secret')
+        db2 = WalletDB(storage.read(), manual_upgrades=True)
+        self.assertEqual({'d': 2}, db2.get('c'))
+        self.assertEqual(db.dump(), db2.dump())
+
 class FakeExchange(ExchangeBase):
     def __init__(self, rate):
         super().__init__(lambda self: None, lambda self: None)
@@ -235,3 +293,124 @@ class TestCreateRestoreWallet(WalletTestCase):
         wallet.delete_address('k1Jz8MzNeHnxNrXiNuXVfvBPTYCNNFyHr5R')
         self.assertEqual(1, len(wallet.get_receiving_addresses()))
 
+    def test_tx_cache_is_not_used_with_storage_encryption(self):
+        network = type('fake_network', (), {'tx_cache': object()})()
+        for encrypt_file in (False, True):
+            path = f'{self.wallet_path}_{encrypt_file}'
+            wallet = create_new_wallet(path=path, password='mypassword', encrypt_file=encrypt_file,
+                                       seed_type='standard', gap_limit=1, config=self.config)['wallet']
+            wallet.network = network
+            self.assertEqual(None if encrypt_file else network.tx_cache, wallet.get_tx_cache())
+
+
+class TestWalletHistory(WalletTestCase):
+
+    def setUp(self):
+        super().setUp()
+        from .test_transaction import signed_blob
+        self.funding_tx = Transaction(signed_blob)
+        self.funding_txid = self.funding_tx.txid()
+        # address receiving the only output of funding_tx
+        self.addr = 'k112pHc1rbsM4fQDiyUFzkUdtdzr4AQBa2r'
+        text = self.addr + ' k1Jz8MzNeHnxNrXiNuXVfvBPTYCNNFyHr5R'
+        self.wallet = restore_wallet_from_text(text, path=self.wallet_path, config=self.config)['wallet']
+        txin = PartialTxInput(prevout=TxOutpoint(bfh(self.funding_txid), 0))
+        txin.script_sig = bfh('00')  # not valid, but complete
+        spending_tx = PartialTransaction.from_io(
+            [txin], [PartialTxOutput.from_address_and_value('k1KvkHhFABPmyuGuBxJXioNenzVxVDyzaV3', 999000)])
+        self.spending_tx = Transaction(spending_tx.serialize())
+        self.spending_txid = self.spending_tx.txid()
+
+    def check_history(self, expected):
+        hist = self.wallet.get_history()
+        self.assertEqual(expected, [(h.txid, h.delta, h.balance) for h in hist])
+        # same as computing it from scratch, up to the order of txs with the same txpos
+        hist2 = self.wallet.get_history(domain=self.wallet.get_addresses())
+        self.assertEqual(sorted((h.txid, h.tx_mined_status, h.delta, h.fee) for h in hist),
+                         sorted((h.txid, h.tx_mined_status, h.delta, h.fee) for h in hist2))
+
+    @mock.patch('electrum.util.trigger_callback')
+    def test_history_is_updated_incrementally(self, mock_trigger_callback):
+        self.check_history([])
+        self.wallet.receive_tx_callback(self.funding_txid, self.funding_tx, TX_HEIGHT_UNCONFIRMED)
+        self.check_history([(self.funding_txid, 1000000, 1000000)])
+        self.wallet.receive_tx_callback(self.spending_txid, self.spending_tx, TX_HEIGHT_UNCONFIRMED)
+        self.check_history([(self.funding_txid, 1000000, 1000000),
+                            (self.spending_txid, -1000000, 0)])
+        # mined with a lower txpos than the funding tx (which is still unconfirmed)
+        self.wallet.add_verified_tx(self.spending_txid, TxMinedInfo(height=100, conf=None, timestamp=0,
+                                                                    txpos=1, header_hash='00' * 32))
+        self.check_history([(self.spending_txid, -1000000, -1000000),
+                            (self.funding_txid, 1000000, 0)])
+        self.wallet.add_verified_tx(self.funding_txid, TxMinedInfo(height=100, conf=None, timestamp=0,
+                                                                   txpos=0, header_hash='00' * 32))
+        self.check_history([(self.funding_txid, 1000000, 1000000),
+                            (self.spending_txid, -1000000, 0)])
+        self.wallet.remove_transaction(self.spending_txid)
+        self.check_history([(self.funding_txid, 1000000, 1000000)])
+
+    def test_history_after_deleting_address(self):
+        self.wallet.receive_tx_callback(self.funding_txid, self.funding_tx, TX_HEIGHT_UNCONFIRMED)
+        self.check_history([(self.funding_txid, 1000000, 1000000)])
+        self.wallet.delete_address(self.addr)
+        self.check_history([])
+
+    @mock.patch('electrum.util.trigger_callback')
+    def test_utxos(self, mock_trigger_callback):
+        def get_utxos(**kwargs):
+            return [(utxo.prevout.to_str(), utxo.address, utxo.value_sats(), utxo.block_height)
+                    for utxo in self.wallet.get_utxos(**kwargs)]
+        self.assertEqual([], get_utxos())
+        self.wallet.receive_tx_callback(self.funding_txid, self.funding_tx, TX_HEIGHT_UNCONFIRMED)
+        coin = self.funding_txid + ':0'
+        self.assertEqual([(coin, self.addr, 1000000, TX_HEIGHT_UNCONFIRMED)], get_utxos())
+        self.assertEqual([], get_utxos(confirmed_only=True))
+        self.assertEqual([], get_utxos(excluded_addresses={self.addr}))
+        self.assertEqual([], get_utxos(domain=['k1Jz8MzNeHnxNrXiNuXVfvBPTYCNNFyHr5R']))
+        self.wallet.add_verified_tx(self.funding_txid, TxMinedInfo(height=100, conf=None, timestamp=0,
+                                                                   txpos=0, header_hash='00' * 32))
+        self.assertEqual([(coin, self.addr, 1000000, 100)], get_utxos(confirmed_only=True))
+        self.wallet.receive_tx_callback(self.spending_txid, self.spending_tx, TX_HEIGHT_UNCONFIRMED)
+        self.assertEqual([], get_utxos())
+        self.assertEqual({}, self.wallet.get_addr_utxo(self.addr))
+        self.wallet.remove_transaction(self.spending_txid)
+        self.assertEqual([(coin, self.addr, 1000000, 100)], get_utxos())
+
+    @mock.patch('electrum.util.trigger_callback')
+    def test_balance(self, mock_trigger_callback):
+        self.assertEqual((0, 0, 0), self.wallet.get_balance())
+        self.wallet.receive_tx_callback(self.funding_txid, self.funding_tx, TX_HEIGHT_UNCONFIRMED)
+        self.assertEqual((0, 1000000, 0), self.wallet.get_balance())
+        self.wallet.add_verified_tx(self.funding_txid, TxMinedInfo(height=100, conf=None, timestamp=0,
+                                                                   txpos=0, header_hash='00' * 32))
+        self.assertEqual((1000000, 0, 0), self.wallet.get_balance())
+        self.wallet.receive_tx_callback(self.spending_txid, self.spending_tx, TX_HEIGHT_UNCONFIRMED)
+        self.assertEqual((1000000, -1000000, 0), self.wallet.get_balance())
+        self.wallet.remove_transaction(self.spending_txid)
+        self.assertEqual((1000000, 0, 0), self.wallet.get_balance())
+        self.wallet.delete_address(self.addr)
+        self.assertEqual((0, 0, 0), self.wallet.get_balance())
+
+    @mock.patch('electrum.util.trigger_callback')
+    def test_balance_coinbase_maturity(self, mock_trigger_callback):
+        txin = PartialTxInput(prevout=TxOutpoint(bytes(32), 0xffffffff))
+        txin.script_sig = bfh('0164')
+        coinbase_tx = PartialTransaction.from_io(
+            [txin], [PartialTxOutput.from_address_and_value(self.addr, 500000)])
+        coinbase_tx = Transaction(coinbase_tx.serialize())
+        coinbase_txid = coinbase_tx.txid()
+        self.wallet.db.put('stored_height', 150)
+        self.wallet.receive_tx_callback(coinbase_txid, coinbase_tx, 100)
+        self.assertEqual((0, 0, 500000), self.wallet.get_balance())
+        self.wallet.on_blockchain_updated('blockchain_updated')
+        self.wallet.db.put('stored_height', 198)
+        self.wallet.on_blockchain_updated('blockchain_updated')
+        self.assertEqual((0, 0, 500000), self.wallet.get_balance())
+        # spendable in the next block
+        self.wallet.db.put('stored_height', 199)
+        self.wallet.on_blockchain_updated('blockchain_updated')
+        self.assertEqual((500000, 0, 0), self.wallet.get_balance())
+        # reorg
+        self.wallet.db.put('stored_height', 190)
+        self.wallet.on_blockchain_updated('blockchain_updated')
+        self.assertEqual((0, 0, 500000), self.wallet.get_balance())
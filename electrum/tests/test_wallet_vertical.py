@@ -6,7 +6,7 @@ from typing import Sequence
 import asyncio
 import copy
 
-from electrum import storage, bitcoin, keystore, bip32, wallet
+from electrum import storage, bitcoin, keystore, bip32, wallet, transaction
 from electrum import Transaction
 from electrum import SimpleConfig
 from electrum.address_synchronizer import TX_HEIGHT_UNCONFIRMED, TX_HEIGHT_UNCONF_PARENT
@@ -102,6 +102,16 @@ class TestWalletKeystoreAddressIntegrityForMainnet(ElectrumTestCase):
         self.assertEqual(w.get_receiving_addresses()[0], 'k1KDHdvDgB4XmUHLRkfrSY3c6WUuoWVMEcy')
         self.assertEqual(w.get_change_addresses()[0], 'k1GHBjZoMnSQ1fhkQwTTeQpYj2gMMBWEbps')
 
+    def test_bip32_get_private_keys_parallel_matches_serial(self):
+        ks = keystore.from_seed('cycle rocket west magnet parrot shuffle foot correct salt library feed song', '', False)
+        derivations = {ks.derive_pubkey(i % 2, i // 2).hex(): [i % 2, i // 2] for i in range(8)}
+        serial = ks._get_private_keys(derivations, None)
+        self.assertEqual(ks.get_private_key([1, 3], None), serial[ks.derive_pubkey(1, 3).hex()])
+        try:
+            self.assertEqual(serial, ks._get_private_keys(derivations, None, num_workers=2))
+        finally:
+            transaction.shutdown_signing_executor()
+
     @mock.patch.object(wallet.Abstract_Wallet, 'save_db')
     def test_electrum_seed_old(self, mock_save_db):
         seed_words = 'powerful random nobody notice nothing important anyway look away hidden message over'
@@ -43,10 +43,10 @@ import copy
 
 from . import ecc, bitcoin, constants, segwit_addr, bip32
 from .bip32 import BIP32Node
-from .util import profiler, to_bytes, bh2u, bfh, chunks, is_hex_str
+from .util import profiler, to_bytes, bh2u, bfh, chunks, is_hex_str, SpawnProcessPool
 from .bitcoin import (TYPE_ADDRESS, TYPE_SCRIPT, hash_160,
                       hash160_to_p2sh, hash160_to_p2pkh, hash_to_segwit_addr,
-                      var_int, TOTAL_COIN_SUPPLY_LIMIT_IN_BTC, COIN,
+                      var_int, var_int_bytes, TOTAL_COIN_SUPPLY_LIMIT_IN_BTC, COIN,
                       int_to_hex, push_script, b58_address_to_hash160,
                       opcodes, add_number_to_script, base_decode, is_segwit_script_type,
                       base_encode, construct_witness, construct_script)
@@ -86,6 +86,9 @@ KOTO_SAPLING_ENCPLAINTEXT_SIZE = 1 + 11 + 8 + 32 + 512
 KOTO_SAPLING_OUTPLAINTEXT_SIZE = 32 + 32
 KOTO_SAPLING_ENCCIPHERTEXT_SIZE = KOTO_SAPLING_ENCPLAINTEXT_SIZE + 16
 KOTO_SAPLING_OUTCIPHERTEXT_SIZE = KOTO_SAPLING_OUTPLAINTEXT_SIZE + 16
+KOTO_GROTH_PROOF_SIZE = 48 + 96 + 48
+KOTO_SAPLING_SPEND_SIZE = 32 + 32 + 32 + 32 + KOTO_GROTH_PROOF_SIZE + 64
+KOTO_SAPLING_OUTPUT_SIZE = 32 + 32 + 32 + KOTO_SAPLING_ENCCIPHERTEXT_SIZE + KOTO_SAPLING_OUTCIPHERTEXT_SIZE + KOTO_GROTH_PROOF_SIZE
 
 class SerializationError(Exception):
     """ Thrown when there's a problem deserializing or serializing """
@@ -122,6 +125,8 @@ class TxOutput:
     scriptpubkey: bytes
     value: Union[int, str]
 
+    __slots__ = ('scriptpubkey', 'value')
+
     def __init__(self, *, scriptpubkey: bytes, value: Union[int, str]):
         self.scriptpubkey = scriptpubkey
         self.value = value  # str when the output is set to max: '!'  # in satoshis
@@ -132,11 +137,8 @@ class TxOutput:
                    value=value)
 
     def serialize_to_network(self) -> bytes:
-        buf = int.to_bytes(self.value, 8, byteorder="little", signed=False)
         script = self.scriptpubkey
-        buf += bfh(var_int(len(script.hex()) // 2))
-        buf += script
-        return buf
+        return int.to_bytes(self.value, 8, byteorder="little", signed=False) + var_int_bytes(len(script)) + script
 
     @classmethod
     def from_network_bytes(cls, raw: bytes) -> 'TxOutput':
@@ -196,6 +198,12 @@ class BIP143SharedTxDigestFields(NamedTuple):
     hashOutputs: str
 
 
+class ZIP243SharedTxDigestFields(NamedTuple):
+    hashPrevouts: bytes
+    hashSequence: bytes
+    hashOutputs: bytes
+
+
 class TxOutpoint(NamedTuple):
     txid: bytes  # endianness same as hex string displayed; reverse of tx serialization order
     out_idx: int
@@ -214,7 +222,7 @@ class TxOutpoint(NamedTuple):
         return [self.txid.hex(), self.out_idx]
 
     def serialize_to_network(self) -> bytes:
-        return self.txid[::-1] + bfh(int_to_hex(self.out_idx, 4))
+        return self.txid[::-1] + self.out_idx.to_bytes(4, 'little')
 
     def is_coinbase(self) -> bool:
         return self.txid == bytes(32)
@@ -227,6 +235,8 @@ class TxInput:
     witness: Optional[bytes]
     _is_coinbase_output: bool
 
+    __slots__ = ('prevout', 'script_sig', 'nsequence', 'witness', '_is_coinbase_output')
+
     def __init__(self, *,
                  prevout: TxOutpoint,
                  script_sig: bytes = None,
@@ -277,23 +287,49 @@ class TxInput:
         return False
 
 
+_STRUCT_INT8 = struct.Struct('<b')
+_STRUCT_UINT8 = struct.Struct('<B')
+_STRUCT_INT16 = struct.Struct('<h')
+_STRUCT_UINT16 = struct.Struct('<H')
+_STRUCT_INT32 = struct.Struct('<i')
+_STRUCT_UINT32 = struct.Struct('<I')
+_STRUCT_INT64 = struct.Struct('<q')
+_STRUCT_UINT64 = struct.Struct('<Q')
+
+
 class BCDataStream(object):
-    """Workalike python implementation of Bitcoin's CDataStream class."""
+    """Workalike python implementation of Bitcoin's CDataStream class.
+
+    Reads go through a memoryview of the buffer and precompiled structs,
+    so only the bytes that are returned get copied.
+    """
 
     def __init__(self):
-        self.input = None  # type: Optional[bytearray]
+        self.input = None  # type: Optional[Union[bytes, bytearray]]
         self.read_cursor = 0
+        self._view = None  # type: Optional[memoryview]
 
     def clear(self):
+        self._release_view()
         self.input = None
         self.read_cursor = 0
 
+    def _release_view(self):
+        if self._view is not None:
+            self._view.release()
+            self._view = None
+
     def write(self, _bytes: Union[bytes, bytearray]):  # Initialize with string of _bytes
         assert isinstance(_bytes, (bytes, bytearray))
         if self.input is None:
-            self.input = bytearray(_bytes)
+            # immutable bytes can be read from without making a copy
+            self.input = _bytes if isinstance(_bytes, bytes) else bytearray(_bytes)
         else:
-            self.input += bytearray(_bytes)
+            self._release_view()  # a bytearray cannot be resized while it is being viewed
+            if not isinstance(self.input, bytearray):
+                self.input = bytearray(self.input)
+            self.input += _bytes
+        self._view = memoryview(self.input)
 
     def read_string(self, encoding='ascii'):
         # Strings are encoded depending on length:
@@ -320,16 +356,15 @@ class BCDataStream(object):
         return self.input[self.read_cursor::]
 
     def read_bytes(self, length: int) -> bytes:
-        if self.input is None:
+        view = self._view
+        if view is None:
             raise SerializationError("call write(bytes) before trying to deserialize")
         assert length >= 0
-        input_len = len(self.input)
         read_begin = self.read_cursor
         read_end = read_begin + length
-        if 0 <= read_begin <= read_end <= input_len:
-            result = self.input[read_begin:read_end]  # type: bytearray
-            self.read_cursor += length
-            return bytes(result)
+        if read_end <= len(view):
+            self.read_cursor = read_end
+            return view[read_begin:read_end].tobytes()
         else:
             raise SerializationError('attempt to read past end of buffer')
 
@@ -343,38 +378,38 @@ class BCDataStream(object):
         return self.read_cursor < len(self.input)
 
     def read_boolean(self) -> bool: return self.read_bytes(1) != b'\x00'
-    def read_int8(self): return self._read_num('<b')
-    def read_uint8(self): return self._read_num('<B')
-    def read_int16(self): return self._read_num('<h')
-    def read_uint16(self): return self._read_num('<H')
-    def read_int32(self): return self._read_num('<i')
-    def read_uint32(self): return self._read_num('<I')
-    def read_int64(self): return self._read_num('<q')
-    def read_uint64(self): return self._read_num('<Q')
+    def read_int8(self): return self._read_struct(_STRUCT_INT8)
+    def read_uint8(self): return self._read_struct(_STRUCT_UINT8)
+    def read_int16(self): return self._read_struct(_STRUCT_INT16)
+    def read_uint16(self): return self._read_struct(_STRUCT_UINT16)
+    def read_int32(self): return self._read_struct(_STRUCT_INT32)
+    def read_uint32(self): return self._read_struct(_STRUCT_UINT32)
+    def read_int64(self): return self._read_struct(_STRUCT_INT64)
+    def read_uint64(self): return self._read_struct(_STRUCT_UINT64)
 
     def write_boolean(self, val): return self.write(b'\x01' if val else b'\x00')
-    def write_int8(self, val): return self._write_num('<b', val)
-    def write_uint8(self, val): return self._write_num('<B', val)
-    def write_int16(self, val): return self._write_num('<h', val)
-    def write_uint16(self, val): return self._write_num('<H', val)
-    def write_int32(self, val): return self._write_num('<i', val)
-    def write_uint32(self, val): return self._write_num('<I', val)
-    def write_int64(self, val): return self._write_num('<q', val)
-    def write_uint64(self, val): return self._write_num('<Q', val)
+    def write_int8(self, val): return self._write_struct(_STRUCT_INT8, val)
+    def write_uint8(self, val): return self._write_struct(_STRUCT_UINT8, val)
+    def write_int16(self, val): return self._write_struct(_STRUCT_INT16, val)
+    def write_uint16(self, val): return self._write_struct(_STRUCT_UINT16, val)
+    def write_int32(self, val): return self._write_struct(_STRUCT_INT32, val)
+    def write_uint32(self, val): return self._write_struct(_STRUCT_UINT32, val)
+    def write_int64(self, val): return self._write_struct(_STRUCT_INT64, val)
+    def write_uint64(self, val): return self._write_struct(_STRUCT_UINT64, val)
 
     def read_compact_size(self):
         try:
-            size = self.input[self.read_cursor]
-            self.read_cursor += 1
-            if size == 253:
-                size = self._read_num('<H')
-            elif size == 254:
-                size = self._read_num('<I')
-            elif size == 255:
-                size = self._read_num('<Q')
-            return size
-        except IndexError as e:
+            size = self._view[self.read_cursor]
+        except (IndexError, TypeError) as e:  # TypeError: nothing was written yet
             raise SerializationError("attempt to read past end of buffer") from e
+        self.read_cursor += 1
+        if size < 253:
+            return size
+        if size == 253:
+            return self._read_struct(_STRUCT_UINT16)
+        if size == 254:
+            return self._read_struct(_STRUCT_UINT32)
+        return self._read_struct(_STRUCT_UINT64)
 
     def write_compact_size(self, size):
         if size < 0:
@@ -383,27 +418,26 @@ class BCDataStream(object):
             self.write(bytes([size]))
         elif size < 2**16:
             self.write(b'\xfd')
-            self._write_num('<H', size)
+            self._write_struct(_STRUCT_UINT16, size)
         elif size < 2**32:
             self.write(b'\xfe')
-            self._write_num('<I', size)
+            self._write_struct(_STRUCT_UINT32, size)
         elif size < 2**64:
             self.write(b'\xff')
-            self._write_num('<Q', size)
+            self._write_struct(_STRUCT_UINT64, size)
         else:
             raise Exception(f"size {size} too large for compact_size")
 
-    def _read_num(self, format):
+    def _read_struct(self, s: struct.Struct):
         try:
-            (i,) = struct.unpack_from(format, self.input, self.read_cursor)
-            self.read_cursor += struct.calcsize(format)
-        except Exception as e:
+            (i,) = s.unpack_from(self._view, self.read_cursor)
+        except (struct.error, TypeError) as e:  # TypeError: nothing was written yet
             raise SerializationError(e) from e
+        self.read_cursor += s.size
         return i
 
-    def _write_num(self, format, num):
-        s = struct.pack(format, num)
-        self.write(s)
+    def _write_struct(self, s: struct.Struct, num):
+        self.write(s.pack(num))
 
 
 def script_GetOp(_bytes : bytes):
@@ -510,6 +544,18 @@ def get_address_from_output_script(_bytes: bytes, *, net=None) -> Optional[str]:
     return None
 
 
+def _read_compact_size_at(raw: bytes, pos: int) -> Tuple[int, int]:
+    """Reads a compact size from raw at pos. Returns (value, position after it)."""
+    size = raw[pos]
+    if size < 253:
+        return size, pos + 1
+    if size == 253:
+        return _STRUCT_UINT16.unpack_from(raw, pos + 1)[0], pos + 3
+    if size == 254:
+        return _STRUCT_UINT32.unpack_from(raw, pos + 1)[0], pos + 5
+    return _STRUCT_UINT64.unpack_from(raw, pos + 1)[0], pos + 9
+
+
 def parse_input(vds: BCDataStream) -> TxInput:
     prevout_hash = vds.read_bytes(32)[::-1]
     prevout_n = vds.read_uint32()
@@ -562,7 +608,7 @@ def parse_PHGRProof(vds):
 
 def parse_GrothProof(vds):
     proof = {}
-    proof['GrothProof'] = vds.read_bytes(48 + 96 + 48)
+    proof['GrothProof'] = vds.read_bytes(KOTO_GROTH_PROOF_SIZE)
     return proof
 
 def parse_JSDescription(vds, useGroth):
@@ -612,20 +658,43 @@ def multisig_script(public_keys: Sequence[str], m: int) -> str:
 
 
 
+def _sign_preimage(preimage: bytes, hash_person: Optional[bytes], privkey_bytes: bytes) -> str:
+    # note: this also runs in the worker processes of the signing executor
+    if hash_person is not None:
+        pre_hash = blake2b(preimage, digest_size=32, person=hash_person).digest()
+    else:
+        pre_hash = sha256d(preimage)
+    privkey = ecc.ECPrivkey(privkey_bytes)
+    sig = privkey.sign_transaction(pre_hash)
+    return bh2u(sig) + '01'  # SIGHASH_ALL
+
+
+signing_pool = SpawnProcessPool('signing')
+
+
+def shutdown_signing_executor() -> None:
+    signing_pool.shutdown()
+
+
 class Transaction:
     _cached_network_ser: Optional[str]
+    _cached_network_ser_bytes: Optional[bytes]
 
     def __str__(self):
         return self.serialize()
 
     def __init__(self, raw):
+        # the network serialization is cached both as hex and as bytes;
+        # either may be missing, and is then derived lazily from the other
+        self._cached_network_ser_bytes = None
         if raw is None:
             self._cached_network_ser = None
         elif isinstance(raw, str):
             self._cached_network_ser = raw.strip() if raw else None
             assert is_hex_str(self._cached_network_ser)
         elif isinstance(raw, (bytes, bytearray)):
-            self._cached_network_ser = bh2u(raw)
+            self._cached_network_ser = None
+            self._cached_network_ser_bytes = bytes(raw)
         else:
             raise Exception(f"cannot initialize transaction from {raw}")
         self._inputs = None  # type: List[TxInput]
@@ -639,15 +708,23 @@ class Transaction:
         self.expiryHeight = 0 # height + 40
         self._joinsplitsraw = b'\x00'
         self._saplingraw = b'\x00' * (8+1+1+1) # ValuBalance + spend + output + joinsplits
+        self._sapling_section = None  # type: Optional[Tuple[List[dict], List[dict]]]
         self._locktime = 0
         self._version = 4
 
         self._cached_txid = None  # type: Optional[str]
+        # offsets into _cached_network_ser_bytes, set when deserializing:
+        # (prevout start, scriptSig start, scriptSig end) for each input, and
+        # (value start, scriptPubKey start, scriptPubKey end) for each output
+        self._txin_spans = None  # type: Optional[List[Tuple[int, int, int]]]
+        self._txout_spans = None  # type: Optional[List[Tuple[int, int, int]]]
 
     def vpub(self):
+        self.deserialize()
         return self._vpub_new
 
     def valueBalance(self):
+        self.deserialize()
         return self._valueBalance
 
     def update(self, raw):
@@ -688,70 +765,145 @@ class Transaction:
     def inputs(self) -> Sequence[TxInput]:
         if self._inputs is None:
             self.deserialize()
+            if self._txin_spans is not None:
+                self._inputs = self._inputs_from_raw()
         return self._inputs
 
     def outputs(self) -> Sequence[TxOutput]:
         if self._outputs is None:
             self.deserialize()
+            if self._txout_spans is not None:
+                self._outputs = self._outputs_from_raw()
         return self._outputs
 
+    def _get_network_ser_bytes(self) -> Optional[bytes]:
+        if self._cached_network_ser_bytes is None and self._cached_network_ser is not None:
+            self._cached_network_ser_bytes = bfh(self._cached_network_ser)
+        return self._cached_network_ser_bytes
+
     def deserialize(self) -> None:
-        if self._cached_network_ser is None:
+        """Parses the network serialization, validating it.
+        Inputs and outputs are only recorded as offsets into the raw tx,
+        and get turned into TxInput/TxOutput objects when first accessed.
+        """
+        if self._inputs is not None or self._txin_spans is not None:
             return
-        if self._inputs is not None:
+        raw = self._get_network_ser_bytes()
+        if raw is None:
             return
-
-        raw_bytes = bfh(self._cached_network_ser)
-        vds = BCDataStream()
-        vds.write(raw_bytes)
-        header = vds.read_uint32()
+        try:
+            self._scan_network_ser(raw)
+        except (struct.error, IndexError) as e:
+            raise SerializationError('attempt to read past end of buffer') from e
+
+    def _scan_network_ser(self, raw: bytes) -> None:
+        raw_len = len(raw)
+        header, = _STRUCT_UINT32.unpack_from(raw, 0)
+        pos = 4
         self.overwintered = ((header >> 31) == 1)
         if self.overwintered:
             self._version = header & 0x7fffffff
         else:
             self._version = header
         if self._version >= 3:
-            self.versionGroupId = vds.read_uint32()
+            self.versionGroupId, = _STRUCT_UINT32.unpack_from(raw, pos)
+            pos += 4
         self.saplinged = (self._version >= 4)
-        n_vin = vds.read_compact_size()
-#        is_segwit = (n_vin == 0) # if private address, n_vin == 0
-        is_segwit = 0
-        if is_segwit:
-            marker = vds.read_bytes(1)
-            if marker != b'\x01':
-                raise ValueError('invalid txn marker byte: {}'.format(marker))
-            n_vin = vds.read_compact_size()
-        self._inputs = [parse_input(vds) for i in range(n_vin)]
-        n_vout = vds.read_compact_size()
-        self._outputs = [parse_output(vds) for i in range(n_vout)]
-        if is_segwit:
-            for txin in self._inputs:
-                parse_witness(vds, txin)
-        self._locktime = vds.read_uint32()
+        n_vin, pos = _read_compact_size_at(raw, pos)
+        txin_spans = []
+        for i in range(n_vin):
+            prevout_start = pos
+            script_len, script_start = _read_compact_size_at(raw, pos + 36)
+            script_end = script_start + script_len
+            txin_spans.append((prevout_start, script_start, script_end))
+            pos = script_end + 4  # nsequence
+        n_vout, pos = _read_compact_size_at(raw, pos)
+        txout_spans = []
+        for i in range(n_vout):
+            value, = _STRUCT_INT64.unpack_from(raw, pos)
+            if value > TOTAL_COIN_SUPPLY_LIMIT_IN_BTC * COIN:
+                raise SerializationError('invalid output amount (too large)')
+            if value < 0:
+                raise SerializationError('invalid output amount (negative)')
+            script_len, script_start = _read_compact_size_at(raw, pos + 8)
+            script_end = script_start + script_len
+            txout_spans.append((pos, script_start, script_end))
+            pos = script_end
+        self._locktime, = _STRUCT_UINT32.unpack_from(raw, pos)
+        pos += 4
         if self._version >= 3:
-            self.expiryHeight = vds.read_uint32()
+            self.expiryHeight, = _STRUCT_UINT32.unpack_from(raw, pos)
+            pos += 4
         n_ShieldedSpend = 0
         n_ShieldedOutput = 0
         if self._version >= 4:
-            self._saplingraw = vds.get_remains()
-            self._valueBalance = vds.read_int64()
-            n_ShieldedSpend = vds.read_compact_size()
-            self.shieldedSpend = [parse_ShieldedSpend(vds) for i in range(n_ShieldedSpend)]
-            n_ShieldedOutput = vds.read_compact_size()
-            self.shieldedOutput = [parse_ShieldedOutput(vds) for i in range(n_ShieldedOutput)]
+            self._saplingraw = raw[pos:]
+            self._sapling_section = None
+            self._valueBalance, = _STRUCT_INT64.unpack_from(raw, pos)
+            n_ShieldedSpend, pos = _read_compact_size_at(raw, pos + 8)
+            pos += n_ShieldedSpend * KOTO_SAPLING_SPEND_SIZE
+            n_ShieldedOutput, pos = _read_compact_size_at(raw, pos)
+            pos += n_ShieldedOutput * KOTO_SAPLING_OUTPUT_SIZE
         if self._version >= 2:
-            self._joinsplitsraw = vds.get_remains()
-            self.n_JSDescs = vds.read_compact_size()
-            useGroth = (self._version >= 4)
-            self._joinsplits = [parse_JSDescription(vds, useGroth) for i in range(self.n_JSDescs)]
-            self._vpub_new = sum(self._joinsplits[x]['vpub_new'] for x in range(self.n_JSDescs))
+            self._joinsplitsraw = raw[pos:]
+            self.n_JSDescs, pos = _read_compact_size_at(raw, pos)
+            self._joinsplits = []
             if self.n_JSDescs > 0:
+                vds = BCDataStream()
+                vds.write(raw[pos:])
+                useGroth = (self._version >= 4)
+                self._joinsplits = [parse_JSDescription(vds, useGroth) for i in range(self.n_JSDescs)]
                 self.joinSplitPubKey = vds.read_bytes(32)
                 self.joinSplitSig = vds.read_bytes(64)
+                pos += vds.read_cursor
+            self._vpub_new = sum(js['vpub_new'] for js in self._joinsplits)
         if self._version >= 4 and (n_ShieldedSpend != 0 or n_ShieldedOutput != 0):
-            self.bindingSig = vds.read_bytes(64)
-        if vds.can_read_more():
+            self.bindingSig = raw[pos:pos+64]
+            pos += 64
+        if pos > raw_len:
+            raise SerializationError('attempt to read past end of buffer')
+        if pos < raw_len:
             raise SerializationError('extra junk at the end')
+        self._txin_spans = txin_spans
+        self._txout_spans = txout_spans
+
+    def _inputs_from_raw(self) -> List[TxInput]:
+        raw = self._cached_network_ser_bytes
+        inputs = []
+        for prevout_start, script_start, script_end in self._txin_spans:
+            prevout = TxOutpoint(txid=raw[prevout_start:prevout_start+32][::-1],
+                                 out_idx=int.from_bytes(raw[prevout_start+32:prevout_start+36], 'little'))
+            inputs.append(TxInput(prevout=prevout,
+                                  script_sig=raw[script_start:script_end],
+                                  nsequence=int.from_bytes(raw[script_end:script_end+4], 'little')))
+        return inputs
+
+    def _outputs_from_raw(self) -> List[TxOutput]:
+        raw = self._cached_network_ser_bytes
+        return [TxOutput(value=int.from_bytes(raw[value_start:value_start+8], 'little'),
+                         scriptpubkey=raw[script_start:script_end])
+                for value_start, script_start, script_end in self._txout_spans]
+
+    @property
+    def shieldedSpend(self) -> List[dict]:
+        return self._parse_sapling_section()[0]
+
+    @property
+    def shieldedOutput(self) -> List[dict]:
+        return self._parse_sapling_section()[1]
+
+    def _parse_sapling_section(self) -> Tuple[List[dict], List[dict]]:
+        self.deserialize()
+        if not self.saplinged:
+            return [], []
+        if self._sapling_section is None:
+            vds = BCDataStream()
+            vds.write(self._saplingraw)
+            vds.read_int64()  # valueBalance
+            spends = [parse_ShieldedSpend(vds) for i in range(vds.read_compact_size())]
+            outputs = [parse_ShieldedOutput(vds) for i in range(vds.read_compact_size())]
+            self._sapling_section = spends, outputs
+        return self._sapling_section
 
     @classmethod
     def get_siglist(self, txin: 'PartialTxInput', *, estimate_size=False):
@@ -892,14 +1044,16 @@ class Transaction:
 
     @classmethod
     def serialize_input(self, txin: TxInput, script: str, withSig=True) -> str:
+        return self.serialize_input_to_bytes(txin, bfh(script), withSig=withSig).hex()
+
+    @classmethod
+    def serialize_input_to_bytes(cls, txin: TxInput, script: bytes, withSig=True) -> bytes:
         # Prev hash and index
-        s = txin.prevout.serialize_to_network().hex()
+        s = txin.prevout.serialize_to_network()
         # Script length, script, sequence
         if withSig:
-            s += var_int(len(script)//2)
-            s += script
-        s += int_to_hex(txin.nsequence, 4)
-        return s
+            s += var_int_bytes(len(script)) + script
+        return s + txin.nsequence.to_bytes(4, 'little')
 
     def _calc_bip143_shared_txdigest_fields(self) -> BIP143SharedTxDigestFields:
         inputs = self.inputs()
@@ -911,21 +1065,45 @@ class Transaction:
                                           hashSequence=hashSequence,
                                           hashOutputs=hashOutputs)
 
+    def _calc_zip243_shared_txdigest_fields(self) -> ZIP243SharedTxDigestFields:
+        inputs = self.inputs()
+        outputs = self.outputs()
+        hashPrevouts = blake2b(b''.join(txin.prevout.serialize_to_network() for txin in inputs),
+                               digest_size=32, person=PREVOUTS_HASH_PERSON).digest()
+        hashSequence = blake2b(b''.join(txin.nsequence.to_bytes(4, 'little') for txin in inputs),
+                               digest_size=32, person=SEQUENCE_HASH_PERSON).digest()
+        hashOutputs = blake2b(b''.join(o.serialize_to_network() for o in outputs),
+                              digest_size=32, person=OUTPUTS_HASH_PERSON).digest()
+        return ZIP243SharedTxDigestFields(hashPrevouts=hashPrevouts,
+                                          hashSequence=hashSequence,
+                                          hashOutputs=hashOutputs)
+
     def is_segwit(self, *, guess_for_address=False):
         return any(txin.is_segwit(guess_for_address=guess_for_address)
                    for txin in self.inputs())
 
     def invalidate_ser_cache(self):
+        if self._txin_spans is not None:
+            # materialize inputs and outputs while the raw tx is still around
+            self.inputs()
+            self.outputs()
         self._cached_network_ser = None
+        self._cached_network_ser_bytes = None
+        self._txin_spans = None
+        self._txout_spans = None
         self._cached_txid = None
 
     def serialize(self) -> str:
         if not self._cached_network_ser:
-            self._cached_network_ser = self.serialize_to_network(estimate_size=False, include_sigs=True)
+            self._cached_network_ser = self.serialize_as_bytes().hex()
         return self._cached_network_ser
 
     def serialize_as_bytes(self) -> bytes:
-        return bfh(self.serialize())
+        raw = self._get_network_ser_bytes()
+        if not raw:
+            raw = self.serialize_to_network_as_bytes(estimate_size=False, include_sigs=True)
+            self._cached_network_ser_bytes = raw
+        return raw
 
     def serialize_to_network(self, *, estimate_size=False, include_sigs=True, force_legacy=False, withSig=True) -> str:
         """Serialize the transaction as used on the Bitcoin network, into hex.
@@ -933,49 +1111,54 @@ class Transaction:
         `force_legacy` signals to use the pre-segwit format
         note: (not include_sigs) implies force_legacy
         """
+        return self.serialize_to_network_as_bytes(estimate_size=estimate_size, include_sigs=include_sigs,
+                                                  force_legacy=force_legacy, withSig=withSig).hex()
+
+    def serialize_to_network_as_bytes(self, *, estimate_size=False, include_sigs=True, force_legacy=False,
+                                      withSig=True) -> bytes:
+        """Same as serialize_to_network, but returns bytes."""
         self.deserialize()
         if self.overwintered:
-            nVersion = int_to_hex(self._version + 0x80000000, 4)
-            nVersionGroupId = int_to_hex(self.versionGroupId, 4)
-            nExpiryHeight = int_to_hex(self.expiryHeight, 4)
+            nVersion = (self._version + 0x80000000).to_bytes(4, 'little')
+            nVersionGroupId = self.versionGroupId.to_bytes(4, 'little')
+            nExpiryHeight = self.expiryHeight.to_bytes(4, 'little')
         else:
-            nVersion = int_to_hex(self._version, 4)
-        nLocktime = int_to_hex(self._locktime, 4)
+            nVersion = self._version.to_bytes(4, 'little')
+        nLocktime = self._locktime.to_bytes(4, 'little')
         inputs = self.inputs()
         outputs = self.outputs()
-        valueBalance = int_to_hex(self._valueBalance, 8)
         joinSplitsRaw = self._joinsplitsraw
         saplingRaw = self._saplingraw
 
-        def create_script_sig(txin: TxInput) -> str:
-            if include_sigs:
-                return self.input_script(txin, estimate_size=estimate_size)
-            return ''
-        txins = var_int(len(inputs)) + ''.join(self.serialize_input(txin, create_script_sig(txin), withSig=withSig)
-                                               for txin in inputs)
-        txouts = var_int(len(outputs)) + ''.join(o.serialize_to_network().hex() for o in outputs)
+        def create_script_sig(txin: TxInput) -> bytes:
+            if not include_sigs:
+                return b''
+            if txin.script_sig is not None:
+                return txin.script_sig
+            return bfh(self.input_script(txin, estimate_size=estimate_size))
+        txins = var_int_bytes(len(inputs)) + b''.join(
+            self.serialize_input_to_bytes(txin, create_script_sig(txin), withSig=withSig) for txin in inputs)
+        txouts = var_int_bytes(len(outputs)) + b''.join(o.serialize_to_network() for o in outputs)
 
         use_segwit_ser_for_estimate_size = estimate_size and self.is_segwit(guess_for_address=True)
         use_segwit_ser_for_actual_use = not estimate_size and self.is_segwit()
         use_segwit_ser = use_segwit_ser_for_estimate_size or use_segwit_ser_for_actual_use
         if include_sigs and not force_legacy and use_segwit_ser:
-            marker = '00'
-            flag = '01'
-            witness = ''.join(self.serialize_witness(x, estimate_size=estimate_size) for x in inputs)
+            marker = b'\x00'
+            flag = b'\x01'
+            witness = bfh(''.join(self.serialize_witness(x, estimate_size=estimate_size) for x in inputs))
             return nVersion + marker + flag + txins + txouts + witness + nLocktime
         else:
-            header = nVersion
             if self.overwintered:
-                header = header + nVersionGroupId + txins + txouts + nLocktime + nExpiryHeight
+                parts = [nVersion, nVersionGroupId, txins, txouts, nLocktime, nExpiryHeight]
                 if self.saplinged:
-                    header = header + saplingRaw.hex()
-                    return header
+                    parts.append(saplingRaw)
+                    return b''.join(parts)
             else:
-                header = header + txins + txouts + nLocktime
+                parts = [nVersion, txins, txouts, nLocktime]
             if self._version >= 2:
-                return header + joinSplitsRaw.hex()
-            else:
-                return header
+                parts.append(joinSplitsRaw)
+            return b''.join(parts)
 
     def to_qr_data(self) -> str:
         """Returns tx as data to be put into a QR code. No side-effects."""
@@ -989,33 +1172,50 @@ class Transaction:
     def txid(self) -> Optional[str]:
         if self._cached_txid is None:
             self.deserialize()
-            all_segwit = all(txin.is_segwit() for txin in self.inputs())
-            if not all_segwit and not self.is_complete():
+            if not self.is_complete() and not all(txin.is_segwit() for txin in self.inputs()):
                 return None
-            try:
-                is_coinbase = False
-                if (len(self.inputs()) > 0):
-                    is_coinbase = self.inputs()[0].is_coinbase_input()
-                if self.saplinged and not is_coinbase:
-                    ser = self.serialize_to_network(force_legacy=True, withSig=False)
-                else:
-                    ser = self.serialize_to_network(force_legacy=True)
-            except UnknownTxinType:
-                # we might not know how to construct scriptSig for some scripts
-                return None
-            self._cached_txid = bh2u(sha256d(bfh(ser))[::-1])
+            is_coinbase = False
+            if (len(self.inputs()) > 0):
+                is_coinbase = self.inputs()[0].is_coinbase_input()
+            # koto: for sapling txs, the txid does not commit to the scriptSigs
+            exclude_script_sigs = self.saplinged and not is_coinbase
+            if self._txin_spans is not None:
+                # we were deserialized from the network serialization, which is still valid:
+                # hash the raw bytes directly instead of re-serializing
+                ser = self._txid_preimage_from_raw(exclude_script_sigs=exclude_script_sigs)
+            else:
+                try:
+                    ser = self.serialize_to_network_as_bytes(force_legacy=True, withSig=not exclude_script_sigs)
+                except UnknownTxinType:
+                    # we might not know how to construct scriptSig for some scripts
+                    return None
+            self._cached_txid = sha256d(ser)[::-1].hex()
         return self._cached_txid
 
+    def _txid_preimage_from_raw(self, *, exclude_script_sigs: bool) -> bytes:
+        raw = self._cached_network_ser_bytes
+        if not exclude_script_sigs:
+            return raw
+        raw_view = memoryview(raw)
+        parts = []
+        pos = 0
+        for prevout_start, script_start, script_end in self._txin_spans:
+            # skip the scriptSig, and its length prefix
+            parts.append(raw_view[pos:prevout_start+36])
+            pos = script_end
+        parts.append(raw_view[pos:])
+        return b''.join(parts)
+
     def wtxid(self) -> Optional[str]:
         self.deserialize()
         if not self.is_complete():
             return None
         try:
-            ser = self.serialize_to_network()
+            ser = self.serialize_to_network_as_bytes()
         except UnknownTxinType:
             # we might not know how to construct scriptSig/witness for some scripts
             return None
-        return bh2u(sha256d(bfh(ser))[::-1])
+        return sha256d(ser)[::-1].hex()
 
     def add_info_from_wallet(self, wallet: 'Abstract_Wallet', **kwargs) -> None:
         return  # no-op
@@ -1059,10 +1259,10 @@ class Transaction:
 
     def estimated_total_size(self):
         """Return an estimated total transaction size in bytes."""
-        if not self.is_complete() or self._cached_network_ser is None:
-            return len(self.serialize_to_network(estimate_size=True)) // 2
+        if not self.is_complete() or self._get_network_ser_bytes() is None:
+            return len(self.serialize_to_network_as_bytes(estimate_size=True))
         else:
-            return len(self._cached_network_ser) // 2  # ASCII hex string
+            return len(self._cached_network_ser_bytes)
 
     def estimated_witness_size(self):
         """Return an estimate of witness size in bytes."""
@@ -1204,48 +1404,32 @@ class PSBTOutputType(IntEnum):
     BIP32_DERIVATION = 2
 
 
-# Serialization/deserialization tools
-def deser_compact_size(f) -> Optional[int]:
-    try:
-        nit = f.read(1)[0]
-    except IndexError:
-        return None     # end of file
-
-    if nit == 253:
-        nit = struct.unpack("<H", f.read(2))[0]
-    elif nit == 254:
-        nit = struct.unpack("<I", f.read(4))[0]
-    elif nit == 255:
-        nit = struct.unpack("<Q", f.read(8))[0]
-    return nit
-
-
 class PSBTSection:
 
-    def _populate_psbt_fields_from_fd(self, fd=None):
-        if not fd: return
+    def _populate_psbt_fields_from_vds(self, vds: BCDataStream = None):
+        if not vds: return
 
         while True:
             try:
-                key_type, key, val = self.get_next_kv_from_fd(fd)
+                key_type, key, val = self.get_next_kv_from_vds(vds)
             except StopIteration:
                 break
             self.parse_psbt_section_kv(key_type, key, val)
 
     @classmethod
-    def get_next_kv_from_fd(cls, fd) -> Tuple[int, bytes, bytes]:
-        key_size = deser_compact_size(fd)
+    def get_next_kv_from_vds(cls, vds: BCDataStream) -> Tuple[int, bytes, bytes]:
+        if not vds.can_read_more():
+            raise UnexpectedEndOfStream()
+        key_size = vds.read_compact_size()
         if key_size == 0:
             raise StopIteration()
-        if key_size is None:
-            raise UnexpectedEndOfStream()
 
-        full_key = fd.read(key_size)
+        full_key = vds.read_bytes(key_size)
         key_type, key = cls.get_keytype_and_key_from_fullkey(full_key)
 
-        val_size = deser_compact_size(fd)
-        if val_size is None: raise UnexpectedEndOfStream()
-        val = fd.read(val_size)
+        if not vds.can_read_more():
+            raise UnexpectedEndOfStream()
+        val = vds.read_bytes(vds.read_compact_size())
 
         return key_type, key, val
 
@@ -1261,11 +1445,11 @@ class PSBTSection:
 
     @classmethod
     def get_keytype_and_key_from_fullkey(cls, full_key: bytes) -> Tuple[int, bytes]:
-        with io.BytesIO(full_key) as key_stream:
-            key_type = deser_compact_size(key_stream)
-            if key_type is None: raise UnexpectedEndOfStream()
-            key = key_stream.read()
-        return key_type, key
+        try:
+            key_type, pos = _read_compact_size_at(full_key, 0)
+        except (IndexError, struct.error):
+            raise UnexpectedEndOfStream() from None
+        return key_type, full_key[pos:]
 
     @classmethod
     def get_fullkey_from_keytype_and_key(cls, key_type: int, key: bytes) -> bytes:
@@ -1759,82 +1943,86 @@ class PartialTransaction(Transaction):
         # We parse the raw stream twice. The first pass is used to find the
         # PSBT_GLOBAL_UNSIGNED_TX key in the global section and set 'tx'.
         # The second pass does everything else.
-        with io.BytesIO(raw[5:]) as fd:  # parsing "first pass"
-            while True:
-                try:
-                    kt, key, val = PSBTSection.get_next_kv_from_fd(fd)
-                except StopIteration:
-                    break
-                try:
-                    kt = PSBTGlobalType(kt)
-                except ValueError:
-                    pass  # unknown type
-                if kt == PSBTGlobalType.UNSIGNED_TX:
-                    if tx is not None:
-                        raise SerializationError(f"duplicate key: {repr(kt)}")
-                    if key: raise SerializationError(f"key for {repr(kt)} must be empty")
-                    unsigned_tx = Transaction(val.hex())
-                    for txin in unsigned_tx.inputs():
-                        if txin.script_sig or txin.witness:
-                            raise SerializationError(f"PSBT {repr(kt)} must have empty scriptSigs and witnesses")
-                    tx = PartialTransaction.from_tx(unsigned_tx)
+        vds = BCDataStream()
+        vds.write(bytes(raw))
+        vds.read_cursor = 5  # skip magic
+        # parsing "first pass"
+        while True:
+            try:
+                kt, key, val = PSBTSection.get_next_kv_from_vds(vds)
+            except StopIteration:
+                break
+            try:
+                kt = PSBTGlobalType(kt)
+            except ValueError:
+                pass  # unknown type
+            if kt == PSBTGlobalType.UNSIGNED_TX:
+                if tx is not None:
+                    raise SerializationError(f"duplicate key: {repr(kt)}")
+                if key: raise SerializationError(f"key for {repr(kt)} must be empty")
+                unsigned_tx = Transaction(val)
+                for txin in unsigned_tx.inputs():
+                    if txin.script_sig or txin.witness:
+                        raise SerializationError(f"PSBT {repr(kt)} must have empty scriptSigs and witnesses")
+                tx = PartialTransaction.from_tx(unsigned_tx)
 
         if tx is None:
             raise SerializationError(f"PSBT missing required global section PSBT_GLOBAL_UNSIGNED_TX")
 
-        with io.BytesIO(raw[5:]) as fd:  # parsing "second pass"
-            # global section
-            while True:
-                try:
-                    kt, key, val = PSBTSection.get_next_kv_from_fd(fd)
-                except StopIteration:
-                    break
-                try:
-                    kt = PSBTGlobalType(kt)
-                except ValueError:
-                    pass  # unknown type
-                if DEBUG_PSBT_PARSING: print(f"{repr(kt)} {key.hex()} {val.hex()}")
-                if kt == PSBTGlobalType.UNSIGNED_TX:
-                    pass  # already handled during "first" parsing pass
-                elif kt == PSBTGlobalType.XPUB:
-                    bip32node = BIP32Node.from_bytes(key)
-                    if bip32node in tx.xpubs:
-                        raise SerializationError(f"duplicate key: {repr(kt)}")
-                    xfp, path = unpack_bip32_root_fingerprint_and_int_path(val)
-                    if bip32node.depth != len(path):
-                        raise SerializationError(f"PSBT global xpub has mismatching depth ({bip32node.depth}) "
-                                                 f"and derivation prefix len ({len(path)})")
-                    child_number_of_xpub = int.from_bytes(bip32node.child_number, 'big')
-                    if not ((bip32node.depth == 0 and child_number_of_xpub == 0)
-                            or (bip32node.depth != 0 and child_number_of_xpub == path[-1])):
-                        raise SerializationError(f"PSBT global xpub has inconsistent child_number and derivation prefix")
-                    tx.xpubs[bip32node] = xfp, path
-                elif kt == PSBTGlobalType.VERSION:
-                    if len(val) > 4:
-                        raise SerializationError(f"value for {repr(kt)} has unexpected length: {len(val)} > 4")
-                    psbt_version = int.from_bytes(val, byteorder='little', signed=False)
-                    if psbt_version > 0:
-                        raise SerializationError(f"Only PSBTs with version 0 are supported. Found version: {psbt_version}")
-                    if key: raise SerializationError(f"key for {repr(kt)} must be empty")
-                else:
-                    full_key = PSBTSection.get_fullkey_from_keytype_and_key(kt, key)
-                    if full_key in tx._unknown:
-                        raise SerializationError(f'duplicate key. PSBT global key for unknown type: {full_key}')
-                    tx._unknown[full_key] = val
+        vds.read_cursor = 5
+        # parsing "second pass"
+        # global section
+        while True:
             try:
-                # inputs sections
-                for txin in tx.inputs():
-                    if DEBUG_PSBT_PARSING: print("-> new input starts")
-                    txin._populate_psbt_fields_from_fd(fd)
-                # outputs sections
-                for txout in tx.outputs():
-                    if DEBUG_PSBT_PARSING: print("-> new output starts")
-                    txout._populate_psbt_fields_from_fd(fd)
-            except UnexpectedEndOfStream:
-                raise UnexpectedEndOfStream('Unexpected end of stream. Num input and output maps provided does not match unsigned tx.') from None
-
-            if fd.read(1) != b'':
-                raise SerializationError("extra junk at the end of PSBT")
+                kt, key, val = PSBTSection.get_next_kv_from_vds(vds)
+            except StopIteration:
+                break
+            try:
+                kt = PSBTGlobalType(kt)
+            except ValueError:
+                pass  # unknown type
+            if DEBUG_PSBT_PARSING: print(f"{repr(kt)} {key.hex()} {val.hex()}")
+            if kt == PSBTGlobalType.UNSIGNED_TX:
+                pass  # already handled during "first" parsing pass
+            elif kt == PSBTGlobalType.XPUB:
+                bip32node = BIP32Node.from_bytes(key)
+                if bip32node in tx.xpubs:
+                    raise SerializationError(f"duplicate key: {repr(kt)}")
+                xfp, path = unpack_bip32_root_fingerprint_and_int_path(val)
+                if bip32node.depth != len(path):
+                    raise SerializationError(f"PSBT global xpub has mismatching depth ({bip32node.depth}) "
+                                             f"and derivation prefix len ({len(path)})")
+                child_number_of_xpub = int.from_bytes(bip32node.child_number, 'big')
+                if not ((bip32node.depth == 0 and child_number_of_xpub == 0)
+                        or (bip32node.depth != 0 and child_number_of_xpub == path[-1])):
+                    raise SerializationError(f"PSBT global xpub has inconsistent child_number and derivation prefix")
+                tx.xpubs[bip32node] = xfp, path
+            elif kt == PSBTGlobalType.VERSION:
+                if len(val) > 4:
+                    raise SerializationError(f"value for {repr(kt)} has unexpected length: {len(val)} > 4")
+                psbt_version = int.from_bytes(val, byteorder='little', signed=False)
+                if psbt_version > 0:
+                    raise SerializationError(f"Only PSBTs with version 0 are supported. Found version: {psbt_version}")
+                if key: raise SerializationError(f"key for {repr(kt)} must be empty")
+            else:
+                full_key = PSBTSection.get_fullkey_from_keytype_and_key(kt, key)
+                if full_key in tx._unknown:
+                    raise SerializationError(f'duplicate key. PSBT global key for unknown type: {full_key}')
+                tx._unknown[full_key] = val
+        try:
+            # inputs sections
+            for txin in tx.inputs():
+                if DEBUG_PSBT_PARSING: print("-> new input starts")
+                txin._populate_psbt_fields_from_vds(vds)
+            # outputs sections
+            for txout in tx.outputs():
+                if DEBUG_PSBT_PARSING: print("-> new output starts")
+                txout._populate_psbt_fields_from_vds(vds)
+        except UnexpectedEndOfStream:
+            raise UnexpectedEndOfStream('Unexpected end of stream. Num input and output maps provided does not match unsigned tx.') from None
+
+        if vds.can_read_more():
+            raise SerializationError("extra junk at the end of PSBT")
 
         for txin in tx.inputs():
             txin.validate_data()
@@ -1964,89 +2152,116 @@ class PartialTransaction(Transaction):
             return None
 
     def serialize_preimage(self, txin_index: int, *,
-                           bip143_shared_txdigest_fields: BIP143SharedTxDigestFields = None) -> str:
-        if self.overwintered:
-            nVersion = int_to_hex(self._version + 0x80000000, 4)
-            nVersionGroupId = int_to_hex(self.versionGroupId, 4)
-            nExpiryHeight = int_to_hex(self.expiryHeight, 4)
-        else:
-            nVersion = int_to_hex(self._version, 4)
-        nHashType = int_to_hex(1, 4)  # SIGHASH_ALL
-        nLocktime = int_to_hex(self._locktime, 4)
+                           bip143_shared_txdigest_fields: BIP143SharedTxDigestFields = None,
+                           zip243_shared_txdigest_fields: ZIP243SharedTxDigestFields = None) -> str:
+        return self.serialize_preimage_to_bytes(
+            txin_index, zip243_shared_txdigest_fields=zip243_shared_txdigest_fields).hex()
+
+    def serialize_preimage_to_bytes(self, txin_index: int, *,
+                                    zip243_shared_txdigest_fields: ZIP243SharedTxDigestFields = None) -> bytes:
+        """zip243_shared_txdigest_fields: as returned by _calc_zip243_shared_txdigest_fields;
+        pass it when computing the preimages of several inputs, so that it is only computed once.
+        """
+        nHashType = (1).to_bytes(4, 'little')  # SIGHASH_ALL
+        nLocktime = self._locktime.to_bytes(4, 'little')
         inputs = self.inputs()
         outputs = self.outputs()
         txin = inputs[txin_index]
+        preimage_script = self.get_preimage_script(txin)
         if self.overwintered:
-            h = blake2b(digest_size=32, person=PREVOUTS_HASH_PERSON)
-            h.update(b''.join(txin.prevout.serialize_to_network() for txin in inputs))
-            hashPrevouts = bh2u(h.digest())
-
-            h = blake2b(digest_size=32, person=SEQUENCE_HASH_PERSON)
-            h.update(bfh(''.join(int_to_hex(txin.nsequence, 4) for txin in inputs)))
-            hashSequence = bh2u(h.digest())
-
-            h = blake2b(digest_size=32, person=OUTPUTS_HASH_PERSON)
-            h.update(bfh(''.join(o.serialize_to_network().hex() for o in outputs)))
-            hashOutputs = bh2u(h.digest())
-
-            hashJoinSplits = int_to_hex(0, 32)
-            hashShieldedSpends = int_to_hex(0, 32)
-            hashShieldedOutputs = int_to_hex(0, 32)
-            valueBalance = int_to_hex(0, 8)
-
-            outpoint = txin.prevout.serialize_to_network().hex()
-            preimage_script = self.get_preimage_script(txin)
-            scriptCode = var_int(len(preimage_script) // 2) + preimage_script
-            amount = int_to_hex(txin.value_sats(), 8)
-            nSequence = int_to_hex(txin.nsequence, 4)
-
+            if zip243_shared_txdigest_fields is None:
+                zip243_shared_txdigest_fields = self._calc_zip243_shared_txdigest_fields()
+            nVersion = (self._version + 0x80000000).to_bytes(4, 'little')
+            nVersionGroupId = self.versionGroupId.to_bytes(4, 'little')
+            nExpiryHeight = self.expiryHeight.to_bytes(4, 'little')
+            hashJoinSplits = bytes(32)
+            outpoint = txin.prevout.serialize_to_network()
+            scriptCode = bfh(var_int(len(preimage_script) // 2) + preimage_script)
+            amount = txin.value_sats().to_bytes(8, 'little')
+            nSequence = txin.nsequence.to_bytes(4, 'little')
+            preimage = [nVersion, nVersionGroupId,
+                        zip243_shared_txdigest_fields.hashPrevouts,
+                        zip243_shared_txdigest_fields.hashSequence,
+                        zip243_shared_txdigest_fields.hashOutputs,
+                        hashJoinSplits]
             if self.saplinged:
-                preimage = nVersion + nVersionGroupId + hashPrevouts + hashSequence + hashOutputs + hashJoinSplits + hashShieldedSpends + hashShieldedOutputs + nLocktime + nExpiryHeight + valueBalance + nHashType + outpoint + scriptCode + amount + nSequence
+                hashShieldedSpends = bytes(32)
+                hashShieldedOutputs = bytes(32)
+                valueBalance = bytes(8)
+                preimage += [hashShieldedSpends, hashShieldedOutputs, nLocktime, nExpiryHeight, valueBalance]
             else:
-                preimage = nVersion + nVersionGroupId + hashPrevouts + hashSequence + hashOutputs + hashJoinSplits + nLocktime + nExpiryHeight + nHashType + outpoint + scriptCode + amount + nSequence
+                preimage += [nLocktime, nExpiryHeight]
+            preimage += [nHashType, outpoint, scriptCode, amount, nSequence]
+            return b''.join(preimage)
         else:
+            nVersion = int_to_hex(self._version, 4)
             txins = var_int(len(inputs)) + ''.join(self.serialize_input(txin, preimage_script if txin_index==k else '', withSig=True)
                                                    for k, txin in enumerate(inputs))
             txouts = var_int(len(outputs)) + ''.join(o.serialize_to_network().hex() for o in outputs)
-            preimage = nVersion + txins + txouts + nLocktime + nHashType
-        return preimage
+            return bfh(nVersion + txins + txouts) + nLocktime + nHashType
 
-    def sign(self, keypairs) -> None:
+    def sign(self, keypairs, *, num_workers: int = 1) -> None:
+        """Signs the inputs we have keys for.
+        If num_workers > 1, the signatures are computed in a process pool;
+        the result is the same as signing serially (nonces are deterministic).
+        """
         # keypairs:  pubkey_hex -> (secret_bytes, is_compressed)
-        bip143_shared_txdigest_fields = self._calc_bip143_shared_txdigest_fields()
+        zip243_shared_txdigest_fields = None
+        if self.overwintered:
+            zip243_shared_txdigest_fields = self._calc_zip243_shared_txdigest_fields()
+        # (txin_idx, pubkey) pairs to sign, in the order the serial path would sign them
+        to_sign = []
         for i, txin in enumerate(self.inputs()):
-            pubkeys = [pk.hex() for pk in txin.pubkeys]
-            for pubkey in pubkeys:
-                if txin.is_complete():
-                    break
-                if pubkey not in keypairs:
-                    continue
-                _logger.info(f"adding signature for {pubkey}")
+            if txin.is_complete():
+                continue
+            to_sign += [(i, pk.hex()) for pk in txin.pubkeys if pk.hex() in keypairs]
+        sigs = None
+        if num_workers > 1 and len(to_sign) >= 2 * num_workers:
+            sigs = self._sign_txins_in_pool(to_sign, keypairs, num_workers=num_workers,
+                                            zip243_shared_txdigest_fields=zip243_shared_txdigest_fields)
+        for k, (i, pubkey) in enumerate(to_sign):
+            if self.inputs()[i].is_complete():
+                continue
+            _logger.info(f"adding signature for {pubkey}")
+            if sigs is not None:
+                sig = sigs[k]
+            else:
                 sec, compressed = keypairs[pubkey]
-                sig = self.sign_txin(i, sec, bip143_shared_txdigest_fields=bip143_shared_txdigest_fields)
-                self.add_signature_to_txin(txin_idx=i, signing_pubkey=pubkey, sig=sig)
+                sig = self.sign_txin(i, sec, zip243_shared_txdigest_fields=zip243_shared_txdigest_fields)
+            self.add_signature_to_txin(txin_idx=i, signing_pubkey=pubkey, sig=sig)
 
         _logger.debug(f"is_complete {self.is_complete()}")
         self.invalidate_ser_cache()
 
-    def sign_txin(self, txin_index, privkey_bytes, *, bip143_shared_txdigest_fields=None) -> str:
+    def _sign_txins_in_pool(self, to_sign: Sequence[Tuple[int, str]], keypairs, *, num_workers: int,
+                            zip243_shared_txdigest_fields=None) -> Optional[List[str]]:
+        """Returns the signatures for to_sign, or None if the pool is not usable."""
+        if not signing_pool.is_usable():
+            return None
+        hash_person = self._get_sighash_person()
+        preimages = []
+        for i, pubkey in to_sign:
+            self.inputs()[i].validate_data(for_signing=True)
+            preimages.append(self.serialize_preimage_to_bytes(
+                i, zip243_shared_txdigest_fields=zip243_shared_txdigest_fields))
+        privkeys = [keypairs[pubkey][0] for i, pubkey in to_sign]
+        chunksize = max(1, len(to_sign) // (4 * num_workers))
+        return signing_pool.map(_sign_preimage, preimages, [hash_person] * len(to_sign), privkeys,
+                                num_workers=num_workers, chunksize=chunksize)
+
+    def _get_sighash_person(self) -> Optional[bytes]:
+        """Returns the blake2b personalization of the sighash, or None for sha256d."""
+        if not self.overwintered:
+            return None
+        return CANOPY_HASH_PERSON if self.saplinged else OVERWINTER_HASH_PERSON
+
+    def sign_txin(self, txin_index, privkey_bytes, *, bip143_shared_txdigest_fields=None,
+                  zip243_shared_txdigest_fields=None) -> str:
         txin = self.inputs()[txin_index]
         txin.validate_data(for_signing=True)
-        if self.overwintered:
-            if self.saplinged:
-                h = blake2b(digest_size=32, person=CANOPY_HASH_PERSON)
-            else:
-                h = blake2b(digest_size=32, person=OVERWINTER_HASH_PERSON)
-            h.update(bfh(self.serialize_preimage(txin_index,
-                                                 bip143_shared_txdigest_fields=bip143_shared_txdigest_fields)))
-            pre_hash = h.digest()
-        else:
-            pre_hash = sha256d(bfh(self.serialize_preimage(txin_index,
-                                                           bip143_shared_txdigest_fields=bip143_shared_txdigest_fields)))
-        privkey = ecc.ECPrivkey(privkey_bytes)
-        sig = privkey.sign_transaction(pre_hash)
-        sig = bh2u(sig) + '01'  # SIGHASH_ALL
-        return sig
+        preimage = self.serialize_preimage_to_bytes(txin_index,
+                                                    zip243_shared_txdigest_fields=zip243_shared_txdigest_fields)
+        return _sign_preimage(preimage, self._get_sighash_person(), privkey_bytes)
 
     def is_complete(self) -> bool:
         return all([txin.is_complete() for txin in self.inputs()])
@@ -2094,13 +2309,14 @@ class PartialTransaction(Transaction):
             return
         if len(self.inputs()) != len(signatures):
             raise Exception('expected {} signatures; got {}'.format(len(self.inputs()), len(signatures)))
+        zip243_shared_txdigest_fields = self._calc_zip243_shared_txdigest_fields()
         for i, txin in enumerate(self.inputs()):
             pubkeys = [pk.hex() for pk in txin.pubkeys]
             sig = signatures[i]
             if bfh(sig) in list(txin.part_sigs.values()):
                 continue
             h = blake2b(digest_size=32, person=CANOPY_HASH_PERSON)
-            h.update(bfh(self.serialize_preimage(i)))
+            h.update(self.serialize_preimage_to_bytes(i, zip243_shared_txdigest_fields=zip243_shared_txdigest_fields))
             pre_hash = h.digest()
             sig_string = ecc.sig_string_from_der_sig(bfh(sig[:-2]))
             for recid in range(4):
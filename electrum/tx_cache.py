@@ -0,0 +1,125 @@
+import sqlite3
+import threading
+from typing import Optional, Dict, Sequence
+
+from .logging import Logger
+from .util import bfh, bh2u
+
+
+DEFAULT_TX_CACHE_SIZE_MB = 100
+
+
+class TxCache(Logger):
+    """Raw transactions keyed by txid, shared by all wallets of the daemon,
+    so that the same transaction is not downloaded again for each wallet.
+
+    Only complete transactions whose txid has been checked should be put here.
+    When the total size exceeds max_size bytes, the least recently used
+    transactions are evicted.
+
+    Unlike SqlDB, methods are synchronous: lookups are by primary key and
+    are needed from non-asyncio threads too (e.g. Abstract_Wallet.get_input_tx).
+    They do disk I/O, so asyncio code must call them with run_in_thread.
+    """
+
+    # lookups update last_used in memory only; it is written with the next
+    # write, or once this many lookups are pending
+    MAX_PENDING_LAST_USED = 1000
+
+    def __init__(self, path: str, *, max_size: int):
+        Logger.__init__(self)
+        self.path = path
+        self.max_size = max_size
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        # this is a cache: losing the last writes on power loss is fine, corruption is not
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS txs (txid BLOB PRIMARY KEY, raw BLOB NOT NULL, last_used INTEGER NOT NULL)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS txs_last_used ON txs (last_used)")
+        self.conn.commit()
+        total_size, last_used = self.conn.execute("SELECT SUM(LENGTH(raw)), MAX(last_used) FROM txs").fetchone()
+        self._total_size = total_size or 0
+        self._counter = last_used or 0
+        self._pending_last_used = {}  # type: Dict[bytes, int]  # txid -> last_used
+        self.logger.info(f"tx cache opened: {self._total_size} bytes")
+
+    def _next_counter(self) -> int:
+        self._counter += 1
+        return self._counter
+
+    def get_tx(self, txid: str) -> Optional[str]:
+        """Returns the raw tx as hex, or None."""
+        return self.get_txs([txid]).get(txid)
+
+    def get_txs(self, txids: Sequence[str]) -> Dict[str, str]:
+        """Returns txid -> raw tx (hex), for the txids we have."""
+        result = {}
+        with self.lock:
+            for txid in txids:
+                row = self.conn.execute("SELECT raw FROM txs WHERE txid=?", (bfh(txid),)).fetchone()
+                if row is None:
+                    continue
+                result[txid] = bh2u(row[0])
+                self._pending_last_used[bfh(txid)] = self._next_counter()
+            if len(self._pending_last_used) >= self.MAX_PENDING_LAST_USED:
+                self._write_last_used()
+                self.conn.commit()
+        return result
+
+    def _write_last_used(self) -> None:
+        self.conn.executemany("UPDATE txs SET last_used=? WHERE txid=?",
+                              [(last_used, txid) for txid, last_used in self._pending_last_used.items()])
+        self._pending_last_used.clear()
+
+    def add_txs(self, raw_txs: Dict[str, str]) -> None:
+        """Stores txid -> raw tx (hex)."""
+        with self.lock:
+            for txid, raw_tx in raw_txs.items():
+                raw = bfh(raw_tx)
+                if self.conn.execute("SELECT 1 FROM txs WHERE txid=?", (bfh(txid),)).fetchone():
+                    continue
+                self.conn.execute("INSERT INTO txs (txid, raw, last_used) VALUES (?,?,?)",
+                                  (bfh(txid), raw, self._next_counter()))
+                self._total_size += len(raw)
+            self._write_last_used()
+            if self._total_size > self.max_size:
+                self._evict()
+            self.conn.commit()
+
+    def add_tx(self, txid: str, raw_tx: str) -> None:
+        self.add_txs({txid: raw_tx})
+
+    def remove_tx(self, txid: str) -> None:
+        with self.lock:
+            row = self.conn.execute("SELECT LENGTH(raw) FROM txs WHERE txid=?", (bfh(txid),)).fetchone()
+            if row is None:
+                return
+            self.conn.execute("DELETE FROM txs WHERE txid=?", (bfh(txid),))
+            self._pending_last_used.pop(bfh(txid), None)
+            self._total_size -= row[0]
+            self._write_last_used()
+            self.conn.commit()
+
+    def _evict(self) -> None:
+        # evict down to 90% of the limit, so that we do not evict on every insert
+        target = self.max_size * 9 // 10
+        cursor = self.conn.execute("SELECT txid, LENGTH(raw) FROM txs ORDER BY last_used")
+        to_delete = []
+        for txid, size in cursor:
+            if self._total_size <= target:
+                break
+            to_delete.append((txid,))
+            self._total_size -= size
+        cursor.close()
+        self.conn.executemany("DELETE FROM txs WHERE txid=?", to_delete)
+        self.logger.info(f"evicted {len(to_delete)} txs from tx cache")
+
+    def total_size(self) -> int:
+        return self._total_size
+
+    def close(self) -> None:
+        with self.lock:
+            self._write_last_used()
+            self.conn.commit()
+            self.conn.close()
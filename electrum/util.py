@@ -32,6 +32,8 @@ import traceback
 import urllib
 import threading
 import hmac
+import concurrent.futures
+import multiprocessing
 import stat
 from locale import localeconv
 import asyncio
@@ -1248,6 +1250,95 @@ class OrderedDictWithIndex(OrderedDict):
         return ret
 
 
+class LRUCache(OrderedDict):
+    """A dict that holds at most maxsize items, evicting the least recently used ones.
+
+    Note: only get() and __setitem__ update recency. Not thread-safe.
+    """
+
+    def __init__(self, *, maxsize: int):
+        assert maxsize > 0, maxsize
+        super().__init__()
+        self.maxsize = maxsize
+
+    def get(self, key, default=None):
+        try:
+            value = self[key]
+        except KeyError:
+            return default
+        self.move_to_end(key)
+        return value
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self.move_to_end(key)
+        while len(self) > self.maxsize:
+            self.popitem(last=False)
+
+
+class SpawnProcessPool:
+    """A lazily created process pool, for CPU-bound work such as hashing or signing.
+
+    Workers are started with 'spawn', so that we never fork a process that has the
+    network threads running. ProcessPoolExecutor takes mp_context only since python 3.7;
+    older versions, and any pool that failed once, make map() return None,
+    and the caller computes the results serially instead.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._executor = None  # type: Optional[concurrent.futures.Executor]
+        self._num_workers = 0
+        self._usable = sys.version_info >= (3, 7)
+        self._lock = threading.Lock()
+
+    def is_usable(self) -> bool:
+        return self._usable
+
+    def _get_executor(self, num_workers: int) -> Optional[concurrent.futures.Executor]:
+        with self._lock:
+            if not self._usable:
+                return None
+            if self._executor is None or self._num_workers != num_workers:
+                if self._executor is not None:
+                    self._executor.shutdown(wait=False)
+                    self._executor = None
+                try:
+                    self._executor = concurrent.futures.ProcessPoolExecutor(
+                        max_workers=num_workers,
+                        mp_context=multiprocessing.get_context('spawn'))
+                except Exception as e:
+                    # e.g. platforms where we cannot start processes
+                    _logger.warning(f"cannot create {self.name} process pool: {repr(e)}")
+                    self._usable = False
+                    return None
+                self._num_workers = num_workers
+            return self._executor
+
+    def map(self, func, *iterables, num_workers: int, chunksize: int = 1) -> Optional[list]:
+        """Returns list(map(func, *iterables)), computed in the pool,
+        or None if the caller has to compute it serially."""
+        executor = self._get_executor(num_workers)
+        if executor is None:
+            return None
+        try:
+            return list(executor.map(func, *iterables, chunksize=chunksize))
+        except Exception as e:
+            # e.g. BrokenProcessPool; do not retry for every call
+            _logger.warning(f"{self.name} process pool failed, working serially from now on: {repr(e)}")
+            with self._lock:
+                self._usable = False
+            self.shutdown()
+            return None
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+            self._executor = None
+            self._num_workers = 0
+
+
 def multisig_type(wallet_type):
     '''If wallet_type is mofn multi-sig, return [m, n],
     otherwise return None.'''
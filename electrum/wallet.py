@@ -63,10 +63,11 @@ from .bitcoin import is_address, address_to_script, is_minikey, relayfee, dust_t
 from .crypto import sha256d
 from . import keystore
 from .keystore import (load_keystore, Hardware_KeyStore, KeyStore, KeyStoreWithMPK,
-                       AddressIndexGeneric, CannotDerivePubkey)
+                       AddressIndexGeneric, CannotDerivePubkey, Software_KeyStore)
 from .util import multisig_type
 from .storage import StorageEncryptionVersion, WalletStorage
-from .wallet_db import WalletDB
+from .wallet_db import WalletDB, open_wallet_db
+from .sqlite_wallet_db import SQLITE_TABLES_KEY, SQLITE_SUFFIX
 from . import transaction, bitcoin, coinchooser, paymentrequest, ecc, bip32
 from .transaction import (Transaction, TxInput, UnknownTxinType, TxOutput,
                           PartialTransaction, PartialTxInput, PartialTxOutput, TxOutpoint)
@@ -85,6 +86,7 @@ from .util import read_json_file, write_json_file, UserFacingException
 
 if TYPE_CHECKING:
     from .network import Network
+    from .tx_cache import TxCache
 
 
 _logger = get_logger(__name__)
@@ -198,10 +200,18 @@ async def sweep(
     rbf = config.get('use_rbf', False)
     if rbf:
         tx.set_rbf(True)
-    tx.sign(keypairs)
+    tx.sign(keypairs, num_workers=get_num_signing_workers(config))
     return tx
 
 
+def get_num_signing_workers(config: 'SimpleConfig') -> int:
+    """Number of processes to sign large txs with; 1 (serial) unless configured."""
+    num_workers = config.get('signing_workers')
+    if num_workers is None:
+        return 1
+    return max(1, int(num_workers))
+
+
 def get_locktime_for_new_transaction(network: 'Network') -> int:
     # if no network or not up to date, just set locktime to zero
     if not network:
@@ -277,6 +287,9 @@ class Abstract_Wallet(AddressSynchronizer, ABC):
         assert self.config is not None, "config must not be None"
         self.db = db
         self.storage = storage
+        if storage and config.get('wallet_journal', False):
+            # save changes by appending them to the wallet file
+            db.enable_journal()
         # load addresses needs to be called before constructor for sanity checks
         db.load_addresses(self.wallet_type)
         self.keystore = None  # type: Optional[KeyStore]  # will be set by load_keystore
@@ -307,9 +320,9 @@ class Abstract_Wallet(AddressSynchronizer, ABC):
         # a wallet may have channel backups, regardless of lnworker activation
         self.lnbackups = LNBackups(self)
 
-    def save_db(self):
+    def save_db(self, *, consolidate: bool = False):
         if self.storage:
-            self.db.write(self.storage)
+            self.db.write(self.storage, consolidate=consolidate)
 
     def save_backup(self):
         backup_dir = get_backup_dir(self.config)
@@ -323,6 +336,8 @@ class Abstract_Wallet(AddressSynchronizer, ABC):
                 channel_backups[chan_id.hex()] = self.lnworker.create_channel_backup(chan_id)
             new_db.put('channels', None)
             new_db.put('lightning_privkey2', None)
+        # the tables in SQLite are not part of the backup, history will be synced again
+        new_db.put(SQLITE_TABLES_KEY, None)
 
         new_path = os.path.join(backup_dir, self.basename() + '.backup')
         new_storage = WalletStorage(new_path)
@@ -359,7 +374,9 @@ class Abstract_Wallet(AddressSynchronizer, ABC):
                 self.lnworker.stop()
                 self.lnworker = None
             self.lnbackups.stop()
-        self.save_db()
+        # leave a plain wallet file behind, readable without replaying a journal
+        self.save_db(consolidate=True)
+        self.db.close()
 
     def set_up_to_date(self, b):
         super().set_up_to_date(b)
@@ -1710,11 +1727,24 @@ class Abstract_Wallet(AddressSynchronizer, ABC):
                     return True
         return False
 
+    def get_tx_cache(self) -> Optional['TxCache']:
+        """Returns the tx cache shared by the wallets of the daemon.
+        It is not used if the wallet file is encrypted, as the cache is not.
+        """
+        if not self.network or self.has_storage_encryption():
+            return None
+        return self.network.tx_cache
+
     def get_input_tx(self, tx_hash, *, ignore_network_issues=False) -> Optional[Transaction]:
         # First look up an input transaction in the wallet where it
         # will likely be.  If co-signing a transaction it may not have
         # all the input txs, in which case we ask the network.
         tx = self.db.get_transaction(tx_hash)
+        tx_cache = self.get_tx_cache()
+        if not tx and tx_cache:
+            raw_tx = tx_cache.get_tx(tx_hash)
+            if raw_tx:
+                tx = Transaction(raw_tx)
         if not tx and self.network and self.network.has_internet_connection():
             try:
                 raw_tx = self.network.run_from_another_thread(
@@ -1726,6 +1756,8 @@ class Abstract_Wallet(AddressSynchronizer, ABC):
                     raise e
             else:
                 tx = Transaction(raw_tx)
+                if tx_cache:
+                    tx_cache.add_tx(tx_hash, raw_tx)
         if not tx and not ignore_network_issues:
             raise NetworkException('failed to get prev tx from network')
         return tx
@@ -1768,7 +1800,10 @@ class Abstract_Wallet(AddressSynchronizer, ABC):
         for k in sorted(self.get_keystores(), key=lambda ks: ks.ready_to_sign(), reverse=True):
             try:
                 if k.can_sign(tmp_tx):
-                    k.sign_transaction(tmp_tx, password)
+                    if isinstance(k, Software_KeyStore):
+                        k.sign_transaction(tmp_tx, password, num_workers=get_num_signing_workers(self.config))
+                    else:
+                        k.sign_transaction(tmp_tx, password)
             except UserCancelled:
                 continue
         # remove sensitive info; then copy back details from temporary tx
@@ -2143,6 +2178,8 @@ class Abstract_Wallet(AddressSynchronizer, ABC):
             raise InvalidPassword()
         self.check_password(old_pw)
         if self.storage:
+            if encrypt_storage and self.db.get(SQLITE_TABLES_KEY):
+                raise WalletFileException('storage encryption is not supported for wallets using SQLite')
             if encrypt_storage:
                 enc_version = self.get_available_storage_encryption_version()
             else:
@@ -2452,6 +2489,9 @@ class Imported_Wallet(Simple_Wallet):
             self.db.remove_addr_history(address)
             for tx_hash in transactions_to_remove:
                 self.remove_transaction(tx_hash)
+            # the deltas of the remaining txs changed
+            self.reset_history_index()
+            self._invalidate_addr_balance(address)
         self.set_label(address, None)
         self.remove_payment_request(address)
         self.set_frozen_state_of_addresses([address], False)
@@ -3005,14 +3045,14 @@ def check_password_for_directory(config, old_password, new_password=None):
         failed = []
         for filename in os.listdir(dirname):
             path = os.path.join(dirname, filename)
-            if not os.path.isfile(path):
+            if not os.path.isfile(path) or path.endswith(SQLITE_SUFFIX):
                 continue
             basename = os.path.basename(path)
             storage = WalletStorage(path)
             if not storage.is_encrypted():
                 # it is a bit wasteful load the wallet here, but that is fine
                 # because we are progressively enforcing storage encryption.
-                db = WalletDB(storage.read(), manual_upgrades=False)
+                db = open_wallet_db(storage, manual_upgrades=False)
                 wallet = Wallet(db, storage, config=config)
                 if wallet.has_keystore_encryption():
                     try:
@@ -3034,7 +3074,7 @@ def check_password_for_directory(config, old_password, new_password=None):
             except:
                 failed.append(basename)
                 continue
-            db = WalletDB(storage.read(), manual_upgrades=False)
+            db = open_wallet_db(storage, manual_upgrades=False)
             wallet = Wallet(db, storage, config=config)
             try:
                 wallet.check_password(old_password)
@@ -36,10 +36,10 @@ from .util import profiler, WalletFileException, multisig_type, TxMinedInfo, bfh
 from .invoices import PR_TYPE_ONCHAIN, Invoice
 from .keystore import bip44_derivation
 from .transaction import Transaction, TxOutpoint, tx_from_any, PartialTransaction, PartialTxOutput
-from .logging import Logger
+from .logging import Logger, get_logger
 from .lnutil import LOCAL, REMOTE, FeeUpdate, UpdateAddHtlc, LocalConfig, RemoteConfig, Keypair, OnlyPubkeyKeypair, RevocationStore, ChannelBackupStorage
 from .lnutil import ChannelConstraints, Outpoint, ShachainElement
-from .json_db import StoredDict, JsonDB, locked, modifier
+from .json_db import StoredDict, JsonDB, locked, modifier, load_json_with_journal
 from .plugin import run_hook, plugin_loaders
 from .paymentrequest import PaymentRequest
 from .submarine_swaps import SwapData
@@ -48,6 +48,8 @@ if TYPE_CHECKING:
     from .storage import WalletStorage
 
 
+_logger = get_logger(__name__)
+
 # seed_version is now used for the version of the wallet file
 
 OLD_SEED_VERSION = 4        # electrum versions < 2.0
@@ -62,6 +64,30 @@ class TxFeesValue(NamedTuple):
     num_inputs: Optional[int] = None
 
 
+def parse_wallet_file(s: str) -> dict:
+    """Parses the contents of a wallet file, without upgrading it."""
+    try:
+        data = load_json_with_journal(s)
+    except:
+        try:
+            d = ast.literal_eval(s)
+            labels = d.get('labels', {})
+        except Exception as e:
+            raise WalletFileException("Cannot read wallet file. (parsing failed)")
+        data = {}
+        for key, value in d.items():
+            try:
+                json.dumps(key)
+                json.dumps(value)
+            except:
+                _logger.info(f'Failed to convert label to json format: {key}')
+                continue
+            data[key] = value
+    if not isinstance(data, dict):
+        raise WalletFileException("Malformed wallet file (not dict)")
+    return data
+
+
 class WalletDB(JsonDB):
 
     def __init__(self, raw, *, manual_upgrades: bool):
@@ -76,25 +102,8 @@ class WalletDB(JsonDB):
             self._after_upgrade_tasks()
 
     def load_data(self, s):
-        try:
-            self.data = json.loads(s)
-        except:
-            try:
-                d = ast.literal_eval(s)
-                labels = d.get('labels', {})
-            except Exception as e:
-                raise WalletFileException("Cannot read wallet file. (parsing failed)")
-            self.data = {}
-            for key, value in d.items():
-                try:
-                    json.dumps(key)
-                    json.dumps(value)
-                except:
-                    self.logger.info(f'Failed to convert label to json format: {key}')
-                    continue
-                self.data[key] = value
-        if not isinstance(self.data, dict):
-            raise WalletFileException("Malformed wallet file (not dict)")
+        """s: the contents of the wallet file, or the result of parse_wallet_file"""
+        self.data = s if isinstance(s, dict) else parse_wallet_file(s)
 
         if not self._manual_upgrades and self.requires_split():
             raise WalletFileException("This wallet has multiple accounts and must be split")
@@ -926,6 +935,7 @@ class WalletDB(JsonDB):
         if scripthash not in self._prevouts_by_scripthash:
             self._prevouts_by_scripthash[scripthash] = set()
         self._prevouts_by_scripthash[scripthash].add((prevout.to_str(), value))
+        self._add_patch(['s', ['prevouts_by_scripthash', scripthash], self._prevouts_by_scripthash[scripthash]])
 
     @modifier
     def remove_prevout_by_scripthash(self, scripthash: str, *, prevout: TxOutpoint, value: int) -> None:
@@ -933,6 +943,7 @@ class WalletDB(JsonDB):
         assert isinstance(prevout, TxOutpoint)
         assert isinstance(value, int)
         self._prevouts_by_scripthash[scripthash].discard((prevout.to_str(), value))
+        self._add_patch(['s', ['prevouts_by_scripthash', scripthash], self._prevouts_by_scripthash[scripthash]])
         if not self._prevouts_by_scripthash[scripthash]:
             self._prevouts_by_scripthash.pop(scripthash)
 
@@ -1117,12 +1128,14 @@ class WalletDB(JsonDB):
         assert isinstance(addr, str)
         self._addr_to_addr_index[addr] = (1, len(self.change_addresses))
         self.change_addresses.append(addr)
+        self._add_patch(['a', ['addresses', 'change'], addr])
 
     @modifier
     def add_receiving_address(self, addr: str) -> None:
         assert isinstance(addr, str)
         self._addr_to_addr_index[addr] = (0, len(self.receiving_addresses))
         self.receiving_addresses.append(addr)
+        self._add_patch(['a', ['addresses', 'receiving'], addr])
 
     @locked
     def get_address_index(self, address: str) -> Optional[Sequence[int]]:
@@ -1255,21 +1268,36 @@ class WalletDB(JsonDB):
             return False
         return True
 
-    def write(self, storage: 'WalletStorage'):
+    def write(self, storage: 'WalletStorage', *, consolidate: bool = False):
+        """consolidate: rewrite the whole file, even if the journal could be used"""
         with self.lock:
-            self._write(storage)
+            self._write(storage, consolidate=consolidate)
 
     @profiler
-    def _write(self, storage: 'WalletStorage'):
+    def _write(self, storage: 'WalletStorage', *, consolidate: bool = False):
         if threading.currentThread().isDaemon():
             self.logger.warning('daemon thread cannot write db')
             return
-        if not self.modified():
+        if not self.modified() and not (consolidate and storage.has_journal()):
             return
-        json_str = self.dump(human_readable=not storage.is_encrypted())
-        storage.write(json_str)
+        if (self._journal_enabled
+                and not consolidate
+                and not self._needs_consolidation
+                and isinstance(self.data, StoredDict)
+                and storage.file_exists()
+                and not storage.should_consolidate()):
+            if self._pending_patches:
+                storage.append(self._pop_journal_record())
+        else:
+            json_str = self.dump(human_readable=not storage.is_encrypted())
+            storage.write(json_str)
+        self._clear_journal()
         self.set_modified(False)
 
+    def close(self):
+        """Releases the resources of the db. It must not be used afterwards."""
+        pass
+
     def is_ready_to_be_used_by_wallet(self):
         return not self.requires_upgrade() and self._called_after_upgrade_tasks
 
@@ -1298,3 +1326,16 @@ class WalletDB(JsonDB):
 
     def set_keystore_encryption(self, enable):
         self.put('use_encryption', enable)
+
+
+def open_wallet_db(storage: 'WalletStorage', *, manual_upgrades: bool) -> WalletDB:
+    """Returns the db of the wallet in storage (which must be decrypted),
+    using the backend the wallet was saved with."""
+    from .sqlite_wallet_db import SqliteWalletDB, SQLITE_TABLES_KEY, get_sqlite_path
+    raw = storage.read()
+    if not raw:
+        return WalletDB(raw, manual_upgrades=manual_upgrades)
+    data = parse_wallet_file(raw)
+    if not data.get(SQLITE_TABLES_KEY):
+        return WalletDB(data, manual_upgrades=manual_upgrades)
+    return SqliteWalletDB(data, manual_upgrades=manual_upgrades, sqlite_path=get_sqlite_path(storage.path))